@@ -0,0 +1,126 @@
+"""
+对比工作流中串行执行的脚本命令与 m3u_dag.py 并行执行 scripts/pipeline.json 的耗时，并检查输出一致
+
+串行版本直接取 .github/workflows/main.yml 中的 python ./scripts/... 命令（跳过 wget、node 与注释行），
+用 bash 逐条执行；源文件用仓库中已提交的播放列表代替下载结果
+
+用法:
+  python benchmarks/bench_dag.py
+  python benchmarks/bench_dag.py --repeat 20 --jobs 4
+"""
+
+import argparse
+import filecmp
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_utils import SCRIPTS_DIR
+
+REPO_DIR = os.path.abspath(os.path.join(SCRIPTS_DIR, '..'))
+WORKFLOW = os.path.join(REPO_DIR, '.github', 'workflows', 'main.yml')
+DEFINITION = os.path.join(REPO_DIR, 'scripts', 'pipeline.json')
+
+# 源文件 -> 代替下载结果的已提交播放列表
+FIXTURES = {
+    'mig.m3u': ['migu.m3u'],
+    'hp.m3u': ['httop.m3u'],
+    'gop.m3u': ['iptv.m3u'],
+    'live2.m3u': ['backup/huuc_ipv6.m3u'],
+    '1.m3u': ['backup/sh.lnott.top.m3u'],
+    't4op.m3u': ['backup/php.jdshipin.com.m3u'],
+    'tv5op.m3u': ['backup/php.jdshipin.com_merged.m3u'],
+    'lite.m3u': ['backup/yp.qqqtv.top.m3u', 'backup/catvod.com.m3u'],
+    'huuc_ipv6.m3u': ['backup/huuc_ipv6.m3u'],
+    'sh.lnott.top.m3u': ['backup/sh.lnott.top.m3u'],
+    'cdn6.101.qzz.io.m3u': ['backup/php.jdshipin.com.m3u'],
+}
+
+
+def workflow_commands():
+    """main.yml 中按顺序出现的 python 脚本命令"""
+    commands = []
+    with open(WORKFLOW, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('python ./scripts/'):
+                commands.append(line)
+    return commands
+
+
+def prepare_sources(directory, repeat):
+    """把已提交的播放列表复制为源文件，repeat > 1 时重复频道记录以模拟更大的上游文件"""
+    for target, fixtures in FIXTURES.items():
+        header = None
+        body = []
+        for fixture in fixtures:
+            with open(os.path.join(REPO_DIR, fixture), 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            if lines and lines[0].startswith('#EXTM3U'):
+                header = header or lines[0]
+                lines = lines[1:]
+            body.extend(lines)
+        with open(os.path.join(directory, target), 'w', encoding='utf-8') as f:
+            if header:
+                f.write(header + '\n')
+            for _ in range(repeat):
+                f.write('\n'.join(body) + '\n')
+
+
+def timed_run(args, cwd):
+    """运行命令并返回耗时秒数"""
+    start = time.perf_counter()
+    subprocess.run(args, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流水线 DAG 并行执行基准测试")
+    parser.add_argument('--repeat', type=int, default=1, help="源文件中频道记录的重复次数")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help="m3u_dag.py 的并行进程数")
+    args = parser.parse_args()
+
+    with open(DEFINITION, 'r', encoding='utf-8') as f:
+        outputs = [node['output'] for node in json.load(f)['nodes'].values() if node.get('output')]
+    script = '\n'.join(workflow_commands()) + '\n'
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dirs = {}
+        for label in ('shell', 'dag_serial', 'dag'):
+            dirs[label] = os.path.join(tmp, label)
+            os.makedirs(dirs[label])
+            os.symlink(SCRIPTS_DIR, os.path.join(dirs[label], 'scripts'))
+            prepare_sources(dirs[label], args.repeat)
+
+        size = sum(os.path.getsize(os.path.join(dirs['shell'], name)) for name in FIXTURES)
+        print(f"源文件: {len(FIXTURES)} 个，共 {size / 1024:.1f}KB；工作流命令 {script.count(chr(10))} 条")
+
+        timings = {
+            'shell': timed_run(['bash', '-c', script], dirs['shell']),
+            'dag_serial': timed_run([sys.executable, './scripts/m3u_dag.py', DEFINITION, '-j', '1'],
+                                    dirs['dag_serial']),
+            'dag': timed_run([sys.executable, './scripts/m3u_dag.py', DEFINITION, '-j', str(args.jobs)],
+                             dirs['dag']),
+        }
+
+        for label in ('dag_serial', 'dag'):
+            mismatched = [name for name in outputs
+                          if not filecmp.cmp(os.path.join(dirs['shell'], name),
+                                             os.path.join(dirs[label], name), shallow=False)]
+            if mismatched:
+                print(f"{label}: 输出与串行脚本不一致: {', '.join(mismatched)}")
+            else:
+                print(f"{label}: {len(outputs)} 个输出文件与串行脚本逐字节一致")
+
+        print(f"{'串行脚本 (bash)':<24}{timings['shell']:8.2f}s")
+        print(f"{'m3u_dag.py -j 1':<24}{timings['dag_serial']:8.2f}s  "
+              f"({timings['shell'] / timings['dag_serial']:.1f}x)")
+        print(f"{f'm3u_dag.py -j {args.jobs}':<24}{timings['dag']:8.2f}s  "
+              f"({timings['shell'] / timings['dag']:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+deduplicate.py 记录已出现键的三种方式在键数增加时的内存与吞吐量对比：
+原实现的字符串集合、m3u_seen.SeenDigests（8 字节摘要）与 m3u_seen.SeenBloom（Bloom 过滤器）
+
+键为 name+url（频道名称与全部 URL），URL 带 msisdn、timestamp 等长参数（模拟运营商源），
+每个键加入两次，一半为重复；并统计 Bloom 过滤器实际丢弃的非重复键数
+
+用法:
+  python benchmarks/bench_dedupe_keys.py
+  python benchmarks/bench_dedupe_keys.py --keys 100000 1000000 --fpr 0.01
+"""
+
+import argparse
+import time
+
+from bench_utils import HOSTS, format_bytes, measure
+
+from m3u_seen import SeenBloom, SeenDigests
+
+
+def make_keys(count):
+    """生成 count 个不同的 (名称, URL) 键字段"""
+    keys = []
+    for i in range(count):
+        host = HOSTS[i % len(HOSTS)]
+        url = (f"http://{host}/PLTV/88888888/224/3221{i:07d}/index.m3u8"
+               f"?msisdn=1{i:010d}&timestamp=20240101{i % 86400:06d}&AuthInfo={i * 7919:016x}")
+        keys.append(('1', f"频道{i}", '1', url))
+    return keys
+
+
+def dedupe_strings(keys):
+    """原实现：保存键拼接后的字符串"""
+    seen = set()
+    kept = 0
+    for key in keys:
+        text = '\n'.join(key)
+        if text not in seen:
+            seen.add(text)
+            kept += 1
+    return seen, kept
+
+
+def dedupe_with(seen, keys):
+    kept = sum(1 for key in keys if seen.add(key))
+    return seen, kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description="去重键存储方式基准测试")
+    parser.add_argument('--keys', type=int, nargs='+', default=[10000, 100000, 500000], help="不同键的数量")
+    parser.add_argument('--fpr', type=float, default=0.001, help="Bloom 过滤器的目标误判率")
+    args = parser.parse_args()
+
+    print(f"{'不同键数':>10}  {'峰值内存':>10}  {'键/秒':>10}  {'保留':>10}  方式")
+    for count in args.keys:
+        unique = make_keys(count)
+        keys = unique + unique  # 第二遍全部为重复
+
+        cases = [
+            ('字符串集合（原实现）', lambda: dedupe_strings(keys)),
+            ('SeenDigests', lambda: dedupe_with(SeenDigests(), keys)),
+            (f'SeenBloom fpr={args.fpr}', lambda: dedupe_with(SeenBloom(count, args.fpr), keys)),
+        ]
+        for label, run in cases:
+            (_, kept), _, peak = measure(run)
+            # measure 开启 tracemalloc 会拖慢速度，吞吐量另外计时
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            print(f"{count:>10}  {format_bytes(peak):>10}  {len(keys) / elapsed:10,.0f}  {kept:>10}  {label}")
+        print(f"{'':>10}  Bloom 误判丢弃 {count - kept} 个键（{(count - kept) / count:.4%}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+extract.py 关键字匹配的吞吐量：原实现（每条记录重新拆分表达式，逐个关键字 in 查找）、
+编译后的表达式（每行一次扫描）与字段条件 url.host in {...}（每条记录一次哈希查找）在主机数量增加时的对比
+
+URL 一侧使用 N 个主机关键字的 || 表达式（模拟按主机过滤酒店源），EXTINF 一侧固定为 "CCTV && !4K"
+（原实现不支持 !，该侧在原实现中只计算 "CCTV"）
+
+用法:
+  python benchmarks/bench_extract_match.py
+  python benchmarks/bench_extract_match.py --channels 200000 --terms 4 16 64 256
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from bench_utils import HOSTS, generate_playlist
+
+from extract import _parse_keyword_args, _split_record_lines
+from m3u_parser import iter_m3u_file
+
+
+def legacy_check_match(text, keyword_str):
+    """原 extract._check_match"""
+    if not keyword_str or not keyword_str.strip():
+        return False
+    processed_keyword = keyword_str.strip().strip('"')
+    if "&&" in processed_keyword:
+        sub_keywords = [k.strip() for k in processed_keyword.split("&&") if k.strip()]
+        match_all = True
+    elif "||" in processed_keyword:
+        sub_keywords = [k.strip() for k in processed_keyword.split("||") if k.strip()]
+        match_all = False
+    else:
+        sub_keywords = [processed_keyword]
+        match_all = True
+    if match_all:
+        return all(k in text for k in sub_keywords)
+    return any(k in text for k in sub_keywords)
+
+
+def load_pairs(path):
+    """读取 (EXTINF, URL) 对"""
+    pairs = []
+    for record in iter_m3u_file(path):
+        if record.extinf is not None:
+            _, url, _ = _split_record_lines(record.lines)
+            if url:
+                pairs.append((record.extinf, url))
+    return pairs
+
+
+def rate(matched, pairs):
+    """
+    :param matched: 判断函数，返回只含一个元素的命中列表（与 extract._parse_keyword_args 相同）
+    :return: (每秒记录数, 命中数)
+    """
+    start = time.perf_counter()
+    hits = sum(1 for extinf, url in pairs if matched(extinf, url)[0])
+    return len(pairs) / (time.perf_counter() - start), hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="extract.py 关键字匹配基准测试")
+    parser.add_argument('--channels', type=int, default=50000, help="合成播放列表的记录数")
+    parser.add_argument('--terms', type=int, nargs='+', default=[4, 16, 64, 256], help="URL 一侧的主机关键字数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'bench.m3u')
+        generate_playlist(path, args.channels, urls_per_channel=1)
+        pairs = load_pairs(path)
+    print(f"{len(pairs)} 条记录")
+
+    print(f"{'原实现 记录/秒':>14}  {'编译后 记录/秒':>14}  {'字段条件 记录/秒':>16}  {'命中':>6}  主机数")
+    for count in args.terms:
+        # 取列表后部的主机，大部分 URL 需要查完所有关键字
+        hosts = [f"//{host}/" for host in HOSTS[-count:]]
+        url_expression = ' || '.join(hosts)
+
+        legacy = lambda extinf, url: [legacy_check_match(extinf, "CCTV") or legacy_check_match(url, url_expression)]
+        legacy_rate, legacy_hits = rate(legacy, pairs)
+
+        ok, matched = _parse_keyword_args(extinf_or_url_keywords=f"CCTV && !4K,{url_expression}")
+        assert ok
+        compiled_rate, hits = rate(matched, pairs)
+        assert hits == legacy_hits
+
+        # 合成数据中每个主机只对应一个端口，按主机名选择与按 "//主机:端口/" 查找结果相同
+        host_set = ', '.join(host.split(':')[0] for host in HOSTS[-count:])
+        ok, by_field = _parse_keyword_args(extinf_or_url_keywords=f"CCTV && !4K,url.host in {{{host_set}}}")
+        assert ok
+        field_rate, field_hits = rate(by_field, pairs)
+        assert field_hits == hits
+        print(f"{legacy_rate:14,.0f}  {compiled_rate:14,.0f}  {field_rate:16,.0f}  {hits:>6}  {count}")
+
+
+if __name__ == "__main__":
+    main()
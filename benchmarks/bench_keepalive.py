@@ -0,0 +1,62 @@
+"""
+rdfinurl.get_final_url 复用连接的效果：每次请求新建连接（模块级 requests.get）与
+ConnectionPool（各线程共用、按主机复用 keep-alive 连接）的吞吐量与服务器端实际建立的连接数
+
+使用本地 LatencyServer（同一 IP:端口，模拟酒店源中大量 URL 位于同一主机）：每个 URL 先 302 重定向一次，
+每个响应延迟 --latency 秒；建立连接的开销随网络往返时间增长，本地回环上只体现 TCP 建连与 Python 端的开销
+
+用法:
+  python benchmarks/bench_keepalive.py
+  python benchmarks/bench_keepalive.py --urls 2000 --workers 20 --per-host 4 20
+"""
+
+import argparse
+import contextlib
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_utils import LatencyServer
+
+from rdfinurl import ConnectionPool, get_final_url
+
+
+def run(urls, workers, pool, server):
+    """:return: (每秒 URL 数, 服务器端新建的连接数, 成功数)"""
+    connections_before = server.connections
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # get_final_url 每个 URL 都会打印，基准测试中丢弃
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = list(executor.map(lambda url: get_final_url(url, 10, 30, pool), urls))
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for result in results if result and result[1])
+    return len(urls) / elapsed, server.connections - connections_before, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="keep-alive 连接池基准测试")
+    parser.add_argument('--urls', type=int, default=1000, help="URL 数")
+    parser.add_argument('--latency', type=float, default=0.005, help="每个响应的延迟（秒）")
+    parser.add_argument('--workers', type=int, default=10, help="线程数")
+    parser.add_argument('--per-host', type=int, nargs='+', default=[2, 10], help="每个主机的连接数上限")
+    args = parser.parse_args()
+
+    with LatencyServer(args.latency) as server:
+        urls = [f"{server.base_url}/r/{i}" for i in range(args.urls)]
+        print(f"{args.urls} 个 URL（{2 * args.urls} 次请求），{args.workers} 个线程，"
+              f"每个响应延迟 {args.latency * 1000:.0f}ms")
+        print(f"{'URL/秒':>10}  {'新建连接':>8}  {'复用率':>7}  {'成功':>6}  方式")
+        rate, connections, ok = run(urls, args.workers, None, server)
+        print(f"{rate:10,.0f}  {connections:>8}  {'-':>7}  {ok:>6}  每次请求新建连接")
+        for per_host in args.per_host:
+            pool = ConnectionPool(per_host=per_host)
+            rate, connections, ok = run(urls, args.workers, pool, server)
+            request_count, connection_count = pool.stats()
+            pool.close()
+            reuse = (request_count - connection_count) / request_count
+            print(f"{rate:10,.0f}  {connections:>8}  {reuse:7.1%}  {ok:>6}  ConnectionPool per_host={per_host}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+m3u_merger.py --jobs 并行解析的扩展性：对同一组输入分别以不同进程数运行，比较耗时并检查输出逐字节一致
+
+用法:
+  python benchmarks/bench_merger_jobs.py
+  python benchmarks/bench_merger_jobs.py --files 5 --channels 200000 --jobs 1,2,4,8
+"""
+
+import argparse
+import filecmp
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_utils import SCRIPTS_DIR, generate_playlist
+
+
+def run_merger(inputs, output, jobs):
+    """运行一次 m3u_merger.py，返回耗时秒数"""
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, os.path.join(SCRIPTS_DIR, 'm3u_merger.py'), '-i', *inputs,
+         '-o', output, '--force', '--jobs', str(jobs)],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="m3u_merger 并行解析基准测试")
+    parser.add_argument('--files', type=int, default=5, help="输入文件数")
+    parser.add_argument('--channels', type=int, default=100000, help="每个文件的频道记录数")
+    parser.add_argument('--jobs', default='1,2,4,8', help="要测试的进程数，逗号分隔")
+    args = parser.parse_args()
+
+    job_counts = [int(j) for j in args.jobs.split(',')]
+    with tempfile.TemporaryDirectory() as tmp:
+        inputs = []
+        for k in range(args.files):
+            path = os.path.join(tmp, f'in_{k}.m3u')
+            generate_playlist(path, args.channels, seed=k)
+            inputs.append(path)
+
+        print(f"{args.files} 个文件 x {args.channels} 个频道，CPU 核数 {os.cpu_count()}")
+        baseline = None
+        reference = os.path.join(tmp, 'out_1.m3u')
+        for jobs in job_counts:
+            output = os.path.join(tmp, f'out_{jobs}.m3u')
+            elapsed = run_merger(inputs, output, jobs)
+            baseline = baseline or elapsed
+            same = jobs == 1 or filecmp.cmp(reference, output, shallow=False)
+            print(f"--jobs {jobs:<3}{elapsed:8.2f}s  ({baseline / elapsed:.2f}x)  输出一致: {'是' if same else '否'}")
+
+
+if __name__ == "__main__":
+    main()
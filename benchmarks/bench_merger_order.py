@@ -0,0 +1,107 @@
+"""
+对比 m3u_merger 组内相对插入顺序的两种实现：
+原先的 list.index + list.insert（每个频道 O(n)）与 LinkedOrder（O(1)），并检查合并顺序一致
+
+生成 5 个相互部分重叠、频道顺序打乱的文件，只统计合并耗时（解析不计入）
+
+用法:
+  python benchmarks/bench_merger_order.py
+  python benchmarks/bench_merger_order.py --files 5 --channels 50000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from bench_utils import GROUPS
+
+from m3u_merger import merge_single_m3u, parse_m3u_records
+from m3u_parser import iter_m3u_file
+
+
+def generate_overlapping(directory, files, channels, seed=0):
+    """
+    第 k 个文件包含编号 [k * channels / 2, k * channels / 2 + channels) 的频道，
+    与前一个文件重叠一半，文件内顺序打乱
+    """
+    rng = random.Random(seed)
+    paths = []
+    step = channels // 2
+    for k in range(files):
+        numbers = list(range(k * step, k * step + channels))
+        rng.shuffle(numbers)
+        path = os.path.join(directory, f'merge_{k}.m3u')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('#EXTM3U\n')
+            for j in numbers:
+                group = GROUPS[j % len(GROUPS)]
+                f.write(f'#EXTINF:-1 group-title="{group}",频道{j:06d}\n')
+                f.write(f'http://10.{k}.{j % 256}.1/live/{j}.m3u8\n')
+        paths.append(path)
+    return paths
+
+
+def legacy_merge(final_channels_data, group_global_order, current_order_list, current_map):
+    """原 m3u_merger 的合并方式：组内顺序保存在 list 中"""
+    current_groups = {}
+    for channel_key in current_order_list:
+        current_groups.setdefault(channel_key[1], []).append((channel_key, current_map[channel_key]))
+
+    for group_title, current_group_items in current_groups.items():
+        if group_title not in final_channels_data:
+            final_channels_data[group_title] = {"channels": {}, "order_list": []}
+            group_global_order.append(group_title)
+
+        final_group_channels = final_channels_data[group_title]["channels"]
+        final_group_order = final_channels_data[group_title]["order_list"]
+        last_known_channel_index = -1
+
+        for (channel_name, _), current_channel_data in current_group_items:
+            if channel_name in final_group_channels:
+                final_channel = final_group_channels[channel_name]
+                final_channel.info = current_channel_data.info
+                final_channel.urls.update(current_channel_data.urls)
+                final_channel.configs = list(set(final_channel.configs + current_channel_data.configs))
+                last_known_channel_index = final_group_order.index(channel_name)
+            else:
+                final_group_channels[channel_name] = current_channel_data
+                insert_index = last_known_channel_index + 1
+                final_group_order.insert(insert_index, channel_name)
+                last_known_channel_index = insert_index
+
+
+def timed_merge(merge, paths):
+    """解析所有文件后计时合并，返回 (耗时秒, {组: 频道顺序})"""
+    parsed = [parse_m3u_records(iter_m3u_file(path)) for path in paths]
+    final_channels_data = {}
+    group_global_order = []
+    start = time.perf_counter()
+    for order_list, channels_map, _ in parsed:
+        merge(final_channels_data, group_global_order, order_list, channels_map)
+    elapsed = time.perf_counter() - start
+    orders = {group: list(final_channels_data[group]["order_list"]) for group in group_global_order}
+    return elapsed, orders
+
+
+def main():
+    parser = argparse.ArgumentParser(description="m3u_merger 组内插入顺序基准测试")
+    parser.add_argument('--files', type=int, default=5, help="输入文件数")
+    parser.add_argument('--channels', type=int, default=50000, help="每个文件的频道数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = generate_overlapping(tmp, args.files, args.channels)
+        legacy_time, legacy_orders = timed_merge(legacy_merge, paths)
+        linked_time, linked_orders = timed_merge(merge_single_m3u, paths)
+
+    total = sum(len(order) for order in linked_orders.values())
+    print(f"{args.files} 个文件 x {args.channels} 个频道，合并后 {total} 个频道，{len(linked_orders)} 个分组")
+    print(f"合并顺序一致: {'是' if legacy_orders == linked_orders else '否'}")
+    print(f"{'list.index + insert':<22}{legacy_time:8.2f}s")
+    print(f"{'LinkedOrder':<22}{linked_time:8.2f}s  ({legacy_time / linked_time:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
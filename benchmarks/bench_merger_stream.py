@@ -0,0 +1,89 @@
+"""
+m3u_merger.py 流式合并（--max-memory）与普通模式对比：耗时、子进程内存峰值（RSS），并检查输出逐字节一致
+
+生成若干相互部分重叠、频道顺序打乱、每个频道有多个 URL 的文件，模拟聚合后的大型酒店源
+
+用法:
+  python benchmarks/bench_merger_stream.py
+  python benchmarks/bench_merger_stream.py --files 4 --channels 100000 --urls 5 --memory 8,32
+"""
+
+import argparse
+import filecmp
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_utils import GROUPS, SCRIPTS_DIR, format_bytes
+
+
+def generate_inputs(directory, files, channels, urls_per_channel, seed=0):
+    """第 k 个文件包含编号 [k * channels / 2, k * channels / 2 + channels) 的频道，与前一个文件重叠一半"""
+    rng = random.Random(seed)
+    paths = []
+    step = channels // 2
+    for k in range(files):
+        numbers = list(range(k * step, k * step + channels))
+        rng.shuffle(numbers)
+        path = os.path.join(directory, f'stream_{k}.m3u')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('#EXTM3U\n')
+            for j in numbers:
+                group = GROUPS[j % len(GROUPS)]
+                f.write(f'#EXTINF:-1 tvg-id="{j}" group-title="{group}",频道{j:07d}\n')
+                if j % 10 == 0:
+                    f.write('#EXTVLCOPT:http-user-agent=Mozilla/5.0\n')
+                for _ in range(urls_per_channel):
+                    f.write(f'http://10.{k}.{rng.randrange(256)}.{rng.randrange(256)}:8080'
+                            f'/hls/{j}/{rng.randrange(10 ** 6)}.m3u8\n')
+        paths.append(path)
+    return paths
+
+
+def run_merger(inputs, output, extra_args):
+    """运行一次 m3u_merger.py，返回 (耗时秒, 子进程 RSS 峰值字节)"""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(SCRIPTS_DIR, 'm3u_merger.py'), '-i', *inputs,
+         '-o', output, '--force', *extra_args],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(f"m3u_merger.py 退出码 {process.returncode}")
+    # Linux 上 ru_maxrss 的单位是 KB
+    return elapsed, usage.ru_maxrss * 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="m3u_merger 流式合并基准测试")
+    parser.add_argument('--files', type=int, default=4, help="输入文件数")
+    parser.add_argument('--channels', type=int, default=50000, help="每个文件的频道数")
+    parser.add_argument('--urls', type=int, default=4, help="每个频道的 URL 数")
+    parser.add_argument('--memory', default='4,16,64', help="要测试的 --max-memory（MB），逗号分隔")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        inputs = generate_inputs(tmp, args.files, args.channels, args.urls)
+        input_size = sum(os.path.getsize(path) for path in inputs)
+        print(f"{args.files} 个文件 x {args.channels} 个频道 x {args.urls} 个 URL，输入共 {format_bytes(input_size)}")
+
+        reference = os.path.join(tmp, 'out_full.m3u')
+        elapsed, peak = run_merger(inputs, reference, [])
+        print(f"{'耗时':>9}  {'RSS 峰值':>9}  模式")
+        print(f"{elapsed:8.2f}s  {format_bytes(peak):>9}  普通模式")
+
+        for memory in args.memory.split(','):
+            output = os.path.join(tmp, f'out_{memory}.m3u')
+            elapsed, peak = run_merger(inputs, output, ['--max-memory', memory])
+            same = filecmp.cmp(reference, output, shallow=False)
+            print(f"{elapsed:8.2f}s  {format_bytes(peak):>9}  --max-memory {memory}（输出一致: {'是' if same else '否'}）")
+
+
+if __name__ == "__main__":
+    main()
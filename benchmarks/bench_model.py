@@ -0,0 +1,96 @@
+"""
+对比 dict 频道记录与 __slots__ Channel（组名驻留）的内存占用
+
+用法:
+  python benchmarks/bench_model.py --channels 500000
+"""
+
+import argparse
+import gc
+import os
+import re
+import tempfile
+import tracemalloc
+
+from bench_utils import generate_playlist, format_bytes
+
+from m3u_parser import iter_m3u_file
+from m3u_model import Channel
+
+GROUP_PATTERN = re.compile(r'group-title="([^"]*)"')
+
+
+def _record_fields(record):
+    name = record.extinf.split(',', 1)[1] if ',' in record.extinf else ""
+    group_match = GROUP_PATTERN.search(record.extinf)
+    group = group_match.group(1) if group_match else "其他"
+    return name, group
+
+
+def build_dicts(filepath):
+    """原 m3u_mergerng.py 的频道结构"""
+    channels = []
+    for record in iter_m3u_file(filepath):
+        if record.extinf is None:
+            continue
+        name, group = _record_fields(record)
+        channels.append({
+            "info": record.extinf,
+            "name": name,
+            "urls": set(record.urls),
+            "configs": record.configs,
+            "original_group": group,
+            "order_idx": len(channels)
+        })
+    return channels
+
+
+def build_channels(filepath):
+    """Channel 记录，组名驻留"""
+    channels = []
+    for record in iter_m3u_file(filepath):
+        if record.extinf is None:
+            continue
+        name, group = _record_fields(record)
+        channels.append(Channel(
+            record.extinf,
+            name=name,
+            urls=set(record.urls),
+            configs=record.configs,
+            group=group,
+            order_idx=len(channels)
+        ))
+    return channels
+
+
+def retained_size(builder, filepath):
+    """返回构建完成后仍被持有的内存（不含解析过程中的临时对象）"""
+    gc.collect()
+    tracemalloc.start()
+    result = builder(filepath)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(result), current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="频道记录内存基准测试")
+    parser.add_argument('--channels', type=int, default=500000, help="合成文件的频道记录数")
+    args = parser.parse_args()
+
+    fd, temp_path = tempfile.mkstemp(suffix='.m3u')
+    os.close(fd)
+    try:
+        generate_playlist(temp_path, args.channels, urls_per_channel=1)
+        print(f"输入: {args.channels} 个频道 ({format_bytes(os.path.getsize(temp_path))})")
+        print(f"{'结构':<20}{'频道数':>10}{'常驻内存':>12}{'每频道':>10}")
+        for label, builder in (("dict", build_dicts), ("Channel(__slots__)", build_channels)):
+            count, size = retained_size(builder, temp_path)
+            print(f"{label:<20}{count:>10}{format_bytes(size):>12}{size / count:>9.0f}B")
+    finally:
+        os.unlink(temp_path)
+
+
+if __name__ == "__main__":
+    main()
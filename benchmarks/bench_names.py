@@ -0,0 +1,79 @@
+"""
+频道名称归一化的吞吐量：原 get_norm_key（去横杠和末尾"台"）与 m3u_names.normalize_channel_name
+（首次计算与命中缓存两种情况）的对比，并统计两种方式得到的不同键数
+
+名称取自仓库中的 migu.m3u 和 httop.m3u，重复多遍模拟聚合后的大列表（同名频道大量重复）
+
+用法:
+  python benchmarks/bench_names.py
+  python benchmarks/bench_names.py --repeat 2000 --input migu.m3u httop.m3u other.m3u
+"""
+
+import argparse
+import os
+import time
+
+from bench_utils import SCRIPTS_DIR
+
+from m3u_extinf import ExtInf
+from m3u_names import normalize_channel_name
+from m3u_parser import iter_m3u_file
+
+REPO_DIR = os.path.join(SCRIPTS_DIR, '..')
+
+
+def legacy_norm_key(name):
+    """原 m3u_mergerng.get_norm_key"""
+    if not name: return ""
+    temp = name.replace('-', '')
+    if temp.endswith('台'):
+        temp = temp[:-1]
+    return temp.strip().upper()
+
+
+def load_names(paths):
+    """读取播放列表中的频道显示名称（保留重复）"""
+    names = []
+    for path in paths:
+        for record in iter_m3u_file(path):
+            if record.extinf is not None:
+                name = (ExtInf(record.extinf).name or "").strip()
+                if name:
+                    names.append(name)
+    return names
+
+
+def throughput(func, names):
+    """返回 (每秒处理的名称数, 结果集合)"""
+    start = time.perf_counter()
+    keys = set(map(func, names))
+    elapsed = time.perf_counter() - start
+    return len(names) / elapsed, keys
+
+
+def main():
+    parser = argparse.ArgumentParser(description="频道名称归一化基准测试")
+    parser.add_argument('--input', nargs='+',
+                        default=[os.path.join(REPO_DIR, 'migu.m3u'), os.path.join(REPO_DIR, 'httop.m3u')],
+                        help="提供频道名称的 M3U 文件")
+    parser.add_argument('--repeat', type=int, default=1000, help="名称列表重复的遍数")
+    args = parser.parse_args()
+
+    names = load_names(args.input)
+    distinct = list(dict.fromkeys(names))
+    workload = names * args.repeat
+    print(f"{len(names)} 个名称（{len(distinct)} 个不同），重复 {args.repeat} 遍共 {len(workload)} 个")
+
+    legacy_rate, legacy_keys = throughput(legacy_norm_key, workload)
+    normalize_channel_name.cache_clear()
+    cold_rate, _ = throughput(normalize_channel_name, distinct)
+    warm_rate, keys = throughput(normalize_channel_name, workload)
+
+    print(f"{'名称/秒':>12}  {'不同键':>6}  方式")
+    print(f"{legacy_rate:12,.0f}  {len(legacy_keys):>6}  原 get_norm_key")
+    print(f"{cold_rate:12,.0f}  {'':>6}  normalize_channel_name 首次计算（每个不同名称一次）")
+    print(f"{warm_rate:12,.0f}  {len(keys):>6}  normalize_channel_name 命中缓存")
+
+
+if __name__ == "__main__":
+    main()
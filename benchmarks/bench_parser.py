@@ -0,0 +1,104 @@
+"""
+对比共享流式解析器 m3u_parser.iter_m3u_records 与各脚本原先的
+"先读成行列表再 while 循环" 解析方式的吞吐量与内存峰值
+
+用法:
+  python benchmarks/bench_parser.py --channels 200000
+  python benchmarks/bench_parser.py --input big_hotel.m3u
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from bench_utils import generate_playlist, measure, format_bytes
+
+from m3u_parser import iter_m3u_file
+
+
+def legacy_list_loop(filepath):
+    """原 extract.py / deduplicate.py 的方式：整文件读入 strip 后的列表再按下标遍历"""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f if line.strip()]
+
+    records = 0
+    i = 0
+    while i < len(lines):
+        if lines[i].startswith("#EXTINF"):
+            records += 1
+            i += 1
+            while i < len(lines) and not lines[i].startswith("#EXTINF"):
+                i += 1
+        else:
+            i += 1
+    return records
+
+
+def legacy_content_loop(filepath):
+    """原 m3u_merger.py 的方式：f.read() 后整体 split 为列表"""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        content = f.read()
+    lines = [line.strip() for line in content.strip().split('\n') if line.strip()]
+
+    records = 0
+    i = 0
+    while i < len(lines):
+        if lines[i].startswith('#EXTINF:'):
+            records += 1
+        i += 1
+    return records
+
+
+def streaming_records(filepath):
+    """共享流式解析器"""
+    records = 0
+    for record in iter_m3u_file(filepath):
+        if record.extinf is not None:
+            records += 1
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="M3U 解析器基准测试")
+    parser.add_argument('--input', help="使用已有的 M3U 文件（不指定则生成合成文件）")
+    parser.add_argument('--channels', type=int, default=200000, help="合成文件的频道记录数")
+    parser.add_argument('--repeat', type=int, default=3, help="每种方式重复次数，取最快一次")
+    args = parser.parse_args()
+
+    temp_path = None
+    if args.input:
+        filepath = args.input
+        with open(filepath, 'r', encoding='utf-8') as f:
+            total_lines = sum(1 for _ in f)
+    else:
+        fd, temp_path = tempfile.mkstemp(suffix='.m3u')
+        os.close(fd)
+        filepath = temp_path
+        total_lines = generate_playlist(filepath, args.channels)
+
+    size = os.path.getsize(filepath)
+    print(f"输入: {filepath} ({format_bytes(size)}, {total_lines} 行)")
+    print(f"{'方式':<24}{'记录数':>10}{'行/秒':>14}{'耗时(s)':>10}{'内存峰值':>12}")
+
+    try:
+        for label, func in (("旧: 行列表 + while", legacy_list_loop),
+                            ("旧: read() + split", legacy_content_loop),
+                            ("新: 流式记录生成器", streaming_records)):
+            best_time = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                func(filepath)
+                elapsed = time.perf_counter() - start
+                best_time = elapsed if best_time is None else min(best_time, elapsed)
+            # 内存峰值单独测一次，避免 tracemalloc 的开销影响计时
+            records, _, peak = measure(func, filepath)
+            print(f"{label:<24}{records:>10}{total_lines / best_time:>14,.0f}"
+                  f"{best_time:>10.3f}{format_bytes(peak):>12}")
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+rdfinurl.py 解析结果缓存的效果：同一播放列表连续运行多次，第一次全部解析并写入缓存，
+之后只解析缓存中已过期的 URL（用 --expire 比例模拟上次运行后过期的部分）
+
+使用本地 LatencyServer 模拟远端服务器：每个 URL 先 302 重定向一次，每个响应延迟 --latency 秒
+
+用法:
+  python benchmarks/bench_redirect_cache.py
+  python benchmarks/bench_redirect_cache.py --urls 5000 --expire 0.1 --latency 0.05
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+import time
+
+from bench_utils import LatencyServer
+
+from rdfinurl import process_m3u_file
+
+
+def run(input_path, output_path, cache_path, workers):
+    """:return: (耗时秒, 输出中的缓存统计行)"""
+    out = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(out):
+        assert process_m3u_file(input_path, output_path, max_workers=workers, timeout=30, max_retries=0,
+                                force=True, cache_path=cache_path)
+    elapsed = time.perf_counter() - start
+    summary = next((line for line in out.getvalue().splitlines() if line.startswith("缓存:")), "")
+    return elapsed, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重定向解析缓存基准测试")
+    parser.add_argument('--urls', type=int, default=1000, help="URL 数")
+    parser.add_argument('--latency', type=float, default=0.02, help="每个响应的延迟（秒）")
+    parser.add_argument('--workers', type=int, default=10, help="线程数")
+    parser.add_argument('--expire', type=float, default=0.1, help="第三次运行前让缓存过期的比例")
+    args = parser.parse_args()
+
+    with LatencyServer(args.latency) as server, tempfile.TemporaryDirectory() as temp_dir:
+        input_path = os.path.join(temp_dir, 'input.m3u')
+        output_path = os.path.join(temp_dir, 'output.m3u')
+        cache_path = os.path.join(temp_dir, 'cache.db')
+        with open(input_path, 'w', encoding='utf-8') as f:
+            f.write("#EXTM3U\n")
+            for i in range(args.urls):
+                f.write(f"#EXTINF:-1,频道{i}\n{server.base_url}/r/{i}\n")
+
+        print(f"{args.urls} 个 URL，每个响应延迟 {args.latency * 1000:.0f}ms，{args.workers} 个线程")
+        print(f"{'耗时(秒)':>8}  {'请求数':>6}  运行")
+        for label in ("无缓存（首次运行）", "缓存全部有效", f"{args.expire:.0%} 已过期"):
+            if label.endswith("已过期"):
+                with sqlite3.connect(cache_path) as conn:
+                    conn.execute("UPDATE redirects SET resolved = 0 WHERE rowid % ? = 0",
+                                 (max(1, round(1 / args.expire)),))
+            requests_before = server.requests
+            elapsed, summary = run(input_path, output_path, cache_path, args.workers)
+            print(f"{elapsed:8.2f}  {server.requests - requests_before:>6}  {label}  {summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+rdfinurl.py 两种解析引擎的吞吐量对比：线程池（requests，--workers 个线程）与
+m3u_resolve 的 asyncio 引擎（单线程，同时 --concurrency 个请求）
+
+使用本地 LatencyServer 模拟远端服务器：每个 URL 先 302 重定向一次，每个响应延迟 --latency 秒，
+因此理论耗时约为 URL 数 × 2 × 延迟 / 并发数
+
+用法:
+  python benchmarks/bench_resolve.py
+  python benchmarks/bench_resolve.py --urls 5000 --latency 0.2 --workers 5 50 --concurrency 200 1000
+"""
+
+import argparse
+import contextlib
+import io
+import resource
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_utils import LatencyServer
+
+from m3u_resolve import resolve_urls
+from rdfinurl import get_final_url
+
+
+def resolve_threads(urls, workers, timeout):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # get_final_url 每个 URL 都会打印，基准测试中丢弃
+        with contextlib.redirect_stdout(io.StringIO()):
+            return dict(zip(urls, executor.map(lambda url: get_final_url(url, 10, timeout), urls)))
+
+
+def run(label, func, urls):
+    start = time.perf_counter()
+    results = func(urls)
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for _, success, video in results.values() if success and video)
+    print(f"{len(urls) / elapsed:10,.0f}  {elapsed:8.2f}  {ok:>6}  {label}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="URL 重定向解析引擎基准测试")
+    parser.add_argument('--urls', type=int, default=2000, help="URL 数")
+    parser.add_argument('--latency', type=float, default=0.1, help="每个响应的延迟（秒）")
+    parser.add_argument('--workers', type=int, nargs='+', default=[5, 50], help="线程池的线程数")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[200, 1000], help="asyncio 引擎的并发数")
+    parser.add_argument('--timeout', type=float, default=30, help="请求超时（秒）")
+    args = parser.parse_args()
+
+    # 每个并发请求占用一个文件描述符
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, 2 * max(args.concurrency) + 256)), hard))
+
+    with LatencyServer(args.latency) as server:
+        urls = [f"{server.base_url}/r/{i}" for i in range(args.urls)]
+        print(f"{args.urls} 个 URL，每个响应延迟 {args.latency * 1000:.0f}ms")
+        print(f"{'URL/秒':>10}  {'耗时(秒)':>8}  {'成功':>6}  引擎")
+        for workers in args.workers:
+            # 线程池较慢，最多取 20 秒左右的 URL 量
+            sample = urls[:max(workers, min(len(urls), int(20 * workers / (2 * args.latency))))]
+            run(f"线程池 workers={workers}（{len(sample)} 个 URL）",
+                lambda items: resolve_threads(items, workers, args.timeout), sample)
+        for concurrency in args.concurrency:
+            run(f"asyncio concurrency={concurrency}",
+                lambda items: resolve_urls(items, concurrency, args.timeout), urls)
+
+
+if __name__ == "__main__":
+    main()
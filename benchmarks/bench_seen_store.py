@@ -0,0 +1,56 @@
+"""
+m3u_seen.SeenStore 的吞吐量：新数据库（全部为新键，提交时用 executemany 在一个事务中写入）、
+第二次运行（全部为之前运行中出现过的键），以及与内存中的 SeenDigests 的对比
+
+用法:
+  python benchmarks/bench_seen_store.py
+  python benchmarks/bench_seen_store.py --keys 500000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from bench_utils import HOSTS
+
+from m3u_seen import SeenDigests, SeenStore
+
+
+def make_keys(count):
+    """生成 count 个不同的单 URL 键（与 filter_seen_urls 的键相同）"""
+    return [('1', f"http://{HOSTS[i % len(HOSTS)]}/live/{i}/index.m3u8") for i in range(count)]
+
+
+def run(seen, keys):
+    """:return: (每秒键数, 保留数)"""
+    start = time.perf_counter()
+    kept = sum(1 for key in keys if seen.add(key))
+    if isinstance(seen, SeenStore):
+        seen.commit()
+        seen.close()
+    return len(keys) / (time.perf_counter() - start), kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite 去重数据库基准测试")
+    parser.add_argument('--keys', type=int, default=100000, help="不同键的数量")
+    args = parser.parse_args()
+
+    keys = make_keys(args.keys)
+    keys += keys[:args.keys // 4]  # 四分之一为本次运行内的重复
+
+    print(f"{'键/秒':>10}  {'保留':>8}  方式")
+    rate, kept = run(SeenDigests(), keys)
+    print(f"{rate:10,.0f}  {kept:>8}  SeenDigests（内存）")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'seen.db')
+        rate, kept = run(SeenStore(path, 'bench'), keys)
+        print(f"{rate:10,.0f}  {kept:>8}  SeenStore（新数据库，{len(keys)} 个键）")
+        rate, kept = run(SeenStore(path, 'bench'), keys)
+        print(f"{rate:10,.0f}  {kept:>8}  SeenStore（第二次运行）")
+        print(f"{'':>10}  {'':>8}  数据库大小 {os.path.getsize(path) / 1024 / 1024:.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+基准测试公共工具：生成合成 M3U 播放列表、计时与内存峰值测量、模拟网络延迟的本地 HTTP 服务器
+"""
+
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+import random
+import tracemalloc
+
+# 让基准脚本可以直接导入 scripts/ 下的模块
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+GROUPS = ["央视", "卫视", "地方", "体育", "影视", "少儿", "其它"]
+HOSTS = [f"10.{i // 256}.{i % 256}.1:{8000 + i % 100}" for i in range(512)]
+
+
+def generate_playlist(path, channels, urls_per_channel=2, config_every=10, seed=0):
+    """
+    生成合成 M3U 文件，频道名与组名会大量重复，模拟酒店源聚合后的文件
+
+    :param path: 输出路径
+    :param channels: #EXTINF 记录数
+    :param urls_per_channel: 每条记录的 URL 数
+    :param config_every: 每隔多少条记录插入一行 #EXTVLCOPT
+    :return: 文件总行数
+    """
+    rng = random.Random(seed)
+    line_count = 1
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('#EXTM3U x-tvg-url="http://example.com/e.xml"\n')
+        for i in range(channels):
+            group = GROUPS[i % len(GROUPS)]
+            if group == "央视":
+                name = f"CCTV-{i % 17 + 1} 综合"
+            elif group == "卫视":
+                name = f"频道{i % 31}卫视"
+            else:
+                name = f"{group}频道{i % 997}"
+            f.write(f'#EXTINF:-1 tvg-id="{name}" tvg-name="{name}" '
+                    f'tvg-logo="http://logo.example.com/{i % 997}.png" group-title="{group}",{name}\n')
+            line_count += 1
+            if config_every and i % config_every == 0:
+                f.write('#EXTVLCOPT:http-user-agent=Mozilla/5.0\n')
+                line_count += 1
+            for _ in range(urls_per_channel):
+                host = HOSTS[rng.randrange(len(HOSTS))]
+                f.write(f'http://{host}/hls/{rng.randrange(10 ** 6)}/index.m3u8?auth=testpub\n')
+                line_count += 1
+    return line_count
+
+
+def measure(func, *args, **kwargs):
+    """
+    运行 func 并返回 (结果, 耗时秒, 内存峰值字节)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def format_bytes(size):
+    """把字节数格式化为便于阅读的字符串"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f}{unit}"
+        size /= 1024
+
+
+async def _serve_latency(latency, port_pipe, connections, requests):
+    async def handle(reader, writer):
+        with connections.get_lock():
+            connections.value += 1
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                with requests.get_lock():
+                    requests.value += 1
+                path = head.split(b' ', 2)[1].decode('ascii')
+                await asyncio.sleep(latency)
+                keep_alive = b'connection: close' not in head.lower()
+                connection = b'keep-alive' if keep_alive else b'close'
+                if path.startswith('/r/'):
+                    location = f"/live/{path[3:]}.m3u8".encode('ascii')
+                    writer.write(b'HTTP/1.1 302 Found\r\nLocation: ' + location +
+                                 b'\r\nContent-Length: 0\r\nConnection: ' + connection + b'\r\n\r\n')
+                else:
+                    body = b'#EXTM3U\n'
+                    writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/vnd.apple.mpegurl\r\n'
+                                 b'Content-Length: ' + str(len(body)).encode('ascii') +
+                                 b'\r\nConnection: ' + connection + b'\r\n\r\n' + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0, backlog=4096)
+    port_pipe.send(server.sockets[0].getsockname()[1])
+    async with server:
+        await server.serve_forever()
+
+
+def _run_latency_server(latency, port_pipe, connections, requests):
+    import resource
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    asyncio.run(_serve_latency(latency, port_pipe, connections, requests))
+
+
+class LatencyServer:
+    """
+    在子进程中运行的本地 HTTP 服务器（asyncio，不与被测代码争用 GIL），每个响应前等待 latency 秒，模拟远端服务器：
+      /r/<路径>  302 重定向到相对地址 /live/<路径>.m3u8
+      其他路径   200，Content-Type 为 application/vnd.apple.mpegurl
+    支持 keep-alive；connections 为建立过的连接数，requests 为请求数
+
+    用法:
+      with LatencyServer(0.05) as server:
+          url = f"{server.base_url}/r/1"
+    """
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self._connections = multiprocessing.Value('l', 0)
+        self._requests = multiprocessing.Value('l', 0)
+        self._process = None
+        self.base_url = None
+
+    @property
+    def connections(self):
+        return self._connections.value
+
+    @property
+    def requests(self):
+        return self._requests.value
+
+    def __enter__(self):
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        self._process = multiprocessing.Process(
+            target=_run_latency_server, args=(self.latency, sender, self._connections, self._requests), daemon=True)
+        self._process.start()
+        self.base_url = f"http://127.0.0.1:{receiver.recv()}"
+        return self
+
+    def __exit__(self, *exc):
+        self._process.terminate()
+        self._process.join()
@@ -1,12 +1,14 @@
 import os
 import argparse
-import tempfile
-import shutil
 
-def add_channels_to_m3u(input_file, output_file, channels_str, group_name, append_to_end, merge_urls):
+from m3u_playlist import Playlist
+from m3u_writer import atomic_write
+
+def build_channels_block(channels_str, group_name, merge_urls):
     """
     支持格式: "频道1,url1,url2;频道2,urlA"
     - merge_urls: True 时，多个 URL 合并在一个元数据下
+    :return: 待插入的文本块
     """
     # 1. 解析频道组
     channel_groups = [g.strip() for g in channels_str.split(';') if g.strip()]
@@ -33,48 +35,64 @@ def add_channels_to_m3u(input_file, output_file, channels_str, group_name, appen
             # 模式：独立生成（每个 URL 一个元数据行）
             for url in urls:
                 new_channels_block += f"{inf_line}{url}\n"
+    return new_channels_block
+
+def insert_channels_block(lines, new_channels_block, append_to_end):
+    """
+    把频道块插入到文件开头（#EXTM3U 之后）或末尾
+    :param lines: 原文件的 readlines() 结果
+    :return: 输出文本片段列表
+    """
+    if append_to_end:
+        output_parts = list(lines)
+        if lines and not lines[-1].endswith('\n'):
+            output_parts.append('\n')
+        output_parts.append(new_channels_block)
+    else:
+        if lines and lines[0].strip().startswith("#EXTM3U"):
+            output_parts = [lines[0], new_channels_block] + lines[1:]
+        else:
+            output_parts = ["#EXTM3U\n", new_channels_block] + lines
+    return output_parts
+
+def add_channels_to_m3u(input_file, output_file, channels_str, group_name, append_to_end, merge_urls):
+    """
+    支持格式: "频道1,url1,url2;频道2,urlA"
+    - merge_urls: True 时，多个 URL 合并在一个元数据下
+    """
+    new_channels_block = build_channels_block(channels_str, group_name, merge_urls)
     
     if not os.path.exists(input_file):
         print(f"错误：找不到输入文件 '{input_file}'")
         return
 
-    is_same_file = os.path.abspath(input_file) == os.path.abspath(output_file)
-
     try:
         with open(input_file, 'r', encoding='utf-8') as f:
             lines = f.readlines()
 
-        if is_same_file:
-            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(output_file), text=True)
-            out_f = open(fd, 'w', encoding='utf-8')
-        else:
-            out_f = open(output_file, 'w', encoding='utf-8')
-
-        with out_f:
-            if append_to_end:
-                out_f.writelines(lines)
-                if lines and not lines[-1].endswith('\n'):
-                    out_f.write('\n')
-                out_f.write(new_channels_block)
-            else:
-                if lines and lines[0].strip().startswith("#EXTM3U"):
-                    out_f.write(lines[0])
-                    out_f.write(new_channels_block)
-                    out_f.writelines(lines[1:])
-                else:
-                    out_f.write("#EXTM3U\n")
-                    out_f.write(new_channels_block)
-                    out_f.writelines(lines)
+        output_parts = insert_channels_block(lines, new_channels_block, append_to_end)
 
-        if is_same_file:
-            shutil.move(temp_path, output_file)
+        # 原子替换，同文件覆盖同样安全；内容未变化时保留原文件
+        if not atomic_write(output_file, output_parts):
+            print(f"内容未变化，保留原文件：{output_file}")
                 
         print(f"处理成功！模式：{'合并 URL' if merge_urls else '独立条目'}，位置：{'末尾' if append_to_end else '开头'}")
 
     except Exception as e:
         print(f"处理过程中发生错误: {e}")
 
-def main():
+def transform_playlist(playlist, args):
+    """
+    流水线阶段：向内存中的播放列表插入频道
+    :param playlist: m3u_playlist.Playlist
+    :param args: build_parser() 解析出的参数
+    :return: 新的 Playlist，内容与命令行方式写出的文件相同
+    """
+    new_channels_block = build_channels_block(args.add, args.group, args.merge)
+    output_parts = insert_channels_block(playlist.readlines(), new_channels_block, args.rear)
+    return Playlist(''.join(output_parts))
+
+def build_parser():
     parser = argparse.ArgumentParser(description="高级 M3U 频道插入脚本")
     parser.add_argument("-i", "--input", required=True, help="输入 M3U 文件")
     parser.add_argument("-o", "--output", required=True, help="输出 M3U 文件")
@@ -82,8 +100,10 @@ def main():
     parser.add_argument("-g", "--group", default="其它", help="分组名")
     parser.add_argument("-r", "--rear", action="store_true", help="添加到文件末尾")
     parser.add_argument("-m", "--merge", action="store_true", help="将同频道下的所有 URL 合并在一个元数据下")
-    
-    args = parser.parse_args()
+    return parser
+
+def main():
+    args = build_parser().parse_args()
     add_channels_to_m3u(args.input, args.output, args.add, args.group, args.rear, args.merge)
 
 if __name__ == "__main__":
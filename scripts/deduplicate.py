@@ -1,118 +1,253 @@
 import argparse
 import os
-import tempfile
-import shutil
 
-def deduplicate_m3u(filepath):
+from m3u_extinf import ExtInf
+from m3u_mmap import MappedPlaylist
+from m3u_parser import M3URecord, iter_m3u_file
+from m3u_playlist import Playlist
+from m3u_seen import SeenBloom, SeenDigests, SeenStore, iter_kept, key_digest
+from m3u_writer import atomic_write, iter_lines
+from m3u_urlkey import analyze_url, canonical_url, is_fresher
+
+# 去重键的组成部分，可用 "+" 组合（如 name+url）
+KEY_CHOICES = ('name', 'tvg-id', 'url', 'canonical-url')
+
+def parse_key(text):
+    """
+    解析 --key：一个或多个用 "+" 连接的组成部分
+    :return: 组成部分元组，如 ('name', 'url')
+    :raises argparse.ArgumentTypeError: 含有未知的组成部分
+    """
+    if isinstance(text, tuple):
+        return text
+    parts = tuple(part.strip() for part in text.split('+'))
+    unknown = [part for part in parts if part not in KEY_CHOICES]
+    if unknown or len(set(parts)) != len(parts):
+        raise argparse.ArgumentTypeError(
+            f"无效的去重键 '{text}'（可选 {', '.join(KEY_CHOICES)}，用 + 组合，不能重复）")
+    return parts
+
+def _channel_name(extinf_line):
+    return extinf_line.split(',', 1)[1] if ',' in extinf_line else ""
+
+def record_key(record, parts):
+    """
+    记录的去重键字段，由 parse_key() 的各组成部分依次拼接，每部分前加值的个数，不同部分之间不会混淆：
+      name           #EXTINF 行第一个逗号之后的文本
+      tvg-id         tvg-id 属性；没有时改用 ('', 频道名称)
+      url            全部 URL（排序后，与顺序无关）
+      canonical-url  全部 URL 规范化后的结果（见 m3u_urlkey）
+    记录没有 URL 时，url 与 canonical-url 同样改用 ('', 频道名称)
+    :return: 字符串元组，供 m3u_seen 的去重容器计算摘要
+    """
+    fields = []
+    for part in parts:
+        if part == 'name':
+            values = [_channel_name(record.extinf)]
+        elif part == 'tvg-id':
+            tvg_id = ExtInf(record.extinf).get('tvg-id')
+            values = [tvg_id] if tvg_id else ['', _channel_name(record.extinf)]
+        else:
+            urls = [line for line in record.lines if not line.startswith('#')]
+            if part == 'canonical-url':
+                urls = [canonical_url(url) for url in urls]
+            values = sorted(urls) if urls else ['', _channel_name(record.extinf)]
+        fields.append(str(len(values)))
+        fields.extend(values)
+    return tuple(fields)
+
+def record_label(record):
+    """记录在 SeenStore 报告中的说明：频道名称与第一个 URL"""
+    url = next((line for line in record.lines if not line.startswith('#')), "")
+    return f"{_channel_name(record.extinf)}\t{url}"
+
+def deduplicate_m3u(filepath, key='name', seen=None):
     """
-    对M3U文件进行去重处理（基于频道名称）
+    对M3U文件进行去重处理（默认基于频道名称）
     兼容多个URL
     """
-    with open(filepath, 'r', encoding='utf-8') as f:
-        lines = [line.strip() for line in f if line.strip()]
+    return deduplicate_records(iter_m3u_file(filepath), key, seen)
+
+def deduplicate_records(records, key='name', seen=None):
+    """
+    对已解析的记录去重
+    :param records: M3URecord 序列
+    :param key: 去重键（见 record_key），如 'name'、'tvg-id+url'；相同的只保留第一条。
+                含 canonical-url 时相同的保留 URL 最新的一条，见 deduplicate_by_url
+    :param seen: 记录已出现的键的容器（m3u_seen），默认 SeenDigests()，每个键只保存 8 字节摘要；
+                 SeenStore 可在多个文件、多次运行之间去重
+    :return: 去重后的行列表（不含 #EXTM3U 头）
+    """
+    return record_lines(unique_records(records, key, seen))
+
+def unique_records(records, key='name', seen=None):
+    """
+    对已解析的记录去重，参数同 deduplicate_records
+    :return: 保留的记录列表，按输出顺序；文件头部和其他注释（extinf 为 None 的记录）原样保留
+    """
+    parts = parse_key(key)
+    if 'canonical-url' in parts:
+        return _unique_records_by_url(records, parts)
+
+    if seen is None:
+        seen = SeenDigests()
+    labelled = isinstance(seen, SeenStore)
+    # 保留文件头部和其他注释；重复频道连同其后续行一并跳过
+    entries = ((None, None, record) if record.extinf is None
+               else (record_key(record, parts), record_label(record) if labelled else None, record)
+               for record in records)
+    return list(iter_kept(seen, entries))
+
+def record_lines(records):
+    """去重结果的输出行：每条记录之后、头部注释的每一行之后各跟一个空行"""
+    lines = []
+    for record in records:
+        if record.extinf is None:
+            for line in record.lines:
+                lines.append(line)
+                lines.append("")
+            continue
+        lines.append(record.extinf)
+        # 添加直到下一个EXTINF或文件结束的所有行
+        lines.extend(record.lines)
+        lines.append("")  # 空行分隔
+    return lines
+
+def deduplicate_by_url(records, key=('canonical-url',)):
+    """
+    按规范化 URL 去重（忽略 msisdn、timestamp 等易变参数，见 m3u_urlkey）：
+    URL 相同的记录只输出一条，位置为第一次出现的位置，内容为其中 URL 最新的记录；
+    没有 URL 的记录仍按频道名称去重
+    :param records: M3URecord 序列
+    :param key: 含 canonical-url 的去重键（见 record_key），如 ('name', 'canonical-url')
+    :return: 去重后的行列表（不含 #EXTM3U 头）
+    """
+    return record_lines(_unique_records_by_url(records, parse_key(key)))
+
+def _unique_records_by_url(records, parts):
+    """deduplicate_by_url 保留的记录列表"""
+    kept_records = []
+    kept = {}    # 去重键的 8 字节摘要 -> (kept_records 中的位置, 新旧程度)
     
-    seen = set()
-    deduped = []
+    for record in records:
+        if record.extinf is None:
+            # 保留文件头部和其他注释
+            kept_records.append(record)
+            continue
+        
+        urls = [line for line in record.lines if not line.startswith('#')]
+        freshness = analyze_url(urls[0])[1] if urls else None
+        digest = key_digest(*record_key(record, parts))
+        
+        if digest not in kept:
+            kept[digest] = (len(kept_records), freshness)
+            kept_records.append(record)
+        else:
+            position, kept_freshness = kept[digest]
+            if is_fresher(freshness, kept_freshness):
+                kept_records[position] = record
+                kept[digest] = (position, freshness)
     
-    i = 0
-    while i < len(lines):
-        if lines[i].startswith("#EXTINF"):
-            extinf_line = lines[i]
-            channel_name = extinf_line.split(',', 1)[1] if ',' in extinf_line else ""
-            
-            if channel_name not in seen:
-                seen.add(channel_name)
-                deduped.append(extinf_line)
-                
-                # 添加直到下一个EXTINF或文件结束的所有行
-                i += 1
-                while i < len(lines) and not lines[i].startswith("#EXTINF"):
-                    deduped.append(lines[i])
-                    i += 1
-                deduped.append("")  # 空行分隔
+    return kept_records
+
+def transform_playlist(playlist, args):
+    """
+    流水线阶段：对内存中的播放列表去重
+    :param playlist: m3u_playlist.Playlist
+    :param args: build_parser() 解析出的参数
+    :return: 新的 Playlist，内容与命令行方式写出的文件相同
+    :raises ValueError: 指定了流水线阶段不支持的 --seen-db，或 --bloom 与 canonical-url 同用
+    """
+    if getattr(args, 'seen_db', None):
+        raise ValueError("流水线阶段不支持 --seen-db，请直接运行 deduplicate.py")
+    seen = None
+    if getattr(args, 'bloom', False):
+        if 'canonical-url' in parse_key(args.key):
+            raise ValueError("--bloom 不能与 canonical-url 同用")
+        seen = SeenBloom(args.capacity, args.fpr)
+    kept = unique_records(playlist.records, args.key, seen)
+    header = ["#EXTM3U"] if args.add_header else []
+    # 交出保留的记录，下一阶段不再解析；只有写出时才生成文本
+    records = kept
+    if header:
+        if kept and kept[0].extinf is None:
+            records = [M3URecord(None, header + kept[0].lines)] + kept[1:]
+        else:
+            records = [M3URecord(None, header)] + kept
+    return Playlist.from_records(records, lambda: header + record_lines(kept))
+
+def deduplicate_m3u_mmap(playlist, seen=None):
+    """
+    mmap 快速路径的去重（按频道名称）：只解码 #EXTINF 行逗号之后的频道名称，
+    未改动的记录以 memoryview 零拷贝输出
+    
+    :param playlist: 已打开的 MappedPlaylist
+    :param seen: 记录已出现的键的容器，同 deduplicate_records
+    :return: (chunks, channel_count)，chunks 为按顺序写出的字节块
+    """
+    mm = playlist.mm
+    if seen is None:
+        seen = SeenDigests()
+    labelled = isinstance(seen, SeenStore)
+    chunks = []
+    channel_count = 0
+    
+    # 保留文件头部和其他注释
+    preamble = playlist.preamble()
+    if preamble:
+        for line in preamble.lines:
+            chunks.append(f"{line}\n\n".encode('utf-8'))
+    
+    def entries():
+        for i in range(len(playlist)):
+            if playlist.is_clean(i):
+                start, eol = playlist.extinf_span(i)
+                comma = mm.find(b',', start, eol)
+                channel_name = mm[comma + 1:eol].decode('utf-8') if comma >= 0 else ""
+                # 与 record_key(record, ('name',)) 相同
+                yield ('1', channel_name), channel_name if labelled else None, (i, None)
             else:
-                # 跳过重复频道
-                i += 1
-                while i < len(lines) and not lines[i].startswith("#EXTINF"):
-                    i += 1
+                # 含有空行、\r 或首尾空白的记录按文本方式规整后输出
+                record = playlist.record(i)
+                yield record_key(record, ('name',)), record_label(record) if labelled else None, (i, record)
+
+    for i, record in iter_kept(seen, entries()):
+        if record is None:
+            chunks.extend(playlist.raw_chunks(i))
         else:
-            # 保留文件头部和其他注释
-            deduped.append(lines[i])
-            deduped.append("")
-            i += 1
+            chunks.append(('\n'.join([record.extinf] + record.lines) + '\n').encode('utf-8'))
+        chunks.append(b'\n')  # 空行分隔
+        channel_count += 1
     
-    return deduped
+    return chunks, channel_count
 
-def safe_write_output(data, input_path, output_path, add_header=True):
+def safe_write_output(data, output_path, add_header=True, binary=False):
     """
-    安全地写入输出文件，支持同文件覆盖
+    安全地写入输出文件：原子替换，支持同文件覆盖，内容未变化时保留原文件
     
     :param data: 要写入的数据列表
-    :param input_path: 输入文件路径
     :param output_path: 输出文件路径
     :param add_header: 是否添加#EXTM3U头部
+    :param binary: data 为字节块（mmap 模式）时为 True，按原样写出
     :return: 成功返回True，失败返回False
     """
-    # 获取绝对路径以判断是否为同一个文件
-    input_abs = os.path.abspath(input_path)
-    output_abs = os.path.abspath(output_path)
-    is_same_file = input_abs == output_abs
-    
     try:
-        # 如果是同一个文件，先写到临时文件
-        if is_same_file:
-            # 在与输出文件相同目录创建临时文件
-            fd, temp_path = tempfile.mkstemp(
-                dir=os.path.dirname(output_path) or '.',
-                suffix='.m3u',
-                text=True
-            )
-            
-            # 使用文件描述符打开文件
-            out_f = os.fdopen(fd, 'w', encoding='utf-8')
+        if binary:
+            chunks = [b"#EXTM3U\n"] + data if add_header else data
         else:
-            # 直接打开输出文件
-            out_f = open(output_path, 'w', encoding='utf-8')
-        
-        # 写入数据
-        with out_f:
-            if add_header:
-                out_f.write("#EXTM3U\n")
-            
-            for line in data:
-                if line == "":  # 处理空行
-                    out_f.write('\n')
-                else:
-                    out_f.write(line + '\n')
-        
-        # 如果是同一个文件，进行原子替换
-        if is_same_file:
-            try:
-                # Python 3.3+ 推荐使用 os.replace 实现原子替换
-                os.replace(temp_path, output_path)
-                print(f"注意：输入和输出为同一文件，已安全覆盖")
-            except Exception as e:
-                # 如果 os.replace 失败，使用 shutil.move 作为备选
-                print(f"警告：os.replace 失败，使用备选方案: {e}")
-                shutil.move(temp_path, output_path)
-        
-        return True
-        
+            chunks = iter_lines(data, header="#EXTM3U" if add_header else None)
+        changed = atomic_write(output_path, chunks, binary=binary)
     except Exception as e:
         print(f"写入文件失败: {e}")
-        
-        # 清理临时文件（如果存在）
-        if is_same_file and 'temp_path' in locals() and os.path.exists(temp_path):
-            try:
-                os.unlink(temp_path)
-            except:
-                pass
-                
         return False
+    
+    if not changed:
+        print(f"内容未变化，保留原文件：{output_path}")
+    return True
 
-def parse_arguments():
+def build_parser():
     """
-    解析命令行参数
+    构建命令行参数解析器
     """
     parser = argparse.ArgumentParser(
         description='M3U文件去重工具 - 安全处理同文件覆盖',
@@ -141,8 +276,67 @@ def parse_arguments():
         action='store_true',
         help='强制覆盖输出文件（如果已存在且与输入不同）'
     )
+    parser.add_argument(
+        '--key',
+        type=parse_key,
+        default='name',
+        help='去重依据：name 为频道名称；tvg-id 为 tvg-id 属性；url 为全部 URL；'
+             'canonical-url 为去掉 msisdn、timestamp 等易变参数后的 URL，相同的只保留 URL 最新的一条；'
+             '可用 + 组合，如 name+url'
+    )
+    parser.add_argument(
+        '--bloom',
+        action='store_true',
+        help='用 Bloom 过滤器记录已出现的键，内存按 --capacity 和 --fpr 预先固定；'
+             '误判的记录会被当作重复丢弃（不能与 canonical-url 同用）'
+    )
+    parser.add_argument(
+        '--capacity',
+        type=int,
+        default=1000000,
+        help='Bloom 过滤器预计的不同键数'
+    )
+    parser.add_argument(
+        '--fpr',
+        type=float,
+        default=0.001,
+        help='Bloom 过滤器达到容量时的误判率'
+    )
+    parser.add_argument(
+        '--seen-db',
+        metavar='FILE',
+        help='把已出现的键保存到 SQLite 数据库（不存在时创建），在多个文件、多次运行之间去重，'
+             '并记录每个键首次出现的时间（不能与 --bloom、canonical-url 同用）'
+    )
+    parser.add_argument(
+        '--seen-run',
+        metavar='NAME',
+        help='--seen-db 的运行名称：使用相同名称的多个命令之间互相去重（如同一流水线的多个输出文件）；'
+             '默认每个命令为新的一次运行，之前运行中出现过的键仍保留'
+    )
+    parser.add_argument(
+        '--skip-known',
+        action='store_true',
+        help='--seen-db 中之前的运行出现过的键也视为重复，只保留新出现的记录'
+    )
+    parser.add_argument(
+        '--seen-report',
+        metavar='FILE',
+        help='把本次运行出现过的键及其首次、最近出现时间写入该文件（制表符分隔）'
+    )
+    parser.add_argument(
+        '--mmap',
+        action='store_true',
+        help='大文件模式：mmap 映射输入文件，按字节处理并零拷贝输出未改动的记录'
+    )
     
-    return parser.parse_args()
+    return parser
+
+def parse_arguments():
+    """
+    解析命令行参数
+    """
+    return build_parser().parse_args()
 
 def validate_arguments(args):
     """
@@ -183,6 +377,22 @@ def validate_arguments(args):
         print(f"错误：输出目录 '{output_dir}' 不可写")
         return False
     
+    if args.bloom:
+        if 'canonical-url' in args.key:
+            print("错误：--bloom 不能与 canonical-url 同用（需要记住每个键保留的记录以替换为最新的）")
+            return False
+        if args.capacity <= 0 or not 0 < args.fpr < 1:
+            print("错误：--capacity 必须为正数，--fpr 必须在 0 与 1 之间")
+            return False
+    
+    if args.seen_db:
+        if args.bloom or 'canonical-url' in args.key:
+            print("错误：--seen-db 不能与 --bloom、canonical-url 同用")
+            return False
+    elif args.seen_run or args.skip_known or args.seen_report:
+        print("错误：--seen-run、--skip-known、--seen-report 需要同时指定 --seen-db")
+        return False
+    
     return True
 
 if __name__ == "__main__":
@@ -193,19 +403,47 @@ if __name__ == "__main__":
         exit(1)
     
     # 执行去重
+    seen = None
     try:
-        unique_entries = deduplicate_m3u(args.input)
-        
-        # 计算频道数量（仅统计EXTINF行）
-        channel_count = sum(1 for line in unique_entries if line.startswith("#EXTINF"))
+        if args.mmap and args.key != ('name',):
+            print("提示：--mmap 只支持按频道名称去重，改用普通模式")
+            args.mmap = False
         
-        # 安全写入输出文件
-        success = safe_write_output(unique_entries, args.input, args.output, args.add_header)
+        if args.seen_db:
+            seen = SeenStore(args.seen_db, f"deduplicate:{'+'.join(args.key)}", args.seen_run, args.skip_known)
+        elif args.bloom:
+            seen = SeenBloom(args.capacity, args.fpr)
+        if args.mmap:
+            with MappedPlaylist(args.input) as playlist:
+                chunks, channel_count = deduplicate_m3u_mmap(playlist, seen)
+                success = safe_write_output(chunks, args.output, args.add_header, binary=True)
+                del chunks  # 释放 memoryview 切片，以便关闭 mmap
+        else:
+            unique_entries = deduplicate_m3u(args.input, args.key, seen)
+            
+            # 计算频道数量（仅统计EXTINF行）
+            channel_count = sum(1 for line in unique_entries if line.startswith("#EXTINF"))
+            
+            # 安全写入输出文件
+            success = safe_write_output(unique_entries, args.output, args.add_header)
         
         if success:
+            # 输出文件写入成功后才提交本次运行的键，写入失败时去重数据库保持不变
+            if isinstance(seen, SeenStore):
+                seen.commit()
             print(f"已处理: {args.input}")
             print(f"去重后: {channel_count} 个频道")
             print(f"输出到: {args.output}")
+            if isinstance(seen, SeenStore):
+                print(f"去重数据库: {args.seen_db}，{seen.summary()}")
+                if args.seen_report:
+                    seen.write_report(args.seen_report)
+                    print(f"首次出现时间已写入: {args.seen_report}")
+            elif seen is not None:
+                print(f"Bloom 过滤器: {seen.size_bytes / 1024:.1f}KB，{seen.hash_count} 个哈希，"
+                      f"{len(seen)} 个键，当前估计误判率 {seen.current_fpr():.4%}")
+                if len(seen) > seen.capacity:
+                    print(f"警告：键数超过 --capacity {seen.capacity}，误判率已高于 --fpr {args.fpr}")
         else:
             print("处理失败！")
             exit(1)
@@ -213,3 +451,6 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"处理过程中发生错误: {e}")
         exit(1)
+    finally:
+        if isinstance(seen, SeenStore):
+            seen.close()
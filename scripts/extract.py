@@ -1,27 +1,218 @@
 import argparse
+import io
+import json
+import re
 import sys
 import os
-import tempfile
-import shutil
+from collections import namedtuple
+from contextlib import redirect_stdout
+from operator import itemgetter
+from urllib.parse import urlsplit
 
-def _check_match(text, keyword_str):
+from m3u_extinf import ExtInf
+from m3u_match import ExpressionError, ExpressionSet, Field
+from m3u_mmap import MappedPlaylist
+from m3u_parser import iter_m3u_file, iter_m3u_records
+from m3u_playlist import Playlist
+from m3u_seen import SeenDigests, SeenSet
+from m3u_writer import atomic_write, iter_lines
+
+# --input / --output 为 "-" 时使用 stdin / stdout（流式模式）
+STDIO = '-'
+
+# 字段条件（语法见 m3u_match）：逗号前的一侧按 EXTINF 的显示名称和属性求值，逗号后的一侧按 URL 的各部分求值
+EXTINF_ATTRIBUTES = ('group-title', 'tvg-id', 'tvg-name', 'tvg-logo', 'tvg-chno',
+                     'tvg-country', 'tvg-language', 'catchup', 'catchup-source')
+EXTINF_FIELDS = dict(
+    [('name', Field(lambda inf: inf.name.strip() if inf.name is not None else None, None))]
+    + [(key, Field(lambda inf, key=key: inf.get(key), None)) for key in EXTINF_ATTRIBUTES]
+)
+URL_FIELDS = {
+    'url.scheme': Field(itemgetter(0), str.lower),
+    'url.host': Field(itemgetter(1), str.lower),
+    'url.port': Field(itemgetter(2), None),
+    'url.path': Field(itemgetter(3), None),
+}
+_DEFAULT_PORTS = {'http': '80', 'https': '443', 'rtsp': '554', 'rtmp': '1935'}
+# 常见的 scheme://[userinfo@]host[:port]/path 形式，一次匹配取出各部分；不符合时回退到 urlsplit
+_URL_PATTERN = re.compile(r'([A-Za-z][A-Za-z0-9+.-]*)://(?:[^/?#@]*@)?(\[[^\]/?#]*\]|[^/?#:\[\]]*)(?::(\d*))?(?=[/?#]|$)([^?#]*)')
+
+# 规则文件中的一条规则：输出路径、EXTINF 与 URL 两侧的表达式、两侧是否都要命中（eandu）、是否丢弃配置行、是否为删除模式
+ExtractRule = namedtuple('ExtractRule', ['output', 'extinf_expression', 'url_expression', 'match_all',
+                                         'no_config', 'remove_mode'])
+
+def _split_keyword_pair(keywords):
+    """按引号和花括号外的逗号切分 "EXTINF表达式,URL表达式"，引号和 {...} 内的逗号属于关键字"""
+    quoted = False
+    braced = False
+    parts = []
+    start = 0
+    for pos, char in enumerate(keywords):
+        if char == '"':
+            quoted = not quoted
+        elif char in '{}' and not quoted:
+            braced = char == '{'
+        elif char == ',' and not quoted and not braced:
+            parts.append(keywords[start:pos].strip())
+            start = pos + 1
+    parts.append(keywords[start:].strip())
+    return parts
+
+def _keyword_expressions(option, keywords):
     """
-    辅助函数：检查文本是否包含指定关键字，支持 && 和 || 逻辑。
+    把 --eandu / --eoru 的参数值拆为两侧表达式
+    :param option: 'eandu' 或 'eoru'
+    :return: (EXTINF表达式, URL表达式, match_all)
+    :raises ValueError: 格式错误
     """
-    if not keyword_str or not keyword_str.strip():
-        return False
+    parts = _split_keyword_pair(keywords)
+    if len(parts) != 2:
+        raise ValueError(f"--{option} 需要格式 'Keyword1,Keyword2'。")
+    match_all = option == 'eandu'
+    if match_all and (not parts[0] or not parts[1]):
+        raise ValueError("--eandu 参数的两个关键字不能为空。")
+    return parts[0], parts[1], match_all
+
+def _split_url(url):
+    """URL 字段条件用：(协议, 主机, 端口, 路径)；没有端口时取协议的默认端口，无法解析时各部分为 None"""
+    match = _URL_PATTERN.match(url)
+    if match:
+        scheme, host, port, path = match.groups()
+        scheme = scheme.lower()
+        host = host.strip('[]').lower() or None
+        port = str(int(port)) if port else None
+    else:
+        try:
+            parts = urlsplit(url)
+            port = parts.port
+        except ValueError:
+            return None, None, None, None
+        scheme, host, path = parts.scheme.lower(), parts.hostname, parts.path
+        port = str(port) if port is not None else None
+    return scheme or None, host, port or _DEFAULT_PORTS.get(scheme), path
+
+def _compile_keyword_tests(expressions):
+    """
+    编译多组表达式（语法见 m3u_match），每组只编译一次。
+    所有组中 EXTINF 一侧的表达式共用一个词表，URL 一侧同样，每行只扫描一遍找出全部关键字，再在结果上对各组求值；
+    extinf/url 为 bytes 时（mmap 模式）关键字按 UTF-8 编码后在字节上匹配，无需解码。
+    :param expressions: [(EXTINF表达式, URL表达式, match_all), ...]，
+                        match_all 为 True 时两侧都要命中（--eandu），否则任一侧命中即可（--eoru）
+    :return: 判断函数 matched(extinf, url)，返回各组是否命中的列表
+    :raises ExpressionError: 表达式语法错误
+    """
+    extinf_field = ExpressionSet(EXTINF_FIELDS, ExtInf, URL_FIELDS)
+    url_field = ExpressionSet(URL_FIELDS, _split_url, EXTINF_FIELDS)
+    tests = [(extinf_field.add(extinf_expression), url_field.add(url_expression), match_all)
+             for extinf_expression, url_expression, match_all in expressions]
 
-    # 处理关键词中的引号，去除首尾可能存在的双引号并清理空格
-    processed_keyword = keyword_str.strip().strip('"')
+    def matched(extinf, url):
+        extinf_mask = extinf_field.scan(extinf)
+        url_mask = url_field.scan(url)
+        return [(extinf_test(extinf_mask) and url_test(url_mask)) if match_all
+                else (extinf_test(extinf_mask) or url_test(url_mask))
+                for extinf_test, url_test, match_all in tests]
+    return matched
 
-    if "&&" in processed_keyword:
-        sub_keywords = [k.strip() for k in processed_keyword.split("&&") if k.strip()]
-        return all(k in text for k in sub_keywords)
-    elif "||" in processed_keyword:
-        sub_keywords = [k.strip() for k in processed_keyword.split("||") if k.strip()]
-        return any(k in text for k in sub_keywords)
+def _parse_keyword_args(extinf_and_url_keywords=None, extinf_or_url_keywords=None):
+    """
+    解析并编译 --eandu / --eoru 参数
+    :return: (ok, matched)，matched(extinf, url) 返回只含一个元素的命中列表
+    """
+    if extinf_and_url_keywords:
+        option, keywords = 'eandu', extinf_and_url_keywords
+    elif extinf_or_url_keywords:
+        option, keywords = 'eoru', extinf_or_url_keywords
     else:
-        return processed_keyword in text
+        return True, lambda extinf, url: [False]
+
+    try:
+        return True, _compile_keyword_tests([_keyword_expressions(option, keywords)])
+    except ExpressionError as e:
+        print(f"错误：关键字表达式无效：{e}")
+    except ValueError as e:
+        print(f"错误：{e}")
+    return False, None
+
+def load_extract_rules(path, no_config=False, remove_mode=False):
+    """
+    读取规则文件（JSON），一次读取输入即可按多条规则分别写出多个文件:
+      {
+        "rules": [
+          {"eandu": "!更新时间,//38.75.136.137", "output": "gop.m3u"},
+          {"eoru": ",qqqtv", "output": "t3o.m3u", "no_config": true},
+          {"eoru": ",catvod.com", "output": "other.m3u", "remove": true}
+        ]
+      }
+
+      eandu / eoru  二选一，写法与命令行参数相同
+      output        输出文件路径，各规则不能相同
+      no_config     只保留 EXTINF 和 URL 行，省略时取命令行 -n
+      remove        删除模式，省略时取命令行 -r
+
+    :return: ExtractRule 列表
+    :raises ValueError: 文件格式错误
+    :raises OSError: 文件无法读取
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        try:
+            definition = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"规则文件 '{path}' 不是有效的 JSON: {e}") from e
+    if not isinstance(definition, dict) or not isinstance(definition.get('rules'), list) or not definition['rules']:
+        raise ValueError("规则文件必须是包含非空 rules 列表的对象")
+
+    rules = []
+    outputs = set()
+    for index, spec in enumerate(definition['rules']):
+        where = f"第 {index + 1} 条规则"
+        if not isinstance(spec, dict):
+            raise ValueError(f"{where}：必须是对象")
+        options = [option for option in ('eandu', 'eoru') if option in spec]
+        if len(options) != 1 or not isinstance(spec[options[0]], str):
+            raise ValueError(f"{where}：需要 eandu 或 eoru 之一（字符串）")
+        output = spec.get('output')
+        if not isinstance(output, str) or not output:
+            raise ValueError(f"{where}：缺少 output")
+        if os.path.abspath(output) in outputs:
+            raise ValueError(f"{where}：output 与前面的规则重复: {output}")
+        outputs.add(os.path.abspath(output))
+        flags = {}
+        for key, default in (('no_config', no_config), ('remove', remove_mode)):
+            flags[key] = spec.get(key, default)
+            if not isinstance(flags[key], bool):
+                raise ValueError(f"{where}：{key} 必须是 true 或 false")
+
+        try:
+            extinf_expression, url_expression, match_all = _keyword_expressions(options[0], spec[options[0]])
+            _compile_keyword_tests([(extinf_expression, url_expression, match_all)])
+        except ValueError as e:
+            raise ValueError(f"{where}：{e}") from e
+        rules.append(ExtractRule(output, extinf_expression, url_expression, match_all,
+                                 flags['no_config'], flags['remove']))
+    return rules
+
+def _compile_rules(rules):
+    """:return: (matched, outputs)，outputs 为各规则的 (no_config, remove_mode)"""
+    matched = _compile_keyword_tests([(rule.extinf_expression, rule.url_expression, rule.match_all)
+                                      for rule in rules])
+    return matched, [(rule.no_config, rule.remove_mode) for rule in rules]
+
+def _split_record_lines(lines):
+    """
+    向下探测，寻找 URL
+    :return: (configs, url, url_pos) —— URL 之前的配置行、第一个非 '#' 开头的行及其位置；
+             在找到 URL 前遇见了下一个标签时 url 为 None
+    """
+    configs = []
+    for pos, line in enumerate(lines):
+        if line.startswith('#'):
+            # 收集配置行
+            configs.append(line)
+        else:
+            # 找到第一个非 '#' 开头的行，判定为 URL
+            return configs, line, pos
+    return configs, None, len(lines)
 
 def extract_keyword_lines(filepath, extinf_and_url_keywords=None, extinf_or_url_keywords=None, 
                           no_config=False, remove_mode=False):
@@ -30,117 +221,46 @@ def extract_keyword_lines(filepath, extinf_and_url_keywords=None, extinf_or_url_
     :param no_config: 如果为 True，则丢弃 #EXTVLCOPT 等中间配置行。
     :param remove_mode: 如果为 True，则删除匹配的记录，保留不匹配的记录。
     """
+    # 解析关键字逻辑
+    ok, matched = _parse_keyword_args(extinf_and_url_keywords, extinf_or_url_keywords)
+    if not ok:
+        return []
+
     try:
-        with open(filepath, 'r', encoding='utf-8') as file:
-            # 过滤掉纯空行，并去除每行末尾换行符
-            lines = [line.strip() for line in file if line.strip()]
+        return _extract_records(iter_m3u_file(filepath), matched, [(no_config, remove_mode)])[0]
     except Exception as e:
         print(f"错误：无法读取文件 {filepath}。原因：{e}")
         return []
 
-    ordered_record_pairs = []
-    seen_record_pairs = set()
+def extract_keyword_records(records, extinf_and_url_keywords=None, extinf_or_url_keywords=None,
+                            no_config=False, remove_mode=False):
+    """
+    与 extract_keyword_lines 相同，但处理已解析的记录（供流水线在内存中串联使用）
+    :param records: M3URecord 序列
+    :return: 输出行列表
+    """
+    ok, matched = _parse_keyword_args(extinf_and_url_keywords, extinf_or_url_keywords)
+    if not ok:
+        return []
+    return _extract_records(records, matched, [(no_config, remove_mode)])[0]
 
-    # 解析关键字逻辑
-    kw1_and_kw2 = None
-    if extinf_and_url_keywords:
-        parts = [k.strip() for k in extinf_and_url_keywords.split(',')]
-        if len(parts) == 2:
-            if not parts[0] or not parts[1]:
-                print("错误：--eandu 参数的两个关键字不能为空。")
-                return []
-            kw1_and_kw2 = (parts[0], parts[1])
-        else:
-            print("错误：--eandu 需要格式 'Keyword1,Keyword2'。")
-            return []
-
-    kw1_or_kw2 = None
-    if extinf_or_url_keywords:
-        parts = [k.strip() for k in extinf_or_url_keywords.split(',')]
-        if len(parts) == 2:
-            kw1_or_kw2 = (parts[0], parts[1])
-        else:
-            print("错误：--eoru 需要格式 'Keyword1,Keyword2'。")
-            return []
-
-    i = 0
-    while i < len(lines):
-        # 寻找记录起始点
-        if lines[i].startswith('#EXTINF'):
-            current_extinf = lines[i]
-            current_sub_configs = []
-            current_url = None
-            
-            # 向下探测，寻找 URL
-            j = i + 1
-            while j < len(lines):
-                next_line = lines[j]
-                if next_line.startswith('#EXTINF'):
-                    # 异常情况：在找到 URL 前遇见了下一个标签，说明当前频道 URL 丢失
-                    break
-                elif next_line.startswith('#'):
-                    # 收集配置行
-                    current_sub_configs.append(next_line)
-                    j += 1
-                else:
-                    # 找到第一个非 '#' 开头的行，判定为 URL
-                    current_url = next_line
-                    break
-            
-            # 如果成功锁定了一组完整的 (EXTINF + URL)
-            if current_url:
-                matched = False
-                if kw1_and_kw2:
-                    matched = _check_match(current_extinf, kw1_and_kw2[0]) and \
-                              _check_match(current_url, kw1_and_kw2[1])
-                elif kw1_or_kw2:
-                    matched = _check_match(current_extinf, kw1_or_kw2[0]) or \
-                              _check_match(current_url, kw1_or_kw2[1])
-
-                # 根据 remove_mode 决定处理逻辑
-                if remove_mode:
-                    # 删除模式：只保留不匹配的记录
-                    if not matched:
-                        # 根据 no_config 参数决定是否包含中间行
-                        if no_config:
-                            record_block = [current_extinf, current_url]
-                        else:
-                            record_block = [current_extinf] + current_sub_configs + [current_url]
-                        
-                        # 去重逻辑
-                        record_key = (current_extinf, current_url)
-                        if record_key not in seen_record_pairs:
-                            ordered_record_pairs.append(record_block)
-                            seen_record_pairs.add(record_key)
-                else:
-                    # 原始模式：只保留匹配的记录
-                    if matched:
-                        # 根据 no_config 参数决定是否包含中间行
-                        if no_config:
-                            record_block = [current_extinf, current_url]
-                        else:
-                            record_block = [current_extinf] + current_sub_configs + [current_url]
-                        
-                        # 去重逻辑
-                        record_key = (current_extinf, current_url)
-                        if record_key not in seen_record_pairs:
-                            ordered_record_pairs.append(record_block)
-                            seen_record_pairs.add(record_key)
-                
-                i = j + 1  # 移动到 URL 之后的一行
-            else:
-                # 丢失 URL 的频道，直接跳到下一个起始点
-                i = j
-        else:
-            # 处理文件开头的非EXTINF行（如#EXTM3U等头部信息）
-            # 在删除模式下，我们保留这些行
-            if remove_mode:
-                ordered_record_pairs.append([lines[i]])
-            i += 1
+def extract_rules_lines(filepath, rules):
+    """
+    按多条规则处理同一个输入文件，只读取和解析一次
+    :param rules: load_extract_rules() 返回的规则列表
+    :return: 与 rules 一一对应的输出行列表；无法读取文件时为 None
+    """
+    matched, outputs = _compile_rules(rules)
+    try:
+        return _extract_records(iter_m3u_file(filepath), matched, outputs)
+    except Exception as e:
+        print(f"错误：无法读取文件 {filepath}。原因：{e}")
+        return None
 
-    # 展开结果，并在每个记录块后添加空行
+def _join_blocks(blocks):
+    """展开记录块，块之间以空行分隔"""
     result = []
-    for block in ordered_record_pairs:
+    for block in blocks:
         result.extend(block)
         result.append("") 
 
@@ -150,67 +270,239 @@ def extract_keyword_lines(filepath, extinf_and_url_keywords=None, extinf_or_url_
     
     return result
 
-def safe_write_output(data, input_path, output_path):
+def _iter_record_blocks(records, matched, outputs, seen_records):
+    """
+    逐条判断记录，按输入顺序产出 (输出序号, 记录块)
+    :param matched: _compile_keyword_tests() 返回的判断函数
+    :param outputs: 与 matched 返回的列表一一对应的 (no_config, remove_mode)
+    :param seen_records: 每个输出一个去重容器（m3u_seen），add((extinf, url)) 对新记录返回 True
+    """
+    states = list(enumerate(zip(outputs, seen_records)))
+
+    for record in records:
+        if record.extinf is None:
+            # 处理文件开头的非EXTINF行（如#EXTM3U等头部信息）
+            # 在删除模式下，我们保留这些行
+            for index, ((_, remove_mode), _) in states:
+                if remove_mode:
+                    for line in record.lines:
+                        yield index, [line]
+            continue
+
+        current_extinf = record.extinf
+        current_sub_configs, current_url, url_pos = _split_record_lines(record.lines)
+
+        # 丢失 URL 的频道（在找到 URL 前遇见了下一个标签），直接跳过
+        if not current_url:
+            continue
+
+        record_key = (current_extinf, current_url)
+        for hit, (index, ((no_config, remove_mode), seen)) in zip(matched(current_extinf, current_url), states):
+            # 删除模式：只保留不匹配的记录；原始模式：只保留匹配的记录
+            # 去重逻辑
+            if hit != remove_mode and seen.add(record_key):
+                # 根据 no_config 参数决定是否包含中间行
+                if no_config:
+                    yield index, [current_extinf, current_url]
+                else:
+                    yield index, [current_extinf] + current_sub_configs + [current_url]
+
+            # URL 之后、下一个 #EXTINF 之前的游离行，删除模式下按头部信息保留
+            if remove_mode:
+                for line in record.lines[url_pos + 1:]:
+                    yield index, [line]
+
+def _extract_blocks(records, matched, outputs):
+    """
+    :param matched: _compile_keyword_tests() 返回的判断函数
+    :param outputs: 与 matched 返回的列表一一对应的 (no_config, remove_mode)
+    :return: 各输出的记录块列表
+    """
+    ordered_record_pairs = [[] for _ in outputs]
+    seen_records = [SeenSet() for _ in outputs]
+    for index, block in _iter_record_blocks(records, matched, outputs, seen_records):
+        ordered_record_pairs[index].append(block)
+    return ordered_record_pairs
+
+def _extract_records(records, matched, outputs):
+    """
+    :return: 各输出的结果行列表，参数同 _extract_blocks
+    """
+    return [_join_blocks(blocks) for blocks in _extract_blocks(records, matched, outputs)]
+
+def iter_keyword_stream(records, matched, no_config=False, remove_mode=False, seen=None, stats=None):
+    """
+    流式模式：每条记录处理完立即产出它的输出文本（含换行），拼接后与 extract_keyword_lines 写出的文件相同。
+    只保留去重用的摘要，内存占用与输入、输出的大小无关
+    :param records: M3URecord 可迭代对象（可以是逐行读取 stdin 的生成器）
+    :param matched: _parse_keyword_args() 返回的判断函数
+    :param seen: 去重容器，默认为 m3u_seen.SeenDigests()（只保存 8 字节哈希）
+    :param stats: 可选的 dict，写入 input（输入记录数）与 output（输出记录数）
+    """
+    if seen is None:
+        seen = SeenDigests()
+    if stats is None:
+        stats = {}
+    stats['input'] = stats['output'] = 0
+
+    def counted(records):
+        for record in records:
+            if record.extinf is not None:
+                stats['input'] += 1
+            yield record
+
+    separator = ""
+    for _, block in _iter_record_blocks(counted(records), matched, [(no_config, remove_mode)], [seen]):
+        if block[0].startswith('#EXTINF'):
+            stats['output'] += 1
+        # 记录块之间以空行分隔
+        yield separator + '\n'.join(block) + '\n'
+        separator = "\n"
+
+def transform_playlist(playlist, args):
+    """
+    流水线阶段：按命令行参数处理内存中的播放列表
+    :param playlist: m3u_playlist.Playlist
+    :param args: build_parser() 解析出的参数
+    :return: 新的 Playlist，内容与命令行方式写出的文件相同
+    """
+    if getattr(args, 'rules', None):
+        raise ValueError("流水线阶段只有一个输出，不支持 --rules")
+    ok, matched = _parse_keyword_args(args.extinf_and_url_keywords, args.extinf_or_url_keywords)
+    if not ok:
+        return Playlist.from_lines([])
+    # 交出记录块，下一阶段直接取用记录；只有写出时才按命令行的格式拼接
+    blocks = _extract_blocks(playlist.records, matched, [(args.no_config, args.remove_mode)])[0]
+    return Playlist.from_blocks(blocks, lambda: _join_blocks(blocks))
+
+def extract_keyword_chunks(playlist, extinf_and_url_keywords=None, extinf_or_url_keywords=None,
+                           no_config=False, remove_mode=False):
+    """
+    mmap 快速路径：关键字直接在 EXTINF/URL 行的字节上匹配，无需解码；
+    原样保留的记录以 memoryview 零拷贝输出。输出与 extract_keyword_lines 完全一致。
+    :param playlist: 已打开的 MappedPlaylist
+    :return: (chunks, record_count)
+    """
+    ok, matched = _parse_keyword_args(extinf_and_url_keywords, extinf_or_url_keywords)
+    if not ok:
+        return [], 0
+    return _extract_chunks(playlist, matched, [(no_config, remove_mode)])[0]
+
+def extract_rules_chunks(playlist, rules):
+    """
+    mmap 模式下按多条规则处理，只扫描一次映射内存
+    :param playlist: 已打开的 MappedPlaylist
+    :param rules: load_extract_rules() 返回的规则列表
+    :return: 与 rules 一一对应的 (chunks, record_count)
+    """
+    matched, outputs = _compile_rules(rules)
+    return _extract_chunks(playlist, matched, outputs)
+
+def _extract_chunks(playlist, matched, outputs):
+    """
+    :param matched: _compile_keyword_tests() 返回的判断函数
+    :param outputs: 与 matched 返回的列表一一对应的 (no_config, remove_mode)
+    :return: 各输出的 (chunks, record_count)
+    """
+    mm = playlist.mm
+    all_blocks = [[] for _ in outputs]  # 每个元素是一个记录块的字节块列表
+    seen_record_pairs = [set() for _ in outputs]
+    record_counts = [0] * len(outputs)
+    states = list(zip(range(len(outputs)), outputs, all_blocks, seen_record_pairs))
+
+    def encode_lines(lines):
+        return [('\n'.join(lines) + '\n').encode('utf-8')]
+
+    preamble = playlist.preamble()
+    if preamble:
+        for _, (_, remove_mode), blocks, _ in states:
+            if remove_mode:
+                for line in preamble.lines:
+                    blocks.append(encode_lines([line]))
+
+    for i in range(len(playlist)):
+        if playlist.is_clean(i):
+            start, eol = playlist.extinf_span(i)
+            spans = list(playlist.iter_body_spans(i))
+            url_index = next((k for k, (s, _) in enumerate(spans) if mm[s] != ord('#')), None)
+            if url_index is None:
+                continue
+
+            extinf = mm[start:eol]
+            url = mm[spans[url_index][0]:spans[url_index][1]]
+            record_key = (extinf, url)
+
+            for hit, (index, (no_config, remove_mode), blocks, seen) in zip(matched(extinf, url), states):
+                if hit != remove_mode and record_key not in seen:
+                    seen.add(record_key)
+                    record_counts[index] += 1
+                    if url_index == len(spans) - 1 and (not no_config or url_index == 0):
+                        # 记录原样保留，直接引用映射内存
+                        blocks.append(playlist.raw_chunks(i))
+                    else:
+                        kept = [(start, eol)] + ([] if no_config else spans[:url_index]) + [spans[url_index]]
+                        blocks.append([b''.join(mm[s:e] + b'\n' for s, e in kept)])
+
+                if remove_mode:
+                    for s, e in spans[url_index + 1:]:
+                        blocks.append([mm[s:e] + b'\n'])
+        else:
+            # 含有空行、\r 或首尾空白的记录解码后按文本方式处理
+            record = playlist.record(i)
+            configs, url, url_pos = _split_record_lines(record.lines)
+            if not url:
+                continue
+
+            record_key = (record.extinf.encode('utf-8'), url.encode('utf-8'))
+            for hit, (index, (no_config, remove_mode), blocks, seen) in zip(matched(record.extinf, url), states):
+                if hit != remove_mode and record_key not in seen:
+                    seen.add(record_key)
+                    record_counts[index] += 1
+                    blocks.append(encode_lines([record.extinf] + ([] if no_config else configs) + [url]))
+
+                if remove_mode:
+                    for line in record.lines[url_pos + 1:]:
+                        blocks.append(encode_lines([line]))
+
+    results = []
+    for blocks, record_count in zip(all_blocks, record_counts):
+        # 记录块之间以空行分隔，最后一块之后不加空行
+        chunks = []
+        for index, block in enumerate(blocks):
+            if index:
+                chunks.append(b'\n')
+            chunks.extend(block)
+        results.append((chunks, record_count))
+    return results
+
+def safe_write_output(data, output_path, binary=False):
     """
-    安全地写入输出文件，支持同文件覆盖
+    安全地写入输出文件：原子替换，支持同文件覆盖，内容未变化时保留原文件
     
     :param data: 要写入的数据列表
-    :param input_path: 输入文件路径
     :param output_path: 输出文件路径
-    :return: (success, temp_path) 成功返回(True, None)，失败返回(False, temp_path)
+    :param binary: 为 True 时 data 是已编码的字节块（mmap 模式），原样写出
+    :return: (success, changed) 成功返回(True, 内容是否有变化)，失败返回(False, False)
     """
-    # 获取绝对路径以判断是否为同一个文件
-    input_abs = os.path.abspath(input_path)
-    output_abs = os.path.abspath(output_path)
-    is_same_file = input_abs == output_abs
-    
-    temp_path = None
-    
     try:
-        # 如果是同一个文件，先写到临时文件
-        if is_same_file:
-            # 在与输出文件相同目录创建临时文件
-            output_dir = os.path.dirname(output_path) or '.'
-            fd, temp_path = tempfile.mkstemp(
-                dir=output_dir,
-                suffix='.m3u',
-                prefix='.tmp_',
-                text=True
-            )
-            
-            # 使用文件描述符打开文件
-            out_f = os.fdopen(fd, 'w', encoding='utf-8')
-        else:
-            # 直接打开输出文件
-            out_f = open(output_path, 'w', encoding='utf-8')
-        
-        # 写入数据
-        with out_f:
-            for line in data:
-                out_f.write(line + '\n')
-        
-        # 如果是同一个文件，进行原子替换
-        if is_same_file:
-            try:
-                # Python 3.3+ 推荐使用 os.replace 实现原子替换
-                os.replace(temp_path, output_path)
-                temp_path = None  # 替换成功，清除临时文件引用
-            except Exception as e:
-                # 如果 os.replace 失败，使用 shutil.move 作为备选
-                print(f"警告：原子替换失败，使用备选方案: {e}")
-                shutil.move(temp_path, output_path)
-                temp_path = None  # 移动成功，清除临时文件引用
-        
-        return True, None
-        
+        changed = atomic_write(output_path, data if binary else iter_lines(data), binary=binary)
     except Exception as e:
         print(f"写入文件失败: {e}")
-        return False, temp_path
+        return False, False
+    
+    if not changed:
+        print(f"内容未变化，保留原文件：{output_path}")
+    return True, changed
 
-def validate_arguments(args):
+def validate_arguments(args, outputs):
     """
     验证命令行参数的合理性
+    :param outputs: 输出文件路径列表（--output 或规则文件中的各 output），"-" 表示 stdout
     """
+    outputs = [output for output in outputs if output != STDIO]
+    if args.input == STDIO:
+        return all(_check_output_dir(output) for output in outputs)
+
     # 检查输入文件是否存在
     if not os.path.exists(args.input):
         print(f"错误：输入文件 '{args.input}' 不存在")
@@ -230,39 +522,55 @@ def validate_arguments(args):
     if not args.input.lower().endswith('.m3u'):
         print(f"警告：输入文件 '{args.input}' 可能不是标准M3U文件")
     
-    # 检查输出目录是否可写
-    output_dir = os.path.dirname(os.path.abspath(args.output)) or '.'
+    input_abs = os.path.abspath(args.input)
+    for output in outputs:
+        if not _check_output_dir(output):
+            return False
+        
+        # 检查输入输出是否为同一文件（提供信息性提示）
+        if input_abs == os.path.abspath(output):
+            print("信息：输入和输出为同一文件，将安全覆盖原文件")
+    
+    return True
+
+def _check_output_dir(output):
+    """检查输出目录是否可写"""
+    output_dir = os.path.dirname(os.path.abspath(output)) or '.'
     if not os.access(output_dir, os.W_OK):
         print(f"错误：输出目录 '{output_dir}' 不可写")
         return False
-    
-    # 检查输入输出是否为同一文件（提供信息性提示）
-    input_abs = os.path.abspath(args.input)
-    output_abs = os.path.abspath(args.output)
-    
-    if input_abs == output_abs:
-        print("信息：输入和输出为同一文件，将安全覆盖原文件")
-    
     return True
 
-def parse_arguments():
+def build_parser():
     parser = argparse.ArgumentParser(description='从M3U文件中提取或删除包含指定关键字的记录')
-    parser.add_argument('--input', required=True, help='输入M3U文件路径')
-    parser.add_argument('--output', required=True, help='输出文件路径')
+    parser.add_argument('--input', required=True, help='输入M3U文件路径，"-" 表示从 stdin 读取（流式模式）')
+    parser.add_argument('--output', help='输出文件路径（使用 --rules 时由规则指定），"-" 表示写到 stdout（流式模式）')
     parser.add_argument('-n', action='store_true', dest='no_config', 
                        help='只保留EXTINF和URL行，丢弃中间配置行')
     parser.add_argument('-r', action='store_true', dest='remove_mode', 
                        help='删除模式：删除匹配的记录，保留不匹配的记录')
     parser.add_argument('--force', action='store_true',
                        help='强制覆盖输出文件（如果已存在且与输入不同）')
+    parser.add_argument('--mmap', action='store_true',
+                       help='以 mmap 方式按字节处理输入文件，适合大文件')
+    parser.add_argument('--stream', action='store_true',
+                       help='流式模式：逐条读取，每条记录处理完立即写出，内存占用与文件大小无关（--input/--output 为 "-" 时自动开启）')
+    parser.add_argument('--dedupe-window', type=int, default=0, metavar='N',
+                       help='流式模式下只按最近 N 个不同记录去重，使内存有固定上限（默认 0：全部记录）')
 
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument('--eandu', dest='extinf_and_url_keywords', 
-                      help='AND模式："EXTINF关键词,URL关键词"')
+                      help='AND模式："EXTINF表达式,URL表达式"，表达式支持 &&、||、! 和括号，如 "CCTV && !测试,m3u8"；'
+                           '也可对字段求值，如 "group-title=央视,url.host in {a.com, b.com}"（字段见 EXTINF_FIELDS、URL_FIELDS）')
     group.add_argument('--eoru', dest='extinf_or_url_keywords', 
-                      help='OR模式："EXTINF关键词,URL关键词"')
+                      help='OR模式："EXTINF表达式,URL表达式"')
+    group.add_argument('--rules', metavar='FILE',
+                      help='规则文件（JSON）：每条规则有自己的表达式、模式和输出文件，只读取一次输入，格式见 load_extract_rules')
+
+    return parser
 
-    return parser.parse_args()
+def parse_arguments():
+    return build_parser().parse_args()
 
 def get_original_channel_count(filepath):
     """
@@ -276,70 +584,170 @@ def get_original_channel_count(filepath):
         print(f"警告：无法计算原始频道数量: {e}")
         return 0
 
-def cleanup_temp_file(temp_path):
+def describe_mode(match_all, remove_mode):
+    """模式说明，如：提取EXTINF或URL匹配(OR)的记录"""
+    action = "删除" if remove_mode else "提取"
+    if match_all:
+        return f"{action}EXTINF和URL均匹配(AND)的记录"
+    return f"{action}EXTINF或URL匹配(OR)的记录"
+
+def run_rules(args, rules):
     """
-    清理临时文件
+    按规则文件处理：只读取一次输入，分别写出各规则的输出
+    :return: 全部输出写入成功时为 True
     """
-    if temp_path and os.path.exists(temp_path):
-        try:
-            os.unlink(temp_path)
-            print(f"已清理临时文件: {temp_path}")
-        except Exception as e:
-            print(f"警告：无法删除临时文件 {temp_path}: {e}")
+    if args.mmap:
+        # 输出块引用映射内存，写完之前不能关闭映射
+        with MappedPlaylist(args.input) as playlist:
+            results = extract_rules_chunks(playlist, rules)
+            written = [safe_write_output(chunks, rule.output, binary=True)[0]
+                       for rule, (chunks, _) in zip(rules, results)]
+            counts = [count for _, count in results]
+            del results
+    else:
+        results = extract_rules_lines(args.input, rules)
+        if results is None:
+            return False
+        written = []
+        counts = []
+        for rule, lines in zip(rules, results):
+            success, _ = safe_write_output(lines, rule.output)
+            written.append(success)
+            counts.append(sum(1 for line in lines if line.startswith('#EXTINF')))
+
+    for rule, success, count in zip(rules, written, counts):
+        status = f"{count} 条记录" if success else "写入失败"
+        option = "-n，" if rule.no_config else ""
+        print(f"{rule.output}：{status}（{option}{describe_mode(rule.match_all, rule.remove_mode)}）")
+    return all(written)
+
+def run_stream(args, stdout):
+    """
+    流式处理：逐条读取输入（文件或 stdin），每条记录处理完即写出（stdout 或经原子写入的输出文件）
+    :param stdout: 二进制的标准输出
+    :return: 成功时为 True
+    """
+    ok, matched = _parse_keyword_args(args.extinf_and_url_keywords, args.extinf_or_url_keywords)
+    if not ok:
+        return False
+
+    seen = SeenDigests(args.dedupe_window)
+    stats = {}
+    if args.input == STDIO:
+        source = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    else:
+        source = open(args.input, 'r', encoding='utf-8')
+    with source:
+        chunks = iter_keyword_stream(iter_m3u_records(source), matched, args.no_config, args.remove_mode,
+                                     seen=seen, stats=stats)
+        if args.output == STDIO:
+            try:
+                for chunk in chunks:
+                    stdout.write(chunk.encode('utf-8'))
+                    stdout.flush()
+            except BrokenPipeError:
+                # 下游提前关闭了管道（如 head），不再输出；避免退出时刷新 stdout 再次报错
+                os.dup2(os.open(os.devnull, os.O_WRONLY), stdout.fileno())
+                print("提示：输出管道已关闭，提前结束")
+        else:
+            success, _ = safe_write_output((chunk.encode('utf-8') for chunk in chunks), args.output, binary=True)
+            if not success:
+                return False
+
+    action = "保留" if args.remove_mode else "提取"
+    print(f"处理完成！读取 {stats['input']} 条记录，{action} {stats['output']} 条记录。")
+    print(f"模式：{describe_mode(bool(args.extinf_and_url_keywords), args.remove_mode)}")
+    window = f"（只记住最近 {args.dedupe_window} 个）" if args.dedupe_window else ""
+    print(f"去重：保存 {len(seen)} 个 8 字节摘要{window}")
+    if args.output != STDIO:
+        print(f"结果保存至：{args.output}")
+    return True
 
 if __name__ == "__main__":
-    args = parse_arguments()
+    parser = build_parser()
+    args = parser.parse_args()
+
+    if args.rules:
+        try:
+            rules = load_extract_rules(args.rules, no_config=args.no_config, remove_mode=args.remove_mode)
+        except (OSError, ValueError) as e:
+            print(f"错误：无法加载规则文件 '{args.rules}'：{e}")
+            sys.exit(1)
+        outputs = [rule.output for rule in rules]
+    elif not args.output:
+        parser.error("需要 --output（或使用 --rules）")
+    else:
+        outputs = [args.output]
+
+    stream = args.stream or STDIO in (args.input, args.output)
+    if stream and (args.rules or args.mmap):
+        parser.error("流式模式（--stream 或 \"-\"）不能与 --rules、--mmap 同时使用")
+    if args.dedupe_window < 0:
+        parser.error("--dedupe-window 不能为负数")
     
     # 验证参数
-    if not validate_arguments(args):
+    if not validate_arguments(args, outputs):
         sys.exit(1)
     
     # 检查输出文件是否已存在且与输入不同
     input_abs = os.path.abspath(args.input)
-    output_abs = os.path.abspath(args.output)
-    
-    if os.path.exists(args.output) and input_abs != output_abs:
-        if not args.force:
-            print(f"错误：输出文件 '{args.output}' 已存在")
-            print("使用 --force 参数强制覆盖，或指定不同的输出文件")
+    for output in outputs:
+        if output != STDIO and os.path.exists(output) and input_abs != os.path.abspath(output):
+            if not args.force:
+                print(f"错误：输出文件 '{output}' 已存在")
+                print("使用 --force 参数强制覆盖，或指定不同的输出文件")
+                sys.exit(1)
+
+    if args.rules:
+        if not run_rules(args, rules):
+            print("处理失败！")
             sys.exit(1)
+        print(f"处理完成！按 {len(rules)} 条规则处理 {args.input}")
+        sys.exit(0)
+
+    if stream:
+        stdout = sys.stdout.buffer
+        # 结果写到 stdout 时，提示信息改写到 stderr
+        with redirect_stdout(sys.stderr if args.output == STDIO else sys.stdout):
+            if not run_stream(args, stdout):
+                print("处理失败！")
+                sys.exit(1)
+        sys.exit(0)
     
     # 根据参数调用函数
     if args.extinf_and_url_keywords:
-        extracted_lines = extract_keyword_lines(
-            args.input, 
-            extinf_and_url_keywords=args.extinf_and_url_keywords,
-            no_config=args.no_config,
-            remove_mode=args.remove_mode
-        )
-        if args.remove_mode:
-            mode_str = "删除EXTINF和URL均匹配(AND)的记录"
-        else:
-            mode_str = "提取EXTINF和URL均匹配(AND)的记录"
+        keyword_args = {'extinf_and_url_keywords': args.extinf_and_url_keywords}
+    else:
+        keyword_args = {'extinf_or_url_keywords': args.extinf_or_url_keywords}
+    mode_str = describe_mode(bool(args.extinf_and_url_keywords), args.remove_mode)
+    
+    if args.mmap:
+        # 输出块引用映射内存，写完之前不能关闭映射
+        with MappedPlaylist(args.input) as playlist:
+            chunks, count = extract_keyword_chunks(
+                playlist,
+                no_config=args.no_config,
+                remove_mode=args.remove_mode,
+                **keyword_args
+            )
+            success, _ = safe_write_output(chunks, args.output, binary=True)
+            del chunks
     else:
         extracted_lines = extract_keyword_lines(
             args.input, 
-            extinf_or_url_keywords=args.extinf_or_url_keywords,
             no_config=args.no_config,
-            remove_mode=args.remove_mode
+            remove_mode=args.remove_mode,
+            **keyword_args
         )
-        if args.remove_mode:
-            mode_str = "删除EXTINF或URL匹配(OR)的记录"
-        else:
-            mode_str = "提取EXTINF或URL匹配(OR)的记录"
+        # 安全写入输出文件
+        success, _ = safe_write_output(extracted_lines, args.output)
+        # 计算统计信息
+        count = sum(1 for line in extracted_lines if line.startswith('#EXTINF'))
     
-    # 安全写入输出文件
-    success, temp_path = safe_write_output(extracted_lines, args.input, args.output)
-    
-    # 如果失败，清理临时文件
     if not success:
-        cleanup_temp_file(temp_path)
         print("处理失败！")
         sys.exit(1)
     
-    # 计算统计信息
-    count = sum(1 for line in extracted_lines if line.startswith('#EXTINF'))
-    
     if args.remove_mode:
         print(f"处理完成！成功保留 {count} 条记录。")
         original_count = get_original_channel_count(args.input)
@@ -0,0 +1,211 @@
+"""
+频道分类规则
+按规则把频道分入若干个桶（目标频道组），每个桶有自己的排序方式；桶的输出顺序即规则的顺序，未匹配任何规则的频道进入默认桶。
+所有规则编译为一个组合正则，每个频道只匹配一次，按规则顺序取第一个命中的规则
+
+规则文件格式（JSON）:
+  {
+    "rules": [
+      {"pattern": "CCTV", "ignore_case": true, "group": "央视", "sort": "number"},
+      {"pattern": "卫视", "group": "卫视", "sort": "order"}
+    ],
+    "default": {"label": "其他", "sort": "group"}
+  }
+
+  pattern      在频道名称中搜索的正则（不能使用命名组和反向引用：合并到组合正则后组号会整体平移）
+  ignore_case  忽略大小写，默认 false
+  group        目标 group-title；省略或为 null 时保留频道原有的组
+  label        统计信息中显示的名称，默认为 group（或 pattern）
+  sort         桶内排序方式，相同时按原顺序:
+                 order   原顺序（默认）
+                 number  匹配处紧跟的数字（可带 "-"），没有数字的排在最后
+                 group   原频道组名
+                 name    频道名称
+"""
+
+import json
+import re
+from collections import namedtuple
+
+DEFAULT_RULES = {
+    "rules": [
+        {"pattern": "CCTV", "ignore_case": True, "group": "央视", "sort": "number"},
+        {"pattern": "卫视", "group": "卫视", "sort": "order"},
+    ],
+    "default": {"label": "其他", "sort": "group"},
+}
+
+SORT_KEYS = ('order', 'number', 'group', 'name')
+# 各层允许的键，拼错的键（如 "buckets"）报错，而不是被静默忽略
+DEFINITION_KEYS = ('rules', 'default')
+RULE_KEYS = ('pattern', 'ignore_case', 'group', 'label', 'sort')
+DEFAULT_KEYS = ('group', 'label', 'sort')
+# 没有数字时的排序值，排在有数字的频道之后
+NO_NUMBER = 999
+
+# 一个桶：统计名称、目标组（None 表示保留原组）、排序方式
+Bucket = namedtuple('Bucket', ['label', 'group', 'sort'])
+# 编译后的规则：组合正则、每个捕获组所属的规则下标、各规则的数字捕获组下标、桶列表（最后一个为默认桶）
+CompiledRules = namedtuple('CompiledRules', ['matcher', 'group_owner', 'number_groups', 'buckets'])
+
+
+def _check_keys(spec, allowed, where):
+    unknown = [key for key in spec if key not in allowed]
+    if unknown:
+        raise ValueError(f"{where}：未知的键 {', '.join(map(repr, unknown))}（可选 {', '.join(allowed)}）")
+
+
+def _references_groups(pattern):
+    """pattern 中是否有编号反向引用（\\1）或条件引用（(?(1)...)）；字符类中的 \\1 是八进制转义，不算"""
+    index = 0
+    in_class = False
+    while index < len(pattern):
+        char = pattern[index]
+        if char == '\\':
+            if not in_class and pattern[index + 1:index + 2] in tuple('123456789'):
+                return True
+            index += 2
+            continue
+        if in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+            # 紧跟在 "[" 或 "[^" 之后的 "]" 是普通字符
+            index += 2 if pattern.startswith('^]', index + 1) else 1
+            if pattern.startswith(']', index):
+                index += 1
+            continue
+        elif pattern.startswith('(?(', index):
+            return True
+        index += 1
+    return False
+
+
+def _make_bucket(spec, where, allowed):
+    if not isinstance(spec, dict):
+        raise ValueError(f"{where}：必须是对象")
+    _check_keys(spec, allowed, where)
+    sort = spec.get('sort', 'order')
+    if sort not in SORT_KEYS:
+        raise ValueError(f"{where}：sort 无效: {sort!r}（可选 {', '.join(SORT_KEYS)}）")
+    group = spec.get('group')
+    if group is not None and not isinstance(group, str):
+        raise ValueError(f"{where}：group 必须是字符串")
+    label = spec.get('label') or group or spec.get('pattern') or "其他"
+    return Bucket(label, group, sort)
+
+
+def compile_rules(definition):
+    """
+    校验并编译规则
+
+    :param definition: 规则定义（格式见模块说明）
+    :return: CompiledRules
+    :raises ValueError: 规则格式错误或正则无法编译
+    """
+    if not isinstance(definition, dict) or not isinstance(definition.get('rules', []), list):
+        raise ValueError("规则定义必须是包含 rules 列表的对象")
+    _check_keys(definition, DEFINITION_KEYS, "规则定义")
+
+    buckets = []
+    alternatives = []
+    for index, rule in enumerate(definition.get('rules', [])):
+        where = f"第 {index + 1} 条规则"
+        bucket = _make_bucket(rule, where, RULE_KEYS)
+        pattern = rule.get('pattern')
+        if not isinstance(pattern, str) or not pattern:
+            raise ValueError(f"{where}：缺少 pattern")
+        try:
+            compiled = re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f"{where}：pattern 无效: {e}") from e
+        if compiled.groupindex:
+            raise ValueError(f"{where}：pattern 不能使用命名组")
+        if _references_groups(pattern):
+            raise ValueError(f"{where}：pattern 不能使用反向引用")
+        if rule.get('ignore_case'):
+            pattern = f"(?i:{pattern})"
+        number = f"(?:-?(?P<_num{index}>\\d+))?" if bucket.sort == 'number' else ""
+        # 每条规则是一个前瞻断言：在整个名称中搜索，命中后不再尝试后面的规则
+        alternatives.append(f"(?=.*?(?P<_rule{index}>{pattern}){number})")
+        buckets.append(bucket)
+    buckets.append(_make_bucket(definition.get('default', {}), "default", DEFAULT_KEYS))
+
+    if not alternatives:
+        return CompiledRules(None, [], [], buckets)
+
+    try:
+        matcher = re.compile(f"(?:{'|'.join(alternatives)})", re.S)
+    except re.error as e:
+        # 单独能编译、合并后不能编译的写法，如不在开头的全局标志 "(?i)"
+        raise ValueError(f"规则无法合并为一个正则: {e}") from e
+    # 组合正则中规则 i 的捕获组（含 pattern 内部的组）位于 _rule{i} 与 _rule{i+1} 之间
+    starts = sorted((matcher.groupindex[f"_rule{i}"], i) for i in range(len(alternatives)))
+    group_owner = [None] * (matcher.groups + 1)
+    for position, (start, rule_index) in enumerate(starts):
+        end = starts[position + 1][0] if position + 1 < len(starts) else matcher.groups + 1
+        for group_index in range(start, end):
+            group_owner[group_index] = rule_index
+    number_groups = [matcher.groupindex.get(f"_num{i}") for i in range(len(alternatives))]
+    return CompiledRules(matcher, group_owner, number_groups, buckets)
+
+
+def load_rules(path=None):
+    """
+    读取并编译规则文件
+
+    :param path: JSON 规则文件路径；None 时使用 DEFAULT_RULES
+    :raises ValueError: 文件格式错误
+    :raises OSError: 文件无法读取
+    """
+    if path is None:
+        return compile_rules(DEFAULT_RULES)
+    with open(path, 'r', encoding='utf-8') as f:
+        try:
+            definition = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"规则文件 '{path}' 不是有效的 JSON: {e}") from e
+    return compile_rules(definition)
+
+
+def match_rule(rules, name):
+    """
+    :return: (桶下标, 数字排序值)；未命中任何规则时为默认桶
+    """
+    match = rules.matcher.match(name) if rules.matcher is not None else None
+    if match is None:
+        return len(rules.buckets) - 1, NO_NUMBER
+    rule_index = rules.group_owner[match.lastindex]
+    number_group = rules.number_groups[rule_index]
+    number = match.group(number_group) if number_group is not None else None
+    return rule_index, int(number) if number is not None else NO_NUMBER
+
+
+def classify(channels, rules):
+    """
+    按规则分桶并排序，设置每个频道的 final_group
+
+    :param channels: Channel 序列（需要 name、group、order_idx）
+    :param rules: CompiledRules
+    :return: [(Bucket, [Channel, ...]), ...]，按输出顺序排列，包含空桶
+    """
+    keyed = [[] for _ in rules.buckets]
+    for channel in channels:
+        bucket_index, number = match_rule(rules, channel.name)
+        bucket = rules.buckets[bucket_index]
+        channel.final_group = bucket.group if bucket.group is not None else channel.group
+        if bucket.sort == 'number':
+            key = (number, channel.order_idx)
+        elif bucket.sort == 'group':
+            key = (channel.group, channel.order_idx)
+        elif bucket.sort == 'name':
+            key = (channel.name, channel.order_idx)
+        else:
+            key = channel.order_idx
+        keyed[bucket_index].append((key, channel))
+
+    result = []
+    for bucket, items in zip(rules.buckets, keyed):
+        items.sort(key=lambda item: item[0])
+        result.append((bucket, [channel for _, channel in items]))
+    return result
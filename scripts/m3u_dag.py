@@ -0,0 +1,326 @@
+"""
+M3U 流水线 DAG 执行器
+按定义文件（JSON，Python 3.11+ 也可用 TOML）执行各直播源的处理链：
+互不依赖的分支在进程池中并行执行，汇总节点在其全部输入就绪后立即开始
+
+定义文件格式（见 scripts/pipeline.json）:
+  {
+    "sources": {"mig": "mig.m3u", ...},
+    "nodes": {
+      "mg_m":   {"inputs": ["mig"], "steps": ["m3u_mergerng"], "output": "mg_m.m3u"},
+      "t0op_m": {"inputs": ["t3op2_ms", "mg_m"], "steps": ["m3u_merger"], "output": "t0op_m.m3u"}
+    }
+  }
+
+  sources  源名称 -> 已下载的文件
+  inputs   引用源或其他节点的名称，多个输入时第一个阶段须为 m3u_merger
+  steps    与 m3u_pipeline.py 的 -s 阶段写法相同
+  output   可省略，省略时结果只在内存中传给下游节点
+  文件路径相对于当前目录
+
+某个节点失败时，依赖它的节点被跳过，其余分支照常执行
+
+增量执行：每次运行后把各节点的输入内容哈希、处理参数和输出文件哈希记录到状态文件（--state），
+下次运行时输入、参数、脚本都未变且输出文件未被改动的节点直接复用上次的输出（见 m3u_runstate.py）。
+上游节点重新计算但结果与上次相同时，下游节点仍可复用
+
+用法:
+  python ./scripts/m3u_dag.py scripts/pipeline.json
+  python ./scripts/m3u_dag.py scripts/pipeline.json -j 4 --only mg_merged,mig_d
+  python ./scripts/m3u_dag.py scripts/pipeline.json -j 1      # 单进程按拓扑顺序执行
+  python ./scripts/m3u_dag.py scripts/pipeline.json --full    # 忽略运行状态，全部重新计算
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+from m3u_pipeline import parse_step, run_steps, write_playlist
+from m3u_playlist import Playlist
+from m3u_runstate import (DEFAULT_STATE_FILE, code_digest, content_digest, load_state,
+                          make_entry, reuse_reason, save_state, text_digest)
+
+
+def load_definition(path):
+    """读取流水线定义文件（.toml 按 TOML 解析，其余按 JSON 解析）"""
+    if path.endswith('.toml'):
+        if tomllib is None:
+            raise ValueError("读取 TOML 定义文件需要 Python 3.11+，请改用 JSON")
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def validate_definition(definition):
+    """
+    检查定义并确定执行顺序
+
+    :return: (sources, nodes, order)，order 为节点名称的拓扑顺序
+    :raises ValueError: 引用不存在、名称冲突、存在环或阶段参数无效
+    """
+    sources = definition.get('sources', {})
+    nodes = definition.get('nodes', {})
+    if not nodes:
+        raise ValueError("定义文件中没有节点")
+
+    for name, node in nodes.items():
+        if name in sources:
+            raise ValueError(f"节点 '{name}' 与源同名")
+        inputs = node.get('inputs', [])
+        if not inputs:
+            raise ValueError(f"节点 '{name}' 没有输入")
+        for ref in inputs:
+            if ref not in sources and ref not in nodes:
+                raise ValueError(f"节点 '{name}' 引用了不存在的输入 '{ref}'")
+        if len(inputs) > 1 and (not node.get('steps') or parse_step(node['steps'][0]).name != 'm3u_merger'):
+            raise ValueError(f"节点 '{name}' 有多个输入，第一个阶段必须是 m3u_merger")
+        for step_text in node.get('steps', []):
+            parse_step(step_text)
+
+    # 按定义中的先后顺序做拓扑排序，便于单进程执行时与原工作流顺序一致
+    order = []
+    state = {}
+
+    def visit(name, path):
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"节点之间存在环: {' -> '.join(path + [name])}")
+        state[name] = 'visiting'
+        for ref in nodes[name]['inputs']:
+            if ref in nodes:
+                visit(ref, path + [name])
+        state[name] = 'done'
+        order.append(name)
+
+    for name in nodes:
+        visit(name, [])
+    return sources, nodes, order
+
+
+def select_nodes(nodes, order, targets):
+    """只保留 targets 及其上游节点"""
+    selected = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in nodes:
+            raise ValueError(f"未知节点 '{name}'")
+        if name in selected:
+            continue
+        selected.add(name)
+        pending.extend(ref for ref in nodes[name]['inputs'] if ref in nodes)
+    return [name for name in order if name in selected]
+
+
+def run_node(inputs, step_texts, output):
+    """
+    执行一个节点（在工作进程中运行）
+
+    :param inputs: 输入列表，元素为文件路径（源或复用的输出）或 Playlist（上游节点的结果）
+    :param step_texts: 阶段描述列表
+    :param output: 输出文件路径，None 表示不写文件
+    :return: (Playlist, 频道数, 结果内容哈希)
+    """
+    playlists = [Playlist.from_file(item) if isinstance(item, str) else item for item in inputs]
+    result = run_steps(playlists, [parse_step(text) for text in step_texts])
+    if output:
+        write_playlist(result, output)
+        digest = content_digest(output)
+    else:
+        digest = text_digest(result.text)
+    channels = len(result)
+    # 只把文本传回主进程，解析结果留在工作进程
+    return Playlist(result.text), channels, digest
+
+
+def execute(sources, nodes, order, jobs, state=None):
+    """
+    执行各节点：输入全部就绪的节点立即提交到进程池（jobs 为 1 时在本进程内执行）
+
+    :param state: 上次的运行状态（m3u_runstate.load_state），None 表示不做增量判断；
+                  执行后原地更新为本次的状态
+    :return: {节点名称: (状态, 开始时间, 结束时间, 频道数或说明)}，时间相对于执行开始
+    """
+    consumers = {}
+    for name in order:
+        for ref in nodes[name]['inputs']:
+            if ref in nodes:
+                consumers[ref] = consumers.get(ref, 0) + 1
+
+    results = {}
+    digests = {}
+    report = {}
+    code = code_digest() if state is not None else None
+    run_start = time.perf_counter()
+
+    def node_args(name):
+        node = nodes[name]
+        inputs = [sources[ref] if ref in sources else results[ref] for ref in node['inputs']]
+        return inputs, node.get('steps', []), node.get('output')
+
+    def release_inputs(name):
+        # 下游节点都已开始后释放上游结果
+        for ref in nodes[name]['inputs']:
+            if ref in nodes:
+                consumers[ref] -= 1
+                if consumers[ref] == 0:
+                    results.pop(ref, None)
+
+    def try_reuse(name):
+        """输入、参数都未变时复用上次的输出，返回是否已复用"""
+        if state is None:
+            return False
+        for ref in nodes[name]['inputs']:
+            if ref in sources and ref not in digests:
+                digests[ref] = content_digest(sources[ref])
+        entry = make_entry(nodes[name], {ref: digests[ref] for ref in nodes[name]['inputs']}, code)
+        reusable, reason = reuse_reason(state.get(name), entry)
+        if not reusable:
+            print(f"重新计算 '{name}'：{reason}", file=sys.stderr)
+            state[name] = entry
+            return False
+        print(f"复用 '{name}'：{reason}", file=sys.stderr)
+        digests[name] = state[name]['output_digest']
+        if consumers.get(name):
+            results[name] = entry['output']
+        now = time.perf_counter() - run_start
+        report[name] = ('复用', now, now, entry['output'])
+        return True
+
+    def finish(name, started, outcome, error):
+        finished = time.perf_counter() - run_start
+        if error is not None:
+            report[name] = ('失败', started, finished, str(error))
+            if state is not None:
+                state.pop(name, None)
+            print(f"节点 '{name}' 失败: {error}", file=sys.stderr)
+            return
+        playlist, channels, digest = outcome
+        digests[name] = digest
+        if state is not None:
+            state[name]['output_digest'] = digest
+        if consumers.get(name):
+            results[name] = playlist
+        report[name] = ('完成', started, finished, channels)
+
+    def blocked(name):
+        return any(ref in nodes and report.get(ref, ('',))[0] in ('失败', '跳过')
+                   for ref in nodes[name]['inputs'])
+
+    waiting = list(order)
+    running = {}
+    pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    try:
+        while waiting or running:
+            # 按拓扑顺序检查，jobs 为 1 时一轮即可依次执行完所有节点
+            for name in list(waiting):
+                if blocked(name):
+                    report[name] = ('跳过', None, None, '上游节点失败')
+                    if state is not None:
+                        state.pop(name, None)
+                    waiting.remove(name)
+                    continue
+                if not all(ref in sources or ref in report for ref in nodes[name]['inputs']):
+                    continue
+                waiting.remove(name)
+                if try_reuse(name):
+                    release_inputs(name)
+                    continue
+                args = node_args(name)
+                release_inputs(name)
+                started = time.perf_counter() - run_start
+                if pool is None:
+                    try:
+                        outcome, error = run_node(*args), None
+                    except Exception as e:
+                        outcome, error = None, e
+                    finish(name, started, outcome, error)
+                else:
+                    running[pool.submit(run_node, *args)] = (name, started)
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, started = running.pop(future)
+                error = future.exception()
+                finish(name, started, None if error else future.result(), error)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return report
+
+
+def print_report(report, order, total):
+    """按开始时间输出各节点的执行情况"""
+    print("节点执行情况:", file=sys.stderr)
+    for name in sorted(order, key=lambda n: (report[n][1] is None, report[n][1] or 0)):
+        status, started, finished, detail = report[name]
+        if started is None:
+            print(f"  {'':>9}    {'':>9}     {status}  {name}（{detail}）", file=sys.stderr)
+        elif status == '完成':
+            print(f"  +{started * 1000:8.1f} ms {(finished - started) * 1000:8.1f} ms  "
+                  f"{status}  {name}（{detail} 个频道）", file=sys.stderr)
+        else:
+            print(f"  +{started * 1000:8.1f} ms {(finished - started) * 1000:8.1f} ms  "
+                  f"{status}  {name}", file=sys.stderr)
+    print(f"总耗时: {total * 1000:.1f} ms", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="按定义文件并行执行 M3U 处理流水线",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('definition', help="流水线定义文件（.json 或 .toml）")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                       help="并行进程数，1 表示单进程顺序执行（默认: CPU 核数）")
+    parser.add_argument('--only', default='',
+                       help="只执行这些节点及其上游节点，多个用逗号分隔")
+    parser.add_argument('--state', default=DEFAULT_STATE_FILE,
+                       help=f"运行状态文件，输入与参数未变的节点复用上次的输出（默认: {DEFAULT_STATE_FILE}）")
+    parser.add_argument('--full', action='store_true',
+                       help="忽略上次的运行状态，全部重新计算（仍会更新状态文件）")
+    parser.add_argument('--no-state', action='store_true',
+                       help="不读写运行状态文件")
+
+    args = parser.parse_args()
+
+    try:
+        definition = load_definition(args.definition)
+        sources, nodes, order = validate_definition(definition)
+        if args.only:
+            order = select_nodes(nodes, order, [t.strip() for t in args.only.split(',') if t.strip()])
+    except (OSError, ValueError) as e:
+        print(f"错误：{e}", file=sys.stderr)
+        sys.exit(1)
+
+    state = None
+    if not args.no_state:
+        state = load_state(args.state)
+        if args.full:
+            for name in order:
+                state.pop(name, None)
+
+    start = time.perf_counter()
+    report = execute(sources, nodes, order, max(1, args.jobs), state)
+    print_report(report, order, time.perf_counter() - start)
+
+    if state is not None:
+        save_state(args.state, state)
+
+    if any(status not in ('完成', '复用') for status, _, _, _ in report.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
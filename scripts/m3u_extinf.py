@@ -0,0 +1,190 @@
+"""
+#EXTINF 行分词器
+一次匹配把 EXTINF 行切分为时长、属性区和显示名称，属性按需解码，修改后只重写变动的字段
+"""
+
+import re
+
+from m3u_model import intern_attr_key
+
+# 常规 EXTINF 行：#EXTINF:<时长> <属性...>,<显示名称>
+_EXTINF_PATTERN = re.compile(
+    r'''#EXTINF:?[ \t]*(?P<duration>-?\d+(?:\.\d+)?)?'''
+    r'''(?P<attrs>(?:\s*[\w-]+=(?:"[^"]*"|'[^']*'|[^\s,"']*))*)'''
+    r'''\s*(?:,(?P<name>.*))?$''',
+    re.S
+)
+_ATTR_PATTERN = re.compile(r'''([\w-]+)=(?:"([^"]*)"|'([^']*)'|([^\s,"']*))''')
+# _ATTR_PATTERN 中属性值所在的分组（match.lastindex）-> 引号
+_ATTR_QUOTES = {2: '"', 3: "'", 4: ''}
+_PREFIX_PATTERN = re.compile(r'#EXTINF:?[ \t]*(-?\d+(?:\.\d+)?)?')
+
+
+def _find_name_comma(line, start):
+    """属性区含有无法识别的内容时，跳过引号内的逗号，查找显示名称前的逗号"""
+    quote = None
+    for pos in range(start, len(line)):
+        char = line[pos]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == ',':
+            return pos
+    return -1
+
+
+class ExtInf:
+    """
+    EXTINF 行的分词结果
+
+    >>> inf = ExtInf('#EXTINF:-1 tvg-name="CCTV1" group-title="央视",CCTV-1 综合')
+    >>> inf.get('group-title'), inf.name
+    ('央视', 'CCTV-1 综合')
+    >>> inf.set('group-title', '央视频道')
+    >>> inf.to_line()
+    '#EXTINF:-1 tvg-name="CCTV1" group-title="央视频道",CCTV-1 综合'
+    """
+    __slots__ = ('line', 'duration', '_attrs_start', '_attrs_end', '_name_start',
+                 '_spans', '_changes', '_new_name')
+
+    def __init__(self, line):
+        self.line = line
+        self._spans = None
+        self._changes = None
+        self._new_name = None
+
+        match = _EXTINF_PATTERN.match(line)
+        if match:
+            self.duration = match.group('duration')
+            self._attrs_start, self._attrs_end = match.span('attrs')
+            self._name_start = match.start('name') if match.group('name') is not None else -1
+        else:
+            prefix = _PREFIX_PATTERN.match(line)
+            self.duration = prefix.group(1) if prefix else None
+            self._attrs_start = prefix.end() if prefix else 0
+            comma = _find_name_comma(line, self._attrs_start)
+            self._attrs_end = comma if comma >= 0 else len(line)
+            self._name_start = comma + 1 if comma >= 0 else -1
+            # 去掉属性区末尾的空白，新增属性时紧跟在最后一个属性之后
+            while self._attrs_end > self._attrs_start and line[self._attrs_end - 1].isspace():
+                self._attrs_end -= 1
+
+    # ---------- 读取 ----------
+    def _tokenize(self):
+        """首次访问属性时才扫描属性区，记录每个属性值的位置"""
+        spans = {}
+        for match in _ATTR_PATTERN.finditer(self.line, self._attrs_start, self._attrs_end):
+            index = match.lastindex
+            start, end = match.span(index)
+            key = intern_attr_key(match.group(1))
+            spans.setdefault(key, []).append((start, end, _ATTR_QUOTES[index]))
+        self._spans = spans
+        return spans
+
+    def get(self, key, default=None):
+        """读取属性值；同名属性出现多次时返回第一个"""
+        if self._changes and key in self._changes:
+            return self._changes[key]
+        if self._spans is None:
+            # 属性区尚未扫描：只找第一个同名属性，不记录其余属性的位置（多数行只读取一两个属性）
+            for match in _ATTR_PATTERN.finditer(self.line, self._attrs_start, self._attrs_end):
+                if match.group(1) == key:
+                    return match.group(match.lastindex)
+            return default
+        if key not in self._spans:
+            return default
+        start, end, _ = self._spans[key][0]
+        return self.line[start:end]
+
+    def __contains__(self, key):
+        if self._changes and key in self._changes:
+            return True
+        spans = self._spans if self._spans is not None else self._tokenize()
+        return key in spans
+
+    def quote_of(self, key):
+        """属性值使用的引号：'"'、"'" 或 ''（无引号），属性不存在时返回 None"""
+        spans = self._spans if self._spans is not None else self._tokenize()
+        if key not in spans:
+            return None
+        return spans[key][0][2]
+
+    @property
+    def attrs(self):
+        """按原始顺序返回全部属性（包括已修改和新增的）"""
+        spans = self._spans if self._spans is not None else self._tokenize()
+        result = {key: self.line[items[0][0]:items[0][1]] for key, items in spans.items()}
+        if self._changes:
+            result.update(self._changes)
+        return result
+
+    @property
+    def name(self):
+        """显示名称（未去除首尾空白），没有逗号时为 None"""
+        if self._new_name is not None:
+            return self._new_name
+        if self._name_start < 0:
+            return None
+        return self.line[self._name_start:]
+
+    # ---------- 修改 ----------
+    def set(self, key, value):
+        """设置属性值，已有的同名属性全部替换，不存在则追加到属性区末尾"""
+        if self._changes is None:
+            self._changes = {}
+        self._changes[intern_attr_key(key)] = value
+
+    def set_name(self, name):
+        """设置显示名称"""
+        self._new_name = name
+
+    @property
+    def modified(self):
+        return bool(self._changes) or self._new_name is not None
+
+    def to_line(self):
+        """重新生成 EXTINF 行，未修改的部分保持原样"""
+        if not self.modified:
+            return self.line
+
+        line = self.line
+        spans = self._spans if self._spans is not None else self._tokenize()
+        replacements = []  # (start, end, text)
+        appended = []
+
+        for key, value in (self._changes or {}).items():
+            if key in spans:
+                for start, end, quote in spans[key]:
+                    if not quote and (not value or any(c in value for c in ' \t,"\'')):
+                        # 原本无引号的值，新值需要引号时补上双引号
+                        replacements.append((start, end, f'"{value}"'))
+                    else:
+                        replacements.append((start, end, value))
+            else:
+                appended.append(f' {key}="{value}"')
+
+        if appended:
+            replacements.append((self._attrs_end, self._attrs_end, ''.join(appended)))
+
+        if self._new_name is not None:
+            if self._name_start >= 0:
+                replacements.append((self._name_start, len(line), self._new_name))
+            else:
+                replacements.append((len(line), len(line), f',{self._new_name}'))
+
+        pieces = []
+        last = 0
+        for start, end, text in sorted(replacements, key=lambda item: item[0]):
+            pieces.append(line[last:start])
+            pieces.append(text)
+            last = end
+        pieces.append(line[last:])
+        return ''.join(pieces)
+
+    def __str__(self):
+        return self.to_line()
+
+    def __repr__(self):
+        return f"ExtInf({self.to_line()!r})"
@@ -8,75 +8,27 @@ import argparse
 import os
 import sys
 import re
-import tempfile
-import shutil
 
-def safe_write_output(content, input_path, output_path):
+from m3u_playlist import Playlist
+from m3u_writer import atomic_write
+
+def safe_write_output(content, output_path):
     """
-    安全地写入输出文件，支持同文件覆盖
+    安全地写入输出文件：原子替换，支持同文件覆盖，内容未变化时保留原文件
     
     :param content: 要写入的内容字符串
-    :param input_path: 输入文件路径
     :param output_path: 输出文件路径
-    :return: (success, temp_path) 成功返回(True, None)，失败返回(False, temp_path)
+    :return: (success, changed) 成功返回(True, 内容是否有变化)，失败返回(False, False)
     """
-    # 获取绝对路径以判断是否为同一个文件
-    input_abs = os.path.abspath(input_path)
-    output_abs = os.path.abspath(output_path)
-    is_same_file = input_abs == output_abs
-    
-    temp_path = None
-    
     try:
-        # 如果是同一个文件，先写到临时文件
-        if is_same_file:
-            # 在与输出文件相同目录创建临时文件
-            output_dir = os.path.dirname(output_path) or '.'
-            fd, temp_path = tempfile.mkstemp(
-                dir=output_dir,
-                suffix='.m3u',
-                prefix='.tmp_',
-                text=True
-            )
-            
-            # 使用文件描述符打开文件
-            out_f = os.fdopen(fd, 'w', encoding='utf-8')
-        else:
-            # 直接打开输出文件
-            out_f = open(output_path, 'w', encoding='utf-8')
-        
-        # 写入数据
-        with out_f:
-            out_f.write(content)
-        
-        # 如果是同一个文件，进行原子替换
-        if is_same_file:
-            try:
-                # Python 3.3+ 推荐使用 os.replace 实现原子替换
-                os.replace(temp_path, output_path)
-                temp_path = None  # 替换成功，清除临时文件引用
-            except Exception as e:
-                # 如果 os.replace 失败，使用 shutil.move 作为备选
-                print(f"警告：原子替换失败，使用备选方案: {e}")
-                shutil.move(temp_path, output_path)
-                temp_path = None  # 移动成功，清除临时文件引用
-        
-        return True, None
-        
+        changed = atomic_write(output_path, [content])
     except Exception as e:
         print(f"写入文件失败: {e}")
-        return False, temp_path
-
-def cleanup_temp_file(temp_path):
-    """
-    清理临时文件
-    """
-    if temp_path and os.path.exists(temp_path):
-        try:
-            os.unlink(temp_path)
-            print(f"已清理临时文件: {temp_path}")
-        except Exception as e:
-            print(f"警告：无法删除临时文件 {temp_path}: {e}")
+        return False, False
+    
+    if not changed:
+        print(f"内容未变化，保留原文件：{output_path}")
+    return True, changed
 
 def validate_arguments(input_path, output_path=None):
     """
@@ -199,10 +151,9 @@ def process_single_file(input_file, output_file, replace_value, force_value, del
         )
         
         # 安全写入输出文件
-        success, temp_path = safe_write_output(processed_content, input_file, output_file)
+        success, _ = safe_write_output(processed_content, output_file)
         
         if not success:
-            cleanup_temp_file(temp_path)
             return False
         
         return True
@@ -211,7 +162,22 @@ def process_single_file(input_file, output_file, replace_value, force_value, del
         print(f"处理文件 '{input_file}' 时发生错误: {e}")
         return False
 
-def main():
+def transform_playlist(playlist, args):
+    """
+    流水线阶段：处理内存中播放列表的文件头
+    
+    :param playlist: m3u_playlist.Playlist
+    :param args: build_parser() 解析出的参数
+    :return: 新的 Playlist，内容与命令行方式写出的文件相同
+    """
+    return Playlist(process_m3u_header(
+        playlist.text,
+        replace_value=args.replace,
+        force_value=args.force,
+        delete_extm3u=args.clean
+    ))
+
+def build_parser():
     parser = argparse.ArgumentParser(
         description="M3U文件头处理工具",
         formatter_class=argparse.RawTextHelpFormatter,
@@ -268,7 +234,10 @@ def main():
         help='显示详细处理信息'
     )
     
-    args = parser.parse_args()
+    return parser
+
+def main():
+    args = build_parser().parse_args()
     
     # 参数验证
     if args.replace and args.force:
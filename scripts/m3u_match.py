@@ -0,0 +1,350 @@
+"""
+关键字表达式匹配
+表达式由关键字和 &&（与）、||（或）、!（非）、括号组成，优先级 ! > && > ||，例如:
+  CCTV && !(购物 || 测试)
+  "CCTV-1(高清)" || 凤凰
+关键字为两个运算符之间去掉首尾空白的文本，单个 & 和 | 属于关键字本身（URL 中常见）；
+含有括号、! 开头或需要保留首尾空白的关键字用双引号括起来。整个表达式被一对双引号包围时去掉这对引号（兼容旧写法），
+去掉后无法解析时把引号内的文本整体作为一个关键字。
+
+字段条件：调用方为一侧文本定义了字段（见 ExpressionSet）时，可以对解析出的字段值求值，而不是在整行中查找:
+  group-title=央视              字段等于该值
+  url.host in {a.com, b.com}    字段等于其中之一（值按哈希索引，一次查找，与集合大小无关）
+  tvg-id~CCTV                   字段包含该文本
+值可以用双引号括起来（group-title="央视 高清"）。字段名不是已定义的字段时，整段文本仍按普通关键字处理
+
+表达式编译一次为语法树再转换为判断函数。同一字段（如 EXTINF 行）上的所有表达式共用一个词表：
+每行文本只从左到右扫描一遍，得到出现过的所有关键字（含相互重叠的）的位掩码，各表达式只在位掩码上求值
+"""
+
+import re
+from collections import namedtuple
+
+# 一侧文本的字段：get 从解析结果中取值（不存在时为 None），fold 在比较前统一写法（如主机名转小写，可为 None）
+Field = namedtuple('Field', ['get', 'fold'])
+
+_PREDICATE_PATTERN = re.compile(
+    r'(?P<field>[a-z][a-z0-9-]*(?:\.[a-z]+)?)\s*(?:(?P<op>[=~])\s*(?P<value>.*)|\s+in\s*\{(?P<set>.*)\})', re.S)
+_PREFIX_PATTERN = re.compile(r'(?P<field>[a-z][a-z0-9-]*(?:\.[a-z]+)?)\s*(?P<op>[=~])\s*')
+
+
+class ExpressionError(ValueError):
+    """表达式语法错误"""
+
+
+def _tokenize(text):
+    """切分为 ('op', 运算符)、('term', 普通关键字) 与 ('literal', 引号内的关键字)"""
+    tokens = []
+    pos = 0
+    length = len(text)
+    while pos < length:
+        char = text[pos]
+        if char.isspace():
+            pos += 1
+        elif text.startswith(('&&', '||'), pos):
+            tokens.append(('op', text[pos:pos + 2]))
+            pos += 2
+        elif char in '!()':
+            tokens.append(('op', char))
+            pos += 1
+        elif char == '"':
+            end = text.find('"', pos + 1)
+            if end < 0:
+                raise ExpressionError(f"引号未闭合（位置 {pos}）")
+            tokens.append(('literal', text[pos + 1:end]))
+            pos = end + 1
+        else:
+            # 普通关键字：直到下一个 &&、||、括号或引号（! 只在关键字开头才是运算符），{...} 整体属于关键字
+            end = pos
+            while end < length and text[end] not in '()"' and not text.startswith(('&&', '||'), end):
+                if text[end] == '{':
+                    close = text.find('}', end)
+                    if close < 0:
+                        raise ExpressionError(f"花括号未闭合（位置 {end}）")
+                    end = close
+                end += 1
+            tokens.append(('term', text[pos:end].strip()))
+            pos = end
+    return tokens
+
+
+def _split_values(text):
+    """{a, "b c"} 中的值列表"""
+    values = [value.strip() for value in text.split(',')]
+    return tuple(value[1:-1] if len(value) >= 2 and value[0] == value[-1] == '"' else value
+                 for value in values if value)
+
+
+def _field_node(text, fields):
+    """普通关键字是对已定义字段的条件时返回 ('field', 字段, 运算符, (值...))，否则返回 None"""
+    match = _PREDICATE_PATTERN.fullmatch(text)
+    if match is None or match.group('field') not in fields:
+        return None
+    if match.group('op') is None:
+        return ('field', match.group('field'), 'in', _split_values(match.group('set')))
+    value = match.group('value').strip()
+    if match.group('op') == '=':
+        return ('field', match.group('field'), 'in', (value,))
+    return ('field', match.group('field'), '~', (value,))
+
+
+def parse_expression(text, fields=()):
+    """
+    解析表达式为语法树
+
+    语法树节点: ('term', 关键字)、('field', 字段, 'in' 或 '~', (值...))、('not', 节点)、
+    ('and', [节点...])、('or', [节点...])、('const', 布尔值)
+
+    >>> parse_expression('a && !(b || c)')
+    ('and', [('term', 'a'), ('not', ('or', [('term', 'b'), ('term', 'c')]))])
+    >>> parse_expression('url.host in {a.com, b.com} && x=1', fields={'url.host'})
+    ('and', [('field', 'url.host', 'in', ('a.com', 'b.com')), ('term', 'x=1')])
+
+    :param text: 表达式；为空或只有空白时得到 ('const', False)（不匹配任何内容）
+    :param fields: 可用作字段条件的字段名
+    :raises ExpressionError: 语法错误
+    """
+    text = (text or "").strip()
+    if len(text) >= 2 and text[0] == text[-1] == '"' and '"' not in text[1:-1]:
+        try:
+            return _parse_tokens(text[1:-1].strip(), fields)
+        except ExpressionError:
+            pass
+    return _parse_tokens(text, fields)
+
+
+def _parse_tokens(text, fields):
+    if not text:
+        return ('const', False)
+
+    tokens = _tokenize(text)
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else (None, None)
+
+    def parse_or():
+        nonlocal pos
+        nodes = [parse_and()]
+        while peek() == ('op', '||'):
+            pos += 1
+            nodes.append(parse_and())
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def parse_and():
+        nonlocal pos
+        nodes = [parse_unary()]
+        while peek() == ('op', '&&'):
+            pos += 1
+            nodes.append(parse_unary())
+        return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+    def parse_unary():
+        nonlocal pos
+        kind, value = peek()
+        if kind is None:
+            raise ExpressionError(f"表达式不完整: {text!r}")
+        pos += 1
+        if kind == 'literal':
+            return ('term', value)
+        if kind == 'term':
+            # field="带引号的值"
+            prefix = _PREFIX_PATTERN.fullmatch(value)
+            if prefix and prefix.group('field') in fields and peek()[0] == 'literal':
+                literal = tokens[pos][1]
+                pos += 1
+                return ('field', prefix.group('field'), 'in' if prefix.group('op') == '=' else '~', (literal,))
+            return _field_node(value, fields) or ('term', value)
+        if value == '!':
+            return ('not', parse_unary())
+        if value == '(':
+            node = parse_or()
+            if peek() != ('op', ')'):
+                raise ExpressionError(f"缺少右括号: {text!r}")
+            pos += 1
+            return node
+        raise ExpressionError(f"意外的 {value!r}: {text!r}")
+
+    tree = parse_or()
+    if pos != len(tokens):
+        raise ExpressionError(f"意外的 {tokens[pos][1]!r}: {text!r}")
+    return tree
+
+
+class TermScanner:
+    """
+    在一行文本中一次找出所有出现的关键字（与 Aho-Corasick 结果相同）
+
+    所有关键字编译为一个按长度降序排列的正则选择分支，由 re 在 C 中扫描：每次找到最左边的命中位置及该处最长的关键字，
+    再从下一个位置继续，因此每个位置都会被检查到；同一位置上较短的命中必是最长命中的前缀，由预先计算的前缀掩码补上
+
+    :param term_bits: 关键字（str）-> 命中时置位的位掩码
+    :param binary: 为 True 时扫描 UTF-8 字节（mmap 模式）
+    """
+    __slots__ = ('_search', '_masks', '_full')
+
+    def __init__(self, term_bits, binary=False):
+        keys = [term.encode('utf-8') if binary else term for term in term_bits]
+        self._full = 0
+        # 每个关键字命中时一并命中的关键字（它自身及它的所有前缀）
+        self._masks = {}
+        for key, bits in zip(keys, term_bits.values()):
+            self._masks[key] = self._masks.get(key, 0) | bits
+            self._full |= bits
+        for key in list(self._masks):
+            for other, bit in list(self._masks.items()):
+                if other != key and key.startswith(other):
+                    self._masks[key] |= bit
+        if keys:
+            ordered = sorted(self._masks, key=len, reverse=True)
+            self._search = re.compile(b'|'.join(map(re.escape, ordered)) if binary
+                                      else '|'.join(map(re.escape, ordered))).search
+        else:
+            self._search = None
+
+    def scan(self, text):
+        """:return: 出现过的关键字位掩码"""
+        search = self._search
+        if search is None:
+            return 0
+        masks = self._masks
+        full = self._full
+        mask = 0
+        match = search(text)
+        while match is not None:
+            mask |= masks[match.group()]
+            if mask == full:
+                break
+            match = search(text, match.start() + 1)
+        return mask
+
+
+def _compile_node(node, leaf_bit):
+    """把语法树转换为判断函数 mask -> bool；leaf_bit 为关键字或字段条件节点分配位"""
+    kind = node[0]
+    if kind == 'const':
+        value = node[1]
+        return lambda mask: value
+    if kind == 'term' and not node[1]:
+        return lambda mask: True  # 空关键字（""）出现在任何文本中
+    if kind in ('term', 'field'):
+        bit = leaf_bit(node)
+        return lambda mask: bool(mask & bit)
+    if kind == 'not':
+        inner = _compile_node(node[1], leaf_bit)
+        return lambda mask: not inner(mask)
+
+    children = [_compile_node(child, leaf_bit) for child in node[1]]
+    # 子节点全是关键字或字段条件时直接比较位掩码
+    if all(child[0] == 'field' or (child[0] == 'term' and child[1]) for child in node[1]):
+        bits = 0
+        for child in node[1]:
+            bits |= leaf_bit(child)
+        if kind == 'and':
+            return lambda mask: mask & bits == bits
+        return lambda mask: bool(mask & bits)
+    if kind == 'and':
+        return lambda mask: all(child(mask) for child in children)
+    return lambda mask: any(child(mask) for child in children)
+
+
+class ExpressionSet:
+    """
+    同一侧文本（如 EXTINF 行）上的一组表达式：共用词表，每行文本只扫描一次、只解析一次
+
+    >>> field = ExpressionSet()
+    >>> is_cctv, not_test = field.add('CCTV && !测试'), field.add('!测试')
+    >>> mask = field.scan('#EXTINF:-1,CCTV-1')
+    >>> is_cctv(mask), not_test(mask)
+    (True, True)
+
+    :param fields: 字段名 -> Field，可在表达式中写字段条件
+    :param parse: 把一行文本解析为 Field.get 的参数，省略时直接传入文本
+    :param foreign_fields: 属于另一侧的字段名，在这一侧使用时报错而不是当作普通关键字
+    """
+    __slots__ = ('_fields', '_parse', '_foreign', '_leaves', '_terms', '_equal', '_contains', '_scanners')
+
+    def __init__(self, fields=None, parse=None, foreign_fields=()):
+        self._fields = fields or {}
+        self._parse = parse
+        self._foreign = frozenset(foreign_fields)
+        self._leaves = {}    # 叶子节点 -> 位
+        self._terms = {}     # 在整行中查找的关键字 -> 位掩码
+        self._equal = {}     # 字段 -> {值: 位掩码}，"=" 与 "in" 条件的哈希索引
+        self._contains = {}  # 字段 -> {文本: 位掩码}，"~" 条件
+        self._scanners = {}
+
+    def _leaf_bit(self, node):
+        bit = self._leaves.get(node)
+        if bit is not None:
+            return bit
+        bit = self._leaves[node] = 1 << len(self._leaves)
+        self._scanners.clear()
+        if node[0] == 'term':
+            self._terms[node[1]] = self._terms.get(node[1], 0) | bit
+            return bit
+
+        _, name, op, values = node
+        fold = self._fields[name].fold
+        index = (self._equal if op == 'in' else self._contains).setdefault(name, {})
+        for value in values:
+            value = fold(value) if fold else value
+            index[value] = index.get(value, 0) | bit
+        return bit
+
+    def add(self, text):
+        """
+        编译表达式并加入词表
+
+        :return: 判断函数，参数为 scan() 的结果
+        :raises ExpressionError: 语法错误，或使用了另一侧的字段
+        """
+        tree = parse_expression(text, set(self._fields) | self._foreign)
+        self._check_fields(tree)
+        return _compile_node(tree, self._leaf_bit)
+
+    def _check_fields(self, node):
+        if node[0] == 'field' and node[1] in self._foreign:
+            raise ExpressionError(f"字段 {node[1]} 不能用于这一侧")
+        if node[0] == 'not':
+            self._check_fields(node[1])
+        elif node[0] in ('and', 'or'):
+            for child in node[1]:
+                self._check_fields(child)
+
+    def _field_scanners(self):
+        scanners = self._scanners.get('fields')
+        if scanners is None:
+            scanners = self._scanners['fields'] = {
+                name: TermScanner(terms) for name, terms in self._contains.items()}
+        return scanners
+
+    def scan(self, text):
+        """扫描一行文本（str 或 UTF-8 bytes），返回命中的关键字与字段条件的位掩码"""
+        binary = not isinstance(text, str)
+        scanner = self._scanners.get(binary)
+        if scanner is None:
+            scanner = self._scanners[binary] = TermScanner(self._terms, binary)
+        mask = scanner.scan(text)
+        if not (self._equal or self._contains):
+            return mask
+
+        parsed = bytes(text).decode('utf-8') if binary else text
+        if self._parse is not None:
+            parsed = self._parse(parsed)
+        for name, index in self._equal.items():
+            value = self._field_value(name, parsed)
+            if value is not None:
+                mask |= index.get(value, 0)
+        for name, field_scanner in self._field_scanners().items():
+            value = self._field_value(name, parsed)
+            if value is not None:
+                mask |= field_scanner.scan(value)
+        return mask
+
+    def _field_value(self, name, parsed):
+        field = self._fields[name]
+        value = field.get(parsed)
+        if value is not None and field.fold:
+            value = field.fold(value)
+        return value
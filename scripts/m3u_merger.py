@@ -1,153 +1,539 @@
-import re
 import argparse
 import sys
 import os
+import heapq
+import marshal
 import tempfile
-import shutil
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from operator import itemgetter
+
+from m3u_parser import iter_m3u_file, iter_m3u_records
+from m3u_model import Channel, LinkedOrder, OrderedSet, intern_group
+from m3u_extinf import ExtInf
+from m3u_playlist import Playlist, flatten_blocks
+from m3u_writer import atomic_write
+from m3u_urlkey import CanonicalURLSet
+from m3u_seen import SeenStore, filter_seen_urls
 
 # --- 辅助函数：提取 Group-Title ---
 def extract_group_title(info_line):
-    """从 #EXTINF 行中提取 group-title 的值。"""
-    match = re.search(r'group-title="([^"]*)"', info_line)
-    if match:
-        return match.group(1).strip()
-    return ""
+    """从 #EXTINF 行（或已分词的 ExtInf）中提取 group-title 的值。"""
+    extinf = info_line if isinstance(info_line, ExtInf) else ExtInf(info_line)
+    return (extinf.get('group-title') or "").strip()
 
 # --- 辅助函数：解析单个 M3U 内容 (支持多URL) ---
 def parse_single_m3u(m3u_content):
+    """
+    解析单个 M3U 内容
+
+    :param m3u_content: M3U 文本字符串，或按行迭代的文件对象
+    :return: (order_list, channels_map, header)
+    """
     if not m3u_content:
         return [], {}, ""
-        
-    lines = [line.strip() for line in m3u_content.strip().split('\n') if line.strip()]
     
-    # channels_map 结构: { ("频道名称", "Group-Title"): {"info": "#EXTINF...", "urls": set()} }
+    if isinstance(m3u_content, str):
+        m3u_content = m3u_content.split('\n')
+    
+    return parse_m3u_records(iter_m3u_records(m3u_content))
+
+def parse_m3u_records(records, url_set=OrderedSet):
+    """
+    由已解析的记录构建频道数据
+
+    :param records: M3URecord 序列
+    :param url_set: URL 容器类型：OrderedSet，或按规范化 URL 去重的 m3u_urlkey.CanonicalURLSet
+    :return: (order_list, channels_map, header)
+    """
+    # channels_map 结构: { ("频道名称", "Group-Title"): Channel(info="#EXTINF...", urls=OrderedSet()) }
+    # URL 和配置行都按首次出现的顺序去重保存
     channels_map = {}
     order_list = [] # 包含 ("频道名称", "Group-Title") 复合键
     header = ""
     
-    current_info_line = None
-    current_channel_name = None
-    current_group_title = None
-    current_config_lines = []  # 存储配置行
-    
-    i = 0
-    while i < len(lines):
-        line = lines[i]
+    for record in records:
+        current_info_line = record.extinf
+        current_channel_name = None
+        current_group_title = None
+        current_config_lines = []  # 存储配置行
         
-        if line.startswith('#EXTM3U'):
-            if not header:
-                header = line
-            i += 1
-            continue
-
-        if line.startswith('#EXTINF:'):
-            # 如果之前有频道数据，先保存
-            if current_info_line and current_channel_name:
-                channel_key = (current_channel_name, current_group_title)
+        if current_info_line is not None:
+            # 一次分词同时得到显示名称与 group-title
+            current_extinf = ExtInf(current_info_line)
+            current_channel_name = (current_extinf.name or "").strip() or None
+            current_group_title = intern_group(extract_group_title(current_extinf))
+        
+        for line in record.lines:
+            if line.startswith('#EXTM3U'):
+                if not header:
+                    header = line
                 
-                if channel_key not in channels_map:
-                    channels_map[channel_key] = {
-                        "info": current_info_line, 
-                        "urls": set(),
-                        "configs": list(current_config_lines)  # 保存配置行
-                    }
-                    order_list.append(channel_key)
-                else:
-                    # 合并到已存在的频道
-                    channels_map[channel_key]["info"] = current_info_line
-                    channels_map[channel_key]["configs"].extend(current_config_lines)
-            
-            # 开始新频道
-            current_info_line = line
-            name_match = re.search(r',(.+)$', line)
-            current_channel_name = name_match.group(1).strip() if name_match else None
-            current_group_title = extract_group_title(current_info_line)
-            current_config_lines = []  # 重置配置行
-            i += 1
-            
-        elif line.startswith('#') and not line.startswith('#EXTINF:'):
-            # 收集配置行（如#EXTVLCOPT）
-            current_config_lines.append(line)
-            i += 1
-            
-        elif line.startswith(('http://', 'https://')):
-            # URL 属于最近解析成功的频道实体
-            if current_channel_name and current_group_title is not None:
-                channel_key = (current_channel_name, current_group_title)
-                if channel_key not in channels_map:
-                    # 如果还没有创建频道实体，先创建
-                    channels_map[channel_key] = {
-                        "info": current_info_line, 
-                        "urls": set(),
-                        "configs": list(current_config_lines)
-                    }
-                    order_list.append(channel_key)
-                channels_map[channel_key]["urls"].add(line)
-            i += 1
-            
-        else:
+            elif line.startswith('#'):
+                # 收集配置行（如#EXTVLCOPT）
+                current_config_lines.append(line)
+                
+            elif line.startswith(('http://', 'https://')):
+                # URL 属于最近解析成功的频道实体
+                if current_channel_name and current_group_title is not None:
+                    channel_key = (current_channel_name, current_group_title)
+                    if channel_key not in channels_map:
+                        # 如果还没有创建频道实体，先创建
+                        channels_map[channel_key] = Channel(
+                            current_info_line,
+                            urls=url_set(),
+                            group=current_group_title,
+                            configs=OrderedSet(current_config_lines)
+                        )
+                        order_list.append(channel_key)
+                    channels_map[channel_key].urls.add(line)
             # 未知行，跳过
-            i += 1
-    
-    # 处理最后一个频道
-    if current_info_line and current_channel_name:
-        channel_key = (current_channel_name, current_group_title)
         
-        if channel_key not in channels_map:
-            channels_map[channel_key] = {
-                "info": current_info_line, 
-                "urls": set(),
-                "configs": list(current_config_lines)
-            }
-            order_list.append(channel_key)
-        else:
-            channels_map[channel_key]["info"] = current_info_line
-            channels_map[channel_key]["configs"].extend(current_config_lines)
+        # 记录结束，保存频道数据
+        if current_info_line and current_channel_name:
+            channel_key = (current_channel_name, current_group_title)
+            
+            if channel_key not in channels_map:
+                channels_map[channel_key] = Channel(
+                    current_info_line,
+                    urls=url_set(),
+                    group=current_group_title,
+                    configs=OrderedSet(current_config_lines)  # 保存配置行
+                )
+                order_list.append(channel_key)
+            else:
+                # 合并到已存在的频道
+                channels_map[channel_key].info = current_info_line
+                channels_map[channel_key].configs.update(current_config_lines)
 
     return order_list, channels_map, header
 
-# --- 安全文件写入函数 ---
-def safe_write_output(content, input_files, output_path):
+# --- 多进程解析 ---
+def parse_file_compact(input_file, url_set=OrderedSet):
     """
-    安全地写入输出文件，支持输入文件包含输出文件的情况
+    在工作进程中解析单个文件，返回只含字符串和元组的紧凑结果，减少跨进程传输的开销
+
+    :return: (header, [(name, group, info, urls, configs), ...])，按 order_list 顺序
     """
-    # 检查输出文件是否在输入文件中
-    output_abs = os.path.abspath(output_path)
-    input_abs_list = [os.path.abspath(f) for f in input_files if os.path.exists(f)]
-    
-    is_output_in_inputs = output_abs in input_abs_list
-    temp_path = None
+    order_list, channels_map, header = parse_m3u_records(iter_m3u_file(input_file), url_set)
+    items = []
+    for channel_key in order_list:
+        channel = channels_map[channel_key]
+        items.append((channel_key[0], channel_key[1], channel.info, tuple(channel.urls), tuple(channel.configs)))
+    return header, items
+
+def unpack_parsed(packed, url_set=OrderedSet):
+    """把 parse_file_compact 的结果还原为 (order_list, channels_map, header)"""
+    header, items = packed
+    order_list = []
+    channels_map = {}
+    for name, group, info, urls, configs in items:
+        group = intern_group(group)
+        channel_key = (name, group)
+        order_list.append(channel_key)
+        channels_map[channel_key] = Channel(info, urls=url_set(urls), group=group, configs=OrderedSet(configs))
+    return order_list, channels_map, header
+
+def iter_parsed_inputs(input_files, jobs=1, url_set=OrderedSet):
+    """
+    按输入顺序产出各文件的解析结果；jobs > 1 时在进程池中并行解析，合并仍按输入顺序进行，输出不变
+
+    :return: 生成 (input_file, (order_list, channels_map, header) 或 None, 异常或 None)
+    """
+    if jobs <= 1 or len(input_files) <= 1:
+        for input_file in input_files:
+            try:
+                yield input_file, parse_m3u_records(iter_m3u_file(input_file), url_set), None
+            except Exception as e:
+                yield input_file, None, e
+        return
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(input_files))) as pool:
+        futures = [pool.submit(parse_file_compact, input_file, url_set) for input_file in input_files]
+        for input_file, future in zip(input_files, futures):
+            try:
+                yield input_file, unpack_parsed(future.result(), url_set), None
+            except Exception as e:
+                yield input_file, None, e
+
+# --- 合并单个文件的解析结果 ---
+def merge_single_m3u(final_channels_data, group_global_order, current_order_list, current_map):
+    """
+    把一个文件的解析结果按 Group-Title 优先的相对插入顺序合并进最终结果
+
+    :param final_channels_data: { group_title: {"channels": {name: Channel}, "order_list": LinkedOrder(name, ...)} }，原地更新
+    :param group_global_order: 组的全局顺序，原地更新
+    :param current_order_list, current_map: parse_single_m3u / parse_m3u_records 的结果
+    """
+    current_groups = {}
+    for channel_key in current_order_list:
+        _, group = channel_key
+        data = current_map[channel_key]
+
+        if group not in current_groups:
+            current_groups[group] = []
+        current_groups[group].append((channel_key, data)) 
+
+    for group_title, current_group_items in current_groups.items():
+        if group_title not in final_channels_data:
+            final_channels_data[group_title] = {"channels": {}, "order_list": LinkedOrder()}
+            group_global_order.append(group_title)
+
+        final_group_data = final_channels_data[group_title]
+        final_group_channels = final_group_data["channels"]
+        final_group_order = final_group_data["order_list"]
+
+        # 最近处理过的已知频道，新频道插在它之后；None 表示插入到组的最前面
+        anchor = None
+
+        for channel_key, current_channel_data in current_group_items:
+            channel_name, _ = channel_key
+
+            if channel_name in final_group_channels:
+                # 合并：更新info，合并URL和配置行
+                final_channel = final_group_channels[channel_name]
+                final_channel.info = current_channel_data.info
+                final_channel.urls.update(current_channel_data.urls)
+
+                # 合并配置行（去重，保持首次出现的顺序）
+                final_channel.configs.update(current_channel_data.configs)
+
+                anchor = channel_name
+
+            else:
+                # 新频道：添加
+                final_group_channels[channel_name] = current_channel_data
+                final_group_order.insert_after(anchor, channel_name)
+                anchor = channel_name
+
+# --- 跨文件、跨运行的 URL 去重 ---
+def drop_seen_urls(final_channels_data, group_global_order, store, canonical=False):
+    """
+    按输出顺序去掉 SeenStore 中已出现过的 URL，没有剩余 URL 的频道从结果中删除
+
+    :return: (去掉的 URL 数, 删除的频道数)
+    """
+    dropped_channels = 0
+    dropped_urls = 0
+    for group_title in group_global_order:
+        group_channels = final_channels_data[group_title]["channels"]
+        names = [name for name in final_channels_data[group_title]["order_list"] if name in group_channels]
+        dropped_urls += filter_seen_urls((group_channels[name] for name in names), store, canonical)
+        for name in names:
+            if not group_channels[name].urls:
+                del group_channels[name]
+                dropped_channels += 1
+    return dropped_urls, dropped_channels
+
+# --- 生成合并后的输出行 ---
+def build_output_lines(final_channels_data, group_global_order, final_header, no_config=False, keep_order=False):
+    """
+    按组的全局顺序和组内顺序生成输出行（输出时以 '\n' 连接，末尾无换行）
+
+    :param keep_order: URL 保持首次出现的顺序，否则按字母排序
+    """
+    return flatten_blocks(build_output_blocks(final_channels_data, group_global_order, final_header,
+                                              no_config, keep_order))
+
+def build_output_blocks(final_channels_data, group_global_order, final_header, no_config=False, keep_order=False):
+    """与 build_output_lines 相同，但按频道分块（文件头、每个频道的 EXTINF 行及其配置行、URL）"""
+    output_blocks = [[final_header]] if final_header else []
     
+    for group_title in group_global_order:
+        if group_title in final_channels_data:
+            group_data = final_channels_data[group_title]
+            
+            for name in group_data["order_list"]:
+                if name in group_data["channels"]:
+                    data = group_data["channels"][name]
+                    
+                    block = [data.info]
+                    
+                    # 写入配置行（如果启用）
+                    if not no_config and data.configs:
+                        block.extend(data.configs)
+                    
+                    # 写入URL行（默认排序后）
+                    block.extend(data.urls if keep_order else sorted(data.urls))
+                    output_blocks.append(block)
+    return output_blocks
+
+# --- 流式合并（限制内存）---
+# 估算缓冲区内存时，每个频道、每个 URL / 配置行在字符串本身之外的开销（字节）
+_ENTRY_OVERHEAD = 240
+_ITEM_OVERHEAD = 80
+# k 路归并时同时打开的临时段文件数上限，超过时先把最早的若干段归并为一段
+_MAX_MERGE_FANIN = 64
+_OUTPUT_LINES_PER_CHUNK = 2048
+
+def iter_channel_entries(records):
+    """
+    逐条产出记录中的频道数据，不在内存中保留整个文件；名称、分组、URL 和配置行的归属与 parse_m3u_records 相同
+
+    :param records: M3URecord 序列
+    :return: 生成 (header, channel_key, first, info, urls, configs)。header 为记录中的第一个 #EXTM3U 行或 None；
+             记录不构成频道时 channel_key 为 None；first 表示频道在本文件中首次出现
+    """
+    seen = set()
+    for record in records:
+        info_line = record.extinf
+        channel_name = None
+        group_title = None
+        if info_line is not None:
+            extinf = ExtInf(info_line)
+            channel_name = (extinf.name or "").strip() or None
+            group_title = intern_group(extract_group_title(extinf))
+
+        header = None
+        urls = []
+        configs = []
+        for line in record.lines:
+            if line.startswith('#EXTM3U'):
+                if header is None:
+                    header = line
+            elif line.startswith('#'):
+                configs.append(line)
+            elif line.startswith(('http://', 'https://')):
+                if channel_name and group_title is not None:
+                    urls.append(line)
+
+        if not (info_line and channel_name):
+            yield header, None, False, None, urls, configs
+            continue
+
+        channel_key = (channel_name, group_title)
+        first = channel_key not in seen
+        if first:
+            seen.add(channel_key)
+        yield header, channel_key, first, info_line, urls, configs
+
+def iter_file_entries(input_file):
+    """流式读取单个文件的频道数据，出错时在异常信息中注明文件名"""
     try:
-        if is_output_in_inputs:
-            output_dir = os.path.dirname(output_path) or '.'
-            fd, temp_path = tempfile.mkstemp(
-                dir=output_dir,
-                suffix='.m3u',
-                prefix='.tmp_',
-                text=True
-            )
-            out_f = os.fdopen(fd, 'w', encoding='utf-8')
-        else:
-            out_f = open(output_path, 'w', encoding='utf-8')
-        
-        with out_f:
-            out_f.write(content)
-        
-        if is_output_in_inputs:
+        yield from iter_channel_entries(iter_m3u_file(input_file))
+    except Exception as e:
+        raise RuntimeError(f"处理文件 '{input_file}' 时发生错误: {e}") from e
+
+def build_stream_ranks(input_files):
+    """
+    第一遍：只读取频道名称和分组，按 merge_single_m3u 的规则确定最终顺序
+
+    :return: (ranks, group_count, header)，ranks 为 {channel_key: 输出序号}
+    """
+    group_orders = {}  # group_title -> LinkedOrder(name, ...)，按组首次出现的顺序排列
+    header = ""
+
+    for input_file in input_files:
+        # 每个组内最近处理过的频道，新频道插在它之后
+        anchors = {}
+        for record_header, channel_key, first, *_ in iter_file_entries(input_file):
+            if record_header and not header:
+                header = record_header
+            if channel_key is None or not first:
+                continue
+
+            channel_name, group_title = channel_key
+            order = group_orders.get(group_title)
+            if order is None:
+                order = group_orders[group_title] = LinkedOrder()
+            if channel_name not in order:
+                order.insert_after(anchors.get(group_title), channel_name)
+            anchors[group_title] = channel_name
+
+    ranks = {}
+    for group_title, order in group_orders.items():
+        for channel_name in order:
+            ranks[(channel_name, group_title)] = len(ranks)
+    return ranks, len(group_orders), header
+
+def write_run(entries, temp_dir):
+    """把按序号排好的频道数据写入临时段文件，返回文件路径"""
+    fd, path = tempfile.mkstemp(dir=temp_dir, suffix='.run')
+    with open(fd, 'wb', buffering=1 << 16) as f:
+        for entry in entries:
+            marshal.dump(entry, f)
+    return path
+
+def read_run(path):
+    """按顺序读出临时段文件中的频道数据"""
+    with open(path, 'rb', buffering=1 << 16) as f:
+        while True:
             try:
-                os.replace(temp_path, output_path)
-                temp_path = None
-            except Exception as e:
-                print(f"警告：原子替换失败，使用备选方案: {e}")
-                shutil.move(temp_path, output_path)
-                temp_path = None
-        
-        return True, None
-        
+                yield marshal.load(f)
+            except EOFError:
+                return
+
+def combine_entries(entries, url_set=OrderedSet):
+    """
+    把按序号排列、同一序号按出现先后排列的频道数据合并：info 取最后一次，URL 和配置行按首次出现的顺序去重
+
+    :param entries: (rank, info, urls, configs) 序列
+    :return: 生成合并后的 (rank, info, urls, configs)，urls 为 url_set，configs 为 OrderedSet
+    """
+    current = None
+    for rank, info, urls, configs in entries:
+        if current is not None and current[0] == rank:
+            current[1] = info
+            current[2].update(urls)
+            current[3].update(configs)
+            continue
+        if current is not None:
+            yield tuple(current)
+        current = [rank, info, url_set(urls), OrderedSet(configs)]
+    if current is not None:
+        yield tuple(current)
+
+def merge_runs(runs, temp_dir, url_set=OrderedSet):
+    """
+    k 路归并临时段，段数超过上限时先归并最早的若干段；返回合并后频道数据的生成器
+
+    :param runs: 段文件路径列表，按写出先后排列
+    """
+    while len(runs) > _MAX_MERGE_FANIN:
+        oldest = runs[:_MAX_MERGE_FANIN]
+        merged = combine_entries(heapq.merge(*(read_run(path) for path in oldest), key=itemgetter(0)), url_set)
+        merged_path = write_run(((rank, info, tuple(urls), tuple(configs))
+                                 for rank, info, urls, configs in merged), temp_dir)
+        for path in oldest:
+            os.unlink(path)
+        runs = [merged_path] + runs[_MAX_MERGE_FANIN:]
+    # heapq.merge 在序号相同时按可迭代对象的先后产出，较早写出的段在前，info 仍取最后一次出现的
+    return combine_entries(heapq.merge(*(read_run(path) for path in runs), key=itemgetter(0)), url_set)
+
+def spill_channels(input_files, ranks, max_bytes, temp_dir, url_set=OrderedSet):
+    """
+    第二遍：按序号在内存中局部合并频道数据，估算占用超过 max_bytes 时排序写出一个临时段
+
+    :return: 段文件路径列表，按写出先后排列
+    """
+    runs = []
+    buffer = {}  # rank -> [info, urls, configs]
+    buffer_bytes = 0
+    getsize = sys.getsizeof
+
+    def flush():
+        entries = ((rank, data[0], tuple(data[1]), tuple(data[2]))
+                   for rank, data in sorted(buffer.items(), key=itemgetter(0)))
+        runs.append(write_run(entries, temp_dir))
+        buffer.clear()
+
+    for input_file in input_files:
+        for _, channel_key, _, info, urls, configs in iter_file_entries(input_file):
+            if channel_key is None:
+                continue
+            rank = ranks[channel_key]
+            data = buffer.get(rank)
+            if data is None:
+                buffer[rank] = data = [info, url_set(), OrderedSet()]
+                buffer_bytes += _ENTRY_OVERHEAD + getsize(info)
+            else:
+                data[0] = info
+
+            # 只有新增的元素计入占用；CanonicalURLSet 中同一路流替换为更新的 URL 时大小基本不变
+            for container, items in ((data[1], urls), (data[2], configs)):
+                for item in items:
+                    count = len(container)
+                    container.add(item)
+                    if len(container) != count:
+                        buffer_bytes += _ITEM_OVERHEAD + getsize(item)
+
+            if buffer_bytes > max_bytes:
+                flush()
+                buffer_bytes = 0
+
+    if buffer:
+        flush()
+    return runs
+
+def iter_stream_output_lines(merged, header, no_config, keep_order, stats):
+    """由归并结果生成输出行，同时统计 URL 数和多 URL 频道数"""
+    if header:
+        yield header
+    for _, info, urls, configs in merged:
+        yield info
+        if not no_config and configs:
+            yield from configs
+        yield from (urls if keep_order else sorted(urls))
+        stats['urls'] += len(urls)
+        if len(urls) > 1:
+            stats['multi_url_channels'] += 1
+
+def iter_joined_chunks(lines):
+    """把输出行分块连接，结果与 '\n'.join(lines) 相同（末尾无换行）"""
+    iterator = iter(lines)
+    separator = ""
+    while True:
+        batch = list(islice(iterator, _OUTPUT_LINES_PER_CHUNK))
+        if not batch:
+            return
+        yield separator + '\n'.join(batch)
+        separator = '\n'
+
+def stream_merge(input_files, output_path, max_bytes, no_config=False, keep_order=False, temp_dir=None,
+                 url_set=OrderedSet):
+    """
+    限制内存的流式合并：输入读两遍，第一遍只保留频道名称确定顺序，第二遍把频道数据分段排序写入临时文件，
+    最后 k 路归并并直接写出。合并规则、组的首次出现顺序和组内相对插入顺序与普通模式相同；
+    max_bytes 限制的是频道数据（info、URL、配置行）缓冲区，频道名称顺序表仍常驻内存
+
+    :return: (success, stats)，stats 为 {'channels', 'groups', 'urls', 'multi_url_channels', 'runs'}
+    """
+    ranks, group_count, header = build_stream_ranks(input_files)
+    stats = {'channels': len(ranks), 'groups': group_count, 'urls': 0, 'multi_url_channels': 0, 'runs': 0}
+
+    with tempfile.TemporaryDirectory(dir=temp_dir, prefix='m3u_merge_') as run_dir:
+        runs = spill_channels(input_files, ranks, max_bytes, run_dir, url_set)
+        del ranks
+        stats['runs'] = len(runs)
+        lines = iter_stream_output_lines(merge_runs(runs, run_dir, url_set), header, no_config, keep_order, stats)
+        success, _ = safe_write_output(iter_joined_chunks(lines), output_path)
+    return success, stats
+
+# --- 流水线阶段 ---
+def url_set_type(args):
+    """按 --canonical-urls 选择 URL 容器类型"""
+    return CanonicalURLSet if args.canonical_urls else OrderedSet
+
+def transform_playlist(playlists, args):
+    """
+    流水线阶段：合并内存中的一个或多个播放列表
+    :param playlists: m3u_playlist.Playlist 列表，按合并顺序排列
+    :param args: build_parser() 解析出的参数
+    :return: 新的 Playlist，内容与命令行方式写出的文件相同
+    """
+    if getattr(args, 'seen_db', None):
+        raise ValueError("流水线阶段不支持 --seen-db，请直接运行 m3u_merger.py")
+    final_channels_data = {}
+    group_global_order = []
+    final_header = ""
+    
+    for playlist in playlists:
+        current_order_list, current_map, header = parse_m3u_records(playlist.records, url_set_type(args))
+        if not final_header and header:
+            final_header = header
+        merge_single_m3u(final_channels_data, group_global_order, current_order_list, current_map)
+    
+    blocks = build_output_blocks(final_channels_data, group_global_order, final_header,
+                                 args.no_config, args.keep_order)
+    return Playlist.from_blocks(blocks, trailing_newline=False)
+
+# --- 安全文件写入函数 ---
+def safe_write_output(content, output_path):
+    """
+    安全地写入输出文件：原子替换，输出文件同时是输入文件时同样安全，内容未变化时保留原文件
+    
+    :param content: 完整文本，或按顺序写出的文本块（流式合并）
+    :return: (success, changed) 成功返回(True, 内容是否有变化)，失败返回(False, False)
+    """
+    try:
+        changed = atomic_write(output_path, [content] if isinstance(content, str) else content)
     except Exception as e:
-        print(f"写入文件失败: {e}")
-        return False, temp_path
+        print(f"写入文件失败: {e}", file=sys.stderr)
+        return False, False
+    
+    if not changed:
+        print(f"内容未变化，保留原文件：{output_path}", file=sys.stderr)
+    return True, changed
 
 # --- 验证参数函数 ---
 def validate_arguments(input_files, output_path):
@@ -188,8 +574,43 @@ def validate_arguments(input_files, output_path):
     
     return True
 
-# --- 主函数：支持多URL的合并 ---
-def main():
+# --- 统计与输出信息 ---
+def collect_stats(final_channels_data, group_global_order):
+    """统计合并结果的频道数、分组数、URL 数和多 URL 频道数"""
+    stats = {'channels': 0, 'groups': len(group_global_order), 'urls': 0, 'multi_url_channels': 0}
+    for group_title in group_global_order:
+        if group_title in final_channels_data:
+            group_data = final_channels_data[group_title]
+            for name in group_data["order_list"]:
+                if name in group_data["channels"]:
+                    stats['channels'] += 1
+                    data = group_data["channels"][name]
+                    stats['urls'] += len(data.urls)
+                    if len(data.urls) > 1:
+                        stats['multi_url_channels'] += 1
+    return stats
+
+def print_summary(args, valid_input_files, stats):
+    """输出合并结果的统计信息"""
+    print(f"成功: {len(valid_input_files)} 个 M3U 文件已合并", file=sys.stderr)
+    print(f"      共 {stats['channels']} 个频道，{stats['groups']} 个分组", file=sys.stderr)
+    print(f"      合并了 {stats['urls']} 个URL", file=sys.stderr)
+    
+    if args.no_config:
+        print(f"      已过滤所有配置行", file=sys.stderr)
+    
+    # 显示多URL频道统计
+    if stats['multi_url_channels'] > 0:
+        print(f"      其中 {stats['multi_url_channels']} 个频道有多个URL源", file=sys.stderr)
+    
+    print(f"      结果已写入 '{args.output}'", file=sys.stderr)
+    
+    output_abs = os.path.abspath(args.output)
+    if output_abs in [os.path.abspath(f) for f in valid_input_files]:
+        print(f"注意: 已安全覆盖输入文件 '{args.output}'", file=sys.stderr)
+
+# --- 命令行参数 ---
+def build_parser():
     parser = argparse.ArgumentParser(
         description="合并M3U文件，支持一个频道下多个URL的合并，并进行 Group-Title 优先的相对插入排序。",
         formatter_class=argparse.RawTextHelpFormatter
@@ -202,8 +623,32 @@ def main():
                        help="强制操作，即使输出文件已存在且不是输入文件")
     parser.add_argument('--no-config', action='store_true',
                        help="不保留配置行（如#EXTVLCOPT）")
-    
-    args = parser.parse_args()
+    parser.add_argument('--keep-order', action='store_true',
+                       help="保持URL首次出现的顺序（默认按字母排序）")
+    parser.add_argument('--canonical-urls', action='store_true',
+                       help="按规范化URL去重：忽略 msisdn、timestamp 等易变参数（见 m3u_urlkey.py），\n"
+                            "同一路流只保留最新的URL")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                       help="并行解析输入文件的进程数（默认: 1，即逐个解析）")
+    parser.add_argument('--max-memory', type=float, metavar='MB',
+                       help="启用流式合并：频道数据缓冲区超过该大小（MB）时排序写入临时文件，\n"
+                            "最后 k 路归并输出，适合超大输入；此模式下不使用 --jobs")
+    parser.add_argument('--temp-dir', type=str,
+                       help="流式合并临时文件所在目录（默认: 系统临时目录）")
+    parser.add_argument('--seen-db', type=str, metavar='FILE',
+                       help="把已出现的URL保存到 SQLite 数据库（不存在时创建），在多次运行、多个命令之间去重，\n"
+                            "并记录每个URL首次出现的时间；同一URL只保留在第一个频道中（不能与 --max-memory 同用）")
+    parser.add_argument('--seen-run', type=str, metavar='NAME',
+                       help="--seen-db 的运行名称：使用相同名称的多个命令之间互相去重（默认每个命令为新的一次运行）")
+    parser.add_argument('--skip-known', action='store_true',
+                       help="--seen-db 中之前的运行出现过的URL也去掉，只保留新出现的URL")
+    parser.add_argument('--seen-report', type=str, metavar='FILE',
+                       help="把本次运行出现过的URL及其首次、最近出现时间写入该文件（制表符分隔）")
+    return parser
+
+# --- 主函数：支持多URL的合并 ---
+def main():
+    args = build_parser().parse_args()
     
     if not args.input:
         print("错误: 请提供至少一个输入文件。", file=sys.stderr)
@@ -232,146 +677,90 @@ def main():
             continue
             
         valid_input_files.append(input_file)
-        
+    
+    if not args.seen_db and (args.seen_run or args.skip_known or args.seen_report):
+        print("错误: --seen-run、--skip-known、--seen-report 需要同时指定 --seen-db", file=sys.stderr)
+        sys.exit(1)
+    
+    if args.max_memory is not None:
+        if args.seen_db:
+            print("错误: --seen-db 不能与 --max-memory 同用", file=sys.stderr)
+            sys.exit(1)
+        if args.max_memory <= 0:
+            print("错误: --max-memory 必须大于 0", file=sys.stderr)
+            sys.exit(1)
+        if args.jobs > 1:
+            print("信息: 流式合并模式下忽略 --jobs", file=sys.stderr)
         try:
-            with open(input_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-                
-            current_order_list, current_map, header = parse_single_m3u(content)
+            success, stats = stream_merge(valid_input_files, args.output, int(args.max_memory * 1024 * 1024),
+                                          args.no_config, args.keep_order, args.temp_dir, url_set_type(args))
+        except Exception as e:
+            print(f"流式合并失败: {e}", file=sys.stderr)
+            sys.exit(1)
+        if not success:
+            print("处理失败！", file=sys.stderr)
+            sys.exit(1)
+        print(f"信息: 流式合并使用了 {stats['runs']} 个临时段", file=sys.stderr)
+        print_summary(args, valid_input_files, stats)
+        return
+
+    for input_file, parsed, error in iter_parsed_inputs(valid_input_files, args.jobs, url_set_type(args)):
+        try:
+            if error is not None:
+                raise error
+            current_order_list, current_map, header = parsed
             
             if not final_header and header:
                 final_header = header
             
-            current_groups = {}
-            for channel_key in current_order_list:
-                _, group = channel_key
-                data = current_map[channel_key]
-                
-                if group not in current_groups:
-                    current_groups[group] = []
-                current_groups[group].append((channel_key, data)) 
-
-            for group_title, current_group_items in current_groups.items():
-                if group_title not in final_channels_data:
-                    final_channels_data[group_title] = {"channels": {}, "order_list": []}
-                    group_global_order.append(group_title)
-                
-                final_group_data = final_channels_data[group_title]
-                final_group_channels = final_group_data["channels"]
-                final_group_order = final_group_data["order_list"]
-                
-                last_known_channel_index = -1
-
-                for channel_key, current_channel_data in current_group_items:
-                    channel_name, _ = channel_key
-                    
-                    if channel_name in final_group_channels:
-                        # 合并：更新info，合并URL和配置行
-                        final_group_channels[channel_name]["info"] = current_channel_data["info"]
-                        final_group_channels[channel_name]["urls"].update(current_channel_data["urls"])
-                        
-                        # 合并配置行（去重）
-                        existing_configs = final_group_channels[channel_name].get("configs", [])
-                        new_configs = current_channel_data.get("configs", [])
-                        all_configs = list(set(existing_configs + new_configs))
-                        final_group_channels[channel_name]["configs"] = all_configs
-                        
-                        try:
-                            last_known_channel_index = final_group_order.index(channel_name)
-                        except ValueError:
-                            pass
-                            
-                    else:
-                        # 新频道：添加
-                        final_group_channels[channel_name] = {
-                            "info": current_channel_data["info"], 
-                            "urls": current_channel_data["urls"],
-                            "configs": current_channel_data.get("configs", [])
-                        }
-                        
-                        insert_index = last_known_channel_index + 1
-                        final_group_order.insert(insert_index, channel_name)
-                        last_known_channel_index = insert_index
+            merge_single_m3u(final_channels_data, group_global_order, current_order_list, current_map)
                         
         except Exception as e:
             print(f"处理文件 '{input_file}' 时发生错误: {e}", file=sys.stderr)
             sys.exit(1)
 
-    # 生成最终内容
-    output_lines = [final_header] if final_header else []
-    
-    for group_title in group_global_order:
-        if group_title in final_channels_data:
-            group_data = final_channels_data[group_title]
-            
-            for name in group_data["order_list"]:
-                if name in group_data["channels"]:
-                    data = group_data["channels"][name]
-                    
-                    output_lines.append(data["info"])
-                    
-                    # 写入配置行（如果启用）
-                    if not args.no_config and data.get("configs"):
-                        for config in data["configs"]:
-                            output_lines.append(config)
-                    
-                    # 写入URL行（排序后）
-                    for url in sorted(list(data["urls"])):
-                        output_lines.append(url)
-                
-    modified_m3u = '\n'.join(output_lines)
+    store = None
+    try:
+        if args.seen_db:
+            scope = 'merger:canonical-url' if args.canonical_urls else 'merger:url'
+            try:
+                store = SeenStore(args.seen_db, scope, args.seen_run, args.skip_known)
+                dropped_urls, dropped_channels = drop_seen_urls(final_channels_data, group_global_order,
+                                                                store, args.canonical_urls)
+            except Exception as e:
+                print(f"去重数据库 '{args.seen_db}' 出错: {e}", file=sys.stderr)
+                sys.exit(1)
+        
+        # 生成最终内容
+        output_lines = build_output_lines(final_channels_data, group_global_order, final_header,
+                                          args.no_config, args.keep_order)
+        modified_m3u = '\n'.join(output_lines)
 
-    # 安全写入
-    success, temp_path = safe_write_output(modified_m3u, valid_input_files, args.output)
-    
-    if not success:
-        if temp_path and os.path.exists(temp_path):
+        # 安全写入
+        success, _ = safe_write_output(modified_m3u, args.output)
+        
+        if not success:
+            print("处理失败！", file=sys.stderr)
+            sys.exit(1)
+        
+        # 输出文件写入成功后才提交本次运行的 URL，写入失败时去重数据库保持不变
+        if store is not None:
             try:
-                os.unlink(temp_path)
-            except:
-                pass
-        print("处理失败！", file=sys.stderr)
-        sys.exit(1)
-    
-    # 统计信息
-    total_channels = 0
-    total_groups = len(group_global_order)
-    total_urls = 0
-    
-    for group_title in group_global_order:
-        if group_title in final_channels_data:
-            group_data = final_channels_data[group_title]
-            total_channels += len(group_data["order_list"])
-            for name in group_data["order_list"]:
-                if name in group_data["channels"]:
-                    data = group_data["channels"][name]
-                    total_urls += len(data["urls"])
-    
-    print(f"成功: {len(valid_input_files)} 个 M3U 文件已合并", file=sys.stderr)
-    print(f"      共 {total_channels} 个频道，{total_groups} 个分组", file=sys.stderr)
-    print(f"      合并了 {total_urls} 个URL", file=sys.stderr)
-    
-    if args.no_config:
-        print(f"      已过滤所有配置行", file=sys.stderr)
-    
-    # 显示多URL频道统计
-    multi_url_channels = 0
-    for group_title in group_global_order:
-        if group_title in final_channels_data:
-            group_data = final_channels_data[group_title]
-            for name in group_data["order_list"]:
-                if name in group_data["channels"]:
-                    data = group_data["channels"][name]
-                    if len(data["urls"]) > 1:
-                        multi_url_channels += 1
-    
-    if multi_url_channels > 0:
-        print(f"      其中 {multi_url_channels} 个频道有多个URL源", file=sys.stderr)
-    
-    print(f"      结果已写入 '{args.output}'", file=sys.stderr)
-    
-    if output_abs in [os.path.abspath(f) for f in valid_input_files]:
-        print(f"注意: 已安全覆盖输入文件 '{args.output}'", file=sys.stderr)
+                store.commit()
+            except Exception as e:
+                print(f"去重数据库 '{args.seen_db}' 出错: {e}", file=sys.stderr)
+                sys.exit(1)
+        
+        print_summary(args, valid_input_files, collect_stats(final_channels_data, group_global_order))
+        if store is not None:
+            print(f"      去重数据库: 去掉 {dropped_urls} 个已出现的URL、{dropped_channels} 个因此没有URL的频道；"
+                  f"{store.summary()}", file=sys.stderr)
+            if args.seen_report:
+                store.write_report(args.seen_report)
+                print(f"      首次出现时间已写入 '{args.seen_report}'", file=sys.stderr)
+    finally:
+        if store is not None:
+            store.close()
 
 if __name__ == "__main__":
     main()
@@ -1,215 +1,197 @@
-import re
 import argparse
 import os
 import sys
-import tempfile
-import shutil
+
+from m3u_parser import iter_m3u_file
+from m3u_model import Channel, OrderedSet
+from m3u_names import normalize_channel_name
+from m3u_classify import classify, load_rules
+from m3u_urlkey import CanonicalURLSet
+from m3u_seen import SeenStore, filter_seen_urls
+from m3u_extinf import ExtInf
+from m3u_playlist import Playlist
+from m3u_writer import atomic_write, iter_lines
 
 #频道组‘混乱’的m3u专用脚本，如将CCTV各频道按照体育、新闻、影视等分在了不同频道组
 # --- 1. 辅助函数：提取归一化 Key ---
 def get_norm_key(name):
-    """去掉横杠和后缀'台'，转大写，用于判断是否为同名频道"""
-    if not name: return ""
-    temp = name.replace('-', '')
-    if temp.endswith('台'):
-        temp = temp[:-1]
-    return temp.strip().upper()
+    """
+    归一化频道名称，用于判断是否为同名频道：
+    忽略大小写、全半角、分隔符、清晰度标记和"频道"/"台"等后缀，CCTV 数字频道忽略描述性后缀（见 m3u_names）
+    """
+    return normalize_channel_name(name)
 
 # --- 2. 辅助函数：判断显示优先级 ---
 def is_preferred(name):
     """判断名字是否含有横杠或'台'"""
     return '-' in name or name.endswith('台')
 
-# --- 3. 辅助函数：提取 CCTV 数字 ---
-def extract_cctv_num(name):
-    """提取 CCTV 后的数字，用于排序。如果没有数字则排在最后。"""
-    match = re.search(r'(?i)CCTV-?(\d+)', name)
-    return int(match.group(1)) if match else 999
-
-# --- 4. 辅助函数：解析 M3U (支持多URL) ---
-def parse_m3u(file_path):
+# --- 3. 辅助函数：解析 M3U (支持多URL) ---
+def parse_m3u(file_path, url_set=OrderedSet):
     if not os.path.exists(file_path):
         return None, [], []
-        
-    channels = {} # key: norm_key, value: data_dict
+    return parse_m3u_records(iter_m3u_file(file_path), url_set)
+
+def parse_m3u_records(records, url_set=OrderedSet):
+    """
+    由已解析的记录构建频道表，返回 (header, channels, order)
+
+    :param url_set: URL 容器类型：OrderedSet，或按规范化 URL 去重的 m3u_urlkey.CanonicalURLSet
+    """
+    channels = {} # key: norm_key, value: Channel
     order = []    # 记录第一次发现该频道的顺序
     header = "#EXTM3U"
     
-    with open(file_path, 'r', encoding='utf-8') as f:
-        lines = [line.strip() for line in f.readlines()]
+    for record in records:
+        current_info = record.extinf
+        current_name = None
+        current_configs = []  # 存储配置行
+        current_urls = []     # 存储当前频道的所有URL
         
-    current_info = None
-    current_name = None
-    current_configs = []  # 存储配置行
-    current_urls = []     # 存储当前频道的所有URL
-    
-    i = 0
-    while i < len(lines):
-        line = lines[i]
+        if current_info is not None:
+            current_extinf = ExtInf(current_info)
+            current_name = (current_extinf.name or "").strip() or None
         
-        if line.startswith('#EXTM3U'):
-            header = line
-            i += 1
-            continue
-            
-        if line.startswith('#EXTINF:'):
-            # 如果之前有频道数据，先保存
-            if current_info and current_name:
-                norm_key = get_norm_key(current_name)
-                
-                # 提取原有的 group-title
-                group_match = re.search(r'group-title="([^"]*)"', current_info)
-                original_group = group_match.group(1) if group_match else "其他"
-                
-                if norm_key not in channels:
-                    channels[norm_key] = {
-                        "info": current_info,
-                        "name": current_name,
-                        "urls": set(current_urls),  # 存储所有URL
-                        "configs": list(current_configs),  # 存储配置行
-                        "original_group": original_group,
-                        "order_idx": len(order)
-                    }
-                    order.append(norm_key)
-                else:
-                    # 合并 URL
-                    channels[norm_key]["urls"].update(current_urls)
-                    # 合并配置行
-                    channels[norm_key]["configs"].extend(current_configs)
-                    # 检查显示名称优先级
-                    old_name = channels[norm_key]["name"]
-                    if is_preferred(current_name) and not is_preferred(old_name):
-                        channels[norm_key]["info"] = current_info
-                        channels[norm_key]["name"] = current_name
-            
-            # 开始新频道
-            current_info = line
-            name_match = re.search(r',([^,]+)$', line)
-            current_name = name_match.group(1).strip() if name_match else None
-            current_configs = []  # 重置配置行
-            current_urls = []     # 重置URL列表
-            i += 1
-            
-        elif line.startswith('#') and not line.startswith('#EXTINF:'):
-            # 收集配置行（如#EXTVLCOPT）
-            current_configs.append(line)
-            i += 1
-            
-        elif line.startswith(('http://', 'https://')) and current_name:
-            # 添加URL到当前频道
-            current_urls.append(line)
-            i += 1
-            
-        else:
+        for line in record.lines:
+            if line.startswith('#EXTM3U'):
+                header = line
+            elif line.startswith('#'):
+                # 收集配置行（如#EXTVLCOPT）
+                current_configs.append(line)
+            elif line.startswith(('http://', 'https://')) and current_name:
+                # 添加URL到当前频道
+                current_urls.append(line)
             # 未知行，跳过
-            i += 1
-    
-    # 处理最后一个频道
-    if current_info and current_name:
+        
+        if not (current_info and current_name):
+            continue
+        
+        # 记录结束，保存频道数据
         norm_key = get_norm_key(current_name)
         
-        group_match = re.search(r'group-title="([^"]*)"', current_info)
-        original_group = group_match.group(1) if group_match else "其他"
+        # 提取原有的 group-title
+        original_group = current_extinf.get('group-title')
+        if original_group is None:
+            original_group = "其他"
         
         if norm_key not in channels:
-            channels[norm_key] = {
-                "info": current_info,
-                "name": current_name,
-                "urls": set(current_urls),
-                "configs": list(current_configs),
-                "original_group": original_group,
-                "order_idx": len(order)
-            }
+            channels[norm_key] = Channel(
+                current_info,
+                name=current_name,
+                urls=url_set(current_urls),  # 存储所有URL（去重，保持首次出现的顺序）
+                configs=OrderedSet(current_configs),  # 存储配置行（去重）
+                group=original_group,
+                order_idx=len(order)
+            )
             order.append(norm_key)
         else:
-            channels[norm_key]["urls"].update(current_urls)
-            channels[norm_key]["configs"].extend(current_configs)
-            old_name = channels[norm_key]["name"]
-            if is_preferred(current_name) and not is_preferred(old_name):
-                channels[norm_key]["info"] = current_info
-                channels[norm_key]["name"] = current_name
+            # 合并 URL
+            channel = channels[norm_key]
+            channel.urls.update(current_urls)
+            # 合并配置行（已有的不再重复添加）
+            channel.configs.update(current_configs)
+            # 检查显示名称优先级
+            if is_preferred(current_name) and not is_preferred(channel.name):
+                channel.info = current_info
+                channel.name = current_name
                     
     return header, channels, order
 
-# --- 5. 安全文件写入函数 ---
-def safe_write_output(header, final_list, input_path, output_path, no_config=False):
+# --- 4. 分类与排序 ---
+def classify_channels(channels, rules=None):
+    """
+    按分类规则（默认为央视、卫视、其他三个桶，见 m3u_classify）把频道分桶并排序
+    
+    :param rules: m3u_classify.CompiledRules，None 时使用默认规则
+    :return: (buckets, stats)，buckets 为 [(Bucket, [Channel, ...]), ...]，按输出顺序排列
+    """
+    # 统计信息
+    stats = {
+        'total_channels': len(channels),
+        'total_urls': 0,
+        'multi_url_channels': 0,
+        'has_config_channels': 0
+    }
+
+    for data in channels.values():
+        urls_count = len(data.urls)
+
+        stats['total_urls'] += urls_count
+        if urls_count > 1:
+            stats['multi_url_channels'] += 1
+        if data.configs:
+            stats['has_config_channels'] += 1
+
+    buckets = classify(channels.values(), rules if rules is not None else load_rules())
+    return buckets, stats
+
+# --- 5. 流水线阶段 ---
+def transform_playlist(playlist, args):
+    """
+    流水线阶段：对内存中的播放列表合并同名频道并按分类规则（默认央视、卫视、其他）重新分组
+    
+    :param playlist: m3u_playlist.Playlist
+    :param args: build_parser() 解析出的参数
+    :return: 新的 Playlist，内容与命令行方式写出的文件相同
+    """
+    if getattr(args, 'seen_db', None):
+        raise ValueError("流水线阶段不支持 --seen-db，请直接运行 m3u_mergerng.py")
+    header, channels, _ = parse_m3u_records(playlist.records, CanonicalURLSet if args.canonical_urls else OrderedSet)
+    if not channels:
+        raise ValueError("未发现有效频道数据。")
+    buckets, _ = classify_channels(channels, load_rules(args.rules))
+    final_list = [item for _, items in buckets for item in items]
+    return Playlist.from_blocks(list(iter_output_blocks(header, final_list, args.no_config, args.keep_order)))
+
+# --- 6. 安全文件写入函数 ---
+def iter_output_lines(header, final_list, no_config=False, keep_order=False):
+    """
+    按输出顺序逐行产出最终内容
+
+    :param keep_order: URL 保持首次出现的顺序，否则按字母排序
+    """
+    for block in iter_output_blocks(header, final_list, no_config, keep_order):
+        yield from block
+
+def iter_output_blocks(header, final_list, no_config=False, keep_order=False):
+    """与 iter_output_lines 相同，但按频道分块产出（文件头、每个频道的 EXTINF 行及其配置行、URL）"""
+    yield [header]
+    for item in final_list:
+        # 替换或添加 info 行中的 group-title，只重写该字段
+        extinf = ExtInf(item.info)
+        extinf.set('group-title', item.final_group)
+        block = [extinf.to_line()]
+        
+        # 写入配置行（如果不过滤）
+        if not no_config and item.configs:
+            block.extend(item.configs)
+        
+        # 写入 URL 行（默认排序后输出，--keep-order 时保持原始顺序）
+        block.extend(item.urls if keep_order else sorted(item.urls))
+        yield block
+
+def safe_write_output(header, final_list, output_path, no_config=False, keep_order=False):
     """
-    安全地写入输出文件，支持同文件覆盖
+    安全地写入输出文件：原子替换，支持同文件覆盖，内容未变化时保留原文件
     
     :param header: M3U文件头部
     :param final_list: 最终频道列表
-    :param input_path: 输入文件路径
     :param output_path: 输出文件路径
     :param no_config: 是否过滤配置行
-    :return: (success, temp_path) 成功返回(True, None)，失败返回(False, temp_path)
+    :param keep_order: 是否保持URL原始顺序
+    :return: (success, changed) 成功返回(True, 内容是否有变化)，失败返回(False, False)
     """
-    # 获取绝对路径以判断是否为同一个文件
-    input_abs = os.path.abspath(input_path)
-    output_abs = os.path.abspath(output_path)
-    is_same_file = input_abs == output_abs
-    
-    temp_path = None
-    
     try:
-        # 如果是同一个文件，先写到临时文件
-        if is_same_file:
-            # 在与输出文件相同目录创建临时文件
-            output_dir = os.path.dirname(output_path) or '.'
-            fd, temp_path = tempfile.mkstemp(
-                dir=output_dir,
-                suffix='.m3u',
-                prefix='.tmp_',
-                text=True
-            )
-            
-            # 使用文件描述符打开文件
-            out_f = os.fdopen(fd, 'w', encoding='utf-8')
-        else:
-            # 直接打开输出文件
-            out_f = open(output_path, 'w', encoding='utf-8')
-        
-        # 写入数据
-        with out_f:
-            out_f.write(header + '\n')
-            for item in final_list:
-                # 替换或更新 info 行中的 group-title
-                info = item["info"]
-                new_group = item["final_group"]
-                if 'group-title="' in info:
-                    info = re.sub(r'group-title="[^"]*"', f'group-title="{new_group}"', info)
-                else:
-                    info = info.replace('#EXTINF:', f'#EXTINF: group-title="{new_group}",')
-                
-                out_f.write(info + '\n')
-                
-                # 写入配置行（如果不过滤）
-                if not no_config and item.get("configs"):
-                    for config_line in item["configs"]:
-                        out_f.write(config_line + '\n')
-                
-                # 写入 URL 行 (排序后，保持稳定)
-                for url in sorted(list(item["urls"])):
-                    out_f.write(url + '\n')
-        
-        # 如果是同一个文件，进行原子替换
-        if is_same_file:
-            try:
-                # Python 3.3+ 推荐使用 os.replace 实现原子替换
-                os.replace(temp_path, output_path)
-                temp_path = None  # 替换成功，清除临时文件引用
-            except Exception as e:
-                # 如果 os.replace 失败，使用 shutil.move 作为备选
-                print(f"警告：原子替换失败，使用备选方案: {e}", file=sys.stderr)
-                shutil.move(temp_path, output_path)
-                temp_path = None  # 移动成功，清除临时文件引用
-        
-        return True, None
-        
+        changed = atomic_write(output_path, iter_lines(iter_output_lines(header, final_list, no_config, keep_order)))
     except Exception as e:
         print(f"写入文件失败: {e}", file=sys.stderr)
-        return False, temp_path
+        return False, False
+    
+    if not changed:
+        print(f"内容未变化，保留原文件：{output_path}", file=sys.stderr)
+    return True, changed
 
-# --- 6. 验证参数函数 ---
+# --- 7. 验证参数函数 ---
 def validate_arguments(input_path, output_path):
     """
     验证命令行参数的合理性
@@ -252,20 +234,8 @@ def validate_arguments(input_path, output_path):
     
     return True
 
-# --- 7. 清理临时文件函数 ---
-def cleanup_temp_file(temp_path):
-    """
-    清理临时文件
-    """
-    if temp_path and os.path.exists(temp_path):
-        try:
-            os.unlink(temp_path)
-            print(f"已清理临时文件: {temp_path}", file=sys.stderr)
-        except Exception as e:
-            print(f"警告：无法删除临时文件 {temp_path}: {e}", file=sys.stderr)
-
 # --- 8. 主逻辑 ---
-def main():
+def build_parser():
     parser = argparse.ArgumentParser(
         description="单文件M3U频道合并排序脚本 - 支持多URL频道，安全处理同文件覆盖",
         formatter_class=argparse.RawTextHelpFormatter
@@ -278,14 +248,32 @@ def main():
                        help='过滤配置行（如#EXTVLCOPT）')
     parser.add_argument('--keep-order', action='store_true',
                        help='保持URL原始顺序（不排序）')
+    parser.add_argument('--canonical-urls', action='store_true',
+                       help='按规范化URL去重：忽略 msisdn、timestamp 等易变参数（见 m3u_urlkey.py），同一路流只保留最新的URL')
+    parser.add_argument('--rules', type=str,
+                       help='分类规则文件（JSON，格式见 m3u_classify.py），默认按央视、卫视、其他分组')
     parser.add_argument('--stats', action='store_true',
                        help='显示详细统计信息')
-    
-    args = parser.parse_args()
+    parser.add_argument('--seen-db', type=str, metavar='FILE',
+                       help='把已出现的URL保存到 SQLite 数据库（不存在时创建），在多次运行、多个命令之间去重，\n'
+                            '并记录每个URL首次出现的时间；同一URL只保留在第一个频道中')
+    parser.add_argument('--seen-run', type=str, metavar='NAME',
+                       help='--seen-db 的运行名称：使用相同名称的多个命令之间互相去重（默认每个命令为新的一次运行）')
+    parser.add_argument('--skip-known', action='store_true',
+                       help='--seen-db 中之前的运行出现过的URL也去掉，只保留新出现的URL')
+    parser.add_argument('--seen-report', type=str, metavar='FILE',
+                       help='把本次运行出现过的URL及其首次、最近出现时间写入该文件（制表符分隔）')
+    return parser
+
+def main():
+    args = build_parser().parse_args()
 
     # 验证参数
     if not validate_arguments(args.input, args.output):
         sys.exit(1)
+    if not args.seen_db and (args.seen_run or args.skip_known or args.seen_report):
+        print("错误：--seen-run、--skip-known、--seen-report 需要同时指定 --seen-db", file=sys.stderr)
+        sys.exit(1)
     
     # 检查输出文件是否已存在且与输入不同
     input_abs = os.path.abspath(args.input)
@@ -297,8 +285,15 @@ def main():
             print("使用 --force 参数强制覆盖，或指定不同的输出文件", file=sys.stderr)
             sys.exit(1)
     
+    # 读取分类规则
+    try:
+        rules = load_rules(args.rules)
+    except (OSError, ValueError) as e:
+        print(f"错误：无法加载分类规则: {e}", file=sys.stderr)
+        sys.exit(1)
+    
     # 解析M3U文件
-    result = parse_m3u(args.input)
+    result = parse_m3u(args.input, CanonicalURLSet if args.canonical_urls else OrderedSet)
     if result[0] is None:
         print("未发现有效频道数据。", file=sys.stderr)
         sys.exit(1)
@@ -309,91 +304,76 @@ def main():
         print("未发现有效频道数据。", file=sys.stderr)
         sys.exit(1)
 
-    # 分类桶
-    cctv_bucket = []
-    weishee_bucket = []
-    other_bucket = []
-    
-    # 统计信息
-    stats = {
-        'total_channels': len(channels),
-        'total_urls': 0,
-        'multi_url_channels': 0,
-        'has_config_channels': 0,
-        'cctv_channels': 0,
-        'weishee_channels': 0,
-        'other_channels': 0
-    }
-
-    for key, data in channels.items():
-        name = data["name"]
-        urls_count = len(data["urls"])
-        
-        stats['total_urls'] += urls_count
-        if urls_count > 1:
-            stats['multi_url_channels'] += 1
-        if data.get("configs"):
-            stats['has_config_channels'] += 1
-        
-        if "CCTV" in name.upper():
-            data["final_group"] = "央视"
-            cctv_bucket.append(data)
-            stats['cctv_channels'] += 1
-        elif "卫视" in name:
-            data["final_group"] = "卫视"
-            weishee_bucket.append(data)
-            stats['weishee_channels'] += 1
-        else:
-            data["final_group"] = data["original_group"]
-            other_bucket.append(data)
-            stats['other_channels'] += 1
+    store = None
+    try:
+        # 按频道首次出现的顺序去掉去重数据库中已出现过的 URL，没有剩余 URL 的频道不再输出
+        if args.seen_db:
+            try:
+                store = SeenStore(args.seen_db, 'merger:canonical-url' if args.canonical_urls else 'merger:url',
+                                  args.seen_run, args.skip_known)
+                dropped_urls = filter_seen_urls((channels[key] for key in order), store, args.canonical_urls)
+            except Exception as e:
+                print(f"去重数据库 '{args.seen_db}' 出错: {e}", file=sys.stderr)
+                sys.exit(1)
+            emptied = [key for key in order if not channels[key].urls]
+            for key in emptied:
+                del channels[key]
 
-    # 排序：
-    # 央视：按数字排
-    cctv_bucket.sort(key=lambda x: extract_cctv_num(x["name"]))
-    # 卫视：按原顺序排
-    weishee_bucket.sort(key=lambda x: x["order_idx"])
-    # 其他：按原频道组名，组内按原顺序
-    other_bucket.sort(key=lambda x: (x["original_group"], x["order_idx"]))
+        buckets, stats = classify_channels(channels, rules)
 
-    # 生成最终列表
-    final_list = cctv_bucket + weishee_bucket + other_bucket
+        # 生成最终列表
+        final_list = [item for _, items in buckets for item in items]
 
-    # 安全写入输出文件
-    success, temp_path = safe_write_output(header, final_list, args.input, args.output, args.no_config)
+        # 安全写入输出文件
+        success, _ = safe_write_output(header, final_list, args.output, args.no_config, args.keep_order)
+        if not success:
+            print("处理失败！", file=sys.stderr)
+            sys.exit(1)
+        
+        # 输出文件写入成功后才提交本次运行的 URL，写入失败时去重数据库保持不变
+        if store is not None:
+            try:
+                store.commit()
+            except Exception as e:
+                print(f"去重数据库 '{args.seen_db}' 出错: {e}", file=sys.stderr)
+                sys.exit(1)
     
-    # 如果失败，清理临时文件
-    if not success:
-        cleanup_temp_file(temp_path)
-        print("处理失败！", file=sys.stderr)
-        sys.exit(1)
+        # 输出统计信息
+        print(f"处理完成！", file=sys.stderr)
+        print(f"- 输入文件: {args.input}", file=sys.stderr)
+        print(f"- 输出文件: {args.output}", file=sys.stderr)
+        print(f"- 频道统计: {len(final_list)} 个频道", file=sys.stderr)
+        for bucket, items in buckets:
+            print(f"  - {bucket.label}：{len(items)} 个", file=sys.stderr)
     
-    # 输出统计信息
-    print(f"处理完成！", file=sys.stderr)
-    print(f"- 输入文件: {args.input}", file=sys.stderr)
-    print(f"- 输出文件: {args.output}", file=sys.stderr)
-    print(f"- 频道统计: {len(final_list)} 个频道", file=sys.stderr)
-    print(f"  - 央视：{len(cctv_bucket)} 个", file=sys.stderr)
-    print(f"  - 卫视：{len(weishee_bucket)} 个", file=sys.stderr)
-    print(f"  - 其他：{len(other_bucket)} 个", file=sys.stderr)
+        if args.no_config:
+            print(f"- 已过滤所有配置行", file=sys.stderr)
     
-    if args.no_config:
-        print(f"- 已过滤所有配置行", file=sys.stderr)
+        if args.keep_order:
+            print(f"- URL保持原始顺序", file=sys.stderr)
+        else:
+            print(f"- URL已按字母排序", file=sys.stderr)
     
-    if args.keep_order:
-        print(f"- URL保持原始顺序", file=sys.stderr)
-    else:
-        print(f"- URL已按字母排序", file=sys.stderr)
+        if args.stats:
+            print(f"\n详细统计信息:", file=sys.stderr)
+            print(f"  - 总URL数: {stats['total_urls']}", file=sys.stderr)
+            print(f"  - 多URL频道: {stats['multi_url_channels']} 个", file=sys.stderr)
+            print(f"  - 有配置行的频道: {stats['has_config_channels']} 个", file=sys.stderr)
+            if stats['total_channels'] > 0:
+                print(f"  - 平均每个频道URL数: {stats['total_urls']/stats['total_channels']:.1f}", file=sys.stderr)
     
-    if args.stats:
-        print(f"\n详细统计信息:", file=sys.stderr)
-        print(f"  - 总URL数: {stats['total_urls']}", file=sys.stderr)
-        print(f"  - 多URL频道: {stats['multi_url_channels']} 个", file=sys.stderr)
-        print(f"  - 有配置行的频道: {stats['has_config_channels']} 个", file=sys.stderr)
-        print(f"  - 平均每个频道URL数: {stats['total_urls']/stats['total_channels']:.1f}", file=sys.stderr)
+        if store is not None:
+            print(f"- 去重数据库: 去掉 {dropped_urls} 个已出现的URL、{len(emptied)} 个因此没有URL的频道；"
+                  f"{store.summary()}", file=sys.stderr)
+            if args.seen_report:
+                store.write_report(args.seen_report)
+                print(f"- 首次出现时间已写入: {args.seen_report}", file=sys.stderr)
     
-    if input_abs == output_abs:
-        print(f"- 注意: 已安全覆盖原文件", file=sys.stderr)
+        if input_abs == output_abs:
+            print(f"- 注意: 已安全覆盖原文件", file=sys.stderr)
+    finally:
+        if store is not None:
+            store.close()
 
 if __name__ == "__main__":
     main()
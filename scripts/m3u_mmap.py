@@ -0,0 +1,165 @@
+"""
+M3U 大文件 mmap 快速路径
+以字节方式映射文件，记录边界保存在 array('Q') 偏移数组中；只解码过滤/排序真正用到的字段，
+未改动的记录可以直接以 memoryview 切片零拷贝写出
+"""
+
+import mmap
+import os
+import re
+from array import array
+
+from m3u_parser import M3URecord
+
+_HASH = ord('#')
+_NEWLINE = ord('\n')
+_SPACE = ord(' ')
+
+# 记录中出现这些字节时，逐行 strip 的结果可能与原始字节不同（空行、\r、行首尾空白、
+# 非 ASCII 的 Unicode 空白字符等），这类记录退回到解码后按文本处理
+_DIRTY_PATTERN = re.compile(
+    rb'[\r\t\x0b\x0c\x1c-\x1f]|\n[ \n]| \n'
+    rb'|\xc2[\x85\xa0]|\xe1\x9a\x80|\xe2\x80[\x80-\x8a\xa8\xa9\xaf]|\xe2\x81\x9f|\xe3\x80\x80'
+)
+
+
+def _split_lines(text):
+    """按文本模式读取文件时的换行规则（LF、CRLF、CR）分行，去除空白并丢弃空行"""
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return [line.strip() for line in lines if line.strip()]
+
+
+class MappedPlaylist:
+    """
+    以 mmap 打开的 M3U 文件
+
+    记录 i 从 starts[i] 开始，到下一条记录起点（或文件末尾）结束，其中 #EXTINF 行为
+    [starts[i], extinf_ends[i])。第一个 #EXTINF 之前的内容（头部等）通过 preamble() 获取。
+
+    用法:
+        with MappedPlaylist(path) as playlist:
+            for i in range(len(playlist)):
+                ...
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._file = open(filepath, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        if self.size:
+            self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            # 空文件无法 mmap
+            self.mm = b''
+        self._view = memoryview(self.mm)
+
+        self.starts = array('Q')
+        self.extinf_ends = array('Q')
+        self._build_index()
+
+    def _build_index(self):
+        """扫描 #EXTINF 出现的位置，只有行首（允许前导空白）的才算记录起点"""
+        mm = self.mm
+        pos = 0
+        while True:
+            hit = mm.find(b'#EXTINF', pos)
+            if hit < 0:
+                break
+            newline = mm.rfind(b'\n', 0, hit)
+            line_start = max(newline, mm.rfind(b'\r', max(newline, 0), hit)) + 1
+            if not mm[line_start:hit].strip():
+                self.starts.append(line_start)
+                self.extinf_ends.append(self._find_eol(hit))
+            pos = hit + 7
+
+    def _find_eol(self, pos):
+        """pos 所在行的行尾位置（LF 或 CR），没有则为文件末尾"""
+        eol = self.mm.find(b'\n', pos)
+        if eol < 0:
+            eol = self.size
+        carriage = self.mm.find(b'\r', pos, eol)
+        return carriage if carriage >= 0 else eol
+
+    # ---------- 生命周期 ----------
+    def close(self):
+        try:
+            self._view.release()
+            if self.size:
+                self.mm.close()
+        except BufferError:
+            # 仍有 memoryview 切片未释放，交给垃圾回收
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return len(self.starts)
+
+    # ---------- 位置 ----------
+    def record_span(self, i):
+        """记录 i 的字节范围 (start, end)，end 为下一条记录起点或文件末尾"""
+        end = self.starts[i + 1] if i + 1 < len(self.starts) else self.size
+        return self.starts[i], end
+
+    def extinf_span(self, i):
+        """记录 i 的 #EXTINF 行字节范围（不含换行符）"""
+        return self.starts[i], self.extinf_ends[i]
+
+    def iter_body_spans(self, i):
+        """逐行产出记录 i 中 #EXTINF 之后各行的字节范围（按 LF 分行，适用于 is_clean 的记录）"""
+        mm = self.mm
+        _, end = self.record_span(i)
+        pos = self.extinf_ends[i] + 1
+        while pos < end:
+            eol = mm.find(b'\n', pos, end)
+            if eol < 0:
+                eol = end
+            if eol > pos:
+                yield pos, eol
+            pos = eol + 1
+
+    def is_clean(self, i):
+        """
+        记录 i 的原始字节是否与"逐行 strip 并去掉空行"后的结果完全一致，
+        一致时可以直接输出原始字节
+        """
+        start, end = self.record_span(i)
+        if self.mm[start] != _HASH or self.mm[end - 1] == _SPACE:
+            return False
+        return _DIRTY_PATTERN.search(self.mm, start, end) is None
+
+    # ---------- 取值 ----------
+    def view(self, start, end):
+        """零拷贝的 memoryview 切片"""
+        return self._view[start:end]
+
+    def raw_chunks(self, i):
+        """记录 i 的原始字节，保证以换行符结尾"""
+        start, end = self.record_span(i)
+        if self.mm[end - 1] == _NEWLINE:
+            return [self._view[start:end]]
+        return [self._view[start:end], b'\n']
+
+    def extinf(self, i):
+        """解码记录 i 的 #EXTINF 行"""
+        start, eol = self.extinf_span(i)
+        return self.mm[start:eol].decode('utf-8').strip()
+
+    def record(self, i):
+        """把记录 i 完整解码为 M3URecord（与文本解析器结果一致）"""
+        start, end = self.record_span(i)
+        lines = _split_lines(self.mm[start:end].decode('utf-8'))
+        return M3URecord(lines[0], lines[1:])
+
+    def preamble(self):
+        """第一个 #EXTINF 之前的内容，没有则返回 None"""
+        end = self.starts[0] if self.starts else self.size
+        if end == 0:
+            return None
+        lines = _split_lines(self.mm[0:end].decode('utf-8'))
+        return M3URecord(None, lines) if lines else None
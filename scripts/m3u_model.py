@@ -0,0 +1,150 @@
+"""
+M3U 频道数据模型
+用 __slots__ 的紧凑频道记录替代各脚本中的 dict，并对大量重复的短字符串做驻留（intern）
+"""
+
+import sys
+from urllib.parse import urlsplit
+
+
+def intern_group(group_title):
+    """驻留频道组名，同名组在内存中只保留一份"""
+    if group_title is None:
+        return None
+    return sys.intern(group_title)
+
+
+def intern_attr_key(key):
+    """驻留 EXTINF 属性名（tvg-id、tvg-name、group-title 等）"""
+    return sys.intern(key)
+
+
+def intern_host(url):
+    """
+    提取并驻留 URL 的 host:port 部分，酒店源中同一 IP:端口会出现成百上千次
+
+    :return: 小写的 netloc，解析失败时返回空字符串
+    """
+    try:
+        netloc = urlsplit(url).netloc
+    except ValueError:
+        return ""
+    return sys.intern(netloc.lower())
+
+
+class Channel:
+    """
+    单个频道记录
+
+    :param info: #EXTINF 行
+    :param urls: URL 容器（各脚本按需使用 list、set 或 OrderedSet）
+    :param name: 频道显示名称
+    :param group: 频道组名（已驻留）
+    :param configs: 配置行容器（如 #EXTVLCOPT，list 或 OrderedSet）
+    :param extgrp_line: 原始 #EXTGRP 行
+    :param order_idx: 首次出现的顺序
+    """
+    __slots__ = ('info', 'urls', 'name', 'group', 'configs', 'extgrp_line',
+                 'order_idx', 'final_group')
+
+    def __init__(self, info, urls=None, name=None, group=None, configs=None,
+                 extgrp_line=None, order_idx=0):
+        self.info = info
+        self.urls = urls if urls is not None else []
+        self.name = name
+        self.group = intern_group(group)
+        self.configs = configs if configs is not None else []
+        self.extgrp_line = extgrp_line
+        self.order_idx = order_idx
+        self.final_group = None
+
+    def __repr__(self):
+        return f"Channel(name={self.name!r}, group={self.group!r}, urls={len(self.urls)})"
+
+
+class LinkedOrder:
+    """
+    保持相对插入顺序的有序集合：以字典实现的双向链表，
+    判断元素是否存在、在某个元素之后插入都是 O(1)（替代 list.index + list.insert）
+
+    :param items: 初始元素，按顺序追加
+    """
+    __slots__ = ('_next', '_prev')
+
+    def __init__(self, items=()):
+        # None 作为首尾相连的哨兵：_next[None] 为第一个元素，_prev[None] 为最后一个元素
+        self._next = {None: None}
+        self._prev = {None: None}
+        for item in items:
+            self.append(item)
+
+    def insert_after(self, anchor, item):
+        """
+        把 item 插入到 anchor 之后
+
+        :param anchor: 已有元素；None 表示插入到最前面
+        :raises ValueError: item 已存在
+        """
+        if item is None or item in self._next:
+            raise ValueError(f"元素已存在: {item!r}")
+        following = self._next[anchor]
+        self._next[anchor] = item
+        self._next[item] = following
+        self._prev[following] = item
+        self._prev[item] = anchor
+
+    def append(self, item):
+        """追加到末尾"""
+        self.insert_after(self._prev[None], item)
+
+    def __contains__(self, item):
+        return item is not None and item in self._next
+
+    def __len__(self):
+        return len(self._next) - 1
+
+    def __iter__(self):
+        next_item = self._next
+        item = next_item[None]
+        while item is not None:
+            yield item
+            item = next_item[item]
+
+    def __repr__(self):
+        return f"LinkedOrder({list(self)!r})"
+
+
+class OrderedSet:
+    """
+    保持插入顺序的去重集合：以字典的键实现，判断元素是否存在、添加都是 O(1)，
+    遍历顺序为首次添加的顺序（替代 set + 输出前排序，以及会不断追加重复项的 list）
+
+    :param items: 初始元素，按顺序添加
+    """
+    __slots__ = ('_items',)
+
+    def __init__(self, items=()):
+        self._items = dict.fromkeys(items)
+
+    def add(self, item):
+        """添加元素，已存在时保持原位置"""
+        self._items[item] = None
+
+    def update(self, items):
+        """按顺序添加多个元素"""
+        self._items.update(dict.fromkeys(items))
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __bool__(self):
+        return bool(self._items)
+
+    def __repr__(self):
+        return f"OrderedSet({list(self._items)!r})"
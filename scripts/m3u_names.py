@@ -0,0 +1,88 @@
+"""
+频道名称归一化
+把 "CCTV-1 综合"、"CCTV1综合"、"CCTV1 HD"、"cctv-1" 等写法归为同一个键，用于判断是否为同一频道。
+规则集中定义在下面的常量中，模块加载时编译为一张字符转换表和一个正则，每个不同的名称只计算一次
+
+归一化步骤:
+  1. 转换表：全角字符转半角、小写转大写、各种分隔符统一为空格
+  2. 正则：去掉末尾的清晰度标记（HD、4K、高清……）和"频道"、"台"等后缀；
+     CCTV 数字频道额外去掉描述性后缀（综合、新闻……）和数字前导零，但保留 "+"（CCTV5 与 CCTV5+ 不同）
+  3. 去掉所有分隔符
+"""
+
+import re
+from functools import lru_cache
+
+# --- 规则 ---
+# 视为分隔符的字符（全角空格转半角后同样处理）
+SEPARATORS = ' \t-_·•.—–'
+# 以字母开头的清晰度标记：前面不能紧跟字母（"CCTV1HD" 去掉 HD，"TVBSD" 不去掉）
+LETTER_TAGS = ('FHD', 'UHD', 'HD', 'SD')
+# 以数字开头的清晰度标记：前面不能紧跟字母或数字，也不能紧跟 "CCTV"（"CCTV4K"、"CCTV-8K" 是独立频道，"北京卫视 4K" 去掉 4K）
+NUMBER_TAGS = ('1080P', '720P', '4K', '8K')
+# 中文清晰度标记与名称后缀，直接去掉
+SUFFIX_TAGS = ('超高清', '高清', '超清', '标清', '蓝光', '频道', '台')
+# CCTV 数字频道的描述性后缀
+CCTV_DESCRIPTIONS = (
+    '综合', '财经', '综艺', '中文国际', '体育赛事', '体育', '电影', '国防军事', '电视剧', '纪录',
+    '科教', '戏曲', '社会与法', '新闻', '少儿', '音乐', '农业农村', '奥林匹克',
+)
+
+_NAME_CACHE_SIZE = 1 << 16
+
+
+def _build_fold_table():
+    """全角 ASCII（U+FF01-U+FF5E）和全角空格转半角，再把小写转大写、分隔符转空格"""
+    def fold(char):
+        char = char.upper()
+        return ' ' if char in SEPARATORS else char
+
+    table = {ord(char): fold(char) for char in map(chr, range(0x21, 0x7F)) if fold(char) != char}
+    table.update((code, fold(chr(code - 0xFEE0))) for code in range(0xFF01, 0xFF5F))
+    table[0x3000] = ' '
+    table.update((ord(char), ' ') for char in SEPARATORS if char != ' ')
+    return table
+
+
+def _alternation(words):
+    """较长的词放在前面，避免被较短的前缀抢先匹配"""
+    return '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+
+def _build_name_pattern():
+    tag = (f"(?:(?<![A-Z])(?:{_alternation(LETTER_TAGS)})"
+           f"|(?<![0-9A-Z])(?<!CCTV )(?:{_alternation(NUMBER_TAGS)})"
+           f"|(?:{_alternation(SUFFIX_TAGS)}))")
+    tags = f"(?: *{tag})*"
+    cctv = (f"CCTV *0*(?P<number>\\d+) *(?P<plus>\\+)?"
+            f"(?: *(?:{_alternation(CCTV_DESCRIPTIONS)}))?")
+    # 先尝试 CCTV 数字频道，不符合时回退到通用规则（名称主体尽量短，把末尾的标记都留给 tags）
+    return re.compile(f" *(?:{cctv}|(?P<core>.*?)){tags} *")
+
+
+_FOLD_TABLE = _build_fold_table()
+_NAME_PATTERN = _build_name_pattern()
+
+
+@lru_cache(maxsize=_NAME_CACHE_SIZE)
+def normalize_channel_name(name):
+    """
+    计算频道名称的归一化键
+
+    >>> normalize_channel_name('CCTV-1 综合'), normalize_channel_name('cctv1 HD'), normalize_channel_name('ＣＣＴＶ－１')
+    ('CCTV1', 'CCTV1', 'CCTV1')
+    >>> normalize_channel_name('CCTV-5+ 体育赛事'), normalize_channel_name('CCTV4K'), normalize_channel_name('湖南卫视 高清')
+    ('CCTV5+', 'CCTV4K', '湖南卫视')
+
+    :param name: 频道显示名称
+    :return: 归一化键；名称为空时返回空字符串
+    """
+    if not name:
+        return ""
+    folded = name.translate(_FOLD_TABLE)
+    match = _NAME_PATTERN.fullmatch(folded)
+    if match.group('number') is not None:
+        return f"CCTV{int(match.group('number'))}{match.group('plus') or ''}"
+    core = match.group('core').replace(' ', '')
+    # 名称只由标记组成（如 "HD"）时保留原样，避免不同频道都归为空键
+    return core or folded.replace(' ', '')
@@ -0,0 +1,78 @@
+"""
+M3U 流式解析模块
+按记录增量读取 M3U 内容，供 scripts/ 下各工具共用，避免先把整个文件读成行列表
+"""
+
+import io
+from collections import namedtuple
+
+
+class M3URecord(namedtuple('M3URecord', ['extinf', 'lines'])):
+    """
+    一条 M3U 记录
+
+    :param extinf: #EXTINF 行；文件开头第一个 #EXTINF 之前的内容（头部、注释等）为 None
+    :param lines: 该记录之后、下一个 #EXTINF 之前的所有非空行（已 strip），保持原始顺序
+    """
+    __slots__ = ()
+
+    @property
+    def configs(self):
+        """以 '#' 开头的配置行（如 #EXTVLCOPT、#EXTGRP）"""
+        return [line for line in self.lines if line.startswith('#')]
+
+    @property
+    def urls(self):
+        """非 '#' 开头的行，即 URL 行"""
+        return [line for line in self.lines if not line.startswith('#')]
+
+
+def iter_m3u_records(lines):
+    """
+    逐条产出 M3U 记录
+
+    :param lines: 任意可迭代的文本行（文件对象、str.splitlines() 结果等），
+                  行尾换行符与首尾空白会被去除，空行被忽略
+    :return: M3URecord 生成器；如果文件在第一个 #EXTINF 之前有内容，
+             第一条记录的 extinf 为 None
+    """
+    current_extinf = None
+    current_lines = []
+
+    for raw_line in lines:
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        if line.startswith('#EXTINF'):
+            if current_extinf is not None or current_lines:
+                yield M3URecord(current_extinf, current_lines)
+            current_extinf = line
+            current_lines = []
+        else:
+            current_lines.append(line)
+
+    if current_extinf is not None or current_lines:
+        yield M3URecord(current_extinf, current_lines)
+
+
+def iter_m3u_file(filepath, encoding='utf-8'):
+    """
+    打开文件并逐条产出 M3U 记录，文件在生成器结束时关闭
+
+    :param filepath: M3U 文件路径
+    :param encoding: 文件编码
+    """
+    with open(filepath, 'r', encoding=encoding) as f:
+        yield from iter_m3u_records(f)
+
+
+def iter_m3u_text(text):
+    """
+    逐条产出内存中一段 M3U 文本的记录，分行规则与按文本模式读文件一致（LF、CRLF、CR）
+
+    :param text: 完整的 M3U 文本
+    """
+    if '\r' in text:
+        return iter_m3u_records(io.StringIO(text, newline=None))
+    return iter_m3u_records(text.split('\n'))
@@ -0,0 +1,199 @@
+"""
+M3U 进程内流水线
+在一个进程里依次执行各脚本的处理函数，阶段之间直接传递内存中的播放列表（m3u_playlist.Playlist），
+省去每一步的解释器启动、读文件、解析和临时文件写入；只写出最终结果，并报告每个阶段的耗时。
+每个阶段的参数与对应脚本的命令行参数相同（不含输入/输出文件）
+
+用法:
+  python ./scripts/m3u_pipeline.py -i gop.m3u -o gop_merged.m3u \\
+      -s "extract --eoru ',//38.75.136.137' -n" \\
+      -s "url_sorter -k cctv5p -ch CCTV -rn CCTV5+" \\
+      -s "add_channel -r -a '五星体育,http://example.com/wxty.m3u8'" \\
+      -s "m3u_merger" \\
+      -s "deduplicate" \\
+      -s "m3u_header_tool -c"
+
+  多个输入文件时第一个阶段必须是 m3u_merger（与 m3u_merger.py -i a.m3u b.m3u 相同）
+"""
+
+import argparse
+import importlib
+import os
+import shlex
+import sys
+import time
+from collections import namedtuple
+
+from m3u_playlist import Playlist
+from m3u_writer import atomic_write
+
+# 阶段名称 -> 该脚本命令行中输入、输出文件参数的写法（流水线运行时自动补上占位值）
+STAGE_IO_OPTIONS = {
+    'extract': ('--input', '--output'),
+    'url_sorter': ('-i', '-o'),
+    'url_sortergr': ('-i', '-o'),
+    'add_channel': ('-i', '-o'),
+    'm3u_merger': ('-i', '-o'),
+    'm3u_mergerng': ('-i', '-o'),
+    'deduplicate': ('-i', '-o'),
+    'm3u_header_tool': ('-i', None),
+}
+
+# 接收多个播放列表的阶段
+MULTI_INPUT_STAGES = {'m3u_merger'}
+
+PIPELINE_PLACEHOLDER = '<pipeline>'
+
+PipelineStep = namedtuple('PipelineStep', ['name', 'text', 'transform', 'args'])
+
+
+def parse_step(step_text):
+    """
+    解析一个阶段描述，如 "url_sorter -k catvod,luuc -r"
+
+    :return: PipelineStep
+    :raises ValueError: 未知阶段或参数无效
+    """
+    tokens = shlex.split(step_text)
+    if not tokens:
+        raise ValueError("阶段描述为空")
+
+    name = os.path.basename(tokens[0])
+    if name.endswith('.py'):
+        name = name[:-3]
+    if name not in STAGE_IO_OPTIONS:
+        raise ValueError(f"未知阶段 '{name}'，可用阶段: {', '.join(STAGE_IO_OPTIONS)}")
+
+    module = importlib.import_module(name)
+    input_option, output_option = STAGE_IO_OPTIONS[name]
+    io_args = [input_option, PIPELINE_PLACEHOLDER]
+    if output_option:
+        io_args += [output_option, PIPELINE_PLACEHOLDER]
+
+    parser = module.build_parser()
+    parser.prog = name
+    try:
+        args = parser.parse_args(io_args + tokens[1:])
+    except SystemExit:
+        # argparse 已输出具体错误
+        raise ValueError(f"阶段参数无效: {step_text}")
+
+    return PipelineStep(name, step_text, module.transform_playlist, args)
+
+
+def run_steps(playlists, steps, timings=None):
+    """
+    对内存中的播放列表依次执行各阶段
+
+    :param playlists: 输入 Playlist 列表
+    :param steps: PipelineStep 列表
+    :param timings: 可选列表，追加 (阶段描述, 耗时秒数, 输出频道数)
+    :return: 最后一个阶段输出的 Playlist
+    """
+    if timings is None:
+        timings = []
+
+    current = None
+    for step in steps:
+        start = time.perf_counter()
+        if step.name in MULTI_INPUT_STAGES:
+            current = step.transform(playlists if current is None else [current], step.args)
+        else:
+            if current is None:
+                if len(playlists) != 1:
+                    raise ValueError("多个输入文件时第一个阶段必须是 m3u_merger")
+                current = playlists[0]
+            current = step.transform(current, step.args)
+        elapsed = time.perf_counter() - start
+        timings.append((step.text, elapsed, len(current)))
+
+    if current is None:
+        if len(playlists) != 1:
+            raise ValueError("多个输入文件时第一个阶段必须是 m3u_merger")
+        current = playlists[0]
+    return current
+
+
+def run_pipeline(input_files, steps, timings=None):
+    """
+    读取输入文件并在内存中依次执行各阶段
+
+    :param input_files: 输入文件路径列表
+    :param steps: PipelineStep 列表
+    :param timings: 可选列表，追加 (阶段描述, 耗时秒数, 输出频道数)
+    :return: 最后一个阶段输出的 Playlist
+    """
+    if timings is None:
+        timings = []
+
+    start = time.perf_counter()
+    playlists = [Playlist.from_file(path) for path in input_files]
+    timings.append(('读取输入', time.perf_counter() - start, sum(len(p) for p in playlists)))
+
+    return run_steps(playlists, steps, timings)
+
+
+def write_playlist(playlist, output_path):
+    """
+    原子写入最终结果，内容未变化时保留原文件
+
+    :return: 文件内容有变化返回 True
+    """
+    return atomic_write(output_path, [playlist.text])
+
+
+def print_timings(timings, total):
+    """输出各阶段耗时"""
+    # 阶段描述可能含中文，放在每行末尾，数字列保持对齐
+    print("阶段耗时:", file=sys.stderr)
+    for text, elapsed, channels in timings:
+        print(f"  {elapsed * 1000:9.1f} ms  {channels:>7} 个频道  {text}", file=sys.stderr)
+    print(f"  {total * 1000:9.1f} ms  合计", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="在一个进程内串联执行 M3U 处理脚本，只写出最终结果",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('-i', '--input', nargs='+', required=True,
+                       help="输入M3U文件（多个文件时第一个阶段须为 m3u_merger）")
+    parser.add_argument('-o', '--output', required=True, help="最终输出文件")
+    parser.add_argument('-s', '--step', action='append', default=[], dest='steps',
+                       help='阶段描述，可重复，按顺序执行\n例如: -s "url_sorter -k CCTV- -r"')
+
+    args = parser.parse_args()
+
+    for input_file in args.input:
+        if not os.path.isfile(input_file):
+            print(f"错误：输入文件 '{input_file}' 不存在", file=sys.stderr)
+            sys.exit(1)
+
+    try:
+        steps = [parse_step(text) for text in args.steps]
+    except ValueError as e:
+        print(f"错误：{e}", file=sys.stderr)
+        sys.exit(1)
+
+    timings = []
+    start = time.perf_counter()
+    try:
+        result = run_pipeline(args.input, steps, timings)
+    except Exception as e:
+        print(f"错误：流水线执行失败: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    write_start = time.perf_counter()
+    try:
+        write_playlist(result, args.output)
+    except Exception as e:
+        print(f"写入文件失败: {e}", file=sys.stderr)
+        sys.exit(1)
+    timings.append(('写入输出', time.perf_counter() - write_start, len(result)))
+
+    print_timings(timings, time.perf_counter() - start)
+    print(f"结果已写入 '{args.output}'", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+内存中的播放列表
+流水线各阶段之间传递的数据，使各脚本的处理函数可以不经临时文件直接串联（见 m3u_pipeline.py）。
+按记录处理的阶段直接交出输出的记录块，下一阶段由记录块得到记录，不再解析文本；
+完整文本只在需要时（写出最终结果、按文本处理的阶段）才生成
+"""
+
+import gc
+import io
+
+from m3u_parser import M3URecord, iter_m3u_records, iter_m3u_text
+
+
+def records_from_blocks(blocks):
+    """
+    把输出的记录块整理为记录，结果与把块中的行写出后再解析相同（块之间的空行不影响解析）
+
+    :param blocks: 行列表的序列。以 #EXTINF 开头的块开始一条新记录，其余块的行并入前一条记录，
+                   第一个 #EXTINF 之前的并入头部记录。块中的行须来自已解析的记录（已去除首尾空白），
+                   只有块首的 #EXTINF 行可以是重新生成的
+    :return: M3URecord 列表
+    """
+    # _make 不经过 namedtuple 的 Python 层 __new__，大量创建时明显更快
+    make = M3URecord._make
+    records = []
+    # 一次性创建大量小对象，暂停分代回收可以省去反复的无效扫描
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for block in blocks:
+            if not block:
+                continue
+            first = block[0]
+            if first.startswith('#EXTINF'):
+                records.append(make((first.strip(), block[1:])))
+                continue
+            lines = [line for line in block if line]
+            if records:
+                records[-1].lines.extend(lines)
+            elif lines:
+                records.append(M3URecord(None, lines))
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return records
+
+
+def flatten_blocks(blocks):
+    """依次展开记录块"""
+    return [line for block in blocks for line in block]
+
+
+class Playlist:
+    """
+    一个阶段的输出
+
+    :param text: 与脚本写入输出文件完全相同的文本
+    :param records: 已知的解析结果（可选），省去再次解析
+    """
+    __slots__ = ('_text', '_lines', '_trailing_newline', '_blocks', '_render', '_records')
+
+    def __init__(self, text=None, records=None):
+        self._text = text
+        self._lines = None
+        self._trailing_newline = True
+        self._blocks = None
+        self._render = None
+        self._records = records
+
+    @classmethod
+    def from_lines(cls, lines, trailing_newline=True):
+        """
+        由输出行构建，文本在需要时才拼接
+
+        :param lines: 输出行，行内不含换行符
+        :param trailing_newline: 每行后都有换行符（逐行 write(line + '\\n') 的脚本）为 True，
+                                 '\\n'.join 写出的脚本为 False
+        """
+        playlist = cls()
+        playlist._lines = lines
+        playlist._trailing_newline = trailing_newline
+        return playlist
+
+    @classmethod
+    def from_blocks(cls, blocks, render=None, trailing_newline=True):
+        """
+        由输出的记录块构建：下一阶段直接由记录块得到记录，输出行与文本在需要时才生成
+
+        :param blocks: 记录块列表，见 records_from_blocks
+        :param render: 无参函数，返回与脚本写出格式一致的输出行；默认依次展开 blocks
+        :param trailing_newline: 同 from_lines
+        """
+        playlist = cls()
+        playlist._blocks = blocks
+        playlist._render = render
+        playlist._trailing_newline = trailing_newline
+        return playlist
+
+    @classmethod
+    def from_records(cls, records, render, trailing_newline=True):
+        """
+        由输出的记录构建：下一阶段直接取用 records，输出行与文本在需要时才生成
+
+        :param records: M3URecord 列表，须与把输出写出后再解析的结果一致
+        :param render: 无参函数，返回与脚本写出格式一致的输出行
+        :param trailing_newline: 同 from_lines
+        """
+        playlist = cls(records=records)
+        playlist._render = render
+        playlist._trailing_newline = trailing_newline
+        return playlist
+
+    @classmethod
+    def from_file(cls, filepath):
+        """读取文件（换行符按文本模式统一为 LF）"""
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return cls(f.read())
+
+    @property
+    def text(self):
+        """与脚本写入输出文件完全相同的文本"""
+        if self._text is None:
+            lines = self._lines
+            if lines is None:
+                lines = self._render() if self._render is not None else flatten_blocks(self._blocks)
+                self._render = None
+            text = '\n'.join(lines)
+            if self._trailing_newline and lines:
+                text += '\n'
+            self._text = text
+        return self._text
+
+    @property
+    def records(self):
+        """M3URecord 列表，与把 text 写入文件后再解析的结果一致"""
+        if self._records is None:
+            if self._blocks is not None:
+                self._records = records_from_blocks(self._blocks)
+            elif self._lines is not None:
+                self._records = list(iter_m3u_records(self._lines))
+            else:
+                self._records = list(iter_m3u_text(self._text))
+        return self._records
+
+    def readlines(self):
+        """与对写出的文件调用 f.readlines() 的结果一致"""
+        return io.StringIO(self.text, newline=None).readlines()
+
+    def __len__(self):
+        # 只有第一条记录（文件头部）可能没有 #EXTINF
+        records = self.records
+        return len(records) - (1 if records and records[0].extinf is None else 0)
+
+    def __repr__(self):
+        return f"Playlist(channels={len(self)}, chars={len(self.text)})"
@@ -0,0 +1,261 @@
+"""
+异步 URL 重定向解析
+基于 asyncio 流直接收发 HTTP/1.1 请求，单线程即可同时保持成百上千个请求，不为每个请求占用一个线程。
+与 rdfinurl.get_final_url 的行为相同：手动跟随 301/302/303/307/308 重定向，4xx/5xx 视为失败，
+收到最终响应头后按 Content-Type（或 .m3u8 扩展名）判断是否为视频，然后立即断开连接，不下载响应体。
+RedirectCache 把解析结果保存在 SQLite 数据库中，供之后的运行复用，只重新解析过期的 URL
+"""
+
+import asyncio
+import sqlite3
+import ssl
+import time
+from urllib.parse import quote, urljoin, urlsplit
+
+REDIRECT_STATUS = (301, 302, 303, 307, 308)
+VIDEO_CONTENT_TYPES = ('video/', 'application/octet-stream', 'application/vnd.apple.mpegurl', 'application/x-mpegurl')
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+# 与 requests 对 URL 重新转义时保留的字符相同
+_SAFE_CHARS = "!#$%&'()*+,/:;=?@[]~"
+_USER_AGENT = 'Mozilla/5.0 (compatible; m3u-resolve)'
+
+_ssl_context = None
+
+
+def is_video_related(content_type, final_url):
+    """
+    :param content_type: 小写的 Content-Type
+    :return: 是否为视频内容或 HLS 播放列表
+    """
+    return any(kind in content_type for kind in VIDEO_CONTENT_TYPES) or final_url.lower().endswith('.m3u8')
+
+
+def _get_ssl_context():
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = ssl.create_default_context()
+    return _ssl_context
+
+
+def _decode_header(value):
+    """响应头按 latin-1 传输，其中的 Location 多为 UTF-8"""
+    try:
+        return value.decode('utf-8')
+    except UnicodeDecodeError:
+        return value.decode('latin-1')
+
+
+async def fetch_headers(url, timeout=5):
+    """
+    发送 GET 请求并只读取响应头
+
+    :return: (状态码, {小写头名称: 值})
+    :raises ValueError: 不支持的 URL
+    :raises OSError, asyncio.TimeoutError, asyncio.IncompleteReadError: 连接或读取失败
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in _DEFAULT_PORTS or not parts.hostname:
+        raise ValueError(f"不支持的 URL: {url}")
+    port = parts.port or _DEFAULT_PORTS[scheme]
+    host = parts.hostname
+    host_header = f"[{host}]" if ':' in host else host
+    if port != _DEFAULT_PORTS[scheme]:
+        host_header = f"{host_header}:{port}"
+    target = quote(parts.path or '/', safe=_SAFE_CHARS)
+    if parts.query:
+        target += '?' + quote(parts.query, safe=_SAFE_CHARS)
+
+    request = (f"GET {target} HTTP/1.1\r\n"
+               f"Host: {host_header}\r\n"
+               f"User-Agent: {_USER_AGENT}\r\n"
+               "Accept: */*\r\n"
+               "Connection: close\r\n\r\n")
+
+    async def exchange():
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=_get_ssl_context() if scheme == 'https' else None,
+            server_hostname=host if scheme == 'https' else None)
+        try:
+            writer.write(request.encode('ascii'))
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+        finally:
+            # 不读取响应体，直接断开
+            writer.transport.abort()
+        return head
+
+    head = await asyncio.wait_for(exchange(), timeout)
+    status_line, *header_lines = head[:-4].split(b'\r\n')
+    fields = status_line.split(None, 2)
+    if len(fields) < 2 or not fields[0].startswith(b'HTTP/') or not fields[1].isdigit():
+        raise ValueError(f"无效的响应: {status_line[:80]!r}")
+    headers = {}
+    for line in header_lines:
+        name, sep, value = line.partition(b':')
+        if sep:
+            headers[name.strip().lower().decode('latin-1')] = _decode_header(value.strip())
+    return int(fields[1]), headers
+
+
+async def get_final_url_async(url, max_redirects=10, timeout=5):
+    """
+    获取 URL 的最终重定向地址，并检查最终响应的 Content-Type
+
+    :return: (最终 URL, 是否成功, 是否为视频相关内容)，与 rdfinurl.get_final_url 相同
+    """
+    current_url = url
+    try:
+        for _ in range(max_redirects):
+            status, headers = await fetch_headers(current_url, timeout)
+            if status >= 400:
+                return current_url, False, False
+            if status in REDIRECT_STATUS and 'location' in headers:
+                new_url = headers['location']
+                if not new_url.startswith(('http://', 'https://')):
+                    new_url = urljoin(current_url, new_url)
+                current_url = new_url
+                continue
+            content_type = headers.get('content-type', '').lower()
+            return current_url, True, is_video_related(content_type, current_url)
+    except (OSError, ValueError, EOFError, asyncio.TimeoutError, asyncio.LimitOverrunError):
+        pass
+    # 失败或重定向次数超过上限
+    return current_url, False, False
+
+
+async def resolve_urls_async(urls, concurrency=200, timeout=5, max_redirects=10, on_result=None):
+    """
+    并发解析多个 URL：concurrency 个协程从队列中依次取 URL，同时进行的请求数不超过 concurrency
+
+    :param on_result: 每解析完一个 URL 调用 on_result(原始 URL, (最终 URL, 是否成功, 是否视频))
+    :return: {原始 URL: (最终 URL, 是否成功, 是否视频)}
+    """
+    pending = iter(dict.fromkeys(urls))
+    results = {}
+
+    async def worker():
+        for url in pending:
+            result = await get_final_url_async(url, max_redirects, timeout)
+            results[url] = result
+            if on_result is not None:
+                on_result(url, result)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return results
+
+
+def resolve_urls(urls, concurrency=200, timeout=5, max_redirects=10, on_result=None):
+    """resolve_urls_async 的同步入口"""
+    return asyncio.run(resolve_urls_async(urls, concurrency, timeout, max_redirects, on_result))
+
+
+# 解析结果的默认有效期（秒）：成功的结果与失败的结果
+DEFAULT_TTL = 24 * 3600
+DEFAULT_NEGATIVE_TTL = 6 * 3600
+# 连续失败达到该次数后失败结果才进入缓存，一次偶然的故障不会让 URL 被跳过
+DEFAULT_NEGATIVE_AFTER = 3
+# 每条 SELECT 语句查询的 URL 数，低于 SQLite 的参数个数上限
+_LOOKUP_BATCH = 500
+
+_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS redirects (
+    url TEXT PRIMARY KEY,
+    final_url TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    video INTEGER NOT NULL,
+    resolved REAL NOT NULL,
+    failures INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class RedirectCache:
+    """
+    重定向解析结果的磁盘缓存（SQLite）：原始 URL -> (最终 URL, 是否成功, 是否视频)，以及解析时间和连续失败次数。
+    成功的结果在 ttl 秒内有效，过期的需要重新解析。
+    失败的结果按连续失败次数处理：不足 negative_after 次时每次运行都重新尝试；达到后在 negative_ttl 秒内不再重试，
+    之后每多失败一次有效期加倍，最长为 ttl；成功一次后连续失败次数清零
+
+    :param path: 数据库文件，不存在时创建
+    :param ttl: 成功结果的有效期（秒）
+    :param negative_ttl: 连续失败达到 negative_after 次时失败结果的有效期（秒）
+    :param negative_after: 失败结果进入缓存所需的连续失败次数
+    """
+    __slots__ = ('_conn', 'ttl', 'negative_ttl', 'negative_after')
+
+    def __init__(self, path, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL, negative_after=DEFAULT_NEGATIVE_AFTER):
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(_CACHE_SCHEMA)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.negative_after = max(1, negative_after)
+
+    def entry_ttl(self, success, failures):
+        """
+        :param failures: 连续失败次数
+        :return: 结果的有效期（秒），0 表示不使用缓存中的结果
+        """
+        if success:
+            return self.ttl
+        if failures < self.negative_after:
+            return 0
+        return min(self.negative_ttl * 2 ** (failures - self.negative_after), self.ttl)
+
+    def lookup(self, urls, now=None):
+        """
+        :param urls: 原始 URL 序列（可以有重复）
+        :return: (hits, misses, expired)：hits 为 {URL: (最终 URL, 是否成功, 是否视频)}，只含未过期的结果；
+                 misses 为需要解析的 URL 列表（按首次出现的顺序）；expired 为其中在缓存中但已过期
+                 （包括连续失败次数不足、需要重试）的个数
+        """
+        now = time.time() if now is None else now
+        unique = list(dict.fromkeys(urls))
+        rows = {}
+        for start in range(0, len(unique), _LOOKUP_BATCH):
+            batch = unique[start:start + _LOOKUP_BATCH]
+            rows.update((row[0], row[1:]) for row in self._conn.execute(
+                f"SELECT url, final_url, success, video, resolved, failures FROM redirects "
+                f"WHERE url IN ({','.join('?' * len(batch))})", batch))
+        hits = {}
+        misses = []
+        expired = 0
+        for url in unique:
+            row = rows.get(url)
+            if row is None:
+                misses.append(url)
+                continue
+            final_url, success, video, resolved, failures = row
+            if now - resolved < self.entry_ttl(success, failures):
+                hits[url] = (final_url, bool(success), bool(video))
+            else:
+                misses.append(url)
+                expired += 1
+        return hits, misses, expired
+
+    def store(self, results, now=None):
+        """
+        保存解析结果（一个事务中批量写入）；失败的 URL 累计连续失败次数，成功后清零
+
+        :param results: {原始 URL: (最终 URL, 是否成功, 是否视频)}
+        """
+        now = time.time() if now is None else now
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO redirects (url, final_url, success, video, resolved, failures) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (url) DO UPDATE SET final_url = excluded.final_url, success = excluded.success, "
+                "video = excluded.video, resolved = excluded.resolved, "
+                "failures = CASE WHEN excluded.success THEN 0 ELSE redirects.failures + 1 END",
+                [(url, final_url, int(success), int(video), now, 0 if success else 1)
+                 for url, (final_url, success, video) in results.items()])
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
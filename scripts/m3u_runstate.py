@@ -0,0 +1,132 @@
+"""
+流水线运行状态
+记录每个节点上次执行时的输入内容哈希、处理参数和输出文件哈希（JSON 文件）。
+输入、参数、脚本代码都未变且输出文件未被改动时，m3u_dag.py 直接复用上次的输出，跳过该节点
+
+状态文件格式:
+  {"version": 1, "nodes": {"节点名称": {
+      "key": 总哈希, "inputs": {输入名称: 内容哈希}, "params": 参数哈希, "code": 脚本哈希,
+      "output": 输出文件, "output_digest": 输出文件哈希}}}
+"""
+
+import hashlib
+import json
+import os
+import sys
+
+from m3u_writer import atomic_write, file_digest
+
+STATE_VERSION = 1
+DEFAULT_STATE_FILE = '.m3u_dag_state.json'
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def content_digest(path):
+    """文件内容哈希（十六进制），文件不存在时返回 None"""
+    try:
+        return file_digest(path).hex()
+    except OSError:
+        return None
+
+
+def text_digest(text):
+    """与把 text 写入文件后计算的 content_digest 一致"""
+    return _digest(text.encode('utf-8'))
+
+
+def code_digest():
+    """scripts/ 下所有 Python 脚本的哈希，脚本修改后所有节点都重新计算"""
+    digest = hashlib.blake2b(digest_size=16)
+    for name in sorted(os.listdir(SCRIPTS_DIR)):
+        if name.endswith('.py'):
+            digest.update(name.encode('utf-8'))
+            with open(os.path.join(SCRIPTS_DIR, name), 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def params_digest(node):
+    """节点处理参数（输入引用、阶段、输出文件）的哈希"""
+    params = {
+        'inputs': node.get('inputs', []),
+        'steps': node.get('steps', []),
+        'output': node.get('output'),
+    }
+    return _digest(json.dumps(params, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+
+
+def make_entry(node, input_digests, code):
+    """
+    生成节点的状态记录（不含输出哈希，执行成功后再补上）
+
+    :param input_digests: {输入名称: 内容哈希}
+    """
+    params = params_digest(node)
+    parts = [code, params] + [f"{ref}={input_digests[ref]}" for ref in node.get('inputs', [])]
+    return {
+        'key': _digest('\n'.join(str(part) for part in parts).encode('utf-8')),
+        'inputs': dict(input_digests),
+        'params': params,
+        'code': code,
+        'output': node.get('output'),
+    }
+
+
+def reuse_reason(previous, entry):
+    """
+    判断能否复用上次的输出
+
+    :param previous: 上次的状态记录，可能为 None
+    :param entry: 本次的状态记录（make_entry 的结果）
+    :return: (可以复用, 原因说明)
+    """
+    if not entry['output']:
+        return False, "节点没有输出文件"
+    if None in entry['inputs'].values():
+        return False, "输入文件缺失"
+    if previous is None:
+        return False, "没有上次的运行记录"
+    if previous.get('code') != entry['code']:
+        return False, "脚本已修改"
+    if previous.get('params') != entry['params']:
+        return False, "处理参数已修改"
+    changed = [ref for ref, digest in entry['inputs'].items()
+               if previous.get('inputs', {}).get(ref) != digest]
+    if changed:
+        return False, f"输入已变化: {', '.join(changed)}"
+    if previous.get('key') != entry['key']:
+        return False, "运行记录不一致"
+    if content_digest(entry['output']) != previous.get('output_digest'):
+        return False, "输出文件缺失或已被修改"
+    return True, "输入与参数未变"
+
+
+def load_state(path):
+    """读取状态文件，不存在或格式不符时返回空状态"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"警告：无法读取运行状态 {path}，将全部重新计算: {e}", file=sys.stderr)
+        return {}
+    if not isinstance(state, dict) or state.get('version') != STATE_VERSION:
+        return {}
+    return state.get('nodes', {})
+
+
+def save_state(path, nodes):
+    """原子写入状态文件"""
+    try:
+        atomic_write(path, [json.dumps({'version': STATE_VERSION, 'nodes': nodes},
+                                       ensure_ascii=False, indent=2, sort_keys=True)])
+        return True
+    except Exception as e:
+        print(f"警告：无法写入运行状态 {path}: {e}", file=sys.stderr)
+        return False
@@ -0,0 +1,384 @@
+"""
+去重容器
+记录"是否已出现过"的键，接口相同：add(键的字段元组) 对第一次出现的键返回 True。
+SeenSet 精确保存键本身；SeenDigests 只保存键的 8 字节哈希（整数），每个键的内存固定，与行的长度无关，
+适合流式处理，可再限定只记住最近的 N 个键，使内存有上限；SeenBloom 为 Bloom 过滤器，内存预先固定，有可控的误判率；
+SeenStore 把键的摘要保存在 SQLite 数据库中，可在多个输入文件、多次运行之间共享，并记录每个键首次出现的时间
+
+add() 的 label 参数只有 SeenStore 使用（保存到数据库，供报告显示），其他容器忽略；
+iter_kept 依次加入一批键，SeenStore 按批查询数据库；filter_seen_urls 供合并脚本按 URL 去重
+"""
+
+import hashlib
+import math
+import sqlite3
+import time
+from collections import deque
+from datetime import datetime
+from itertools import islice, repeat
+
+from m3u_urlkey import canonical_url
+from m3u_writer import atomic_write
+
+KEY_SIZE = 8
+# SeenStore 每条 SELECT 语句查询的键数，低于 SQLite 的参数个数上限
+_LOOKUP_BATCH = 500
+
+
+def key_digest(*fields):
+    """
+    多个字段（单行文本）组合后的 8 字节哈希，以整数返回
+
+    >>> key_digest('#EXTINF:-1,CCTV1', 'http://a/1') == key_digest('#EXTINF:-1,CCTV1', 'http://a/1')
+    True
+    """
+    data = '\n'.join(fields).encode('utf-8', 'surrogatepass')
+    return int.from_bytes(hashlib.blake2b(data, digest_size=KEY_SIZE).digest(), 'big')
+
+
+class SeenSet:
+    """精确去重：保存键本身（字段元组）"""
+    __slots__ = ('_keys',)
+
+    def __init__(self):
+        self._keys = set()
+
+    def add(self, key, label=None):
+        """:return: 键第一次出现时为 True"""
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        return True
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class SeenDigests:
+    """
+    按 8 字节哈希去重：两个不同的键哈希相同的概率约为 键数² / 2⁶⁵，千万级键时约为百万分之三
+
+    :param window: 只记住最近的 window 个不同的键（0 或 None 表示不限）；超出后最早的键被遗忘，
+                   与它相同的记录再次出现时不再被识别为重复
+    """
+    __slots__ = ('_digests', '_window', '_order')
+
+    def __init__(self, window=None):
+        self._digests = set()
+        self._window = window or None
+        self._order = deque() if self._window else None
+
+    def add(self, key, label=None):
+        """
+        :param key: 字段元组
+        :return: 键（在窗口内）第一次出现时为 True
+        """
+        digest = key_digest(*key)
+        if digest in self._digests:
+            return False
+        self._digests.add(digest)
+        if self._order is not None:
+            self._order.append(digest)
+            if len(self._order) > self._window:
+                self._digests.discard(self._order.popleft())
+        return True
+
+    def __len__(self):
+        return len(self._digests)
+
+
+class SeenBloom:
+    """
+    按 Bloom 过滤器去重：内存只取决于容量和误判率（每个键约 -ln(误判率) / ln²2 位，0.1% 时约 1.8 字节），
+    不随键的长度和数量增长。误判的代价是把从未出现过的键当作重复（记录被丢弃），不会漏掉真正的重复
+
+    :param capacity: 预计的不同键数；加入的键超过容量后误判率逐渐高于 fpr
+    :param fpr: 达到容量时的目标误判率
+    """
+    __slots__ = ('_bits', '_size', '_hashes', 'count', 'capacity')
+
+    def __init__(self, capacity, fpr):
+        if capacity <= 0 or not 0 < fpr < 1:
+            raise ValueError("容量必须为正数，误判率必须在 0 与 1 之间")
+        self.capacity = capacity
+        self._size = max(64, math.ceil(-capacity * math.log(fpr) / math.log(2) ** 2))
+        self._hashes = max(1, round(self._size / capacity * math.log(2)))
+        self._bits = bytearray((self._size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        data = '\n'.join(key).encode('utf-8', 'surrogatepass')
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        # 双重哈希：第 i 个位置为 h1 + i * h2
+        first = int.from_bytes(digest[:8], 'big')
+        step = int.from_bytes(digest[8:], 'big') | 1
+        size = self._size
+        return [(first + i * step) % size for i in range(self._hashes)]
+
+    def add(self, key, label=None):
+        """
+        :param key: 字段元组
+        :return: 键（很可能）第一次出现时为 True；已出现或误判时为 False
+        """
+        bits = self._bits
+        new = False
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def __contains__(self, key):
+        bits = self._bits
+        return all(bits[position >> 3] & 1 << (position & 7) for position in self._positions(key))
+
+    @property
+    def size_bytes(self):
+        return len(self._bits)
+
+    @property
+    def hash_count(self):
+        return self._hashes
+
+    def current_fpr(self):
+        """按已加入的键数估计的当前误判率"""
+        return (1 - math.exp(-self._hashes * self.count / self._size)) ** self._hashes
+
+    def __len__(self):
+        return self.count
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE,
+    started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seen (
+    scope TEXT NOT NULL,
+    digest INTEGER NOT NULL,
+    label TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    run INTEGER NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS seen_digest ON seen (scope, digest);
+"""
+
+
+def _signed_digest(key):
+    """key_digest 转为 SQLite INTEGER 能保存的有符号 64 位整数"""
+    digest = key_digest(*key)
+    return digest - (1 << 64) if digest >= 1 << 63 else digest
+
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class SeenStore:
+    """
+    SQLite 持久化的去重容器：每个键保存 8 字节摘要（带索引）、首次/最近出现时间和最近一次出现的运行。
+    同一次运行中键第二次出现时为重复；之前的运行中出现过的键默认仍保留（只更新最近出现时间），
+    skip_known=True 时同样视为重复，只保留从未出现过的键。
+    本次运行的新键和更新保存在内存中，commit() 时用 executemany 在一个事务中写入（新的运行也在这时创建）：
+    脚本在输出文件写入成功后再提交，中途退出或写入失败时数据库保持不变，运行期间也不占用数据库的写锁。
+    with 语句正常结束时自动提交，因异常退出时丢弃
+
+    :param path: 数据库文件，不存在时创建
+    :param scope: 键的命名空间（如 'deduplicate:name'），不同含义的键互不影响
+    :param run: 运行名称；多个命令使用相同的名称时属于同一次运行，在它们之间去重
+               （如同一流水线中分别生成的多个输出文件）。None 表示新的一次运行
+    :param skip_known: 之前的运行中出现过的键也视为重复
+    """
+    __slots__ = ('_conn', 'scope', 'run_name', 'run_id', 'skip_known', '_new', '_touched',
+                 'new', 'known', 'duplicates')
+
+    def __init__(self, path, scope, run=None, skip_known=False):
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(_SCHEMA)
+        self.scope = scope
+        self.skip_known = skip_known
+        self._new = {}      # 待写入的新键：摘要 -> 标签
+        self._touched = {}  # 待更新的之前运行中的键：摘要 -> None
+        self.new = self.known = self.duplicates = 0
+
+        self.run_name = run
+        row = self._conn.execute("SELECT id FROM runs WHERE name = ?", (run,)).fetchone() if run else None
+        # 新的运行在第一次提交时才写入 runs 表，此前没有任何键属于它
+        self.run_id = row[0] if row else None
+
+    def add(self, key, label=None):
+        """
+        :param key: 字段元组
+        :param label: 保存到数据库的可读说明（如频道名称与 URL），只在第一次写入时保存
+        :return: 键需要保留时为 True
+        """
+        digest = _signed_digest(key)
+        return self._add_digest(digest, label, self._lookup((digest,)))
+
+    def add_many(self, keys, labels=None):
+        """
+        依次加入一批键，结果与逐个调用 add 相同，但数据库中的已有键每 _LOOKUP_BATCH 个用一条 SELECT 查询
+
+        :param labels: 与 keys 一一对应的标签，None 表示都没有
+        :return: 与 keys 一一对应的是否保留
+        """
+        digests = [_signed_digest(key) for key in keys]
+        stored = self._lookup(digests)
+        return [self._add_digest(digest, label, stored)
+                for digest, label in zip(digests, repeat(None) if labels is None else labels)]
+
+    def _lookup(self, digests):
+        """:return: {摘要: 最近出现的运行}，只含数据库中已有、内存中还没有的键"""
+        pending = list(dict.fromkeys(digest for digest in digests
+                                     if digest not in self._new and digest not in self._touched))
+        stored = {}
+        for start in range(0, len(pending), _LOOKUP_BATCH):
+            batch = pending[start:start + _LOOKUP_BATCH]
+            stored.update(self._conn.execute(
+                f"SELECT digest, run FROM seen WHERE scope = ? AND digest IN ({','.join('?' * len(batch))})",
+                (self.scope, *batch)))
+        return stored
+
+    def _add_digest(self, digest, label, stored):
+        if digest in self._new or digest in self._touched:
+            self.duplicates += 1
+            return False
+        run = stored.get(digest)
+        if run is None:
+            self._new[digest] = label
+            self.new += 1
+            return True
+        if run == self.run_id:
+            self.duplicates += 1
+            return False
+        self._touched[digest] = None
+        self.known += 1
+        return not self.skip_known
+
+    def flush(self):
+        """把内存中的新键和更新写入当前事务（不提交）"""
+        if not self._new and not self._touched:
+            return
+        now = time.time()
+        if self.run_id is None:
+            cursor = self._conn.execute("INSERT OR IGNORE INTO runs (name, started) VALUES (?, ?)",
+                                        (self.run_name, now))
+            # 同名的运行可能已由同时运行的另一个命令创建
+            self.run_id = cursor.lastrowid if cursor.rowcount else self._conn.execute(
+                "SELECT id FROM runs WHERE name = ?", (self.run_name,)).fetchone()[0]
+        scope, run_id = self.scope, self.run_id
+        self._conn.executemany(
+            "INSERT INTO seen (scope, digest, label, first_seen, last_seen, run) VALUES (?, ?, ?, ?, ?, ?)",
+            ((scope, digest, label, now, now, run_id) for digest, label in self._new.items()))
+        self._conn.executemany(
+            "UPDATE seen SET last_seen = ?, run = ? WHERE scope = ? AND digest = ?",
+            ((now, run_id, scope, digest) for digest in self._touched))
+        self._new.clear()
+        self._touched.clear()
+
+    def commit(self):
+        """在一个事务中写入并提交本次运行的所有改动"""
+        self.flush()
+        self._conn.commit()
+
+    def first_seen(self, key):
+        """:return: 键首次出现的时间戳，未出现过时为 None"""
+        self.flush()
+        row = self._conn.execute("SELECT first_seen FROM seen WHERE scope = ? AND digest = ?",
+                                 (self.scope, _signed_digest(key))).fetchone()
+        return row[0] if row else None
+
+    def iter_run_keys(self):
+        """按首次出现时间产出本次运行出现过的键：(标签, 首次出现时间戳, 最近出现时间戳)"""
+        self.flush()
+        yield from self._conn.execute(
+            "SELECT label, first_seen, last_seen FROM seen WHERE scope = ? AND run = ? ORDER BY first_seen, rowid",
+            (self.scope, self.run_id))
+
+    def write_report(self, path):
+        """把本次运行出现过的键及其首次出现时间写成制表符分隔的文本"""
+        lines = ("首次出现\t最近出现\t键\n",)
+        rows = (f"{format_time(first)}\t{format_time(last)}\t{label or ''}\n"
+                for label, first, last in self.iter_run_keys())
+        atomic_write(path, (line for part in (lines, rows) for line in part))
+
+    def summary(self):
+        return (f"本次新增 {self.new} 个键，之前运行中出现过 {self.known} 个"
+                f"{'（已作为重复跳过）' if self.skip_known else ''}，本次运行内重复 {self.duplicates} 个")
+
+    def close(self):
+        """关闭数据库，丢弃未提交的改动"""
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.commit()
+        finally:
+            self.close()
+
+    def __len__(self):
+        return self.new + self.known
+
+
+def iter_kept(seen, entries):
+    """
+    依次把条目的键加入去重容器，产出需要保留的条目，结果与逐个调用 seen.add(key, label) 相同。
+    SeenStore 每次取 _LOOKUP_BATCH 个条目交给 add_many，按批查询数据库；其他容器逐个调用 add
+
+    :param entries: (key, label, item) 可迭代对象；key 为 None 的条目不参与去重，直接保留
+    :return: 生成需要保留的 item
+    """
+    if not isinstance(seen, SeenStore):
+        for key, label, item in entries:
+            if key is None or seen.add(key, label):
+                yield item
+        return
+
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, _LOOKUP_BATCH))
+        if not batch:
+            return
+        keyed = [(key, label) for key, label, _ in batch if key is not None]
+        kept = iter(seen.add_many([key for key, _ in keyed], [label for _, label in keyed]))
+        for key, _, item in batch:
+            if key is None or next(kept):
+                yield item
+
+
+def filter_seen_urls(channels, seen, canonical=False):
+    """
+    按顺序去掉各频道中已出现过的 URL（包括其他频道中出现过的），频道的 URL 容器原地替换为同类型的新容器。
+    每个 URL 的键与 deduplicate.py --key url（canonical=True 时为 canonical-url）对只有一个 URL 的记录的键相同
+
+    :param channels: m3u_model.Channel 序列
+    :param seen: 去重容器，通常为 SeenStore
+    :return: 去掉的 URL 数
+    """
+    channels = list(channels)
+
+    def entries():
+        for index, channel in enumerate(channels):
+            name = channel.info.split(',', 1)[-1]
+            for url in channel.urls:
+                yield ('1', canonical_url(url) if canonical else url), f"{name}\t{url}", (index, url)
+
+    kept = [[] for _ in channels]
+    for index, url in iter_kept(seen, entries()):
+        kept[index].append(url)
+
+    dropped = 0
+    for channel, urls in zip(channels, kept):
+        if len(urls) != len(channel.urls):
+            dropped += len(channel.urls) - len(urls)
+            channel.urls = type(channel.urls)(urls)
+    return dropped
@@ -0,0 +1,170 @@
+"""
+URL 规范化去重
+同一路流的 URL 常带有每次请求都不同的查询参数（咪咕的 msisdn、timestamp、SecurityKey、encrypt、client_ip），
+规范化时按主机规则去掉这些易变参数，再以规范化 URL 的 8 字节哈希作为去重键。
+CanonicalURLSet 与 m3u_model.OrderedSet 接口相同，可直接作为频道的 URL 容器：同一键只保留一个原始 URL，
+位置为该键首次出现的位置，内容为最新的 URL（按主机规则中的时间参数比较，没有时间参数时取后出现的）
+"""
+
+import hashlib
+from collections import namedtuple
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit
+
+# 主机规则：易变参数（不区分大小写）与表示生成时间的参数（值越大越新，None 表示没有）
+HostRule = namedtuple('HostRule', ['volatile', 'fresh'])
+
+_MIGU_RULE = HostRule(('msisdn', 'timestamp', 'SecurityKey', 'encrypt', 'client_ip'), 'timestamp')
+
+# 按域名后缀匹配（"miguvideo.com" 同时匹配 "hlszymgsplive.miguvideo.com"），最长的后缀优先；
+# "*" 中的易变参数对所有主机生效
+HOST_RULES = {
+    '*': HostRule((), None),
+    'miguvideo.com': _MIGU_RULE,
+    'cmvideo.cn': _MIGU_RULE,
+    'migu.cn': _MIGU_RULE,
+}
+
+KEY_SIZE = 8
+_DEFAULT_PORTS = {'http': '80', 'https': '443'}
+
+
+@lru_cache(maxsize=4096)
+def host_rule(host):
+    """
+    查找主机适用的规则（结果按主机缓存）
+
+    :param host: 小写主机名（不含端口）
+    :return: (易变参数的小写名称集合, 时间参数的小写名称或 None)
+    """
+    default = HOST_RULES.get('*', HostRule((), None))
+    volatile = {name.lower() for name in default.volatile}
+    fresh = default.fresh
+    labels = host.split('.')
+    for start in range(len(labels)):
+        rule = HOST_RULES.get('.'.join(labels[start:]))
+        if rule is not None:
+            volatile.update(name.lower() for name in rule.volatile)
+            fresh = rule.fresh or fresh
+            break
+    return frozenset(volatile), fresh.lower() if fresh else None
+
+
+def analyze_url(url):
+    """
+    一次解析同时得到规范化 URL 和新旧程度
+
+    :return: (canonical, freshness)，见 canonical_url 与 url_freshness
+    """
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+        port = parts.port
+    except ValueError:
+        return url, None
+    volatile, fresh = host_rule(host)
+
+    scheme = parts.scheme.lower()
+    if ':' in host:
+        host = f"[{host}]"
+    netloc = host if port is None or str(port) == _DEFAULT_PORTS.get(scheme) else f"{host}:{port}"
+    if '@' in parts.netloc:
+        netloc = f"{parts.netloc.rsplit('@', 1)[0]}@{netloc}"
+
+    query = ""
+    freshness = None
+    if parts.query:
+        # 参数按原始（未解码）形式比较和排序，不做解码再编码
+        kept = []
+        for param in parts.query.split('&'):
+            if not param:
+                continue
+            name, _, value = param.partition('=')
+            name = name.lower()
+            if name == fresh and value:
+                freshness = (len(value), value)
+            if name not in volatile:
+                kept.append(param)
+        kept.sort()
+        query = '&'.join(kept)
+    return urlunsplit((scheme, netloc, parts.path, query, "")), freshness
+
+
+def canonical_url(url):
+    """
+    规范化 URL：协议和主机转小写，去掉默认端口和片段，按主机规则去掉易变参数，其余参数排序
+
+    >>> canonical_url('HTTP://Live.MiguVideo.com:80/a/index.m3u8?msisdn=1&sid=2&timestamp=3#x')
+    'http://live.miguvideo.com/a/index.m3u8?sid=2'
+
+    :return: 规范化后的 URL；无法解析时原样返回
+    """
+    return analyze_url(url)[0]
+
+
+def _digest(canonical):
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=KEY_SIZE).digest()
+
+
+def url_key(url):
+    """规范化 URL 的固定长度哈希（8 字节），作为去重键"""
+    return _digest(analyze_url(url)[0])
+
+
+def url_freshness(url):
+    """
+    URL 的新旧程度：主机规则中时间参数的值，可比较；没有时间参数时返回 None
+
+    :return: (长度, 值) 元组，数字串按数值大小比较
+    """
+    return analyze_url(url)[1]
+
+
+def is_fresher(new, old):
+    """new 是否不比 old 旧（None 表示未知，未知的总被替换；两者都未知时后出现的为新）"""
+    if new is None:
+        return old is None
+    return old is None or new >= old
+
+
+class CanonicalURLSet:
+    """
+    按规范化 URL 去重的有序 URL 容器，接口与 OrderedSet 相同：
+    遍历时按键首次出现的顺序产出每个键保留的原始 URL（该键最新的 URL）
+
+    :param urls: 初始 URL，按顺序添加
+    """
+    __slots__ = ('_items',)
+
+    def __init__(self, urls=()):
+        self._items = {}  # url_key -> (freshness, url)
+        self.update(urls)
+
+    def add(self, url):
+        """添加 URL；同一键已存在时，新 URL 不比已有的旧则替换（位置不变）"""
+        canonical, freshness = analyze_url(url)
+        key = _digest(canonical)
+        current = self._items.get(key)
+        if current is not None and not is_fresher(freshness, current[0]):
+            return
+        self._items[key] = (freshness, url)
+
+    def update(self, urls):
+        """按顺序添加多个 URL"""
+        for url in urls:
+            self.add(url)
+
+    def __contains__(self, url):
+        return url_key(url) in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return (url for _, url in self._items.values())
+
+    def __bool__(self):
+        return bool(self._items)
+
+    def __repr__(self):
+        return f"CanonicalURLSet({list(self)!r})"
@@ -0,0 +1,111 @@
+"""
+统一的原子写入
+各脚本共用：把生成器产生的文本块（或字节块）编码后写入同目录的缓冲临时文件，边写边计算哈希；
+写完后与已有文件比较，内容相同则丢弃临时文件、保留原文件（不改动修改时间），否则原子替换。
+输入和输出为同一文件时同样安全
+"""
+
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+from itertools import islice
+
+DIGEST_SIZE = 16
+_BUFFER_SIZE = 1 << 16
+_READ_BLOCK = 1 << 20
+_LINES_PER_CHUNK = 2048
+
+
+def file_digest(filepath):
+    """计算文件内容的哈希（blake2b，16 字节）"""
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(_READ_BLOCK), b''):
+            digest.update(block)
+    return digest.digest()
+
+
+def _target_mode(output_path):
+    """沿用已有文件的权限；新文件按 umask 设置（mkstemp 创建的文件默认只有属主可读写）"""
+    try:
+        return stat.S_IMODE(os.stat(output_path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def atomic_write(output_path, chunks, binary=False, encoding='utf-8'):
+    """
+    原子写入文件，内容未变化时不替换
+
+    :param output_path: 输出文件路径
+    :param chunks: 按顺序写出的文本块（binary=True 时为字节块，可以是 memoryview）的可迭代对象
+    :param binary: chunks 是否为字节块
+    :param encoding: 文本块的编码
+    :return: 文件内容有变化（已替换）返回 True，与已有文件相同返回 False
+    :raises OSError: 写入或替换失败，临时文件已清理
+    """
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    fd, temp_path = tempfile.mkstemp(dir=output_dir, suffix=os.path.splitext(output_path)[1], prefix='.tmp_')
+    try:
+        digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+        size = 0
+        with open(fd, 'wb', buffering=_BUFFER_SIZE) as out_f:
+            if binary:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    size += out_f.write(chunk)
+            else:
+                # 文本块攒到约 64KB 再统一编码、计算哈希和写入，避免逐行调用
+                pending = []
+                pending_size = 0
+                for chunk in chunks:
+                    pending.append(chunk)
+                    pending_size += len(chunk)
+                    if pending_size >= _BUFFER_SIZE:
+                        block = ''.join(pending).encode(encoding)
+                        digest.update(block)
+                        size += out_f.write(block)
+                        pending = []
+                        pending_size = 0
+                if pending:
+                    block = ''.join(pending).encode(encoding)
+                    digest.update(block)
+                    size += out_f.write(block)
+
+        # 先比较大小，大小相同时才读取已有文件计算哈希
+        try:
+            unchanged = (os.path.getsize(output_path) == size
+                         and file_digest(output_path) == digest.digest())
+        except OSError:
+            unchanged = False
+        if unchanged:
+            os.unlink(temp_path)
+            return False
+
+        os.chmod(temp_path, _target_mode(output_path))
+        try:
+            os.replace(temp_path, output_path)
+        except OSError:
+            # 跨文件系统等情况下 os.replace 失败，使用 shutil.move 作为备选
+            shutil.move(temp_path, output_path)
+        return True
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def iter_lines(lines, header=None):
+    """把行序列转换为写出的文本块：每行之后加换行符，每块包含若干行"""
+    if header is not None:
+        yield header + '\n'
+    iterator = iter(lines)
+    while True:
+        batch = list(islice(iterator, _LINES_PER_CHUNK))
+        if not batch:
+            return
+        yield '\n'.join(batch) + '\n'
@@ -2,25 +2,106 @@ import requests
 import re
 import os
 import sys
-import tempfile
-import shutil
+import threading
+import weakref
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlsplit
 import argparse
 
-def get_final_url(url, max_redirects=10, timeout=5):
+from requests.adapters import HTTPAdapter
+
+from m3u_writer import atomic_write
+from m3u_resolve import (DEFAULT_NEGATIVE_AFTER, DEFAULT_NEGATIVE_TTL, DEFAULT_TTL, RedirectCache,
+                         is_video_related, resolve_urls)
+
+ENGINES = ('threads', 'asyncio')
+
+# 每个主机（IP:端口）最多同时使用的连接数，超过时等待空闲连接
+DEFAULT_PER_HOST = 8
+# 响应体不超过该大小（字节）时读完，使连接回到连接池复用；更大或长度未知（如视频流）时直接断开
+_DRAIN_LIMIT = 64 * 1024
+
+class CountingAdapter(HTTPAdapter):
+    """
+    统计请求数与新建连接数的 HTTPAdapter：每个响应所用的套接字第一次出现时记为新建连接。
+    按套接字而不是连接对象计数：断开的连接对象回到连接池后，下次使用时会在同一个对象上重新连接。
+    计数保存在适配器中，不受 urllib3 关闭最久未用主机的连接池影响（连接池被关闭时其计数也随之丢失）。
+    只统计收到响应的请求；响应须以 stream=True 获取，连接在 send 返回时仍由响应持有
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.request_count = 0
+        self.connection_count = 0
+        self._known = weakref.WeakSet()
+        self._count_lock = threading.Lock()
+
+    def send(self, request, *args, **kwargs):
+        response = super().send(request, *args, **kwargs)
+        sock = getattr(getattr(response.raw, 'connection', None), 'sock', None)
+        with self._count_lock:
+            self.request_count += 1
+            if sock is None or sock not in self._known:
+                self.connection_count += 1
+                if sock is not None:
+                    self._known.add(sock)
+        return response
+
+class ConnectionPool:
+    """
+    各线程共用的 keep-alive 连接池：每个线程一个 requests.Session（Cookie 等状态不在线程间共享），
+    所有 Session 挂载同一个 HTTPAdapter，同一主机的后续请求（包括重定向的下一跳）复用已建立的 TCP/TLS 连接
+
+    :param hosts: 同时保留连接的主机数，超过时最久未用的主机的连接被关闭
+    :param per_host: 每个主机最多同时使用的连接数
+    """
+    def __init__(self, hosts=100, per_host=DEFAULT_PER_HOST):
+        self.adapter = CountingAdapter(pool_connections=hosts, pool_maxsize=per_host, pool_block=True)
+        self._local = threading.local()
+
+    def session(self):
+        """当前线程的 Session"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', self.adapter)
+            session.mount('https://', self.adapter)
+            self._local.session = session
+        return session
+
+    def stats(self):
+        """:return: (请求数, 新建的连接数)，见 CountingAdapter"""
+        return self.adapter.request_count, self.adapter.connection_count
+
+    def close(self):
+        self.adapter.close()
+
+def _release(response):
+    """结束响应：较小的响应体读完后连接回到连接池，否则断开连接，中止下载"""
+    length = response.headers.get('Content-Length', '')
+    if length.isdigit() and int(length) <= _DRAIN_LIMIT:
+        try:
+            response.content
+        except requests.exceptions.RequestException:
+            pass
+    response.close()
+
+def get_final_url(url, max_redirects=10, timeout=5, pool=None):
     """
     获取 URL 的最终重定向地址，并在获取到响应头后检查 Content-Type。
     如果检测到视频内容（包括HLS播放列表），则中止下载响应体。
+    :param pool: ConnectionPool，复用连接；None 时每次请求都建立新连接
     """
     current_url = url
     redirect_count = 0
+    get = pool.session().get if pool is not None else requests.get
 
     try:
         while redirect_count < max_redirects:
             # 初始请求，allow_redirects=False 来手动处理重定向
-            response = requests.get(current_url, allow_redirects=False, timeout=timeout, stream=True) # stream=True 关键
+            response = get(current_url, allow_redirects=False, timeout=timeout, stream=True) # stream=True 关键
+            if response.status_code >= 400:
+                _release(response)
             response.raise_for_status() # 检查HTTP状态码，如果不是2xx，则抛出异常
 
             if response.status_code in (301, 302, 303, 307, 308) and 'Location' in response.headers:
@@ -29,8 +110,8 @@ def get_final_url(url, max_redirects=10, timeout=5):
                     new_url = urljoin(current_url, new_url)
                 current_url = new_url
                 redirect_count += 1
-                # 在重定向时关闭当前响应的连接
-                response.close()
+                # 重定向响应体很小，读完后连接留给下一跳或同一主机的其他 URL
+                _release(response)
             else:
                 # 到达最终URL，或者不再重定向
                 final_url = current_url
@@ -38,31 +119,29 @@ def get_final_url(url, max_redirects=10, timeout=5):
                 print(f"最终URL: {final_url}")
                 print(f"Content-Type: {content_type}")
 
-                # 检查是否为视频内容或HLS播放列表
-                is_video_related = False
-                if 'video/' in content_type or \
-                   'application/octet-stream' in content_type or \
-                   'application/vnd.apple.mpegurl' in content_type or \
-                   'application/x-mpegurl' in content_type or \
-                   final_url.lower().endswith('.m3u8'): # 也可以根据文件扩展名判断
-
-                    is_video_related = True
+                # 检查是否为视频内容或HLS播放列表（也根据 .m3u8 扩展名判断）
+                if is_video_related(content_type, final_url):
                     print(f"检测到视频相关内容 ({content_type} 或 .m3u8)，中止响应体下载。")
-                    response.close() # 立即关闭连接，中止下载
-                    return final_url, True, is_video_related # 返回最终URL，成功，是视频
+                    _release(response) # 视频流立即断开，中止下载；较小的 HLS 播放列表读完后复用连接
+                    return final_url, True, True # 返回最终URL，成功，是视频
                 else:
                     print(f"检测到非视频相关内容 ({content_type})。")
-                    response.close() # 如果不需要响应体内容，也可以直接关闭
-                    return final_url, True, is_video_related # 返回最终URL，成功，不是视频
+                    _release(response) # 不需要响应体内容
+                    return final_url, True, False # 返回最终URL，成功，不是视频
 
     except requests.exceptions.RequestException as e:
         print(f"⚠️ 请求失败: {current_url} ({type(e).__name__}: {e})")
         # 即使请求失败，也返回三个值，保持一致性
         return current_url, False, False
 
-def resolve_urls_with_retry(urls, max_workers=10, timeout=5, max_retries=3, delay_between_retries=10):
+def resolve_urls_with_retry(urls, max_workers=10, timeout=5, max_retries=3, delay_between_retries=10,
+                            engine='threads', concurrency=200, pool=None):
     """
     解析URL，失败后延迟重试，最多尝试 max_retries 次
+
+    :param engine: 'threads' 在线程池中用 requests 逐个请求（max_workers 个线程）；
+                   'asyncio' 用 m3u_resolve 在单线程中同时保持 concurrency 个请求
+    :param pool: threads 引擎使用的 ConnectionPool
     """
     # 存储最终解析的URL和其视频相关性状态
     resolved_info = {}
@@ -72,40 +151,46 @@ def resolve_urls_with_retry(urls, max_workers=10, timeout=5, max_retries=3, dela
         print(f"\n🔄 开始第 {retries+1} 轮处理...")
         failed_urls = []
 
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # 提交任务，future_to_url 映射 future 对象到原始 URL
-            future_to_url = {executor.submit(get_final_url, url, 10, timeout): url for url in urls}
-
-            for future in as_completed(future_to_url):
-                original_url = future_to_url[future]
-                try:
-                    # 关键修改在这里：解包三个返回值
-                    final_url, success, is_video_related = future.result()
-                    # 存储解析后的信息
-                    resolved_info[original_url] = {
-                        "final_url": final_url,
-                        "success": success,
-                        "is_video_related": is_video_related
-                    }
-
-                    if success:
-                        status = "✅ 成功"
-                        if is_video_related:
-                            status += " (视频相关)"
-                        print(f"{status}: {final_url}")
-                    else:
-                        print(f"❌ 失败: {original_url}")
+        def record(original_url, result):
+            final_url, success, is_video = result
+            # 存储解析后的信息
+            resolved_info[original_url] = {
+                "final_url": final_url,
+                "success": success,
+                "is_video_related": is_video
+            }
+
+            if success:
+                status = "✅ 成功"
+                if is_video:
+                    status += " (视频相关)"
+                print(f"{status}: {final_url}")
+            else:
+                print(f"❌ 失败: {original_url}")
+                failed_urls.append(original_url)
+
+        if engine == 'asyncio':
+            resolve_urls(urls, concurrency, timeout, on_result=record)
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # 提交任务，future_to_url 映射 future 对象到原始 URL
+                future_to_url = {executor.submit(get_final_url, url, 10, timeout, pool): url for url in urls}
+
+                for future in as_completed(future_to_url):
+                    original_url = future_to_url[future]
+                    try:
+                        # 解包三个返回值
+                        record(original_url, future.result())
+                    except Exception as exc:
+                        print(f"❌ URL '{original_url}' 生成异常: {exc}")
                         failed_urls.append(original_url)
-                except Exception as exc:
-                    print(f"❌ URL '{original_url}' 生成异常: {exc}")
-                    failed_urls.append(original_url)
-                    # 存储异常情况下的信息
-                    resolved_info[original_url] = {
-                        "final_url": original_url, # 失败时，final_url 可以是原始URL
-                        "success": False,
-                        "is_video_related": False, # 失败时，默认为非视频
-                        "error": str(exc)
-                    }
+                        # 存储异常情况下的信息
+                        resolved_info[original_url] = {
+                            "final_url": original_url, # 失败时，final_url 可以是原始URL
+                            "success": False,
+                            "is_video_related": False, # 失败时，默认为非视频
+                            "error": str(exc)
+                        }
 
 
         if not failed_urls:
@@ -123,61 +208,23 @@ def resolve_urls_with_retry(urls, max_workers=10, timeout=5, max_retries=3, dela
 
     return resolved_info # 返回包含所有解析结果的字典
 
-def safe_write_output(lines, input_path, output_path):
+def safe_write_output(lines, output_path):
     """
-    安全地写入输出文件，支持同文件覆盖
+    安全地写入输出文件：原子替换，支持同文件覆盖，内容未变化时保留原文件
     
     :param lines: 要写入的行列表
-    :param input_path: 输入文件路径
     :param output_path: 输出文件路径
-    :return: (success, temp_path) 成功返回(True, None)，失败返回(False, temp_path)
+    :return: (success, changed) 成功返回(True, 内容是否有变化)，失败返回(False, False)
     """
-    # 获取绝对路径以判断是否为同一个文件
-    input_abs = os.path.abspath(input_path)
-    output_abs = os.path.abspath(output_path)
-    is_same_file = input_abs == output_abs
-    
-    temp_path = None
-    
     try:
-        # 如果是同一个文件，先写到临时文件
-        if is_same_file:
-            # 在与输出文件相同目录创建临时文件
-            output_dir = os.path.dirname(output_path) or '.'
-            fd, temp_path = tempfile.mkstemp(
-                dir=output_dir,
-                suffix='.m3u',
-                prefix='.tmp_',
-                text=True
-            )
-            
-            # 使用文件描述符打开文件
-            out_f = os.fdopen(fd, 'w', encoding='utf-8')
-        else:
-            # 直接打开输出文件
-            out_f = open(output_path, 'w', encoding='utf-8')
-        
-        # 写入数据
-        with out_f:
-            out_f.write('\n'.join(lines))
-        
-        # 如果是同一个文件，进行原子替换
-        if is_same_file:
-            try:
-                # Python 3.3+ 推荐使用 os.replace 实现原子替换
-                os.replace(temp_path, output_path)
-                temp_path = None  # 替换成功，清除临时文件引用
-            except Exception as e:
-                # 如果 os.replace 失败，使用 shutil.move 作为备选
-                print(f"警告：原子替换失败，使用备选方案: {e}")
-                shutil.move(temp_path, output_path)
-                temp_path = None  # 移动成功，清除临时文件引用
-        
-        return True, None
-        
+        changed = atomic_write(output_path, ['\n'.join(lines)])
     except Exception as e:
         print(f"写入文件失败: {e}")
-        return False, temp_path
+        return False, False
+    
+    if not changed:
+        print(f"内容未变化，保留原文件：{output_path}")
+    return True, changed
 
 def validate_arguments(input_path, output_path):
     """
@@ -221,20 +268,17 @@ def validate_arguments(input_path, output_path):
     
     return True
 
-def cleanup_temp_file(temp_path):
-    """
-    清理临时文件
-    """
-    if temp_path and os.path.exists(temp_path):
-        try:
-            os.unlink(temp_path)
-            print(f"已清理临时文件: {temp_path}")
-        except Exception as e:
-            print(f"警告：无法删除临时文件 {temp_path}: {e}")
-
-def process_m3u_file(input_file, output_file, max_workers=10, timeout=5, max_retries=3, force=False):
+def process_m3u_file(input_file, output_file, max_workers=10, timeout=5, max_retries=3, force=False,
+                     engine='threads', concurrency=200, per_host=DEFAULT_PER_HOST,
+                     cache_path=None, cache_ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL,
+                     negative_after=DEFAULT_NEGATIVE_AFTER):
     """
     处理 M3U 文件，解析所有 URL，自动重试失败项
+    :param engine, concurrency: 见 resolve_urls_with_retry
+    :param per_host: threads 引擎每个主机最多同时使用的连接数
+    :param cache_path: 解析结果缓存（m3u_resolve.RedirectCache）的数据库文件，None 表示不使用缓存
+    :param cache_ttl, negative_ttl, negative_after: 成功结果的有效期（秒），以及连续失败 negative_after 次后
+                                                    失败结果的有效期（秒），见 m3u_resolve.RedirectCache
     """
     start_time = time.time()
 
@@ -268,11 +312,46 @@ def process_m3u_file(input_file, output_file, max_workers=10, timeout=5, max_ret
 
     print(f"找到 {url_count} 个需要处理的URL")
 
+    # 缓存中未过期的结果（包括失败的结果）直接使用，只解析没有缓存或已过期的 URL
+    cache = None
+    cached = {}
+    urls_to_resolve = urls_to_process
+    if cache_path:
+        try:
+            cache = RedirectCache(cache_path, cache_ttl, negative_ttl, negative_after)
+            cached, urls_to_resolve, expired_count = cache.lookup(urls_to_process)
+        except Exception as e:
+            print(f"错误：无法读取缓存 '{cache_path}': {e}")
+            return False
+        print(f"缓存命中 {len(cached)} 个，需要解析 {len(urls_to_resolve)} 个（其中 {expired_count} 个已过期或连续失败次数不足、需要重试）")
+
+    # 按主机复用连接；保留连接的主机数按输入中的主机数（重定向目标另留余量），减少连接池被提前关闭
+    pool = None
+    if engine == 'threads' and urls_to_resolve:
+        hosts = {urlsplit(url).netloc for url in urls_to_resolve}
+        pool = ConnectionPool(hosts=2 * len(hosts) + 10, per_host=per_host)
+
     # resolved_map 现在存储的是包含 'final_url', 'success', 'is_video_related' 的字典
-    resolved_map = resolve_urls_with_retry(
-        urls_to_process, max_workers=max_workers, timeout=timeout, 
-        max_retries=max_retries, delay_between_retries=10
-    )
+    resolved_map = {}
+    try:
+        if urls_to_resolve:
+            resolved_map = resolve_urls_with_retry(
+                urls_to_resolve, max_workers=max_workers, timeout=timeout, 
+                max_retries=max_retries, delay_between_retries=10,
+                engine=engine, concurrency=concurrency, pool=pool
+            )
+        if cache is not None:
+            cache.store({url: (info["final_url"], info["success"], info["is_video_related"])
+                         for url, info in resolved_map.items()})
+    finally:
+        connection_stats = pool.stats() if pool is not None else None
+        if pool is not None:
+            pool.close()
+        if cache is not None:
+            cache.close()
+
+    for url, (final_url, success, is_video) in cached.items():
+        resolved_map[url] = {"final_url": final_url, "success": success, "is_video_related": is_video}
 
     # 遍历原始行，替换为最终解析的URL
     success_count = 0
@@ -293,10 +372,9 @@ def process_m3u_file(input_file, output_file, max_workers=10, timeout=5, max_ret
             fail_count += 1
 
     # 安全写入输出文件
-    write_success, temp_path = safe_write_output(lines, input_file, output_file)
+    write_success, _ = safe_write_output(lines, output_file)
     
     if not write_success:
-        cleanup_temp_file(temp_path)
         return False
 
     total_time = time.time() - start_time
@@ -312,6 +390,16 @@ def process_m3u_file(input_file, output_file, max_workers=10, timeout=5, max_ret
     if success_count > 0:
         print(f"  - 成功率: {success_count/url_count*100:.1f}%")
     
+    if cache is not None:
+        cached_failures = sum(1 for _, success, _ in cached.values() if not success)
+        print(f"缓存: 命中 {len(cached)} 个（其中 {cached_failures} 个为未过期的失败结果，未重新解析），"
+              f"未命中 {len(urls_to_resolve)} 个（其中 {expired_count} 个已过期或连续失败次数不足、需要重试）")
+    
+    if connection_stats is not None and connection_stats[0] > 0:
+        request_count, connection_count = connection_stats
+        print(f"连接复用: {request_count} 次请求，新建 {connection_count} 个连接，"
+              f"复用率 {(request_count - connection_count) / request_count * 100:.1f}%")
+    
     if input_abs == output_abs:
         print("注意：已安全覆盖原文件")
     
@@ -332,6 +420,22 @@ def parse_arguments():
                        help='最大重试次数 (默认: 5)')
     parser.add_argument('--force', action='store_true',
                        help='强制覆盖输出文件（如果已存在且与输入不同）')
+    parser.add_argument('--engine', choices=ENGINES, default='threads',
+                       help='threads: 线程池中逐个请求（--workers 个线程）；'
+                            'asyncio: 单线程异步请求，同时进行 --concurrency 个 (默认: threads)')
+    parser.add_argument('--concurrency', type=int, default=200,
+                       help='asyncio 引擎同时进行的请求数 (默认: 200)')
+    parser.add_argument('--cache', metavar='FILE',
+                       help='解析结果缓存（SQLite 数据库，不存在时创建）：有效期内的 URL 直接使用上次的结果，不再请求')
+    parser.add_argument('--cache-ttl', type=float, default=DEFAULT_TTL / 3600,
+                       help=f'成功结果在缓存中的有效期（小时） (默认: {DEFAULT_TTL / 3600:g})')
+    parser.add_argument('--negative-ttl', type=float, default=DEFAULT_NEGATIVE_TTL / 3600,
+                       help=f'连续失败 --negative-after 次的URL在缓存中的有效期（小时），期间不再重试；'
+                            f'之后每多失败一次加倍，最长为 --cache-ttl (默认: {DEFAULT_NEGATIVE_TTL / 3600:g})')
+    parser.add_argument('--negative-after', type=int, default=DEFAULT_NEGATIVE_AFTER,
+                       help=f'连续失败多少次后失败结果才进入缓存，此前每次运行都重新尝试 (默认: {DEFAULT_NEGATIVE_AFTER})')
+    parser.add_argument('--per-host', type=int, default=DEFAULT_PER_HOST,
+                       help=f'threads 引擎每个主机（IP:端口）最多同时使用的 keep-alive 连接数 (默认: {DEFAULT_PER_HOST})')
     
     return parser.parse_args()
 
@@ -341,6 +445,15 @@ if __name__ == "__main__":
     # 验证参数
     if not validate_arguments(args.input, args.output):
         sys.exit(1)
+    if args.per_host < 1 or args.concurrency < 1:
+        print("错误：--per-host 与 --concurrency 必须为正数")
+        sys.exit(1)
+    if args.cache_ttl < 0 or args.negative_ttl < 0:
+        print("错误：--cache-ttl 与 --negative-ttl 不能为负数")
+        sys.exit(1)
+    if args.negative_after < 1:
+        print("错误：--negative-after 必须为正数")
+        sys.exit(1)
     
     success = process_m3u_file(
         input_file=args.input,
@@ -348,7 +461,14 @@ if __name__ == "__main__":
         max_workers=args.workers,
         timeout=args.timeout,
         max_retries=args.retries,
-        force=args.force
+        force=args.force,
+        engine=args.engine,
+        concurrency=args.concurrency,
+        per_host=args.per_host,
+        cache_path=args.cache,
+        cache_ttl=args.cache_ttl * 3600,
+        negative_ttl=args.negative_ttl * 3600,
+        negative_after=args.negative_after
     )
     
     if not success:
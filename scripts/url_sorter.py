@@ -1,48 +1,50 @@
 import argparse
 import sys
-import re
 import os
-import tempfile
-import shutil
+
+from m3u_parser import iter_m3u_file
+from m3u_model import Channel
+from m3u_extinf import ExtInf
+from m3u_playlist import Playlist, flatten_blocks
+from m3u_writer import atomic_write, iter_lines
 
 def sort_m3u_urls(input_file, output_file, keywords_str, reverse_mode=False, target_channels_str=None, new_name=None, force=False):
-    # 1. 参数解析与标准化
-    keywords = [k.strip() for k in keywords_str.split(',') if k.strip()]
-    target_channels = [c.strip() for c in target_channels_str.split(',') if c.strip()] if target_channels_str else None
-    
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+        return sort_m3u_records(iter_m3u_file(input_file), keywords_str, reverse_mode, target_channels_str, new_name)
     except Exception as e:
         print(f"Error: 无法读取输入文件: {e}")
         return False
 
+def sort_m3u_records(records, keywords_str, reverse_mode=False, target_channels_str=None, new_name=None):
+    """
+    对已解析的记录排序 URL 并按条件重命名
+    :param records: M3URecord 序列
+    :return: (output_lines, rename_count, sort_count, total_channels)
+    """
+    blocks, rename_count, sort_count, total_channels = sort_m3u_blocks(
+        records, keywords_str, reverse_mode, target_channels_str, new_name)
+    return flatten_blocks(blocks), rename_count, sort_count, total_channels
+
+def sort_m3u_blocks(records, keywords_str, reverse_mode=False, target_channels_str=None, new_name=None):
+    """
+    与 sort_m3u_records 相同，但返回记录块（文件头、每个频道的 EXTINF 行及其 URL），供流水线直接交给下一阶段
+    :return: (blocks, rename_count, sort_count, total_channels)
+    """
+    # 1. 参数解析与标准化
+    keywords = [k.strip() for k in keywords_str.split(',') if k.strip()]
+    target_channels = [c.strip() for c in target_channels_str.split(',') if c.strip()] if target_channels_str else None
+    
     # 2. 结构化解析
     processed_content = []
-    start_index = 0
-    # 兼容处理首行（BOM 或 空格）
-    if lines and '#EXTM3U' in lines[0]:
-        processed_content.append(lines[0].strip())
-        start_index = 1
-
     channels_data = []
-    current_inf = None
-    current_urls = []
 
-    for line in lines[start_index:]:
-        line = line.strip()
-        if not line: continue
-        if line.startswith('#EXTINF'):
-            if current_inf:
-                channels_data.append({"inf": current_inf, "urls": current_urls})
-            current_inf = line
-            current_urls = []
-        else:
-            current_urls.append(line)
-    
-    # 存入最后一个频道组
-    if current_inf:
-        channels_data.append({"inf": current_inf, "urls": current_urls})
+    for record in records:
+        if record.extinf is None:
+            # 兼容处理首行（BOM 或 空格），其余 #EXTINF 之前的行丢弃
+            if record.lines and '#EXTM3U' in record.lines[0]:
+                processed_content.append(record.lines[0])
+            continue
+        channels_data.append(Channel(record.extinf, urls=record.lines))
 
     # 排序得分函数
     def get_sort_score(item):
@@ -56,107 +58,77 @@ def sort_m3u_urls(input_file, output_file, keywords_str, reverse_mode=False, tar
 
     # 重命名函数
     def rename_inf(inf_line, name):
+        extinf = ExtInf(inf_line)
         # 同步更新 tvg-name 属性
-        if 'tvg-name="' in inf_line:
-            inf_line = re.sub(r'tvg-name="[^"]*"', f'tvg-name="{name}"', inf_line)
+        if 'tvg-name' in extinf:
+            extinf.set('tvg-name', name)
         # 更新末尾显示名称
-        if ',' in inf_line:
-            parts = inf_line.rsplit(',', 1)
-            return f"{parts[0]},{name}"
-        return f"{inf_line},{name}"
+        extinf.set_name(name)
+        return extinf.to_line()
 
     # 3. 生成输出内容
-    output_lines = []
+    blocks = []
     rename_count = 0
     sort_count = 0
     
     if processed_content:
-        output_lines.append(processed_content[0])
+        blocks.append([processed_content[0]])
     
     for ch in channels_data:
         # 条件 A: 频道名匹配（命中 -ch）
-        name_match = any(tc in ch["inf"] for tc in target_channels) if target_channels else False
+        name_match = any(tc in ch.info for tc in target_channels) if target_channels else False
         
         # 条件 B: 旗下 URL 匹配（命中 -k）
-        url_match = any(any(kw in url for kw in keywords) for url in ch["urls"])
+        url_match = any(any(kw in url for kw in keywords) for url in ch.urls)
         
         # 只有 A 和 B 同时成立，才执行重命名
-        final_inf = ch["inf"]
+        final_inf = ch.info
         if name_match and url_match and new_name:
-            final_inf = rename_inf(ch["inf"], new_name)
+            final_inf = rename_inf(ch.info, new_name)
             rename_count += 1
         
-        output_lines.append(final_inf)
-        
         # 排序逻辑：如果指定了 -ch，则只对命中的频道排序；未指定则全局排
         should_sort = name_match if target_channels else True
-        if should_sort and len(ch["urls"]) > 1:
+        if should_sort and len(ch.urls) > 1:
             # 稳定排序保证了未匹配项保持原始相对顺序
-            sorted_list = sorted(ch["urls"], key=get_sort_score)
-            output_lines.extend(sorted_list)
-            if sorted_list != ch["urls"]:  # 如果排序有变化
+            sorted_list = sorted(ch.urls, key=get_sort_score)
+            blocks.append([final_inf] + sorted_list)
+            if sorted_list != ch.urls:  # 如果排序有变化
                 sort_count += 1
         else:
-            output_lines.extend(ch["urls"])
+            blocks.append([final_inf] + ch.urls)
     
-    return output_lines, rename_count, sort_count, len(channels_data)
+    return blocks, rename_count, sort_count, len(channels_data)
+
+def transform_playlist(playlist, args):
+    """
+    流水线阶段：对内存中的播放列表排序 URL / 重命名
+    :param playlist: m3u_playlist.Playlist
+    :param args: build_parser() 解析出的参数
+    :return: 新的 Playlist，内容与命令行方式写出的文件相同
+    """
+    blocks, _, _, _ = sort_m3u_blocks(
+        playlist.records, args.keywords, args.reverse, args.channels, args.rename
+    )
+    return Playlist.from_blocks(blocks)
 
-def safe_write_output(lines, input_path, output_path):
+def safe_write_output(lines, output_path):
     """
-    安全地写入输出文件，支持同文件覆盖
+    安全地写入输出文件：原子替换，支持同文件覆盖，内容未变化时保留原文件
     
     :param lines: 要写入的行列表
-    :param input_path: 输入文件路径
     :param output_path: 输出文件路径
-    :return: (success, temp_path) 成功返回(True, None)，失败返回(False, temp_path)
+    :return: (success, changed) 成功返回(True, 内容是否有变化)，失败返回(False, False)
     """
-    # 获取绝对路径以判断是否为同一个文件
-    input_abs = os.path.abspath(input_path)
-    output_abs = os.path.abspath(output_path)
-    is_same_file = input_abs == output_abs
-    
-    temp_path = None
-    
     try:
-        # 如果是同一个文件，先写到临时文件
-        if is_same_file:
-            # 在与输出文件相同目录创建临时文件
-            output_dir = os.path.dirname(output_path) or '.'
-            fd, temp_path = tempfile.mkstemp(
-                dir=output_dir,
-                suffix='.m3u',
-                prefix='.tmp_',
-                text=True
-            )
-            
-            # 使用文件描述符打开文件
-            out_f = os.fdopen(fd, 'w', encoding='utf-8')
-        else:
-            # 直接打开输出文件
-            out_f = open(output_path, 'w', encoding='utf-8')
-        
-        # 写入数据
-        with out_f:
-            for line in lines:
-                out_f.write(line + '\n')
-        
-        # 如果是同一个文件，进行原子替换
-        if is_same_file:
-            try:
-                # Python 3.3+ 推荐使用 os.replace 实现原子替换
-                os.replace(temp_path, output_path)
-                temp_path = None  # 替换成功，清除临时文件引用
-            except Exception as e:
-                # 如果 os.replace 失败，使用 shutil.move 作为备选
-                print(f"警告：原子替换失败，使用备选方案: {e}")
-                shutil.move(temp_path, output_path)
-                temp_path = None  # 移动成功，清除临时文件引用
-        
-        return True, None
-        
+        changed = atomic_write(output_path, iter_lines(lines))
     except Exception as e:
         print(f"写入文件失败: {e}")
-        return False, temp_path
+        return False, False
+    
+    if not changed:
+        print(f"内容未变化，保留原文件：{output_path}")
+    return True, changed
 
 def validate_arguments(input_path, output_path):
     """
@@ -200,18 +172,7 @@ def validate_arguments(input_path, output_path):
     
     return True
 
-def cleanup_temp_file(temp_path):
-    """
-    清理临时文件
-    """
-    if temp_path and os.path.exists(temp_path):
-        try:
-            os.unlink(temp_path)
-            print(f"已清理临时文件: {temp_path}")
-        except Exception as e:
-            print(f"警告：无法删除临时文件 {temp_path}: {e}")
-
-def main():
+def build_parser():
     parser = argparse.ArgumentParser(description="M3U 复合条件重命名与 URL 排序加固工具")
     parser.add_argument("-i", "--input", required=True, help="输入文件路径")
     parser.add_argument("-o", "--output", default="sorted_output.m3u", help="输出文件路径")
@@ -220,8 +181,10 @@ def main():
     parser.add_argument("-ch", "--channels", help="目标频道名关键字，逗号分隔")
     parser.add_argument("-rn", "--rename", help="重命名 (仅在满足 -ch 且包含 -k 时生效)")
     parser.add_argument("--force", action="store_true", help="强制覆盖输出文件（如果已存在且与输入不同）")
-    
-    args = parser.parse_args()
+    return parser
+
+def main():
+    args = build_parser().parse_args()
     
     # 验证参数
     if not validate_arguments(args.input, args.output):
@@ -248,11 +211,8 @@ def main():
             sys.exit(1)
         
         # 安全写入输出文件
-        success, temp_path = safe_write_output(output_lines, args.input, args.output)
-        
-        # 如果失败，清理临时文件
+        success, _ = safe_write_output(output_lines, args.output)
         if not success:
-            cleanup_temp_file(temp_path)
             print("处理失败！")
             sys.exit(1)
         
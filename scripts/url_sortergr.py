@@ -1,11 +1,14 @@
 import argparse
 import sys
-import re
 import os
-import tempfile
-import shutil
 import traceback
-from typing import List, Dict, Optional, Tuple, Set
+from typing import List, Dict, Optional, Tuple, Set, Iterable, Union
+
+from m3u_parser import M3URecord, iter_m3u_file, iter_m3u_records
+from m3u_model import Channel
+from m3u_extinf import ExtInf
+from m3u_playlist import Playlist
+from m3u_writer import atomic_write, iter_lines
 
 # ==================== 调试和错误处理配置 ====================
 DEBUG_MODE = os.environ.get('DEBUG', 'false').lower() == 'true'
@@ -73,152 +76,84 @@ def validate_arguments_extended(args) -> Tuple[bool, str]:
     return True, ""
 
 # ==================== 原有函数（添加调试输出） ====================
-def parse_extinf_group(extinf_line: str) -> Optional[str]:
-    """从EXTINF行解析group-title属性"""
-    debug_log(f"解析EXTINF行: {extinf_line[:100]}...", 'debug')
-    
-    # 查找 group-title="..." 模式
-    group_match = re.search(r'group-title="([^"]*)"', extinf_line)
-    if group_match:
-        result = group_match.group(1)
-        debug_log(f"从group-title属性解析到组名: {result}", 'debug')
-        return result
+def parse_extinf_group(extinf_line: Union[str, ExtInf]) -> Optional[str]:
+    """从EXTINF行解析group-title属性（支持双引号、单引号）"""
+    extinf = extinf_line if isinstance(extinf_line, ExtInf) else ExtInf(extinf_line)
+    debug_log(f"解析EXTINF行: {extinf.line[:100]}...", 'debug')
     
-    # 也可以尝试查找 group-title='...' 单引号模式
-    group_match = re.search(r"group-title='([^']*)'", extinf_line)
-    if group_match:
-        result = group_match.group(1)
-        debug_log(f"从group-title属性(单引号)解析到组名: {result}", 'debug')
+    result = extinf.get('group-title')
+    if result is not None:
+        debug_log(f"从group-title属性解析到组名: {result}", 'debug')
         return result
     
     debug_log("EXTINF行中没有找到group-title属性", 'debug')
     return None
 
-def update_extinf_group(extinf_line: str, new_group_name: str) -> str:
-    """更新EXTINF行中的group-title属性"""
-    debug_log(f"更新组名: '{extinf_line[:50]}...' -> '{new_group_name}'", 'debug')
-    
-    # 如果已有group-title属性，替换它
-    if 'group-title="' in extinf_line:
-        updated_line = re.sub(r'group-title="[^"]*"', f'group-title="{new_group_name}"', extinf_line)
-    elif "group-title='" in extinf_line:
-        updated_line = re.sub(r"group-title='[^']*'", f"group-title='{new_group_name}'", extinf_line)
-    else:
-        # 如果没有group-title属性，需要添加
-        if ',' in extinf_line:
-            parts = extinf_line.rsplit(',', 1)
-            attributes = parts[0]
-            channel_name = parts[1]
-            if attributes.endswith('"'):
-                updated_line = f'{attributes} group-title="{new_group_name}",{channel_name}'
-            else:
-                updated_line = f'{attributes} group-title="{new_group_name}",{channel_name}'
-        else:
-            debug_log(f"无法更新组名，EXTINF格式异常: {extinf_line}", 'warn')
-            return extinf_line
+def update_extinf_group(extinf_line: Union[str, ExtInf], new_group_name: str) -> str:
+    """更新EXTINF行中的group-title属性，没有则添加"""
+    extinf = extinf_line if isinstance(extinf_line, ExtInf) else ExtInf(extinf_line)
+    debug_log(f"更新组名: '{extinf.line[:50]}...' -> '{new_group_name}'", 'debug')
+    
+    if 'group-title' not in extinf and extinf.name is None:
+        debug_log(f"无法更新组名，EXTINF格式异常: {extinf.line}", 'warn')
+        return extinf.to_line()
+    
+    extinf.set('group-title', new_group_name)
+    updated_line = extinf.to_line()
     
     debug_log(f"更新后的行: {updated_line[:100]}...", 'debug')
     return updated_line
 
-def parse_m3u_file(lines: List[str]) -> Tuple[List[Dict], List[str]]:
+def parse_m3u_file(lines: Iterable[str]) -> Tuple[List[Channel], List[str]]:
     """解析M3U文件，支持多种格式"""
-    debug_log(f"开始解析M3U文件，共 {len(lines)} 行", 'info')
+    return parse_m3u_records(iter_m3u_records(lines))
+
+def parse_m3u_records(records: Iterable[M3URecord]) -> Tuple[List[Channel], List[str]]:
+    """由已解析的记录构建频道列表和头部"""
+    debug_log("开始解析M3U文件", 'info')
     
     channels_data = []
     header_lines = []
-    
-    current_inf = None
-    current_urls = []
-    current_group = None
-    current_extgrp = None
     channel_count = 0
-    line_num = 0
     
-    i = 0
-    while i < len(lines):
-        line_num += 1
-        line = lines[i].strip()
-        
-        if not line:
-            i += 1
-            continue
-        
-        debug_log(f"行 {line_num}: 处理 '{line[:50]}...'", 'debug')
-        
-        # 处理文件头
-        if i == 0 and (line.startswith('#EXTM3U') or line.startswith('#PLAYLIST')):
-            header_lines.append(line)
-            debug_log(f"行 {line_num}: 识别为文件头", 'debug')
-            i += 1
-            continue
-        
-        # 处理其他可能的头部注释
-        if i < 3 and line.startswith('#'):
-            if not line.startswith('#EXTINF') and not line.startswith('#EXTGRP'):
-                header_lines.append(line)
-                debug_log(f"行 {line_num}: 识别为头部注释", 'debug')
-                i += 1
-                continue
-        
-        # 处理EXTGRP标签
-        if line.startswith('#EXTGRP:'):
-            current_extgrp = line
-            current_group = line.replace('#EXTGRP:', '').strip()
-            debug_log(f"行 {line_num}: 识别为EXTGRP标签，组名: {current_group}", 'debug')
-            i += 1
-            continue
-        
-        # 处理EXTINF行
-        if line.startswith('#EXTINF'):
-            # 保存上一个频道
-            if current_inf:
-                group = current_group
-                if group is None:
-                    group = parse_extinf_group(current_inf)
-                
-                channels_data.append({
-                    "inf": current_inf, 
-                    "urls": current_urls,
-                    "group": group,
-                    "extgrp_line": current_extgrp
-                })
-                channel_count += 1
-                debug_log(f"完成解析频道 {channel_count}: 组名='{group}', URL数量={len(current_urls)}", 'debug')
-            
-            # 开始新频道
-            current_inf = line
-            current_urls = []
-            current_group = parse_extinf_group(line)
-            current_extgrp = None
-            debug_log(f"行 {line_num}: 识别为新频道开始", 'debug')
-            i += 1
-            continue
-        
-        # 处理URL行
-        if not line.startswith('#'):
-            current_urls.append(line)
-            debug_log(f"行 {line_num}: 识别为URL ({len(current_urls)})", 'debug')
-            i += 1
+    for record in records:
+        # 处理文件头：前 3 行中的注释行（#EXTGRP 除外）视为头部
+        if record.extinf is None:
+            for pos, line in enumerate(record.lines):
+                if pos < 3 and line.startswith('#') and not line.startswith('#EXTGRP'):
+                    header_lines.append(line)
+                    debug_log(f"头部第 {pos + 1} 行: 识别为头部信息", 'debug')
+                else:
+                    debug_log(f"头部第 {pos + 1} 行: 跳过 '{line[:50]}...'", 'debug')
             continue
         
-        # 其他注释行
-        debug_log(f"行 {line_num}: 跳过注释行", 'debug')
-        i += 1
-    
-    # 保存最后一个频道
-    if current_inf:
-        group = current_group
-        if group is None:
-            group = parse_extinf_group(current_inf)
-        
-        channels_data.append({
-            "inf": current_inf, 
-            "urls": current_urls,
-            "group": group,
-            "extgrp_line": current_extgrp
-        })
+        current_inf = record.extinf
+        current_urls = []
+        current_group = parse_extinf_group(current_inf)
+        current_extgrp = None
+        
+        for line in record.lines:
+            # 处理EXTGRP标签
+            if line.startswith('#EXTGRP:'):
+                current_extgrp = line
+                current_group = line.replace('#EXTGRP:', '').strip()
+                debug_log(f"识别为EXTGRP标签，组名: {current_group}", 'debug')
+            # 处理URL行
+            elif not line.startswith('#'):
+                current_urls.append(line)
+                debug_log(f"识别为URL ({len(current_urls)})", 'debug')
+            # 其他注释行
+            else:
+                debug_log(f"跳过注释行 '{line[:50]}...'", 'debug')
+        
+        channels_data.append(Channel(
+            current_inf,
+            urls=current_urls,
+            group=current_group,
+            extgrp_line=current_extgrp
+        ))
         channel_count += 1
-        debug_log(f"完成解析最后一个频道: 组名='{group}', URL数量={len(current_urls)}", 'debug')
+        debug_log(f"完成解析频道 {channel_count}: 组名='{current_group}', URL数量={len(current_urls)}", 'debug')
     
     debug_log(f"解析完成: 共 {len(channels_data)} 个频道, {len(header_lines)} 行头部", 'info')
     
@@ -226,7 +161,7 @@ def parse_m3u_file(lines: List[str]) -> Tuple[List[Dict], List[str]]:
     if DEBUG_MODE:
         group_stats = {}
         for ch in channels_data:
-            group = ch.get("group", "无组名")
+            group = ch.group
             group_stats[group] = group_stats.get(group, 0) + 1
         
         debug_log("频道组统计:", 'debug')
@@ -239,8 +174,9 @@ def sort_m3u_urls(input_file: str, output_file: str, keywords_str: str,
                   reverse_mode: bool = False, target_channels_str: Optional[str] = None,
                   new_name: Optional[str] = None, force: bool = False,
                   group_names_str: Optional[str] = None, rename_group: Optional[str] = None,
-                  group_sort: bool = False) -> Tuple[List[str], int, int, int, int, int, int]:
-    """处理M3U文件，支持URL排序和条件重命名"""
+                  group_sort: bool = False,
+                  records: Optional[Iterable[M3URecord]] = None) -> Tuple[List[str], int, int, int, int, int, int]:
+    """处理M3U文件，支持URL排序和条件重命名；传入 records 时直接处理已解析的记录，不再读取 input_file"""
     
     debug_log("=" * 60, 'info')
     debug_log("开始处理M3U文件", 'info')
@@ -269,21 +205,15 @@ def sort_m3u_urls(input_file: str, output_file: str, keywords_str: str,
     rename_mode = bool(new_name or rename_group)
     debug_log(f"重命名模式: {rename_mode}", 'info')
     
-    try:
-        debug_log(f"正在读取文件: {input_file}", 'info')
-        with open(input_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        debug_log(f"读取成功，共 {len(lines)} 行", 'info')
-    except Exception as e:
-        log_exception(e, "读取输入文件")
-        return None, 0, 0, 0, 0, 0, 0
-    
     # 2. 结构化解析
     try:
-        channels_data, header_lines = parse_m3u_file([line.rstrip('\n') for line in lines])
+        if records is None:
+            debug_log(f"正在读取文件: {input_file}", 'info')
+            records = iter_m3u_file(input_file)
+        channels_data, header_lines = parse_m3u_records(records)
         debug_log(f"解析出 {len(channels_data)} 个频道", 'info')
     except Exception as e:
-        log_exception(e, "解析M3U文件")
+        log_exception(e, "读取并解析M3U文件")
         return None, 0, 0, 0, 0, 0, 0
     
     # 排序得分函数
@@ -299,8 +229,8 @@ def sort_m3u_urls(input_file: str, output_file: str, keywords_str: str,
         return 0
 
     # 频道组排序得分函数 - 修复版本，支持反向模式
-    def get_group_sort_score(channel_data: Dict, reverse: bool = False) -> int:
-        ch_group = channel_data.get("group", "")
+    def get_group_sort_score(channel_data: Channel, reverse: bool = False) -> int:
+        ch_group = channel_data.group
         
         if group_names:
             for index, group_kw in enumerate(group_names):
@@ -318,19 +248,14 @@ def sort_m3u_urls(input_file: str, output_file: str, keywords_str: str,
         else:
             return 1   # 排在最后面
 
-    # 重命名频道函数
-    def rename_inf(inf_line: str, name: str) -> str:
-        debug_log(f"重命名频道: '{inf_line[:50]}...' -> '{name}'", 'debug')
-        
-        if 'tvg-name="' in inf_line:
-            inf_line = re.sub(r'tvg-name="[^"]*"', f'tvg-name="{name}"', inf_line)
-        elif "tvg-name='" in inf_line:
-            inf_line = re.sub(r"tvg-name='[^']*'", f"tvg-name='{name}'", inf_line)
-        
-        if ',' in inf_line:
-            parts = inf_line.rsplit(',', 1)
-            return f"{parts[0]},{name}"
-        return f"{inf_line},{name}"
+    # 重命名频道函数：同步更新 tvg-name 属性和末尾显示名称
+    def rename_inf(extinf: ExtInf, name: str) -> str:
+        debug_log(f"重命名频道: '{extinf.line[:50]}...' -> '{name}'", 'debug')
+        
+        if 'tvg-name' in extinf:
+            extinf.set('tvg-name', name)
+        extinf.set_name(name)
+        return extinf.to_line()
 
     # 3. 生成输出内容
     output_lines = []
@@ -356,7 +281,7 @@ def sort_m3u_urls(input_file: str, output_file: str, keywords_str: str,
         if DEBUG_MODE:
             debug_log("组排序后的频道顺序:", 'debug')
             for idx, ch in enumerate(channels_data[:10]):  # 只显示前10个
-                group = ch.get("group", "无组名")
+                group = ch.group
                 debug_log(f"  频道 {idx+1}: 组='{group}', 得分={get_group_sort_score(ch, reverse_mode)}", 'debug')
     
     # 处理每个频道
@@ -368,14 +293,14 @@ def sort_m3u_urls(input_file: str, output_file: str, keywords_str: str,
     
     for idx, ch in enumerate(channels_data):
         processed_channel_count += 1
-        ch_group = ch.get("group", "")
-        extgrp_line = ch.get("extgrp_line")
+        ch_group = ch.group
+        extgrp_line = ch.extgrp_line
         
         debug_log(f"处理频道 {idx+1}/{len(channels_data)}: 组='{ch_group}'", 'debug')
         
         # 条件匹配
-        name_match = any(tc.lower() in ch["inf"].lower() for tc in target_channels) if target_channels else False
-        url_match_for_rename = any(any(kw.lower() in url.lower() for kw in keywords) for url in ch["urls"])
+        name_match = any(tc.lower() in ch.info.lower() for tc in target_channels) if target_channels else False
+        url_match_for_rename = any(any(kw.lower() in url.lower() for kw in keywords) for url in ch.urls)
         group_match = any(gn.lower() in ch_group.lower() for gn in group_names) if group_names else True
         
         debug_log(f"  频道名匹配: {name_match}, URL匹配: {url_match_for_rename}, 组匹配: {group_match}", 'debug')
@@ -425,12 +350,13 @@ def sort_m3u_urls(input_file: str, output_file: str, keywords_str: str,
         
         if not should_process:
             debug_log(f"  跳过处理（不匹配组条件）", 'debug')
-            output_lines.append(ch["inf"])
-            output_lines.extend(ch["urls"])
+            output_lines.append(ch.info)
+            output_lines.extend(ch.urls)
             continue
         
-        # 初始化最终INF行
-        final_inf = ch["inf"]
+        # 初始化最终INF行；只有需要改写时才分词
+        final_inf = ch.info
+        extinf = None
         channel_renamed = False
         
         # 重命名模式逻辑
@@ -440,13 +366,14 @@ def sort_m3u_urls(input_file: str, output_file: str, keywords_str: str,
             # 频道重命名
             if new_name and target_channels and keywords:
                 if name_match and url_match_for_rename:
-                    final_inf = rename_inf(ch["inf"], new_name)
+                    extinf = ExtInf(ch.info)
+                    final_inf = rename_inf(extinf, new_name)
                     rename_count += 1
                     channel_renamed = True
                     debug_log(f"  频道重命名成功，计数: {rename_count}", 'debug')
             
             # 频道组重命名（group-title属性）
-            if rename_group and group_match and parse_extinf_group(final_inf):
+            if rename_group and group_match and parse_extinf_group(extinf or ch.info):
                 should_rename_group_attr = False
                 
                 if not keywords and not target_channels:
@@ -459,7 +386,7 @@ def sort_m3u_urls(input_file: str, output_file: str, keywords_str: str,
                     should_rename_group_attr = True
                 
                 if should_rename_group_attr:
-                    final_inf = update_extinf_group(final_inf, rename_group)
+                    final_inf = update_extinf_group(extinf or ch.info, rename_group)
                     if ch_group not in processed_groups:
                         group_rename_count += 1
                         processed_groups.add(ch_group)
@@ -469,7 +396,7 @@ def sort_m3u_urls(input_file: str, output_file: str, keywords_str: str,
             
             # 重命名模式下：先输出EXTINF行，再输出URLs
             output_lines.append(final_inf)
-            output_lines.extend(ch["urls"])
+            output_lines.extend(ch.urls)
             
         # 排序模式逻辑
         else:
@@ -477,7 +404,7 @@ def sort_m3u_urls(input_file: str, output_file: str, keywords_str: str,
             should_sort_urls = False
             
             if group_sort:
-                should_sort_urls = group_match and len(ch["urls"]) > 1
+                should_sort_urls = group_match and len(ch.urls) > 1
             else:
                 if target_channels:
                     should_sort_urls = name_match and group_match
@@ -490,91 +417,63 @@ def sort_m3u_urls(input_file: str, output_file: str, keywords_str: str,
             output_lines.append(final_inf)
             
             # 然后输出URLs（可能排序）
-            if should_sort_urls and len(ch["urls"]) > 1:
-                sorted_list = sorted(ch["urls"], key=get_url_sort_score)
+            if should_sort_urls and len(ch.urls) > 1:
+                sorted_list = sorted(ch.urls, key=get_url_sort_score)
                 output_lines.extend(sorted_list)
-                if sorted_list != ch["urls"]:
+                if sorted_list != ch.urls:
                     sort_count += 1
                     debug_log(f"  URL排序成功，排序变化计数: {sort_count}", 'debug')
             else:
-                output_lines.extend(ch["urls"])
+                output_lines.extend(ch.urls)
     
     debug_log(f"处理完成: 重命名 {rename_count} 个频道, 排序 {sort_count} 个频道", 'info')
     debug_log(f"组重命名: {group_rename_count} 个频道组", 'info')
     
     return output_lines, rename_count, sort_count, len(channels_data), group_rename_count, group_sort_count, group_rename_with_k_count
 
-def safe_write_output(lines: List[str], input_path: str, output_path: str) -> Tuple[bool, Optional[str]]:
-    """安全地写入输出文件"""
+def safe_write_output(lines: List[str], output_path: str) -> Tuple[bool, bool]:
+    """安全地写入输出文件：原子替换，内容未变化时保留原文件，返回 (是否成功, 内容是否有变化)"""
     debug_log(f"安全写入输出文件: {output_path}", 'info')
-    debug_log(f"输入路径: {input_path}", 'debug')
-    
-    input_abs = os.path.abspath(input_path)
-    output_abs = os.path.abspath(output_path)
-    is_same_file = input_abs == output_abs
-    
-    debug_log(f"是否为同一文件: {is_same_file}", 'debug')
-    
-    temp_path = None
     
     try:
-        if is_same_file:
-            output_dir = os.path.dirname(output_path) or '.'
-            fd, temp_path = tempfile.mkstemp(
-                dir=output_dir,
-                suffix='.m3u',
-                prefix='.tmp_',
-                text=True
-            )
-            debug_log(f"创建临时文件: {temp_path}", 'debug')
-            
-            out_f = os.fdopen(fd, 'w', encoding='utf-8')
-        else:
-            out_f = open(output_path, 'w', encoding='utf-8')
-            debug_log(f"直接打开输出文件: {output_path}", 'debug')
-        
-        with out_f:
-            for line in lines:
-                out_f.write(line + '\n')
-        
-        debug_log(f"写入完成，共 {len(lines)} 行", 'info')
-        
-        if is_same_file:
-            try:
-                os.replace(temp_path, output_path)
-                temp_path = None
-                debug_log("原子替换原文件成功", 'info')
-            except Exception as e:
-                debug_log(f"原子替换失败，使用备选方案: {e}", 'warn')
-                shutil.move(temp_path, output_path)
-                temp_path = None
-                debug_log("移动临时文件成功", 'info')
-        
-        return True, None
-        
+        changed = atomic_write(output_path, iter_lines(lines))
     except Exception as e:
         log_exception(e, "写入输出文件")
-        return False, temp_path
+        return False, False
+    
+    debug_log(f"写入完成，共 {len(lines)} 行", 'info')
+    if not changed:
+        debug_log("内容未变化，保留原文件", 'info')
+    return True, changed
 
-def cleanup_temp_file(temp_path: Optional[str]) -> None:
-    """清理临时文件"""
-    if temp_path and os.path.exists(temp_path):
-        try:
-            os.unlink(temp_path)
-            debug_log(f"已清理临时文件: {temp_path}", 'info')
-        except Exception as e:
-            debug_log(f"无法删除临时文件 {temp_path}: {e}", 'warn')
+def transform_playlist(playlist: Playlist, args: argparse.Namespace) -> Playlist:
+    """
+    流水线阶段：对内存中的播放列表排序 URL / 频道组并按条件重命名
+    
+    :param playlist: m3u_playlist.Playlist
+    :param args: build_parser() 解析出的参数
+    :return: 新的 Playlist，内容与命令行方式写出的文件相同
+    """
+    output_lines = sort_m3u_urls(
+        args.input, args.output, args.keywords,
+        reverse_mode=args.reverse,
+        target_channels_str=args.channels,
+        new_name=args.rename,
+        group_names_str=args.groups,
+        rename_group=args.rename_group,
+        group_sort=args.group_sort,
+        records=playlist.records
+    )[0]
+    if output_lines is None:
+        raise ValueError("频道排序失败")
+    return Playlist.from_lines(output_lines)
 
-def main():
-    """主函数，添加详细的错误处理"""
-    debug_log("脚本启动", 'info')
-    debug_log(f"命令行参数: {sys.argv}", 'debug')
-    
-    try:
-        parser = argparse.ArgumentParser(
-            description="M3U URL排序与条件重命名工具",
-            formatter_class=argparse.RawDescriptionHelpFormatter,
-            epilog="""
+def build_parser() -> argparse.ArgumentParser:
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(
+        description="M3U URL排序与条件重命名工具",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
 🚀 调试选项:
   设置环境变量 DEBUG=true 启用调试模式
   设置环境变量 LOG_LEVEL=debug|info|warn|error 控制日志级别
@@ -600,30 +499,38 @@ def main():
   例如，把"其它"组排到最后:
     %(prog)s -i input.m3u -gr "其它" -gs -r
             """
-        )
-        
-        # 基础参数
-        parser.add_argument("-i", "--input", required=True, help="输入M3U文件路径")
-        parser.add_argument("-o", "--output", default="sorted_output.m3u", help="输出文件路径")
-        parser.add_argument("-k", "--keywords", default="", help="URL关键字，逗号分隔")
-        parser.add_argument("-r", "--reverse", action="store_true", help="开启反向模式（影响URL排序和组排序）")
-        
-        # 频道相关参数
-        parser.add_argument("-ch", "--channels", help="目标频道名关键字，逗号分隔")
-        parser.add_argument("-rn", "--rename", help="重命名频道名（需同时满足 -ch 和 -k 条件）")
-        
-        # 频道组相关参数
-        parser.add_argument("-gr", "--groups", help="目标频道组名关键字，逗号分隔")
-        parser.add_argument("-rg", "--rename-group", help="重命名频道组名")
-        parser.add_argument("-gs", "--group-sort", action="store_true", help="对频道组进行排序")
-        
-        parser.add_argument("--force", action="store_true", help="强制覆盖输出文件")
-        
-        # 添加调试参数
-        parser.add_argument("--debug", action="store_true", help="启用调试模式")
-        parser.add_argument("--verbose", "-v", action="store_true", help="详细输出")
-        
-        args = parser.parse_args()
+    )
+    
+    # 基础参数
+    parser.add_argument("-i", "--input", required=True, help="输入M3U文件路径")
+    parser.add_argument("-o", "--output", default="sorted_output.m3u", help="输出文件路径")
+    parser.add_argument("-k", "--keywords", default="", help="URL关键字，逗号分隔")
+    parser.add_argument("-r", "--reverse", action="store_true", help="开启反向模式（影响URL排序和组排序）")
+    
+    # 频道相关参数
+    parser.add_argument("-ch", "--channels", help="目标频道名关键字，逗号分隔")
+    parser.add_argument("-rn", "--rename", help="重命名频道名（需同时满足 -ch 和 -k 条件）")
+    
+    # 频道组相关参数
+    parser.add_argument("-gr", "--groups", help="目标频道组名关键字，逗号分隔")
+    parser.add_argument("-rg", "--rename-group", help="重命名频道组名")
+    parser.add_argument("-gs", "--group-sort", action="store_true", help="对频道组进行排序")
+    
+    parser.add_argument("--force", action="store_true", help="强制覆盖输出文件")
+    
+    # 添加调试参数
+    parser.add_argument("--debug", action="store_true", help="启用调试模式")
+    parser.add_argument("--verbose", "-v", action="store_true", help="详细输出")
+    
+    return parser
+
+def main():
+    """主函数，添加详细的错误处理"""
+    debug_log("脚本启动", 'info')
+    debug_log(f"命令行参数: {sys.argv}", 'debug')
+    
+    try:
+        args = build_parser().parse_args()
         
         # 处理调试参数
         if args.debug:
@@ -685,10 +592,9 @@ def main():
         # 安全写入输出文件
         debug_log("开始写入输出文件", 'info')
         try:
-            success, temp_path = safe_write_output(output_lines, args.input, args.output)
+            success, changed = safe_write_output(output_lines, args.output)
             
             if not success:
-                cleanup_temp_file(temp_path)
                 print("❌ 写入输出文件失败")
                 sys.exit(1)
         except Exception as e:
@@ -725,7 +631,7 @@ def main():
         if DEBUG_MODE:
             print(f"\n🔍 调试信息:")
             print(f"   处理的行数: {len(output_lines)}")
-            print(f"   临时文件: {'已清理' if temp_path is None else '存在'}")
+            print(f"   内容变化: {'是' if changed else '否（保留原文件）'}")
         
         if input_abs == output_abs:
             print(f"\n⚠️  注意: 已安全覆盖原文件")
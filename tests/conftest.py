@@ -0,0 +1,10 @@
+"""
+测试公共配置：让测试可以直接导入 scripts/ 下的模块（与 benchmarks/bench_utils.py 相同）
+"""
+
+import os
+import sys
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
@@ -0,0 +1,53 @@
+"""deduplicate.py：组合去重键"""
+
+import argparse
+
+import pytest
+
+from deduplicate import parse_key, record_key, unique_records
+from m3u_parser import M3URecord
+from m3u_seen import SeenBloom
+
+
+def test_parse_key():
+    assert parse_key('name') == ('name',)
+    assert parse_key(' name + url ') == ('name', 'url')
+    assert parse_key(('tvg-id',)) == ('tvg-id',)
+    for text in ('title', 'name+name', 'name+', ''):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_key(text)
+
+
+def test_record_key_parts():
+    record = M3URecord('#EXTINF:-1 tvg-id="cctv1",CCTV-1', ['#EXTVLCOPT:x', 'http://b/1', 'http://a/1?t=1'])
+    assert record_key(record, ('name',)) == ('1', 'CCTV-1')
+    assert record_key(record, ('tvg-id', 'url')) == ('1', 'cctv1', '2', 'http://a/1?t=1', 'http://b/1')
+    # URL 的顺序不影响键
+    swapped = record._replace(lines=['http://a/1?t=1', 'http://b/1'])
+    assert record_key(swapped, ('url',)) == record_key(record, ('url',))
+
+
+def test_record_key_fallbacks():
+    record = M3URecord('#EXTINF:-1 group-title="央视",CCTV-1', [])
+    assert record_key(record, ('tvg-id',)) == ('2', '', 'CCTV-1')
+    assert record_key(record, ('url',)) == ('2', '', 'CCTV-1')
+    # 各部分带值的个数，不同组合不会得到相同的键
+    a = M3URecord('#EXTINF:-1,A', ['x'])
+    b = M3URecord('#EXTINF:-1,', ['A', 'x'])
+    assert record_key(a, ('name', 'url')) != record_key(b, ('name', 'url'))
+
+
+def test_unique_records_with_keys():
+    records = [
+        M3URecord(None, ['#EXTM3U']),
+        M3URecord('#EXTINF:-1,CCTV-1', ['http://a/1']),
+        M3URecord('#EXTINF:-1,CCTV-1', ['http://a/2']),
+        M3URecord('#EXTINF:-1,CCTV1', ['HTTP://A:80/1']),
+    ]
+    by_name = unique_records(records, 'name')
+    assert [r.lines for r in by_name] == [['#EXTM3U'], ['http://a/1'], ['HTTP://A:80/1']]
+    assert unique_records(records, 'name', SeenBloom(100, 0.001)) == by_name
+    assert len(unique_records(records, 'name+url')) == 4
+    # 规范化 URL 相同：位置为第一次出现的位置，没有时间参数时内容取后出现的记录
+    kept = unique_records(records, 'canonical-url')
+    assert [r.lines for r in kept] == [['#EXTM3U'], ['HTTP://A:80/1'], ['http://a/2']]
@@ -0,0 +1,109 @@
+"""extract.py：流式模式与一次读入整个文件的输出相同，规则文件与逐条运行的输出相同"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from extract import load_extract_rules
+
+EXTRACT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts', 'extract.py')
+
+SOURCE = """#EXTM3U
+#EXTINF:-1 group-title="央视",CCTV-1 综合
+#EXTVLCOPT:http-user-agent=x
+http://10.0.0.1/hls/1.m3u8
+#EXTINF:-1 group-title="卫视",湖南卫视
+http://10.0.0.2/live/2
+
+#EXTINF:-1 group-title="央视",CCTV-1 综合
+#EXTVLCOPT:http-user-agent=x
+http://10.0.0.1/hls/1.m3u8
+#EXTINF:-1 group-title="地方",CCTV 测试
+udp://239.0.0.1:5000
+"""
+
+
+def run_extract(*args, stdin=None, cwd=None):
+    result = subprocess.run([sys.executable, EXTRACT, *args], input=stdin, capture_output=True,
+                            encoding='utf-8', cwd=cwd)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+@pytest.mark.parametrize('options', [
+    ['--eoru', 'CCTV,hls'],
+    ['--eandu', 'CCTV && !测试,http', '-n'],
+    ['--eoru', 'CCTV,udp', '-r'],
+])
+def test_stream_matches_whole_file(tmp_path, options):
+    source = tmp_path / 'in.m3u'
+    source.write_text(SOURCE, encoding='utf-8')
+    run_extract('--input', str(source), '--output', str(tmp_path / 'whole.m3u'), *options)
+    run_extract('--input', str(source), '--output', str(tmp_path / 'stream.m3u'), '--stream', *options)
+    expected = (tmp_path / 'whole.m3u').read_text(encoding='utf-8')
+    assert '#EXTINF' in expected
+    assert (tmp_path / 'stream.m3u').read_text(encoding='utf-8') == expected
+    assert run_extract('--input', '-', '--output', '-', *options, stdin=SOURCE) == expected
+
+
+RULES = [
+    ({"eandu": "CCTV && !测试,http"}, ['--eandu', 'CCTV && !测试,http']),
+    ({"eoru": "卫视,udp", "no_config": True}, ['--eoru', '卫视,udp', '-n']),
+    ({"eoru": "group-title=央视,", "remove": True}, ['--eoru', 'group-title=央视,', '-r']),
+]
+
+
+@pytest.mark.parametrize('mmap', [[], ['--mmap']])
+def test_rules_match_separate_runs(tmp_path, mmap):
+    source = tmp_path / 'in.m3u'
+    source.write_text(SOURCE, encoding='utf-8')
+    specs = [dict(spec, output=f'rule{index}.m3u') for index, (spec, _) in enumerate(RULES)]
+    (tmp_path / 'rules.json').write_text(json.dumps({"rules": specs}, ensure_ascii=False), encoding='utf-8')
+    run_extract('--input', 'in.m3u', '--rules', 'rules.json', *mmap, cwd=tmp_path)
+
+    for index, (_, options) in enumerate(RULES):
+        run_extract('--input', 'in.m3u', '--output', f'single{index}.m3u', *options, *mmap, cwd=tmp_path)
+        expected = (tmp_path / f'single{index}.m3u').read_bytes()
+        assert b'#EXTINF' in expected
+        assert (tmp_path / f'rule{index}.m3u').read_bytes() == expected
+
+
+def test_rules_take_command_line_defaults(tmp_path):
+    source = tmp_path / 'in.m3u'
+    source.write_text(SOURCE, encoding='utf-8')
+    rules = {"rules": [{"eoru": "CCTV,", "output": "a.m3u"}, {"eoru": "CCTV,", "output": "b.m3u", "no_config": False}]}
+    (tmp_path / 'rules.json').write_text(json.dumps(rules), encoding='utf-8')
+    run_extract('--input', 'in.m3u', '--rules', 'rules.json', '-n', cwd=tmp_path)
+    assert '#EXTVLCOPT' not in (tmp_path / 'a.m3u').read_text(encoding='utf-8')
+    assert '#EXTVLCOPT' in (tmp_path / 'b.m3u').read_text(encoding='utf-8')
+
+
+@pytest.mark.parametrize('content, message', [
+    ('{"rules": [', '不是有效的 JSON'),
+    ('[]', '非空 rules 列表'),
+    ('{"rules": []}', '非空 rules 列表'),
+    ('{"rules": ["CCTV,"]}', '必须是对象'),
+    ('{"rules": [{"output": "a.m3u"}]}', 'eandu 或 eoru'),
+    ('{"rules": [{"eandu": "a,", "eoru": "b,", "output": "a.m3u"}]}', 'eandu 或 eoru'),
+    ('{"rules": [{"eoru": 1, "output": "a.m3u"}]}', 'eandu 或 eoru'),
+    ('{"rules": [{"eoru": "CCTV,"}]}', '缺少 output'),
+    ('{"rules": [{"eoru": "CCTV,", "output": "a.m3u", "remove": "yes"}]}', 'remove 必须是'),
+    ('{"rules": [{"eoru": "(CCTV,", "output": "a.m3u"}]}', '第 1 条规则'),
+    # 两条规则写到同一个文件（写法不同也算）
+    ('{"rules": [{"eoru": "CCTV,", "output": "a.m3u"}, {"eoru": "卫视,", "output": "./a.m3u"}]}',
+     '第 2 条规则：output 与前面的规则重复'),
+])
+def test_malformed_rules(tmp_path, content, message):
+    path = tmp_path / 'rules.json'
+    path.write_text(content, encoding='utf-8')
+    with pytest.raises(ValueError, match=message):
+        load_extract_rules(str(path))
+
+    (tmp_path / 'in.m3u').write_text(SOURCE, encoding='utf-8')
+    result = subprocess.run([sys.executable, EXTRACT, '--input', 'in.m3u', '--rules', 'rules.json'],
+                            capture_output=True, encoding='utf-8', cwd=tmp_path)
+    assert result.returncode == 1 and message.split('：')[-1] in result.stdout
+    assert sorted(os.listdir(tmp_path)) == ['in.m3u', 'rules.json']
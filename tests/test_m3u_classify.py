@@ -0,0 +1,126 @@
+"""m3u_classify：按规则顺序分桶、桶内排序与规则校验"""
+
+import pytest
+
+from m3u_classify import DEFAULT_RULES, NO_NUMBER, Bucket, classify, compile_rules, load_rules, match_rule
+from m3u_model import Channel
+
+
+def make_channels(*specs):
+    return [Channel(f'#EXTINF:-1,{name}', name=name, group=group, order_idx=index)
+            for index, (name, group) in enumerate(specs)]
+
+
+def names(buckets):
+    return [(bucket.label, [channel.name for channel in channels]) for bucket, channels in buckets]
+
+
+def test_default_rules():
+    channels = make_channels(('CCTV-13 新闻', '新闻'), ('湖南卫视', '卫视频道'), ('cctv-1', '综合'),
+                             ('CCTV-5+', '体育'), ('CCTV风云剧场', '付费'), ('翡翠台', '香港'), ('凤凰中文', '香港'),
+                             ('北京新闻', '地方'))
+    buckets = classify(channels, load_rules())
+    assert names(buckets) == [
+        ('央视', ['cctv-1', 'CCTV-5+', 'CCTV-13 新闻', 'CCTV风云剧场']),
+        ('卫视', ['湖南卫视']),
+        ('其他', ['北京新闻', '翡翠台', '凤凰中文']),
+    ]
+    # 目标组为 None 的默认桶保留原组
+    assert [channel.final_group for channel in buckets[2][1]] == ['地方', '香港', '香港']
+    assert buckets[0][1][0].final_group == '央视'
+    assert load_rules().buckets == compile_rules(DEFAULT_RULES).buckets
+
+
+def test_first_matching_rule_wins():
+    rules = compile_rules({"rules": [
+        {"pattern": "卫视", "group": "卫视"},
+        {"pattern": "湖南", "group": "湖南"},
+        {"pattern": "体育", "group": "体育", "sort": "name"},
+    ]})
+    channels = make_channels(('湖南卫视', ''), ('湖南都市', ''), ('湖南体育', ''), ('五星体育', ''), ('广东体育', ''))
+    assert names(classify(channels, rules)) == [
+        ('卫视', ['湖南卫视']),
+        ('湖南', ['湖南都市', '湖南体育']),
+        ('体育', ['五星体育', '广东体育']),
+        ('其他', []),
+    ]
+
+
+def test_number_sort():
+    rules = compile_rules({"rules": [{"pattern": "CCTV", "ignore_case": True, "group": "央视", "sort": "number"}]})
+    assert match_rule(rules, 'CCTV-13') == (0, 13)
+    assert match_rule(rules, 'cctv5+') == (0, 5)
+    assert match_rule(rules, 'CCTV 1') == (0, NO_NUMBER)
+    assert match_rule(rules, '湖南卫视') == (1, NO_NUMBER)
+    channels = make_channels(('CCTV-10', ''), ('CCTV 风云', ''), ('CCTV-2', ''), ('CCTV2', ''), ('CCTV1', ''))
+    # 数字相同时按原顺序，没有数字的排在最后
+    assert names(classify(channels, rules))[0][1] == ['CCTV1', 'CCTV-2', 'CCTV2', 'CCTV-10', 'CCTV 风云']
+
+
+def test_rule_groups_do_not_confuse_owner():
+    # 规则内部的捕获组和 number 捕获组都归属于各自的规则
+    rules = compile_rules({"rules": [
+        {"pattern": "(体育|赛事)", "group": "体育", "sort": "number"},
+        {"pattern": "(新闻)(综合)?", "group": "新闻"},
+        {"pattern": "电影", "group": "电影", "sort": "number"},
+    ]})
+    assert match_rule(rules, '赛事3') == (0, 3)
+    assert match_rule(rules, '新闻综合') == (1, NO_NUMBER)
+    assert match_rule(rules, '新闻') == (1, NO_NUMBER)
+    assert match_rule(rules, '电影-6') == (2, 6)
+
+
+def test_other_sort_keys_and_default():
+    rules = compile_rules({"rules": [], "default": {"label": "全部", "group": "合并", "sort": "group"}})
+    assert rules.matcher is None and rules.buckets == [Bucket('全部', '合并', 'group')]
+    channels = make_channels(('A', 'sport'), ('B', 'news'), ('C', 'sport'))
+    assert names(classify(channels, rules)) == [('全部', ['B', 'A', 'C'])]
+    assert {channel.final_group for channel in channels} == {'合并'}
+
+
+@pytest.mark.parametrize('definition', [
+    [],
+    {"rules": {}},
+    {"rules": ["CCTV"]},
+    {"rules": [{"group": "央视"}]},
+    {"rules": [{"pattern": ""}]},
+    {"rules": [{"pattern": "("}]},
+    {"rules": [{"pattern": "CCTV", "sort": "size"}]},
+    {"rules": [{"pattern": "CCTV", "group": 1}]},
+    {"rules": [], "default": "其他"},
+])
+def test_invalid_rules(definition):
+    with pytest.raises(ValueError):
+        compile_rules(definition)
+
+
+@pytest.mark.parametrize('definition, message', [
+    # 合并后编号会平移：单独编译时 "(.)\\1" 能匹配 "AAtv"，组合正则中却不能
+    ({"rules": [{"pattern": "(.)\\1"}]}, '反向引用'),
+    ({"rules": [{"pattern": "(a)?(?(1)b|c)"}]}, '反向引用'),
+    ({"rules": [{"pattern": "(?P<n>CCTV)"}, {"pattern": "(?P<n>卫视)"}]}, '命名组'),
+    ({"rules": [{"pattern": "(?P<n>\\d)(?P=n)"}]}, '命名组'),
+    # 不在开头的全局标志单独能编译，合并后不能
+    ({"rules": [{"pattern": "(?i)cctv"}]}, '无法合并'),
+    ({"buckets": [{"pattern": "CCTV"}]}, "未知的键 'buckets'"),
+    ({"rules": [{"pattern": "CCTV", "ignorecase": True}]}, "未知的键 'ignorecase'"),
+    ({"rules": [], "default": {"pattern": "CCTV"}}, "未知的键 'pattern'"),
+])
+def test_rejected_rules(definition, message):
+    with pytest.raises(ValueError, match=message):
+        compile_rules(definition)
+
+
+def test_escaped_backslashes_are_not_references():
+    rules = compile_rules({"rules": [{"pattern": "\\\\1"}, {"pattern": "[\\1]x"}]})
+    assert match_rule(rules, 'a\\1') == (0, NO_NUMBER)
+    assert match_rule(rules, '\x01x') == (1, NO_NUMBER)
+
+
+def test_load_rules_file(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text('{"rules": [{"pattern": "卫视", "label": "各地卫视"}]}', encoding='utf-8')
+    assert load_rules(str(path)).buckets[0] == Bucket('各地卫视', None, 'order')
+    path.write_text('{"rules": [', encoding='utf-8')
+    with pytest.raises(ValueError, match='不是有效的 JSON'):
+        load_rules(str(path))
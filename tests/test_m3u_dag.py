@@ -0,0 +1,97 @@
+"""m3u_dag：定义检查、节点选择与按依赖执行"""
+
+import pytest
+
+from m3u_dag import execute, select_nodes, validate_definition
+
+SOURCE = """#EXTM3U
+#EXTINF:-1 group-title="央视",CCTV-1
+http://10.0.0.1/hls/1.m3u8
+#EXTINF:-1 group-title="卫视",湖南卫视
+http://10.0.0.2/live/2
+#EXTINF:-1 group-title="卫视",湖南卫视
+http://10.0.0.2/live/2
+"""
+
+
+def make_definition():
+    return {
+        'sources': {'src': 'src.m3u'},
+        'nodes': {
+            'sorted': {'inputs': ['src'], 'steps': ['url_sorter -k hls']},
+            'dedup': {'inputs': ['sorted'], 'steps': ['deduplicate'], 'output': 'dedup.m3u'},
+            'cctv': {'inputs': ['src'], 'steps': ["extract --eoru 'CCTV,http'"], 'output': 'cctv.m3u'},
+            'merged': {'inputs': ['dedup', 'cctv'], 'steps': ['m3u_merger'], 'output': 'merged.m3u'},
+        },
+    }
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """定义文件中的路径相对于当前目录"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'src.m3u').write_text(SOURCE, encoding='utf-8')
+    return tmp_path
+
+
+def test_topological_order_follows_definition():
+    definition = make_definition()
+    # 汇总节点写在前面时，上游节点排在它之前
+    definition['nodes'] = {'merged': definition['nodes'].pop('merged'), **definition['nodes']}
+    _, _, order = validate_definition(definition)
+    assert order == ['sorted', 'dedup', 'cctv', 'merged']
+
+
+@pytest.mark.parametrize('change, message', [
+    (lambda d: d['nodes']['dedup'].update(inputs=['missing']), '不存在的输入'),
+    (lambda d: d['nodes']['sorted'].update(inputs=['merged']), '环'),
+    (lambda d: d['nodes']['merged'].update(steps=['deduplicate']), '第一个阶段必须是 m3u_merger'),
+    (lambda d: d['nodes']['cctv'].update(inputs=[]), '没有输入'),
+    (lambda d: d['nodes'].update(src={'inputs': ['src']}), '与源同名'),
+    (lambda d: d['nodes']['cctv'].update(steps=['no_such_script']), '未知阶段'),
+])
+def test_invalid_definitions(change, message):
+    definition = make_definition()
+    change(definition)
+    with pytest.raises(ValueError, match=message):
+        validate_definition(definition)
+
+
+def test_select_nodes_keeps_upstream():
+    _, nodes, order = validate_definition(make_definition())
+    assert select_nodes(nodes, order, ['dedup']) == ['sorted', 'dedup']
+    assert select_nodes(nodes, order, ['cctv']) == ['cctv']
+    with pytest.raises(ValueError):
+        select_nodes(nodes, order, ['nope'])
+
+
+def test_execute_writes_outputs(workdir):
+    sources, nodes, order = validate_definition(make_definition())
+    report = execute(sources, nodes, order, jobs=1)
+    assert {name: status for name, (status, *_) in report.items()} == dict.fromkeys(order, '完成')
+    assert report['dedup'][3] == 2
+    assert not (workdir / 'sorted.m3u').exists()
+    assert '湖南卫视' in (workdir / 'merged.m3u').read_text(encoding='utf-8')
+
+
+def test_failed_node_skips_dependents(workdir):
+    definition = make_definition()
+    # 输入文件缺失，节点在执行时失败
+    definition['sources']['src'] = 'missing.m3u'
+    definition['sources']['other'] = 'src.m3u'
+    definition['nodes']['alone'] = {'inputs': ['other'], 'steps': ['deduplicate'], 'output': 'alone.m3u'}
+    sources, nodes, order = validate_definition(definition)
+    report = execute(sources, nodes, order, jobs=1)
+    assert report['sorted'][0] == '失败' and report['cctv'][0] == '失败'
+    assert report['dedup'][0] == '跳过' and report['merged'][0] == '跳过'
+    assert report['alone'][0] == '完成'
+
+
+def test_parallel_matches_sequential(workdir):
+    sources, nodes, order = validate_definition(make_definition())
+    execute(sources, nodes, order, jobs=1)
+    sequential = (workdir / 'merged.m3u').read_bytes()
+    (workdir / 'merged.m3u').unlink()
+    report = execute(sources, nodes, order, jobs=2)
+    assert all(status == '完成' for status, *_ in report.values())
+    assert (workdir / 'merged.m3u').read_bytes() == sequential
@@ -0,0 +1,90 @@
+"""m3u_extinf：EXTINF 分词与重新生成"""
+
+from m3u_extinf import ExtInf
+
+LINE = '#EXTINF:-1 tvg-id=cctv1 group-title=\'央视\' tvg-logo="a,b.png",CCTV-1 综合'
+
+
+def test_fields():
+    inf = ExtInf(LINE)
+    assert inf.duration == '-1'
+    assert inf.name == 'CCTV-1 综合'
+    assert inf.attrs == {'tvg-id': 'cctv1', 'group-title': '央视', 'tvg-logo': 'a,b.png'}
+    assert [inf.quote_of(key) for key in ('tvg-id', 'group-title', 'tvg-logo', 'tvg-name')] == ['', "'", '"', None]
+    assert 'tvg-logo' in inf and 'tvg-name' not in inf
+
+
+def test_missing_parts():
+    inf = ExtInf('#EXTINF:-1')
+    assert (inf.duration, inf.name, inf.attrs) == ('-1', None, {})
+    inf = ExtInf('#EXTINF:10.5,')
+    assert (inf.duration, inf.name) == ('10.5', '')
+    inf = ExtInf('#EXTINF group-title="g"')
+    assert (inf.duration, inf.name, inf.get('group-title')) == (None, None, 'g')
+
+
+def test_get_does_not_tokenize():
+    inf = ExtInf(LINE)
+    assert inf.get('group-title') == '央视'
+    assert inf.get('tvg-name', 'x') == 'x'
+    # 只读取属性时不记录属性位置
+    assert inf._spans is None
+    assert inf.quote_of('group-title') == "'"
+    assert inf._spans is not None
+    assert inf.get('tvg-logo') == 'a,b.png'
+
+
+def test_duplicate_attribute_returns_first():
+    inf = ExtInf('#EXTINF:-1 tvg-name="a" tvg-name="b",X')
+    assert inf.get('tvg-name') == 'a'
+    assert inf.attrs == {'tvg-name': 'a'}
+
+
+def test_unmodified_line_is_returned_as_is():
+    inf = ExtInf(LINE)
+    inf.get('group-title')
+    assert not inf.modified
+    assert inf.to_line() is LINE
+
+
+def test_set_keeps_quotes_and_untouched_text():
+    inf = ExtInf(LINE)
+    inf.set('group-title', '央视频道')
+    inf.set('tvg-id', 'cctv-1')
+    assert inf.get('group-title') == '央视频道'
+    assert inf.to_line() == '#EXTINF:-1 tvg-id=cctv-1 group-title=\'央视频道\' tvg-logo="a,b.png",CCTV-1 综合'
+
+
+def test_unquoted_value_gets_quotes_when_needed():
+    for value, expected in (('a b', '"a b"'), ('a,b', '"a,b"'), ('', '""')):
+        inf = ExtInf('#EXTINF:-1 tvg-id=x,A')
+        inf.set('tvg-id', value)
+        assert inf.to_line() == f'#EXTINF:-1 tvg-id={expected},A'
+
+
+def test_set_replaces_every_duplicate():
+    inf = ExtInf('#EXTINF:-1 tvg-name="a" tvg-name="b",X')
+    inf.set('tvg-name', 'c')
+    assert inf.to_line() == '#EXTINF:-1 tvg-name="c" tvg-name="c",X'
+
+
+def test_new_attribute_and_name():
+    inf = ExtInf(LINE)
+    inf.set('tvg-name', 'CCTV1')
+    inf.set_name('CCTV-1')
+    assert inf.to_line() == ('#EXTINF:-1 tvg-id=cctv1 group-title=\'央视\' tvg-logo="a,b.png" '
+                             'tvg-name="CCTV1",CCTV-1')
+    inf = ExtInf('#EXTINF:-1')
+    inf.set('group-title', 'g')
+    inf.set_name('N')
+    assert inf.to_line() == '#EXTINF:-1 group-title="g",N'
+
+
+def test_unrecognized_attribute_text():
+    # 属性区有无法识别的内容：跳过引号内的逗号找显示名称，新属性紧跟在属性区之后
+    inf = ExtInf('#EXTINF:-1 bad"x,y" group-title="g"   ,Name, with comma')
+    assert inf.name == 'Name, with comma'
+    assert inf.get('group-title') == 'g'
+    inf.set('tvg-id', '1')
+    assert inf.to_line() == '#EXTINF:-1 bad"x,y" group-title="g" tvg-id="1"   ,Name, with comma'
+
@@ -0,0 +1,173 @@
+"""m3u_match：关键字表达式的解析、一次扫描的关键字匹配、字段条件与求值"""
+
+import random
+
+import pytest
+
+from extract import EXTINF_FIELDS
+from m3u_extinf import ExtInf
+from m3u_match import ExpressionError, ExpressionSet, Field, TermScanner, parse_expression
+
+# 测试用的 URL 字段：解析结果为 (主机, 路径)
+URL_FIELDS = {
+    'url.host': Field(lambda parts: parts[0], str.lower),
+    'url.path': Field(lambda parts: parts[1], None),
+}
+
+
+def split_url(url):
+    host, _, path = url.partition('://')[2].partition('/')
+    return host, '/' + path
+
+
+@pytest.mark.parametrize('text, tree', [
+    ('CCTV', ('term', 'CCTV')),
+    ('  a  ||  b  ', ('or', [('term', 'a'), ('term', 'b')])),
+    # 优先级 ! > && > ||
+    ('a || b && !c', ('or', [('term', 'a'), ('and', [('term', 'b'), ('not', ('term', 'c'))])])),
+    ('(a || b) && c', ('and', [('or', [('term', 'a'), ('term', 'b')]), ('term', 'c')])),
+    ('!!a', ('not', ('not', ('term', 'a')))),
+    # 单个 & 和 |、关键字中间的 ! 属于关键字
+    ('a&b=1 || x|y', ('or', [('term', 'a&b=1'), ('term', 'x|y')])),
+    ('hi!there', ('term', 'hi!there')),
+    ('中央 电视台 && 高清', ('and', [('term', '中央 电视台'), ('term', '高清')])),
+    # 引号内的关键字原样保留
+    ('"CCTV-1(高清)" || " a "', ('or', [('term', 'CCTV-1(高清)'), ('term', ' a ')])),
+    ('"!测试" && a', ('and', [('term', '!测试'), ('term', 'a')])),
+    # 整个表达式被引号包围时去掉引号（旧写法），去掉后无法解析时引号内整体为一个关键字
+    ('"a || b"', ('or', [('term', 'a'), ('term', 'b')])),
+    ('"!测试"', ('not', ('term', '测试'))),
+    ('"a || ("', ('term', 'a || (')),
+    ('', ('const', False)),
+    ('   ', ('const', False)),
+    (None, ('const', False)),
+    ('""', ('const', False)),
+    ('"" || a', ('or', [('term', ''), ('term', 'a')])),
+])
+def test_parse_expression(text, tree):
+    assert parse_expression(text) == tree
+
+
+@pytest.mark.parametrize('text', ['a &&', '(a || b', 'a)', '|| a', '!', '"abc', 'a && ()'])
+def test_syntax_errors(text):
+    with pytest.raises(ExpressionError):
+        parse_expression(text)
+
+
+def test_expression_error_is_value_error():
+    assert issubclass(ExpressionError, ValueError)
+
+
+def test_scanner_finds_overlapping_terms():
+    terms = ['CCTV', 'CCTV-1', 'TV-1', 'V', '卫视', 'x']
+    scanner = TermScanner({term: 1 << i for i, term in enumerate(terms)})
+    assert scanner.scan('CCTV-1 湖南卫视') == 0b011111
+    assert scanner.scan('CCTV-2') == 0b001001
+    assert scanner.scan('') == 0
+    assert TermScanner({}).scan('anything') == 0
+
+
+def test_scanner_binary_matches_text():
+    terms = {'央视': 1, 'hls': 2, '视频': 4}
+    line = '#EXTINF:-1,央视频道 http://a/hls'
+    assert TermScanner(terms, binary=True).scan(line.encode('utf-8')) == TermScanner(terms).scan(line) == 7
+
+
+def test_scanner_matches_substring_search():
+    rng = random.Random(0)
+    alphabet = 'ab央-'
+    for _ in range(300):
+        terms = {''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 6))}
+        term_bits = {term: 1 << i for i, term in enumerate(sorted(terms))}
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+        expected = 0
+        for term, bit in term_bits.items():
+            if term in text:
+                expected |= bit
+        assert TermScanner(term_bits).scan(text) == expected, (term_bits, text)
+
+
+def test_expression_set_evaluates_on_one_scan():
+    field = ExpressionSet()
+    is_cctv = field.add('CCTV && !(购物 || 测试)')
+    is_sat = field.add('卫视 || 凤凰')
+    nothing = field.add('')
+    anything = field.add('"" || CCTV')
+    cases = {
+        '#EXTINF:-1,CCTV-1 综合': (True, False),
+        '#EXTINF:-1,CCTV 购物': (False, False),
+        '#EXTINF:-1,湖南卫视': (False, True),
+        '#EXTINF:-1,凤凰 CCTV': (True, True),
+    }
+    for line, expected in cases.items():
+        mask = field.scan(line)
+        assert (is_cctv(mask), is_sat(mask)) == expected
+        assert not nothing(mask) and anything(mask)
+        assert field.scan(line.encode('utf-8')) == mask
+
+
+def test_terms_added_after_scanning():
+    field = ExpressionSet()
+    first = field.add('a')
+    assert first(field.scan('b')) is False
+    second = field.add('b')
+    mask = field.scan('b')
+    assert second(mask) and not first(mask)
+
+
+@pytest.mark.parametrize('text, tree', [
+    ('group-title=央视', ('field', 'group-title', 'in', ('央视',))),
+    ('group-title = "央视 高清"', ('field', 'group-title', 'in', ('央视 高清',))),
+    ('tvg-id~CCTV', ('field', 'tvg-id', '~', ('CCTV',))),
+    ('url.host in {a.com, "b.com", }', ('field', 'url.host', 'in', ('a.com', 'b.com'))),
+    ('url.host in {a.com} && !url.path~/hls', ('and', [('field', 'url.host', 'in', ('a.com',)),
+                                                        ('not', ('field', 'url.path', '~', ('/hls',)))])),
+    # 不是已定义的字段时仍是普通关键字
+    ('x=1', ('term', 'x=1')),
+    ('Group-title=央视', ('term', 'Group-title=央视')),
+])
+def test_parse_field_predicates(text, tree):
+    assert parse_expression(text, {'group-title', 'tvg-id', 'url.host', 'url.path'}) == tree
+
+
+def test_unclosed_set():
+    with pytest.raises(ExpressionError):
+        parse_expression('url.host in {a.com', {'url.host'})
+
+
+def test_field_predicates_on_extinf():
+    field = ExpressionSet(EXTINF_FIELDS, ExtInf, URL_FIELDS)
+    central = field.add('group-title=央视 && !name~购物')
+    either = field.add('group-title in {卫视, 地方} || tvg-id~CCTV')
+    exact_name = field.add('name="CCTV-1 综合"')
+    cases = {
+        '#EXTINF:-1 tvg-id="CCTV1" group-title="央视",CCTV-1 综合': (True, True, True),
+        '#EXTINF:-1 group-title="央视频道",CCTV-1 综合': (False, False, True),
+        '#EXTINF:-1 group-title="央视",CCTV 购物': (False, False, False),
+        # 字段条件只看字段值，不在整行中查找
+        '#EXTINF:-1 tvg-name="group-title=卫视",湖南': (False, False, False),
+        '#EXTINF:-1 group-title="地方",tvg-id~CCTV': (False, True, False),
+    }
+    for line, expected in cases.items():
+        mask = field.scan(line)
+        assert (central(mask), either(mask), exact_name(mask)) == expected, line
+        assert field.scan(line.encode('utf-8')) == mask
+
+
+def test_field_values_are_folded():
+    field = ExpressionSet(URL_FIELDS, split_url)
+    hosts = field.add('url.host in {A.com, b.COM} && url.path~/HLS')
+    assert hosts(field.scan('http://a.COM/HLS/1.m3u8'))
+    assert hosts(field.scan('http://B.com/x/HLS'))
+    # 没有 fold 的字段区分大小写
+    assert not hosts(field.scan('http://a.com/hls/1.m3u8'))
+    assert not hosts(field.scan('http://c.com/HLS'))
+
+
+def test_foreign_fields_are_rejected():
+    field = ExpressionSet(EXTINF_FIELDS, ExtInf, URL_FIELDS)
+    with pytest.raises(ExpressionError, match='url.host'):
+        field.add('CCTV && !url.host=a.com')
+    url_field = ExpressionSet(URL_FIELDS, split_url, EXTINF_FIELDS)
+    with pytest.raises(ExpressionError, match='group-title'):
+        url_field.add('group-title=央视')
@@ -0,0 +1,129 @@
+"""m3u_merger.py：流式合并、并行解析与普通合并的输出相同"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+import m3u_merger
+from m3u_merger import merge_single_m3u, build_output_lines, parse_single_m3u, stream_merge
+
+MERGER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts', 'm3u_merger.py')
+
+
+def make_input(index, count=60):
+    """生成一个输入文件的内容：频道在文件间部分重叠、组内相对顺序不同，带配置行和重复 URL"""
+    lines = ['#EXTM3U x-tvg-url="http://epg/%d"' % index]
+    for i in range(count):
+        number = (i * 7 + index * 13) % (count + 20)
+        group = ('央视', '卫视', '地方')[number % 3]
+        lines.append(f'#EXTINF:-1 group-title="{group}" tvg-id="{index}",频道{number}')
+        if number % 4 == 0:
+            lines.append(f'#EXTVLCOPT:http-user-agent=ua{index % 2}')
+        lines.append(f'http://10.0.{index}.1/{number}/{i % 3}.m3u8')
+        lines.append(f'http://10.0.0.9/{number}/shared.m3u8')
+    lines.append('#EXTINF:-1 group-title="其他",没有地址')
+    return '\n'.join(lines) + '\n'
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    paths = []
+    for index in range(6):
+        path = tmp_path / f'in{index}.m3u'
+        path.write_text(make_input(index), encoding='utf-8')
+        paths.append(str(path))
+    return paths
+
+
+def merge_in_memory(paths, no_config=False, keep_order=False):
+    final_channels_data = {}
+    group_global_order = []
+    final_header = ""
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            order_list, channels_map, header = parse_single_m3u(f.read())
+        if not final_header and header:
+            final_header = header
+        merge_single_m3u(final_channels_data, group_global_order, order_list, channels_map)
+    return '\n'.join(build_output_lines(final_channels_data, group_global_order, final_header,
+                                        no_config, keep_order))
+
+
+def run_merger(*args):
+    return subprocess.run([sys.executable, MERGER, *args], capture_output=True, encoding='utf-8')
+
+
+@pytest.mark.parametrize('no_config, keep_order', [(False, False), (True, False), (False, True), (True, True)])
+@pytest.mark.parametrize('max_bytes', [1, 4096, 1 << 30])
+def test_stream_matches_in_memory(tmp_path, inputs, max_bytes, no_config, keep_order):
+    output = str(tmp_path / 'out.m3u')
+    success, stats = stream_merge(inputs, output, max_bytes, no_config, keep_order, str(tmp_path))
+    assert success
+    expected = merge_in_memory(inputs, no_config, keep_order)
+    with open(output, encoding='utf-8') as f:
+        assert f.read() == expected
+    assert stats['channels'] == expected.count('#EXTINF')
+    assert stats['groups'] == 4
+    if max_bytes == 1 << 30:
+        assert stats['runs'] == 1
+    else:
+        assert stats['runs'] > 1
+    # 临时段文件全部删除
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(p) for p in inputs + [output])
+
+
+def test_multi_level_merge(tmp_path, inputs, monkeypatch):
+    # 段数超过归并上限时先归并最早的若干段，可能多轮
+    monkeypatch.setattr(m3u_merger, '_MAX_MERGE_FANIN', 3)
+    output = str(tmp_path / 'out.m3u')
+    success, stats = stream_merge(inputs, output, 1, keep_order=True, temp_dir=str(tmp_path))
+    assert success and stats['runs'] > 3 * 3
+    with open(output, encoding='utf-8') as f:
+        assert f.read() == merge_in_memory(inputs, keep_order=True)
+
+
+def test_stream_merge_command_line(tmp_path, inputs):
+    def run(output, *options):
+        result = run_merger('-i', *inputs, '-o', output, *options)
+        assert result.returncode == 0, result.stderr
+        with open(output, encoding='utf-8') as f:
+            return f.read()
+
+    for options in ([], ['--keep-order', '--no-config']):
+        expected = run(str(tmp_path / 'memory.m3u'), '--force', *options)
+        assert run(str(tmp_path / 'stream.m3u'), '--force', '--max-memory', '0.001', *options) == expected
+        assert expected == merge_in_memory(inputs, '--no-config' in options, '--keep-order' in options)
+
+
+def test_jobs_output_is_identical(tmp_path, inputs):
+    outputs = []
+    for jobs in ('1', '3'):
+        output = str(tmp_path / f'jobs{jobs}.m3u')
+        result = run_merger('-i', *inputs, '-o', output, '--jobs', jobs, '--canonical-urls')
+        assert result.returncode == 0, result.stderr
+        with open(output, 'rb') as f:
+            outputs.append(f.read())
+    assert outputs[0] == outputs[1]
+
+
+def test_jobs_report_errors_in_input_order(tmp_path, inputs):
+    bad = []
+    for name in ('bad1.m3u', 'bad2.m3u'):
+        path = tmp_path / name
+        path.write_bytes(b'#EXTM3U\n#EXTINF:-1,\xff\xfe\nhttp://a/1\n')
+        bad.append(str(path))
+    files = [inputs[0], bad[0], inputs[1], bad[1]]
+
+    parsed = {jobs: [(name, error is None) for name, _, error in m3u_merger.iter_parsed_inputs(files, jobs)]
+              for jobs in (1, 4)}
+    assert parsed[1] == parsed[4] == [(inputs[0], True), (bad[0], False), (inputs[1], True), (bad[1], False)]
+
+    for jobs in ('1', '4'):
+        output = tmp_path / f'jobs{jobs}.m3u'
+        result = run_merger('-i', *files, '-o', str(output), '--jobs', jobs)
+        # 停在按输入顺序的第一个出错文件，不写出输出
+        assert result.returncode == 1
+        assert bad[0] in result.stderr and bad[1] not in result.stderr
+        assert not output.exists()
@@ -0,0 +1,152 @@
+"""m3u_mmap：记录偏移索引、需要退回文本处理的记录，以及 --mmap 与文本模式的输出逐字节相同"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from m3u_mmap import MappedPlaylist
+from m3u_parser import iter_m3u_file
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+
+BODY = """#EXTM3U x-tvg-url="http://epg"
+# 注释
+#EXTINF:-1 group-title="央视",CCTV-1 综合
+#EXTVLCOPT:http-user-agent=x
+http://10.0.0.1/hls/1.m3u8
+#EXTINF:-1 group-title="卫视",湖南卫视
+http://10.0.0.2/live/2
+http://10.0.0.2/live/2b
+#EXTINF:-1 group-title="央视",CCTV-1 综合
+#EXTVLCOPT:http-user-agent=x
+http://10.0.0.1/hls/1.m3u8
+
+  #EXTINF:-1 group-title="卫视",东方卫视  
+	http://10.0.0.3/live/3
+#EXTINF:-1 group-title="地方",没有地址
+#EXTINF:-1 group-title="地方",CCTV 测试 
+udp://239.0.0.1:5000
+#EXTINF:-1 group-title="卫视",湖南卫视
+http://10.0.0.2/live/2
+"""
+
+CASES = {
+    'lf': BODY.encode('utf-8'),
+    'crlf': BODY.replace('\n', '\r\n').encode('utf-8'),
+    'cr': BODY.replace('\n', '\r').encode('utf-8'),
+    'nbsp': BODY.replace('湖南卫视\n', '湖南卫视\u00a0\n').encode('utf-8'),
+    'bom': b'\xef\xbb\xbf' + BODY.encode('utf-8'),
+    'no-trailing-newline': BODY.rstrip('\n').encode('utf-8'),
+    'no-header': BODY.split('\n', 2)[2].encode('utf-8'),
+    'empty': b'',
+    'only-header': b'#EXTM3U',
+}
+
+
+@pytest.fixture(params=sorted(CASES))
+def source(request, tmp_path):
+    path = tmp_path / 'in.m3u'
+    path.write_bytes(CASES[request.param])
+    return path
+
+
+def test_records_match_text_parser(source):
+    expected = list(iter_m3u_file(str(source)))
+    with MappedPlaylist(str(source)) as playlist:
+        preamble = playlist.preamble()
+        records = ([preamble] if preamble else []) + [playlist.record(i) for i in range(len(playlist))]
+    assert records == expected
+
+
+def test_offset_index(tmp_path):
+    path = tmp_path / 'in.m3u'
+    data = CASES['crlf']
+    path.write_bytes(data)
+    with MappedPlaylist(str(path)) as playlist:
+        assert len(playlist) == 7
+        # 记录从 #EXTINF 所在行的行首开始（包括前导空白），首尾相接覆盖整个文件
+        assert data[:playlist.starts[0]].endswith(b'# \xe6\xb3\xa8\xe9\x87\x8a\r\n')
+        assert data[playlist.starts[3]:].startswith(b'  #EXTINF')
+        assert [playlist.record_span(i)[1] for i in range(6)] == list(playlist.starts[1:])
+        assert playlist.record_span(6)[1] == playlist.size == len(data)
+        # EXTINF 行的范围不含 \r\n
+        start, end = playlist.extinf_span(1)
+        assert data[start:end] == '#EXTINF:-1 group-title="卫视",湖南卫视'.encode('utf-8')
+        assert playlist.extinf(3) == '#EXTINF:-1 group-title="卫视",东方卫视'
+
+
+def test_extinf_inside_a_line_is_not_a_record(tmp_path):
+    path = tmp_path / 'in.m3u'
+    path.write_bytes(b'#EXTINF:-1,A\nhttp://a/#EXTINF\n#EXTVLCOPT:#EXTINF\n#EXTINF:-1,B\nhttp://b\n')
+    with MappedPlaylist(str(path)) as playlist:
+        assert len(playlist) == 2
+        assert playlist.record(0).lines == ['http://a/#EXTINF', '#EXTVLCOPT:#EXTINF']
+
+
+def test_is_clean(tmp_path):
+    path = tmp_path / 'in.m3u'
+    path.write_bytes(CASES['lf'])
+    with MappedPlaylist(str(path)) as playlist:
+        # 空行、前导空白和制表符、行尾空格都需要退回文本处理
+        assert [playlist.is_clean(i) for i in range(len(playlist))] == [True, True, False, False, True, False, True]
+        spans = list(playlist.iter_body_spans(1))
+        assert [playlist.mm[s:e] for s, e in spans] == [b'http://10.0.0.2/live/2', b'http://10.0.0.2/live/2b']
+    path.write_bytes(CASES['crlf'])
+    with MappedPlaylist(str(path)) as playlist:
+        assert not any(playlist.is_clean(i) for i in range(len(playlist)))
+    # 不换行空格（U+00A0）等 Unicode 空白在行首尾会被 strip 去掉；出现在行中间时同样保守地退回
+    path.write_bytes('#EXTINF:-1,A\u00a0\nhttp://a\n#EXTINF:-1,\u00a0B\nhttp://b\n'.encode('utf-8'))
+    with MappedPlaylist(str(path)) as playlist:
+        assert [playlist.is_clean(i) for i in range(len(playlist))] == [False, False]
+
+
+def test_zero_copy_chunks(tmp_path):
+    path = tmp_path / 'in.m3u'
+    path.write_bytes(CASES['no-trailing-newline'])
+    with MappedPlaylist(str(path)) as playlist:
+        first = playlist.raw_chunks(0)
+        assert len(first) == 1 and isinstance(first[0], memoryview)
+        assert first[0].obj is playlist.mm
+        # 最后一条记录没有换行符时补上
+        last = playlist.raw_chunks(len(playlist) - 1)
+        assert bytes(last[0]).endswith(b'2') and last[1] == b'\n'
+        del first, last
+
+
+def test_close_with_live_views(tmp_path):
+    path = tmp_path / 'in.m3u'
+    path.write_bytes(CASES['lf'])
+    playlist = MappedPlaylist(str(path))
+    chunk = playlist.raw_chunks(0)[0]
+    # 仍有切片引用映射内存时关闭不报错，切片保持可用
+    playlist.close()
+    assert bytes(chunk).startswith(b'#EXTINF')
+
+
+def run_script(script, *args, cwd):
+    result = subprocess.run([sys.executable, os.path.join(SCRIPTS, script), *args],
+                            capture_output=True, encoding='utf-8', cwd=cwd)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+
+@pytest.mark.parametrize('options', [[], ['--no-extm3u']])
+def test_deduplicate_mmap_is_identical(source, options):
+    cwd = source.parent
+    run_script('deduplicate.py', '-i', 'in.m3u', '-o', 'text.m3u', *options, cwd=cwd)
+    run_script('deduplicate.py', '-i', 'in.m3u', '-o', 'mmap.m3u', '--mmap', *options, cwd=cwd)
+    assert (cwd / 'mmap.m3u').read_bytes() == (cwd / 'text.m3u').read_bytes()
+
+
+@pytest.mark.parametrize('options', [
+    ['--eoru', 'CCTV,live'],
+    ['--eandu', '卫视,http', '-n'],
+    ['--eoru', '湖南,', '-r'],
+    ['--eoru', ',udp', '-r', '-n'],
+])
+def test_extract_mmap_is_identical(source, options):
+    cwd = source.parent
+    run_script('extract.py', '--input', 'in.m3u', '--output', 'text.m3u', *options, cwd=cwd)
+    run_script('extract.py', '--input', 'in.m3u', '--output', 'mmap.m3u', '--mmap', *options, cwd=cwd)
+    assert (cwd / 'mmap.m3u').read_bytes() == (cwd / 'text.m3u').read_bytes()
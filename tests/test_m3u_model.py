@@ -0,0 +1,87 @@
+"""m3u_model：频道记录、字符串驻留与有序容器"""
+
+import pytest
+
+from m3u_model import Channel, LinkedOrder, OrderedSet, intern_attr_key, intern_group, intern_host
+
+
+def test_intern_group_shares_one_string():
+    a = ''.join(['央', '视'])
+    b = ''.join(['央', '视'])
+    assert a is not b
+    assert intern_group(a) is intern_group(b)
+    assert intern_group(None) is None
+
+
+def test_intern_attr_key():
+    assert intern_attr_key(''.join(['group', '-title'])) is intern_attr_key('group-title')
+
+
+def test_intern_host():
+    host = intern_host('http://10.0.0.1:8080/live/1.m3u8')
+    assert host == '10.0.0.1:8080'
+    assert intern_host('HTTP://Example.COM/a') == 'example.com'
+    assert intern_host('http://EXAMPLE.com:80/b') is intern_host('http://example.com:80/c')
+    # urlsplit 无法解析的 URL（方括号不成对）返回空字符串
+    assert intern_host('http://[::1/a') == ''
+    assert intern_host('不是 URL') == ''
+
+
+def test_channel_defaults():
+    ch = Channel('#EXTINF:-1,A')
+    assert ch.urls == [] and ch.configs == []
+    assert ch.name is None and ch.group is None and ch.final_group is None
+    # 默认容器不在实例间共享
+    ch.urls.append('http://a')
+    assert Channel('#EXTINF:-1,B').urls == []
+
+
+def test_channel_interns_group():
+    group = ''.join(['卫', '视'])
+    ch = Channel('#EXTINF:-1,A', group=group)
+    assert ch.group is intern_group('卫视')
+
+
+def test_channel_keeps_given_containers():
+    urls = {'http://a'}
+    ch = Channel('#EXTINF:-1,A', urls=urls, name='A', order_idx=3)
+    assert ch.urls is urls
+    assert (ch.name, ch.order_idx) == ('A', 3)
+    assert repr(ch) == "Channel(name='A', group=None, urls=1)"
+
+
+def test_channel_has_no_instance_dict():
+    ch = Channel('#EXTINF:-1,A')
+    with pytest.raises(AttributeError):
+        ch.extra = 1
+
+
+def test_linked_order_insert_after():
+    order = LinkedOrder(['央视', '卫视'])
+    order.insert_after('央视', '体育')
+    order.insert_after(None, '置顶')
+    order.insert_after('卫视', '其它')
+    order.append('少儿')
+    assert list(order) == ['置顶', '央视', '体育', '卫视', '其它', '少儿']
+    assert len(order) == 6
+    assert '体育' in order and '影视' not in order and None not in order
+
+
+def test_linked_order_rejects_existing_items():
+    order = LinkedOrder(['a'])
+    with pytest.raises(ValueError):
+        order.append('a')
+    with pytest.raises(ValueError):
+        order.insert_after('a', None)
+    assert list(order) == ['a']
+    assert list(LinkedOrder()) == [] and len(LinkedOrder()) == 0
+
+
+def test_ordered_set_keeps_first_position():
+    urls = OrderedSet(['http://b', 'http://a', 'http://b'])
+    urls.add('http://c')
+    urls.add('http://a')
+    urls.update(['http://d', 'http://c'])
+    assert list(urls) == ['http://b', 'http://a', 'http://c', 'http://d']
+    assert len(urls) == 4 and 'http://a' in urls and 'http://e' not in urls
+    assert urls and not OrderedSet()
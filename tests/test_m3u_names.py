@@ -0,0 +1,53 @@
+"""m3u_names：频道名称归一化"""
+
+import pytest
+
+from m3u_names import normalize_channel_name
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('CCTV-1 综合', 'CCTV1'),
+    ('CCTV1综合', 'CCTV1'),
+    ('CCTV1 HD', 'CCTV1'),
+    ('cctv-1', 'CCTV1'),
+    ('CCTV01', 'CCTV1'),
+    ('CCTV_1 高清', 'CCTV1'),
+    # 全角字符与全角空格
+    ('ＣＣＴＶ－１', 'CCTV1'),
+    ('ＣＣＴＶ１３　新闻', 'CCTV13'),
+    ('CCTV-5+ 体育赛事', 'CCTV5+'),
+    ('CCTV5+', 'CCTV5+'),
+    ('CCTV-5 体育', 'CCTV5'),
+    # 清晰度后缀
+    ('湖南卫视 高清', '湖南卫视'),
+    ('湖南卫视4K', '湖南卫视'),
+    ('北京卫视 4K', '北京卫视'),
+    ('东方卫视 FHD', '东方卫视'),
+    ('浙江卫视HD', '浙江卫视'),
+    ('翡翠台', '翡翠'),
+    ('凤凰中文 1080P', '凤凰中文'),
+    # CCTV 的 4K/8K 是独立频道
+    ('CCTV4K', 'CCTV4K'),
+    ('CCTV-4K 超高清', 'CCTV4K'),
+    ('CCTV 8K', 'CCTV8K'),
+    # 字母开头的标记前面紧跟字母时不去掉
+    ('TVBSD', 'TVBSD'),
+    # 只由标记组成的名称保留原样
+    ('HD', 'HD'),
+    ('', ''),
+    (None, ''),
+])
+def test_normalize(name, expected):
+    assert normalize_channel_name(name) == expected
+
+
+@pytest.mark.parametrize('a, b', [
+    ('CCTV4K', 'CCTV4'),
+    ('CCTV-4K', 'CCTV-4 中文国际'),
+    ('CCTV5+', 'CCTV5'),
+    ('CCTV1', 'CCTV11'),
+    ('CCTV8K', 'CCTV8 电视剧'),
+    ('湖南卫视', '湖南都市'),
+])
+def test_distinct_channels(a, b):
+    assert normalize_channel_name(a) != normalize_channel_name(b)
@@ -0,0 +1,70 @@
+"""m3u_parser 的边界情况：头部、空行、首尾空白、换行符与文件结尾"""
+
+from m3u_parser import M3URecord, iter_m3u_file, iter_m3u_records, iter_m3u_text
+
+
+def test_header_before_first_extinf():
+    records = list(iter_m3u_text('#EXTM3U x-tvg-url="a.xml"\n#EXTINF:-1,CCTV1\nhttp://a/1\n'))
+    assert records == [
+        M3URecord(None, ['#EXTM3U x-tvg-url="a.xml"']),
+        M3URecord('#EXTINF:-1,CCTV1', ['http://a/1']),
+    ]
+
+
+def test_no_header():
+    records = list(iter_m3u_text('#EXTINF:-1,CCTV1\nhttp://a/1'))
+    assert records == [M3URecord('#EXTINF:-1,CCTV1', ['http://a/1'])]
+
+
+def test_empty_and_blank_input():
+    assert list(iter_m3u_text('')) == []
+    assert list(iter_m3u_text('\n  \n\t\n')) == []
+
+
+def test_blank_lines_and_whitespace_are_dropped():
+    text = '\n  #EXTINF:-1,CCTV1  \n\n   http://a/1 \n\n\nhttp://a/2\n\n'
+    assert list(iter_m3u_text(text)) == [M3URecord('#EXTINF:-1,CCTV1', ['http://a/1', 'http://a/2'])]
+
+
+def test_extinf_without_urls():
+    records = list(iter_m3u_text('#EXTINF:-1,A\n#EXTINF:-1,B\nhttp://b\n#EXTINF:-1,C'))
+    assert records == [
+        M3URecord('#EXTINF:-1,A', []),
+        M3URecord('#EXTINF:-1,B', ['http://b']),
+        M3URecord('#EXTINF:-1,C', []),
+    ]
+
+
+def test_configs_and_urls_keep_order():
+    text = '#EXTINF:-1,A\n#EXTVLCOPT:http-user-agent=x\nhttp://a/1\n#EXTGRP:央视\nhttp://a/2\n'
+    record, = iter_m3u_text(text)
+    assert record.lines == ['#EXTVLCOPT:http-user-agent=x', 'http://a/1', '#EXTGRP:央视', 'http://a/2']
+    assert record.configs == ['#EXTVLCOPT:http-user-agent=x', '#EXTGRP:央视']
+    assert record.urls == ['http://a/1', 'http://a/2']
+
+
+def test_extinf_prefix_without_colon():
+    # 只看 #EXTINF 前缀，与各脚本原来的判断一致
+    records = list(iter_m3u_text('#EXTINF,A\nhttp://a\n'))
+    assert records == [M3URecord('#EXTINF,A', ['http://a'])]
+
+
+def test_line_endings_match_text_mode_file(tmp_path):
+    expected = [M3URecord(None, ['#EXTM3U']), M3URecord('#EXTINF:-1,A', ['http://a', 'http://b'])]
+    for newline in ('\n', '\r\n', '\r'):
+        text = newline.join(['#EXTM3U', '#EXTINF:-1,A', 'http://a', 'http://b']) + newline
+        assert list(iter_m3u_text(text)) == expected
+        path = tmp_path / 'list.m3u'
+        path.write_bytes(text.encode('utf-8'))
+        assert list(iter_m3u_file(str(path))) == expected
+
+
+def test_file_without_trailing_newline(tmp_path):
+    path = tmp_path / 'list.m3u'
+    path.write_text('#EXTINF:-1,频道\nhttp://a', encoding='utf-8')
+    assert list(iter_m3u_file(str(path))) == [M3URecord('#EXTINF:-1,频道', ['http://a'])]
+
+
+def test_records_accept_any_iterable():
+    lines = iter(['#EXTINF:-1,A\n', 'http://a\n'])
+    assert list(iter_m3u_records(lines)) == [M3URecord('#EXTINF:-1,A', ['http://a'])]
@@ -0,0 +1,92 @@
+"""m3u_playlist 与进程内流水线：阶段交出的记录须与其文本重新解析的结果一致"""
+
+import pytest
+
+from m3u_parser import M3URecord, iter_m3u_text
+from m3u_pipeline import parse_step, run_steps
+from m3u_playlist import Playlist, records_from_blocks
+
+SOURCE = """#EXTM3U x-tvg-url="a.xml"
+# 注释
+#EXTINF:-1 tvg-name="CCTV1" group-title="央视",CCTV-1 综合
+#EXTVLCOPT:http-user-agent=x
+http://10.0.0.1:8094/hls/1/index.m3u8
+udp://239.0.0.1:5000
+#EXTINF:-1 group-title="卫视",湖南卫视
+http://10.0.0.2/hls/2.m3u8
+
+#EXTINF:-1 group-title="卫视",湖南卫视
+http://10.0.0.2/hls/2.m3u8
+http://10.0.0.3/live/2
+#EXTINF:-1 group-title="地方",测试频道
+#EXTINF:-1 group-title="央视",CCTV-1 综合
+http://10.0.0.4:8094/live/1
+"""
+
+STEPS = [
+    "extract --eoru 'CCTV||卫视,http' -n", "extract --eandu '!CCTV,http'", "extract --eoru 'CCTV,udp' -r",
+    "url_sorter -k hls,udp", "url_sorter -k 8094 -ch CCTV -rn 'NEW '",
+    "url_sortergr -k hls", "deduplicate", "deduplicate --key canonical-url", "deduplicate --key name+url --no-extm3u",
+    "m3u_merger", "m3u_merger --keep-order --no-config", "m3u_mergerng", "m3u_mergerng --keep-order",
+    "add_channel -a '五星体育,http://example.com/wxty.m3u8'", "m3u_header_tool -c",
+]
+
+
+def test_records_from_blocks_matches_parsing():
+    # 记录块之间的空行（如各脚本写出的分隔行）不影响结果
+    blocks = [['#EXTM3U'], [''], ['#EXTINF:-1,A', 'http://a'], ['#EXTVLCOPT:x'],
+              ['#EXTINF:-1,B'], ['', 'http://b']]
+    text = '\n'.join(line for block in blocks for line in block)
+    assert records_from_blocks(blocks) == list(iter_m3u_text(text))
+    assert records_from_blocks([['#EXTINF:-1,A', 'http://a']]) == [M3URecord('#EXTINF:-1,A', ['http://a'])]
+    assert records_from_blocks([[], ['']]) == []
+
+
+def test_playlist_from_lines():
+    playlist = Playlist.from_lines(['#EXTM3U', '#EXTINF:-1,A', 'http://a'])
+    assert playlist.text == '#EXTM3U\n#EXTINF:-1,A\nhttp://a\n'
+    assert len(playlist) == 1
+    assert Playlist.from_lines(['#EXTINF:-1,A'], trailing_newline=False).text == '#EXTINF:-1,A'
+    assert Playlist.from_lines([]).text == ''
+
+
+def test_playlist_render_is_lazy():
+    calls = []
+
+    def render():
+        calls.append(1)
+        return ['#EXTINF:-1,A', '', 'http://a']
+
+    playlist = Playlist.from_blocks([['#EXTINF:-1,A', 'http://a']], render)
+    assert playlist.records == [M3URecord('#EXTINF:-1,A', ['http://a'])]
+    assert calls == []
+    assert playlist.text == '#EXTINF:-1,A\n\nhttp://a\n'
+    assert playlist.text == '#EXTINF:-1,A\n\nhttp://a\n'
+    assert calls == [1]
+
+
+def test_playlist_readlines_matches_file():
+    playlist = Playlist('#EXTINF:-1,A\r\nhttp://a\r\n')
+    assert playlist.readlines() == ['#EXTINF:-1,A\n', 'http://a\n']
+
+
+@pytest.mark.parametrize('step_text', STEPS)
+def test_stage_records_match_text(step_text):
+    step = parse_step(step_text)
+    source = Playlist(SOURCE)
+    output = step.transform([source] if step.name == 'm3u_merger' else source, step.args)
+    assert output.records == list(iter_m3u_text(output.text))
+    assert len(output) == len(Playlist(output.text))
+
+
+@pytest.mark.parametrize('first', STEPS)
+def test_chained_stages_match_text_handoff(first):
+    # 直接交出记录与先写成文本再读入，后续阶段的输出相同
+    rest = ["url_sorter -k hls", "deduplicate", "extract --eoru '卫视||CCTV,http'"]
+    steps = [parse_step(text) for text in [first] + rest]
+    direct = run_steps([Playlist(SOURCE)], steps).text
+
+    current = Playlist(SOURCE)
+    for step in steps:
+        current = Playlist(run_steps([current], [step]).text)
+    assert direct == current.text
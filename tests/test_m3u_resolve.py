@@ -0,0 +1,146 @@
+"""m3u_resolve：异步重定向解析（本地 asyncio HTTP 服务器）与解析结果缓存的有效期"""
+
+import asyncio
+
+import pytest
+
+from m3u_resolve import RedirectCache, get_final_url_async, is_video_related, resolve_urls_async
+
+# 路径 -> 原始响应头
+RESPONSES = {
+    '/video': b'HTTP/1.1 200 OK\r\nContent-Type: video/mp2t\r\n\r\n',
+    '/page': b'HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n',
+    '/live.m3u8': b'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n\r\n',
+    '/missing': b'HTTP/1.1 404 Not Found\r\n\r\n',
+    '/relative': b'HTTP/1.1 302 Found\r\nLocation: /video\r\n\r\n',
+    '/chain': b'HTTP/1.1 301 Moved\r\nLocation: /relative\r\n\r\n',
+    '/loop': b'HTTP/1.1 302 Found\r\nLocation: /loop\r\n\r\n',
+    '/no-location': b'HTTP/1.1 302 Found\r\nContent-Type: video/mp4\r\n\r\n',
+    '/garbage': b'SSH-2.0-OpenSSH\r\n\r\n',
+    '/utf8': 'HTTP/1.1 302 Found\r\nLocation: /视频\r\n\r\n'.encode('utf-8'),
+    '/%E8%A7%86%E9%A2%91': b'HTTP/1.1 200 OK\r\nContent-Type: application/vnd.apple.mpegurl\r\n\r\n',
+}
+
+
+async def handle(reader, writer):
+    request = await reader.readuntil(b'\r\n\r\n')
+    path = request.split(b' ', 2)[1].decode('ascii')
+    writer.write(RESPONSES.get(path, b'HTTP/1.1 500 Error\r\n\r\n') + b'body')
+    await writer.drain()
+    writer.close()
+
+
+def resolve(*paths, **kwargs):
+    async def main():
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        base = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        async with server:
+            results = await resolve_urls_async([base + path for path in paths], **kwargs)
+        return {url[len(base):]: (final.replace(base, ''), ok, video)
+                for url, (final, ok, video) in results.items()}
+    return asyncio.run(main())
+
+
+def test_final_responses():
+    assert resolve('/video', '/page', '/live.m3u8', '/missing') == {
+        '/video': ('/video', True, True),
+        '/page': ('/page', True, False),
+        '/live.m3u8': ('/live.m3u8', True, True),
+        '/missing': ('/missing', False, False),
+    }
+
+
+def test_redirects():
+    assert resolve('/relative', '/chain', '/utf8') == {
+        '/relative': ('/video', True, True),
+        '/chain': ('/video', True, True),
+        '/utf8': ('/视频', True, True),
+    }
+
+
+def test_redirect_limit_and_bad_responses():
+    results = resolve('/loop', '/no-location', '/garbage', max_redirects=3)
+    assert results['/loop'] == ('/loop', False, False)
+    # 没有 Location 的重定向按最终响应处理
+    assert results['/no-location'] == ('/no-location', True, True)
+    assert results['/garbage'] == ('/garbage', False, False)
+
+
+def test_duplicates_and_callback():
+    seen = []
+    results = resolve('/video', '/video', '/page', concurrency=1,
+                      on_result=lambda url, result: seen.append(url.rsplit('/', 1)[1]))
+    # 重复的 URL 只解析一次
+    assert sorted(results) == ['/page', '/video']
+    assert seen == ['video', 'page']
+
+
+@pytest.mark.parametrize('url', ['ftp://127.0.0.1/a', 'http:///a', 'http://127.0.0.1:1/a'])
+def test_unreachable_or_unsupported(url):
+    assert asyncio.run(get_final_url_async(url, timeout=1)) == (url, False, False)
+
+
+def test_is_video_related():
+    assert is_video_related('application/x-mpegurl; charset=utf-8', 'http://a/b')
+    assert is_video_related('', 'http://a/B.M3U8')
+    assert not is_video_related('text/html', 'http://a/b.m3u8?x=1')
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with RedirectCache(str(tmp_path / 'redirects.db'), ttl=1000, negative_ttl=100, negative_after=3) as cache:
+        yield cache
+
+
+def test_entry_ttl(cache):
+    assert cache.entry_ttl(True, 0) == 1000
+    # 连续失败不足 negative_after 次时不使用缓存，之后有效期逐次加倍，最长为 ttl
+    assert [cache.entry_ttl(False, failures) for failures in range(1, 9)] == [0, 0, 100, 200, 400, 800, 1000, 1000]
+    with RedirectCache(':memory:', negative_after=0) as other:
+        assert other.negative_after == 1
+
+
+def test_positive_results_expire(cache):
+    cache.store({'http://a/1': ('http://cdn/1', True, True)}, now=0)
+    assert cache.lookup(['http://a/1', 'http://a/2', 'http://a/1'], now=999) == (
+        {'http://a/1': ('http://cdn/1', True, True)}, ['http://a/2'], 0)
+    assert cache.lookup(['http://a/1'], now=1000) == ({}, ['http://a/1'], 1)
+
+
+def test_failures_cached_after_repeated_failures(cache):
+    failed = {'http://a/1': ('http://a/1', False, False)}
+    for now in (0, 10):
+        cache.store(failed, now=now)
+        # 偶然的失败不进入缓存，下次运行重新尝试
+        assert cache.lookup(['http://a/1'], now=now + 1) == ({}, ['http://a/1'], 1)
+    cache.store(failed, now=20)
+    assert cache.lookup(['http://a/1'], now=119)[0] == {'http://a/1': ('http://a/1', False, False)}
+    assert cache.lookup(['http://a/1'], now=120)[1] == ['http://a/1']
+    cache.store(failed, now=120)
+    assert cache.lookup(['http://a/1'], now=319)[0]
+    assert not cache.lookup(['http://a/1'], now=320)[0]
+
+
+def test_success_resets_failures(cache):
+    failed = {'http://a/1': ('http://a/1', False, False)}
+    for now in range(4):
+        cache.store(failed, now=now)
+    cache.store({'http://a/1': ('http://cdn/1', True, False)}, now=10)
+    assert cache.lookup(['http://a/1'], now=500)[0] == {'http://a/1': ('http://cdn/1', True, False)}
+    cache.store(failed, now=2000)
+    assert cache.lookup(['http://a/1'], now=2001) == ({}, ['http://a/1'], 1)
+
+
+def test_lookup_in_batches(cache):
+    urls = [f'http://a/{i}' for i in range(1234)]
+    cache.store({url: (url, True, False) for url in urls[::2]}, now=0)
+    hits, misses, expired = cache.lookup(urls, now=1)
+    assert len(hits) == 617 and misses == urls[1::2] and expired == 0
+
+
+def test_cache_persists(tmp_path):
+    path = str(tmp_path / 'redirects.db')
+    with RedirectCache(path) as cache:
+        cache.store({'http://a/1': ('http://cdn/1', True, True)})
+    with RedirectCache(path) as cache:
+        assert cache.lookup(['http://a/1'])[0] == {'http://a/1': ('http://cdn/1', True, True)}
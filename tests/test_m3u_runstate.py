@@ -0,0 +1,119 @@
+"""m3u_runstate 与 m3u_dag 的增量执行：输入、参数、脚本未变时复用输出，任一变化时重新计算"""
+
+import json
+
+import pytest
+
+import m3u_dag
+from m3u_dag import execute, validate_definition
+from m3u_runstate import content_digest, load_state, save_state, text_digest
+
+SOURCE = """#EXTM3U
+#EXTINF:-1 group-title="央视",CCTV-1
+http://10.0.0.1/hls/1.m3u8
+#EXTINF:-1 group-title="卫视",湖南卫视
+http://10.0.0.2/live/2
+"""
+
+DEFINITION = {
+    'sources': {'src': 'src.m3u', 'extra': 'extra.m3u'},
+    'nodes': {
+        'sorted': {'inputs': ['src'], 'steps': ['url_sorter -k hls']},
+        'dedup': {'inputs': ['sorted'], 'steps': ['deduplicate'], 'output': 'dedup.m3u'},
+        'cctv': {'inputs': ['extra'], 'steps': ["extract --eandu 'CCTV,http'"], 'output': 'cctv.m3u'},
+        'merged': {'inputs': ['dedup', 'cctv'], 'steps': ['m3u_merger'], 'output': 'merged.m3u'},
+    },
+}
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'src.m3u').write_text(SOURCE, encoding='utf-8')
+    (tmp_path / 'extra.m3u').write_text(SOURCE, encoding='utf-8')
+    return tmp_path
+
+
+def run(state, definition=DEFINITION):
+    sources, nodes, order = validate_definition(json.loads(json.dumps(definition)))
+    report = execute(sources, nodes, order, jobs=1, state=state)
+    return {name: status for name, (status, *_) in report.items()}
+
+
+def test_text_digest_matches_file(tmp_path):
+    path = tmp_path / 'a.m3u'
+    path.write_text('#EXTINF:-1,频道\nhttp://a\n', encoding='utf-8')
+    assert text_digest('#EXTINF:-1,频道\nhttp://a\n') == content_digest(str(path))
+    assert content_digest(str(tmp_path / 'missing.m3u')) is None
+
+
+def test_unchanged_run_reuses_outputs(workdir):
+    state = {}
+    assert set(run(state).values()) == {'完成'}
+    assert all('output_digest' in entry for entry in state.values())
+    # 没有输出文件的节点总是重新计算，结果不变时下游仍然复用
+    assert run(state) == {'sorted': '完成', 'dedup': '复用', 'cctv': '复用', 'merged': '复用'}
+
+
+def test_changed_source_recomputes_dependents(workdir):
+    state = {}
+    run(state)
+    (workdir / 'extra.m3u').write_text(SOURCE + '#EXTINF:-1,CCTV-2\nhttp://10.0.0.3/2\n', encoding='utf-8')
+    assert run(state) == {'sorted': '完成', 'dedup': '复用', 'cctv': '完成', 'merged': '完成'}
+    assert 'CCTV-2' in (workdir / 'merged.m3u').read_text(encoding='utf-8')
+
+
+def test_same_upstream_result_keeps_downstream(workdir):
+    state = {}
+    run(state)
+    # 输入变化但提取结果不变：cctv 重新计算，merged 的输入哈希未变，仍然复用
+    (workdir / 'extra.m3u').write_text(SOURCE + '#EXTINF:-1,其它\nhttp://10.0.0.3/2\n', encoding='utf-8')
+    assert run(state) == {'sorted': '完成', 'dedup': '复用', 'cctv': '完成', 'merged': '复用'}
+
+
+def test_modified_or_missing_output_recomputes(workdir):
+    state = {}
+    run(state)
+    (workdir / 'cctv.m3u').write_text('手动修改', encoding='utf-8')
+    (workdir / 'dedup.m3u').unlink()
+    assert run(state) == {'sorted': '完成', 'dedup': '完成', 'cctv': '完成', 'merged': '复用'}
+    assert (workdir / 'dedup.m3u').exists()
+
+
+def test_changed_params_recompute(workdir):
+    state = {}
+    run(state)
+    definition = json.loads(json.dumps(DEFINITION))
+    definition['nodes']['cctv']['steps'] = ["extract --eandu '卫视,http'"]
+    assert run(state, definition) == {'sorted': '完成', 'dedup': '复用', 'cctv': '完成', 'merged': '完成'}
+
+
+def test_changed_code_recomputes_everything(workdir, monkeypatch):
+    state = {}
+    run(state)
+    monkeypatch.setattr(m3u_dag, 'code_digest', lambda: 'changed')
+    assert set(run(state).values()) == {'完成'}
+
+
+def test_failed_node_is_dropped_from_state(workdir):
+    state = {}
+    run(state)
+    (workdir / 'extra.m3u').unlink()
+    assert run(state)['cctv'] == '失败'
+    assert 'cctv' not in state and 'merged' not in state
+    assert 'dedup' in state
+
+
+def test_state_file_roundtrip(workdir):
+    state = {}
+    run(state)
+    assert save_state('state.json', state)
+    assert load_state('state.json') == state
+    assert run(load_state('state.json'))['merged'] == '复用'
+
+
+@pytest.mark.parametrize('content', ['{', '[]', '{"version": 0, "nodes": {"a": {}}}'])
+def test_unusable_state_file_starts_over(workdir, content):
+    (workdir / 'state.json').write_text(content, encoding='utf-8')
+    assert load_state('state.json') == {}
+    assert load_state('missing.json') == {}
@@ -0,0 +1,280 @@
+"""m3u_seen：各去重容器对第一次出现的键返回 True；去重数据库在输出写入成功后才提交"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from m3u_model import Channel, OrderedSet
+from m3u_seen import SeenBloom, SeenDigests, SeenSet, SeenStore, filter_seen_urls, iter_kept, key_digest
+
+KEYS = [('#EXTINF:-1,CCTV1', 'http://a/1'), ('#EXTINF:-1,CCTV1', 'http://a/2'),
+        ('#EXTINF:-1,CCTV1', 'http://a/1'), ('#EXTINF:-1,湖南卫视', 'http://b/1')]
+
+
+def test_key_digest():
+    digest = key_digest(*KEYS[0])
+    assert 0 <= digest < 1 << 64
+    assert digest == key_digest('#EXTINF:-1,CCTV1', 'http://a/1')
+    # 字段边界参与哈希
+    assert key_digest('ab', 'c') != key_digest('a', 'bc')
+    # 无法编码的代理字符不报错
+    assert key_digest('\udcff') != key_digest('')
+
+
+@pytest.mark.parametrize('make', [SeenSet, SeenDigests, lambda: SeenBloom(1000, 0.001)])
+def test_first_occurrence(make):
+    seen = make()
+    assert [seen.add(key) for key in KEYS] == [True, True, False, True]
+    assert len(seen) == 3
+    assert seen.add(KEYS[3], label='忽略') is False
+
+
+def test_digest_window_forgets_oldest():
+    seen = SeenDigests(window=2)
+    assert seen.add(('a',)) and seen.add(('b',))
+    assert not seen.add(('a',))
+    assert seen.add(('c',))  # 'a' 被遗忘
+    assert len(seen) == 2
+    assert seen.add(('a',))
+    assert not seen.add(('c',))
+
+
+def test_digest_window_zero_is_unbounded():
+    seen = SeenDigests(window=0)
+    for i in range(100):
+        seen.add((str(i),))
+    assert len(seen) == 100
+    assert not seen.add(('0',))
+
+
+def test_bloom_never_misses_duplicates():
+    bloom = SeenBloom(5000, 0.01)
+    keys = [(f'#EXTINF:-1,频道{i}', f'http://10.0.{i % 256}.1/{i}') for i in range(5000)]
+    kept = sum(bloom.add(key) for key in keys)
+    assert not any(bloom.add(key) for key in keys)
+    assert all(key in bloom for key in keys)
+    assert len(bloom) == kept
+    # 误判只会丢弃新键，比例应接近目标误判率
+    assert 5000 - kept < 5000 * 0.01 * 3
+
+
+def test_bloom_false_positive_rate_near_target():
+    fpr = 0.01
+    bloom = SeenBloom(10000, fpr)
+    for i in range(10000):
+        bloom.add(('a', str(i)))
+    false_hits = sum(('b', str(i)) in bloom for i in range(20000))
+    assert false_hits / 20000 < fpr * 2
+    assert 0 < bloom.current_fpr() < fpr * 1.5
+
+
+def test_bloom_sizing():
+    bloom = SeenBloom(100000, 0.001)
+    # 每个键约 -ln(0.001) / ln²2 ≈ 14.4 位，约 10 个哈希
+    assert 179000 < bloom.size_bytes < 181000
+    assert bloom.hash_count == 10
+    assert SeenBloom(1, 0.5).size_bytes == 8
+
+
+@pytest.mark.parametrize('capacity, fpr', [(0, 0.01), (-1, 0.01), (10, 0), (10, 1), (10, 1.5)])
+def test_bloom_rejects_invalid_parameters(capacity, fpr):
+    with pytest.raises(ValueError):
+        SeenBloom(capacity, fpr)
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / 'seen.db')
+
+
+def test_store_within_one_run(db):
+    with SeenStore(db, 'test') as store:
+        assert [store.add(key) for key in KEYS] == [True, True, False, True]
+        assert (store.new, store.known, store.duplicates) == (3, 0, 1)
+        assert len(store) == 3
+
+
+def test_store_across_runs(db):
+    with SeenStore(db, 'test') as store:
+        store.add(KEYS[0])
+    with SeenStore(db, 'test') as store:
+        # 之前运行中出现过的键默认保留，本次运行内再出现时为重复
+        assert [store.add(key) for key in KEYS] == [True, True, False, True]
+        assert (store.new, store.known, store.duplicates) == (2, 1, 1)
+    with SeenStore(db, 'test', skip_known=True) as store:
+        assert [store.add(key) for key in KEYS + [('新',)]] == [False, False, False, False, True]
+        assert '已作为重复跳过' in store.summary()
+
+
+def test_store_named_run_is_shared(db):
+    with SeenStore(db, 'test', run='nightly') as first:
+        assert first.add(KEYS[0])
+    with SeenStore(db, 'test', run='nightly') as second:
+        assert not second.add(KEYS[0])
+        assert second.run_id == first.run_id
+    with SeenStore(db, 'test', run='other') as third:
+        assert third.add(KEYS[0])
+
+
+def test_store_scopes_are_separate(db):
+    with SeenStore(db, 'deduplicate:name') as a, SeenStore(db, 'deduplicate:url') as b:
+        assert a.add(KEYS[0]) and b.add(KEYS[0])
+
+
+def test_store_first_seen_and_report(db, tmp_path, monkeypatch):
+    monkeypatch.setattr('m3u_seen.time.time', lambda: 1_700_000_000.0)
+    with SeenStore(db, 'test') as store:
+        store.add(KEYS[0], label='CCTV1\thttp://a/1')
+    monkeypatch.setattr('m3u_seen.time.time', lambda: 1_700_086_400.0)
+    with SeenStore(db, 'test') as store:
+        assert store.first_seen(KEYS[0]) == 1_700_000_000.0
+        assert store.first_seen(KEYS[1]) is None
+        store.add(KEYS[0], label='不会覆盖')
+        store.add(KEYS[3], label='湖南卫视\thttp://b/1')
+        assert [row[0] for row in store.iter_run_keys()] == ['CCTV1\thttp://a/1', '湖南卫视\thttp://b/1']
+        report = tmp_path / 'report.tsv'
+        store.write_report(str(report))
+    lines = report.read_text(encoding='utf-8').splitlines()
+    assert lines[0] == '首次出现\t最近出现\t键'
+    assert lines[1].endswith('\tCCTV1\thttp://a/1')
+    assert lines[1].split('\t')[0] != lines[1].split('\t')[1]
+    assert len(lines) == 3
+
+
+def test_store_keeps_large_digests(db):
+    # 摘要超过有符号 64 位范围的键也能保存和查找
+    keys = [(str(i),) for i in range(200)]
+    assert any(key_digest(*key) >= 1 << 63 for key in keys)
+    with SeenStore(db, 'test') as store:
+        assert all(store.add(key) for key in keys)
+        # 提交前写入事务的键同样参与本次运行内的去重
+        assert store.first_seen(keys[0]) is not None
+        assert not any(store.add(key) for key in keys)
+    with SeenStore(db, 'test', skip_known=True) as store:
+        assert not any(store.add(key) for key in keys)
+
+
+def count_selects(store):
+    statements = []
+    store._conn.set_trace_callback(statements.append)
+    return lambda: sum(statement.startswith('SELECT') for statement in statements)
+
+
+def test_store_add_many_matches_add(db, tmp_path):
+    old = [(str(i),) for i in range(0, 1200, 3)]
+    keys = [(str(i),) for i in range(1200)] + [(str(i),) for i in range(0, 1200, 7)]
+    with SeenStore(db, 'test') as store:
+        for key in old:
+            store.add(key)
+    other = str(tmp_path / 'other.db')
+    with SeenStore(other, 'test') as store:
+        for key in old:
+            store.add(key)
+
+    with SeenStore(db, 'test') as one, SeenStore(other, 'test') as many:
+        selects = count_selects(many)
+        expected = [one.add(key) for key in keys]
+        assert many.add_many(keys[:600]) + many.add_many(keys[600:]) == expected
+        # 每批最多 500 个键一条 SELECT；第二批中已在内存里的键不再查询
+        assert selects() == 2 + 2
+        assert (many.new, many.known, many.duplicates) == (one.new, one.known, one.duplicates)
+
+
+def test_iter_kept(db):
+    entries = [(KEYS[0], 'a', 1), (None, None, 2), (KEYS[2], 'b', 3), (KEYS[1], 'c', 4), (None, None, 5)]
+    assert list(iter_kept(SeenSet(), entries)) == [1, 2, 4, 5]
+    with SeenStore(db, 'test') as store:
+        assert list(iter_kept(store, entries)) == [1, 2, 4, 5]
+        assert [row[0] for row in store.iter_run_keys()] == ['a', 'c']
+
+
+def test_filter_seen_urls_in_batches(db):
+    channels = [Channel(f'#EXTINF:-1,频道{i}', urls=[f'http://a/{i}', f'http://a/{i + 1}']) for i in range(1000)]
+    with SeenStore(db, 'test') as store:
+        selects = count_selects(store)
+        assert filter_seen_urls(channels, store) == 999
+        assert selects() == 4
+    assert [channel.urls for channel in channels[:2]] == [['http://a/0', 'http://a/1'], ['http://a/2']]
+
+
+def test_filter_seen_urls():
+    channels = [Channel('#EXTINF:-1,A', urls=['http://a/1?timestamp=1', 'http://a/2']),
+                Channel('#EXTINF:-1,B', urls=OrderedSet(['http://a/2', 'http://b/1']))]
+    assert filter_seen_urls(channels, SeenSet()) == 1
+    assert channels[0].urls == ['http://a/1?timestamp=1', 'http://a/2']
+    assert isinstance(channels[1].urls, OrderedSet) and list(channels[1].urls) == ['http://b/1']
+
+    channels = [Channel('#EXTINF:-1,A', urls=['http://live.miguvideo.com/1?timestamp=1']),
+                Channel('#EXTINF:-1,B', urls=['http://live.miguvideo.com/1?timestamp=2'])]
+    assert filter_seen_urls(channels, SeenSet(), canonical=True) == 1
+    assert channels[1].urls == []
+
+
+def dump(db):
+    with sqlite3.connect(db) as conn:
+        return list(conn.iterdump())
+
+
+def test_store_changes_wait_for_commit(db):
+    with SeenStore(db, 'test', run='nightly') as store:
+        store.add(KEYS[0])
+    before = dump(db)
+
+    store = SeenStore(db, 'test', run='nightly')
+    keys = [(str(i),) for i in range(12000)]
+    assert all(store.add(key) for key in keys)
+    store.first_seen(keys[0])
+    store.close()
+    assert dump(db) == before
+
+    # 新的运行同样在提交时才创建
+    with pytest.raises(RuntimeError):
+        with SeenStore(db, 'test') as store:
+            store.add(KEYS[1])
+            raise RuntimeError
+    assert dump(db) == before
+
+    store = SeenStore(db, 'test')
+    assert store.add(KEYS[0]) and store.add(KEYS[1])
+    store.commit()
+    store.close()
+    with SeenStore(db, 'test', skip_known=True) as store:
+        assert not store.add(KEYS[0]) and not store.add(KEYS[1])
+
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+
+
+@pytest.mark.parametrize('script, options', [
+    ('m3u_merger.py', []),
+    ('m3u_merger.py', ['--canonical-urls', '--jobs', '2']),
+    ('m3u_mergerng.py', []),
+    ('deduplicate.py', []),
+    ('deduplicate.py', ['--key', 'name+url']),
+    ('deduplicate.py', ['--mmap']),
+])
+def test_failed_write_leaves_store_unchanged(tmp_path, script, options):
+    def run(output, count):
+        source = tmp_path / 'in.m3u'
+        source.write_text('#EXTM3U\n' + ''.join(f'#EXTINF:-1 group-title="g",频道{i}\nhttp://10.0.0.1/{i}\n'
+                                                for i in range(count)), encoding='utf-8')
+        return subprocess.run([sys.executable, os.path.join(SCRIPTS, script), '-i', str(source), '-o', output,
+                               '--force', '--seen-db', db, *options], capture_output=True, encoding='utf-8')
+
+    db = str(tmp_path / 'seen.db')
+    assert run(str(tmp_path / 'first.m3u'), 2000).returncode == 0
+    before = dump(db)
+
+    # 输出文件所在的"目录"是一个普通文件，写入失败
+    (tmp_path / 'out').write_text('', encoding='utf-8')
+    result = run(str(tmp_path / 'out' / 'out.m3u'), 12000)
+    assert result.returncode == 1, result.stdout + result.stderr
+    assert dump(db) == before
+
+    # 重新运行时本次新增的键都还在
+    result = run(str(tmp_path / 'second.m3u'), 12000)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert (tmp_path / 'second.m3u').read_text(encoding='utf-8').count('http://') == 12000
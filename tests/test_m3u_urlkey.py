@@ -0,0 +1,85 @@
+"""m3u_urlkey：规范化 URL、去重键与按新旧保留的 URL 容器"""
+
+import pytest
+
+from m3u_urlkey import (CanonicalURLSet, canonical_url, host_rule, is_fresher, url_freshness,
+                        url_key)
+
+MIGU = 'http://hlszymgsplive.miguvideo.com/wd_r2/cctv1/index.m3u8'
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('HTTP://Example.COM:80/Path/a.m3u8#frag', 'http://example.com/Path/a.m3u8'),
+    ('https://example.com:443/a', 'https://example.com/a'),
+    ('http://example.com:8080/a', 'http://example.com:8080/a'),
+    ('https://example.com:80/a', 'https://example.com:80/a'),
+    ('http://example.com/a?b=2&a=1&&c', 'http://example.com/a?a=1&b=2&c'),
+    # 参数按原始形式比较，不做解码
+    ('http://example.com/a?q=%E5%A4%AE&p=a%2Bb', 'http://example.com/a?p=a%2Bb&q=%E5%A4%AE'),
+    ('http://user:pw@Example.com/a', 'http://user:pw@example.com/a'),
+    ('http://[::1]:8080/a', 'http://[::1]:8080/a'),
+    ('rtp://239.0.0.1:5000', 'rtp://239.0.0.1:5000'),
+])
+def test_canonical_url(url, expected):
+    assert canonical_url(url) == expected
+
+
+def test_unparsable_url_is_kept():
+    assert canonical_url('http://[::1/a') == 'http://[::1/a'
+    assert url_freshness('http://[::1/a') is None
+
+
+def test_volatile_params_only_for_matching_hosts():
+    url = f'{MIGU}?msisdn=138&Timestamp=20240101&SecurityKey=k&encrypt=e&client_ip=1.1.1.1&sid=7'
+    assert canonical_url(url) == f'{MIGU}?sid=7'
+    # 其他主机保留同名参数
+    assert canonical_url('http://example.com/a?msisdn=1&sid=7') == 'http://example.com/a?msisdn=1&sid=7'
+    # 后缀按完整域名段匹配
+    assert canonical_url('http://notmiguvideo.com/a?msisdn=1') == 'http://notmiguvideo.com/a?msisdn=1'
+
+
+def test_host_rule():
+    volatile, fresh = host_rule('live.cmvideo.cn')
+    assert 'securitykey' in volatile and fresh == 'timestamp'
+    assert host_rule('example.com') == (frozenset(), None)
+
+
+def test_url_key():
+    a = url_key(f'{MIGU}?msisdn=1&timestamp=1')
+    assert len(a) == 8
+    # 路径区分大小写
+    assert a != url_key(f'{MIGU.replace("cctv1", "CCTV1")}?timestamp=2&msisdn=2')
+    assert a == url_key(f'HTTP://HLSZYMGSPLIVE.miguvideo.com:80/wd_r2/cctv1/index.m3u8?timestamp=9')
+    assert url_key('http://example.com/a') != url_key('http://example.com/b')
+
+
+def test_freshness_compares_numerically():
+    older = url_freshness(f'{MIGU}?timestamp=999')
+    newer = url_freshness(f'{MIGU}?timestamp=1000')
+    assert older == (3, '999') and newer > older
+    assert url_freshness(f'{MIGU}?timestamp=') is None
+    assert url_freshness('http://example.com/a?timestamp=1') is None
+
+
+def test_is_fresher():
+    assert is_fresher((1, '2'), (1, '1'))
+    assert is_fresher((1, '1'), (1, '1'))
+    assert not is_fresher((1, '1'), (1, '2'))
+    assert is_fresher((1, '1'), None)
+    assert not is_fresher(None, (1, '1'))
+    assert is_fresher(None, None)
+
+
+def test_canonical_set_keeps_position_and_newest_url():
+    urls = CanonicalURLSet([
+        f'{MIGU}?timestamp=200&msisdn=a',
+        'http://example.com/b',
+        f'{MIGU}?timestamp=100&msisdn=b',   # 更旧，不替换
+        f'{MIGU}?timestamp=300&msisdn=c',   # 更新，位置不变
+        'http://EXAMPLE.com/b#x',           # 没有时间参数，后出现的替换
+    ])
+    assert list(urls) == [f'{MIGU}?timestamp=300&msisdn=c', 'http://EXAMPLE.com/b#x']
+    assert len(urls) == 2 and urls
+    assert f'{MIGU}?msisdn=z' in urls
+    assert 'http://example.com/c' not in urls
+    assert not CanonicalURLSet()
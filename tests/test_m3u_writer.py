@@ -0,0 +1,107 @@
+"""m3u_writer：原子写入、内容相同时保留原文件、失败时清理临时文件"""
+
+import os
+
+import pytest
+
+from m3u_writer import atomic_write, file_digest, iter_lines
+
+
+def test_creates_file(tmp_path):
+    path = tmp_path / 'out.m3u'
+    assert atomic_write(str(path), ['#EXTM3U\n', '#EXTINF:-1,频道\n']) is True
+    assert path.read_text(encoding='utf-8') == '#EXTM3U\n#EXTINF:-1,频道\n'
+    assert os.listdir(tmp_path) == ['out.m3u']
+
+
+def test_identical_content_keeps_file(tmp_path):
+    path = tmp_path / 'out.m3u'
+    path.write_text('a\nb\n', encoding='utf-8')
+    os.utime(path, (1_000_000, 1_000_000))
+    inode = path.stat().st_ino
+    assert atomic_write(str(path), iter(['a\n', 'b\n'])) is False
+    assert path.stat().st_mtime == 1_000_000
+    assert path.stat().st_ino == inode
+    assert os.listdir(tmp_path) == ['out.m3u']
+
+
+def test_changed_content_replaces_file(tmp_path):
+    path = tmp_path / 'out.m3u'
+    path.write_text('a\nb\n', encoding='utf-8')
+    # 大小相同、内容不同
+    assert atomic_write(str(path), ['a\nc\n']) is True
+    assert path.read_text(encoding='utf-8') == 'a\nc\n'
+
+
+def test_large_text_spans_buffers(tmp_path):
+    path = tmp_path / 'out.m3u'
+    lines = [f'http://10.0.0.1/{i}/频道.m3u8\n' for i in range(20000)]
+    assert atomic_write(str(path), lines) is True
+    data = path.read_bytes()
+    assert data == ''.join(lines).encode('utf-8')
+    assert atomic_write(str(path), lines) is False
+
+
+def test_binary_chunks(tmp_path):
+    path = tmp_path / 'out.bin'
+    payload = bytes(range(256)) * 10
+    assert atomic_write(str(path), [payload[:100], memoryview(payload)[100:]], binary=True) is True
+    assert path.read_bytes() == payload
+
+
+def test_failure_keeps_original_and_cleans_up(tmp_path):
+    path = tmp_path / 'out.m3u'
+    path.write_text('原内容\n', encoding='utf-8')
+
+    def chunks():
+        yield '新内容\n'
+        raise RuntimeError('生成失败')
+
+    with pytest.raises(RuntimeError):
+        atomic_write(str(path), chunks())
+    assert path.read_text(encoding='utf-8') == '原内容\n'
+    assert os.listdir(tmp_path) == ['out.m3u']
+
+
+def test_keeps_existing_mode(tmp_path):
+    path = tmp_path / 'out.m3u'
+    path.write_text('a\n', encoding='utf-8')
+    os.chmod(path, 0o640)
+    atomic_write(str(path), ['b\n'])
+    assert path.stat().st_mode & 0o777 == 0o640
+
+
+def test_new_file_follows_umask(tmp_path):
+    path = tmp_path / 'out.m3u'
+    umask = os.umask(0o022)
+    try:
+        atomic_write(str(path), ['a\n'])
+    finally:
+        os.umask(umask)
+    assert path.stat().st_mode & 0o777 == 0o644
+
+
+def test_same_input_and_output(tmp_path):
+    path = tmp_path / 'list.m3u'
+    path.write_text('a\nb\n', encoding='utf-8')
+    with open(path, 'r', encoding='utf-8') as f:
+        assert atomic_write(str(path), (line.upper() for line in f)) is True
+    assert path.read_text(encoding='utf-8') == 'A\nB\n'
+
+
+def test_file_digest_depends_on_content(tmp_path):
+    a = tmp_path / 'a'
+    b = tmp_path / 'b'
+    a.write_bytes(b'x' * 3_000_000)
+    b.write_bytes(b'x' * 2_999_999 + b'y')
+    assert len(file_digest(str(a))) == 16
+    assert file_digest(str(a)) != file_digest(str(b))
+
+
+def test_iter_lines():
+    assert ''.join(iter_lines(['a', 'b'], header='#EXTM3U')) == '#EXTM3U\na\nb\n'
+    assert list(iter_lines([])) == []
+    lines = [str(i) for i in range(5000)]
+    chunks = list(iter_lines(iter(lines)))
+    assert len(chunks) == 3
+    assert ''.join(chunks) == '\n'.join(lines) + '\n'
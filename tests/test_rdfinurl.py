@@ -0,0 +1,132 @@
+"""rdfinurl.py：线程引擎的 keep-alive 连接复用（本地 HTTP 服务器）"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from rdfinurl import ConnectionPool, get_final_url
+
+# 大响应体：远大于套接字缓冲区，客户端不读完时服务器端必然写入失败
+BIG_BODY_SIZE = 64 * 1024 * 1024
+BIG_CHUNK = b'\0' * (1 << 16)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        if self.path.startswith('/hop/'):
+            # /hop/N 重定向到 /hop/N-1，/hop/0 为普通网页
+            hops = int(self.path.rsplit('/', 1)[1])
+            if hops:
+                self.send_response(302)
+                self.send_header('Location', f'/hop/{hops - 1}')
+                self.send_header('Content-Length', '7')
+                self.end_headers()
+                self.wfile.write(b'moved\r\n')
+                return
+            self.send(200, 'text/html', b'<html></html>')
+        elif self.path == '/playlist.m3u8':
+            self.send(200, 'application/vnd.apple.mpegurl', b'#EXTM3U\n' * 100)
+        elif self.path == '/big':
+            self.send_response(200)
+            self.send_header('Content-Type', 'video/mp2t')
+            self.send_header('Content-Length', str(BIG_BODY_SIZE))
+            self.end_headers()
+            sent = 0
+            try:
+                while sent < BIG_BODY_SIZE:
+                    self.wfile.write(BIG_CHUNK)
+                    sent += len(BIG_CHUNK)
+            except OSError:
+                self.close_connection = True
+            with server.lock:
+                server.big_sent.append(sent)
+        else:
+            self.send(404, 'text/plain', b'missing')
+
+    def send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.daemon_threads = True
+    httpd.lock = threading.Lock()
+    httpd.requests = 0
+    httpd.big_sent = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def base_url(server):
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def test_redirect_chain_reuses_connection(server):
+    base = base_url(server)
+    pool = ConnectionPool()
+    try:
+        for _ in range(3):
+            assert get_final_url(f'{base}/hop/5', pool=pool) == (f'{base}/hop/0', True, False)
+        assert get_final_url(f'{base}/playlist.m3u8', pool=pool) == (f'{base}/playlist.m3u8', True, True)
+        assert get_final_url(f'{base}/missing', pool=pool) == (f'{base}/missing', False, False)
+        requests_sent, connections = pool.stats()
+    finally:
+        pool.close()
+    # 重定向的每一跳和之后的 URL 都在同一个连接上
+    assert requests_sent == server.requests == 3 * 6 + 2
+    assert connections == 1
+
+
+def test_large_body_is_not_drained(server):
+    base = base_url(server)
+    pool = ConnectionPool()
+    try:
+        assert get_final_url(f'{base}/big', pool=pool) == (f'{base}/big', True, True)
+        assert get_final_url(f'{base}/hop/1', pool=pool) == (f'{base}/hop/0', True, False)
+        requests_sent, connections = pool.stats()
+    finally:
+        pool.close()
+    # 视频流直接断开，不下载响应体；下一个请求新建连接，之后的重定向复用它
+    assert requests_sent == 3 and connections == 2
+    server.shutdown()
+    assert len(server.big_sent) == 1 and server.big_sent[0] < BIG_BODY_SIZE
+
+
+def test_threads_share_connections(server):
+    base = base_url(server)
+    pool = ConnectionPool(per_host=2)
+    results = {}
+
+    def worker(index):
+        results[index] = get_final_url(f'{base}/hop/3', pool=pool)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(8)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        requests_sent, connections = pool.stats()
+    finally:
+        pool.close()
+    assert set(results.values()) == {(f'{base}/hop/0', True, False)}
+    # 每个主机最多同时使用 2 个连接
+    assert requests_sent == 8 * 4
+    assert connections <= 2